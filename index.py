@@ -17,12 +17,16 @@
 
 # Pylint Rule Overrides
 
+# pylint: disable=too-many-lines
+
 # Modules
 
 import os
 import sys
+import signal
 import logging
 import argparse
+import concurrent.futures
 import pathlib
 import datetime
 
@@ -32,10 +36,30 @@ from lib.utils import logger_util
 from lib.utils import date_util
 from lib.utils import directory_util
 from lib.utils import file_util
+from lib.utils import system_util
 from lib.utils.obfuscation_util import obfuscate
 from lib.classes.cloudant_database import CloudantDatabase
 from lib.classes.scan_conflicts_task import ScanConflictsTask
 from lib.classes.delete_conflicts_task import DeleteConflictsTask
+from lib.classes.progress_reporter import ProgressReporter
+from lib.classes.request_metrics import RequestMetrics
+from lib.classes.phase_profiler import PhaseProfiler
+from lib.classes.trace_recorder import TraceRecorder
+from lib.classes.retry_policy import RetryPolicy
+from lib.classes.circuit_breaker import CircuitBreaker
+from lib.classes.rate_limiter import RateLimiter
+from lib.classes.capacity_scheduler import CapacityScheduler
+from lib.classes.load_monitor import LoadMonitor
+from lib.classes.session_cache import SessionCache
+from lib.classes import retry_policy
+from lib.classes import circuit_breaker
+from lib.classes import rate_limiter
+from lib.classes import capacity_scheduler
+from lib.classes import load_monitor
+from lib.classes import maintenance_schedule
+from lib.classes import session_cache
+from lib.classes import trace_recorder
+from lib.classes import cloudant_database
 
 # Authorship
 
@@ -58,9 +82,9 @@ ENV_CLOUDANT_PASSWORD = "CLOUDANT_PASSWORD"
 ARGUMENT_PARSER_EPILOG = \
     "=== Environment Variables ===\n" \
     "\n" \
-    "CLOUDANT_ACCOUNT : Cloudant account name.\n" \
-    "CLOUDANT_API_KEY : Cloudant API key.\n" \
-    "CLOUDANT_PASSWORD : Cloudant password.\n" \
+    "CLOUDANT_ACCOUNT : Cloudant account name (optional when --url or --replay is specified).\n" \
+    "CLOUDANT_API_KEY : Cloudant API key (optional when --replay is specified).\n" \
+    "CLOUDANT_PASSWORD : Cloudant password (optional when --replay is specified).\n" \
     "\n" \
     "=== Examples ===\n" \
     "\n" \
@@ -68,7 +92,19 @@ ARGUMENT_PARSER_EPILOG = \
     "export CLOUDANT_API_KEY=api_key\n" \
     "export CLOUDANT_PASSWORD=password\n" \
     "\n" \
-    "python index.py -d -n projects-api_prod-dallas\n"
+    "python index.py -d -n projects-api_prod-dallas\n" \
+    "\n" \
+    "python index.py -n conflicts-benchmark --url http://127.0.0.1:5984\n" \
+    "\n" \
+    "python index.py -n conflicts-benchmark --replay results/conflicts_cassette.ndjson.gz --replay-speed 2\n" \
+    "\n" \
+    "python index.py -d -n conflicts-benchmark --url http://127.0.0.1:5984 --faults mixed\n" \
+    "\n" \
+    "python index.py -d -n conflicts-benchmark --url http://127.0.0.1:5984 --cooperative nightly-1\n" \
+    "\n" \
+    "python index.py -d -n conflicts-benchmark --url http://127.0.0.1:5984 --daemon --metrics-port 9090\n" \
+    "\n" \
+    "python index.py -d -n conflicts-benchmark --url http://127.0.0.1:5984 --compact\n"
 
 PROP_CLOUDANT_ACCOUNT = "cloudant_account"
 PROP_CLOUDANT_API_KEY = "cloudant_api_key"
@@ -100,10 +136,122 @@ SUMMARY_FILENAME = "{0}{1}{2}{3}".format(
     CURRENT_TIME,
     constants.TEXT_FILE_EXTENSION)
 
+SUMMARY_JSON_FILENAME = "{0}{1}{2}{3}".format(
+    constants.FILE_PREFIX,
+    "summary_",
+    CURRENT_TIME,
+    constants.JSON_FILE_EXTENSION)
+
+PROGRESS_FILENAME = "{0}{1}{2}{3}".format(
+    constants.FILE_PREFIX,
+    "progress_",
+    CURRENT_TIME,
+    constants.NDJSON_FILE_EXTENSION)
+
+METRICS_FILENAME = "{0}{1}{2}{3}".format(
+    constants.FILE_PREFIX,
+    "metrics_",
+    CURRENT_TIME,
+    constants.PROMETHEUS_FILE_EXTENSION)
+
+TRACE_FILENAME = "{0}{1}{2}{3}".format(
+    constants.FILE_PREFIX,
+    "trace_",
+    CURRENT_TIME,
+    constants.JSON_FILE_EXTENSION)
+
+VERIFICATION_DETAILS_CSV_FILENAME = "{0}{1}{2}{3}".format(
+    constants.FILE_PREFIX,
+    "verification_details_",
+    CURRENT_TIME,
+    constants.CSV_FILE_EXTENSION)
+
+DAEMON_DETAILS_CSV_FILENAME = "{0}{1}{2}{3}".format(
+    constants.FILE_PREFIX,
+    "daemon_details_",
+    CURRENT_TIME,
+    constants.CSV_FILE_EXTENSION)
+
+# Daemon state (resume sequence) of a database; in the user state directory rather than the timestamped results
+# directory, so that restarts find it
+DAEMON_STATE_DIRNAME = os.path.join("~", ".local", "state", "couchdb_conflict_remover")
+
+DAEMON_STATE_FILENAME_FORMAT = "{0}{1}{{0}}{2}".format(
+    constants.FILE_PREFIX,
+    "daemon_state_",
+    constants.JSON_FILE_EXTENSION)
+
+CHECKPOINT_FILENAME = "{0}{1}{2}{3}".format(
+    constants.FILE_PREFIX,
+    "checkpoint_",
+    CURRENT_TIME,
+    constants.JSON_FILE_EXTENSION)
+
+CASSETTE_FILENAME = "{0}{1}{2}{3}{4}".format(
+    constants.FILE_PREFIX,
+    "cassette_",
+    CURRENT_TIME,
+    constants.NDJSON_FILE_EXTENSION,
+    constants.GZIP_FILE_EXTENSION)
+
+PROFILE_CPU = "cpu"
+PROFILE_MEMORY = "memory"
+PROFILE_TRACE = "trace"
+PROFILE_MODES = (PROFILE_CPU, PROFILE_MEMORY, PROFILE_TRACE)
+
+HTTP_STATUS_TOO_MANY_REQUESTS = "429"
+
+# See: cloudant.client.Cloudant (account)
+CLOUDANT_ACCOUNT_URL_FORMAT = "https://{0}.cloudant.com"
+
+BYTES_PER_MIB = 1024 * 1024
+
 DEFAULT_THRESHOLD = 5000 # revisions
 
+DEFAULT_LOG_EVERY = 0 # rows / revisions (disabled)
+
+DEFAULT_PROGRESS_INTERVAL = 10 # seconds
+
+DEFAULT_PAGE_SIZE = 100 # rows
+
+DEFAULT_CHUNK_SIZE = 500 # revisions
+
+# Defaults of the optional features, whose modules are imported on demand (see: MetricsServer)
+
+DEFAULT_RANGES = 16 # ranges of the document ID keyspace (see: LeaseCoordinator)
+
+DEFAULT_LEASE_TTL = 60 # seconds
+
+DEFAULT_HEARTBEAT = 5 # seconds (see: ConflictsDaemon)
+
+DEFAULT_MICRO_BATCH_SIZE = 20 # documents
+
+DEFAULT_MICRO_BATCH_DELAY = 1.0 # seconds
+
+DEFAULT_VERIFY_CHUNK_SIZE = 200 # documents (see: VerifyConflictsTask)
+
+MAX_VERIFY_ROUNDS = 3
+
+DEFAULT_COMPACT_TIMEOUT = 3600 # seconds (see: CompactionTask)
+
+DEFAULT_MERGE_FIELD = "updated"
+
+DEFAULT_MERGE_BATCH_SIZE = 500 # revisions (see: MergeConflictsTask)
+
+DEFAULT_CONCURRENCY = 1 # workers
+
+PREFLIGHT_WORKERS = 2 # concurrent preflight requests
+
+DEFAULT_REPLAY_SPEED = 1.0 # recorded latencies
+
 DEFAULT_LOGGER = logging.getLogger("index")
 
+# Exit status of a run whose verification left conflicted (or unverified) documents (see: --verify)
+EXIT_STATUS_UNRESOLVED = 2
+
+# Exit status of a run whose compaction requests failed (see: --compact)
+EXIT_STATUS_COMPACTION_FAILED = 1
+
 # Functions ------------------------------------------------------------------->
 
 def _parse_command_line_args():
@@ -111,6 +259,8 @@ def _parse_command_line_args():
     Parse command-line arguments
     """
 
+    # pylint: disable=too-many-statements
+
     parser = argparse.ArgumentParser(
         epilog=ARGUMENT_PARSER_EPILOG,
         formatter_class=argparse.RawTextHelpFormatter)
@@ -121,6 +271,14 @@ def _parse_command_line_args():
         required=True,
         help="The name of the target CouchDB / Cloudant database.")
 
+    parser.add_argument(
+        "-u",
+        "--url",
+        default=None,
+        help="The CouchDB / Cloudant server URL (e.g. a local CouchDB or the stand-in server). "
+             "Takes precedence over the CLOUDANT_ACCOUNT environment variable. "
+             "Default: https://CLOUDANT_ACCOUNT.cloudant.com.")
+
     parser.add_argument(
         "-d",
         "--delete",
@@ -128,36 +286,664 @@ def _parse_command_line_args():
         help="Enable deletion mode. "
              "Default: False.")
 
-    parser.add_argument(
-        "-r",
-        "--results-dir",
-        default=DEFAULT_RESULTS_DIRNAME,
-        help="The directory name to use for storing results. "
-             "Default: {0}.".format(DEFAULT_RESULTS_DIRNAME))
+    parser.add_argument(
+        "-r",
+        "--results-dir",
+        default=DEFAULT_RESULTS_DIRNAME,
+        help="The directory name to use for storing results. "
+             "Default: {0}.".format(DEFAULT_RESULTS_DIRNAME))
+
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=int,
+        default=DEFAULT_THRESHOLD,
+        help="The maximum threshold of revisions used to determine whether a conflicted document "
+             "is included during the deletion phase (see: --chunk-oversized). "
+             "Default: {0}.".format(DEFAULT_THRESHOLD))
+
+    parser.add_argument(
+        "--chunk-oversized",
+        action="store_true",
+        default=False,
+        help="Include the documents exceeding the threshold in the deletion phase: their conflicted revisions are "
+             "fetched when processed and deleted in chunks, with a checkpoint saved between chunks (at most every "
+             "30 seconds). "
+             "Default: False.")
+
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="The number of revisions deleted per _bulk_docs request (see: --chunk-oversized). "
+             "Default: {0}.".format(DEFAULT_CHUNK_SIZE))
+
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help="The number of conflicts view rows retrieved per request during the scan phase. "
+             "Default: {0}.".format(DEFAULT_PAGE_SIZE))
+
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="The number of conflicted documents processed in parallel during the deletion phase. "
+             "Default: {0}.".format(DEFAULT_CONCURRENCY))
+
+    parser.add_argument(
+        "--log-every",
+        type=int,
+        default=DEFAULT_LOG_EVERY,
+        help="Log every Nth scanned row and deleted revision. "
+             "Periodic aggregate progress lines are logged regardless. "
+             "Use 0 to disable per-row logging. "
+             "Default: {0}.".format(DEFAULT_LOG_EVERY))
+
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=DEFAULT_PROGRESS_INTERVAL,
+        help="The interval (in seconds) between progress reports (console and NDJSON progress file). "
+             "Default: {0}.".format(DEFAULT_PROGRESS_INTERVAL))
+
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve request metrics (Prometheus text format) on http://127.0.0.1:PORT/metrics while running. "
+             "Default: disabled.")
+
+    parser.add_argument(
+        "--profile",
+        action="append",
+        choices=PROFILE_MODES,
+        default=[],
+        help="Profile the scan and deletion phases (repeatable). "
+             "cpu: cProfile statistics (.pstats) per phase. "
+             "memory: tracemalloc snapshots at phase boundaries. "
+             "trace: Chrome trace event JSON of phases, HTTP requests, row processing and delete batches. "
+             "Default: disabled.")
+
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Record every HTTP request / response and its timing to a cassette file in the results directory "
+             "(credentials scrubbed). "
+             "Default: False.")
+
+    parser.add_argument(
+        "--replay",
+        default=None,
+        help="Replay a recorded cassette file instead of connecting to the server (offline). "
+             "Default: disabled.")
+
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=DEFAULT_REPLAY_SPEED,
+        help="The replay speed relative to the recorded latencies (e.g. 2 = twice as fast). "
+             "Use 0 to replay without delays. "
+             "Default: {0}.".format(DEFAULT_REPLAY_SPEED))
+
+    parser.add_argument(
+        "--faults",
+        default=None,
+        help="Inject faults (429, 500, connection resets, slow responses) into HTTP requests for resilience "
+             "testing ({0}). "
+             "Default: disabled.".format(constants.FAULTS_HELP))
+
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=retry_policy.DEFAULT_MAX_RETRIES,
+        help="The maximum number of retries of an idempotent request failing with 429, 5xx, a connection error "
+             "or a timeout (exponential backoff with jitter). Use 0 to disable retries. "
+             "Default: {0}.".format(retry_policy.DEFAULT_MAX_RETRIES))
+
+    parser.add_argument(
+        "--retry-budget",
+        type=float,
+        default=retry_policy.DEFAULT_BUDGET_RATIO,
+        help="The retries allowed per request across all workers (e.g. 0.2 = at most 1 retry for 5 requests, "
+             "plus a small reserve) to avoid retry storms. "
+             "Default: {0}.".format(retry_policy.DEFAULT_BUDGET_RATIO))
+
+    parser.add_argument(
+        "--breaker-error-rate",
+        type=float,
+        default=circuit_breaker.DEFAULT_ERROR_RATE,
+        help="The fraction (0 - 1) of failed (429, 5xx, connection errors) or slow request attempts among the last "
+             "{0} that trips the circuit breaker: all workers pause until a periodic probe succeeds. "
+             "Use 0 to disable the circuit breaker. "
+             "Default: {1}.".format(circuit_breaker.DEFAULT_WINDOW_SIZE, circuit_breaker.DEFAULT_ERROR_RATE))
+
+    parser.add_argument(
+        "--breaker-latency",
+        type=float,
+        default=circuit_breaker.DEFAULT_LATENCY,
+        help="The latency (in seconds) beyond which a request attempt counts as slow for the circuit breaker. "
+             "Use 0 to ignore latency. "
+             "Default: {0}.".format(circuit_breaker.DEFAULT_LATENCY))
+
+    parser.add_argument(
+        "--breaker-probe-interval",
+        type=float,
+        default=circuit_breaker.DEFAULT_PROBE_INTERVAL,
+        help="The interval (in seconds) between probe requests while the circuit breaker is open. "
+             "Default: {0}.".format(circuit_breaker.DEFAULT_PROBE_INTERVAL))
+
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0,
+        help="The maximum request rate (requests/s, token bucket). Shared with every other instance targeting the "
+             "same account on this host (see: --rate-limit-file). Use 0 to disable rate limiting. "
+             "Default: 0.")
+
+    parser.add_argument(
+        "--rate-limit-burst",
+        type=float,
+        default=None,
+        help="The maximum number of requests sent in a burst (token bucket capacity). "
+             "Default: the rate limit (one second of requests).")
+
+    parser.add_argument(
+        "--rate-limit-file",
+        default=None,
+        help="The rate limiter state file shared by the instances that split the rate limit. "
+             "Default: a file per Cloudant account in the temporary directory.")
+
+    parser.add_argument(
+        "--no-shared-rate-limit",
+        action="store_true",
+        help="Apply the rate limit (and the capacity budgets) to this instance only. "
+             "Default: False.")
+
+    parser.add_argument(
+        "--read-rate",
+        type=float,
+        default=0,
+        help="The budget (requests/s) of the read capacity class (document reads, _all_docs, _bulk_get). "
+             "Use 0 for unlimited. "
+             "Default: 0.")
+
+    parser.add_argument(
+        "--write-rate",
+        type=float,
+        default=0,
+        help="The budget (requests/s) of the write capacity class (document writes and deletions, _bulk_docs). "
+             "Use 0 for unlimited. "
+             "Default: 0.")
+
+    parser.add_argument(
+        "--query-rate",
+        type=float,
+        default=0,
+        help="The budget (requests/s) of the global query capacity class (views, Cloudant Query). "
+             "Use 0 for unlimited. "
+             "Default: 0.")
+
+    parser.add_argument(
+        "--capacity-auto",
+        action="store_true",
+        help="Derive the capacity class budgets not specified above from the provisioned throughput capacity of "
+             "the Cloudant account (read at start-up). "
+             "Default: False.")
+
+    parser.add_argument(
+        "--capacity-fraction",
+        type=float,
+        default=capacity_scheduler.DEFAULT_CAPACITY_FRACTION,
+        help="The fraction (0 - 1) of the provisioned throughput capacity used by the capacity class budgets "
+             "(see: --capacity-auto). "
+             "Default: {0}.".format(capacity_scheduler.DEFAULT_CAPACITY_FRACTION))
+
+    parser.add_argument(
+        "--load-aware",
+        action="store_true",
+        help="Sample the cluster activity (_active_tasks: indexing, compaction, replication) and the request latency "
+             "trend, halve the concurrency and rate limits while the cluster is under pressure and restore them "
+             "gradually once it is idle. "
+             "Default: False.")
+
+    parser.add_argument(
+        "--load-interval",
+        type=float,
+        default=load_monitor.DEFAULT_INTERVAL,
+        help="The interval (in seconds) between cluster activity samples (see: --load-aware). "
+             "Default: {0}.".format(load_monitor.DEFAULT_INTERVAL))
+
+    parser.add_argument(
+        "--load-max-tasks",
+        type=int,
+        default=load_monitor.DEFAULT_MAX_TASKS,
+        help="The number of background tasks (indexing, compaction, replication) at which the cluster is considered "
+             "under pressure (see: --load-aware). "
+             "Default: {0}.".format(load_monitor.DEFAULT_MAX_TASKS))
+
+    parser.add_argument(
+        "--load-latency-factor",
+        type=float,
+        default=load_monitor.DEFAULT_LATENCY_FACTOR,
+        help="The request latency, relative to its usual level, at which the cluster is considered under pressure "
+             "(see: --load-aware). Use 0 to ignore latency. "
+             "Default: {0}.".format(load_monitor.DEFAULT_LATENCY_FACTOR))
+
+    parser.add_argument(
+        "--schedule",
+        default=None,
+        help="The maintenance schedule followed by the deletion phase (local time): {0}, the percentage of full "
+             "speed allowed in each window (0 = paused; first matching window wins), e.g. "
+             "01:00-05:00=100,07:00-19:00=0,*=10. A checkpoint is saved at every window boundary (see: --resume). "
+             "Default: full speed.".format(maintenance_schedule.SPECIFICATION_HELP))
+
+    parser.add_argument(
+        "--resume",
+        default=None,
+        help="Resume the deletion phase from the checkpoint file saved by an interrupted run (the scan phase is "
+             "skipped). Requires deletion mode. "
+             "Default: disabled.")
+
+    parser.add_argument(
+        "--cooperative",
+        default=None,
+        metavar="RUN_ID",
+        help="Share the deletion phase with the other instances started with the same run identifier: the document "
+             "ID keyspace is split into ranges claimed through leases, and the result shards of every instance are "
+             "merged into the summary. Requires deletion mode. "
+             "Default: disabled.")
+
+    parser.add_argument(
+        "--lease-dir",
+        default=None,
+        help="The directory shared by the cooperating instances for the leases and result shards (e.g. for testing "
+             "on a single host). "
+             "Default: _local documents of the database.")
+
+    parser.add_argument(
+        "--ranges",
+        type=int,
+        default=DEFAULT_RANGES,
+        help="The number of ranges of the document ID keyspace (see: --cooperative); must be the same for every "
+             "instance. "
+             "Default: {0}.".format(DEFAULT_RANGES))
+
+    parser.add_argument(
+        "--lease-ttl",
+        type=float,
+        default=DEFAULT_LEASE_TTL,
+        help="The time (in seconds) a range lease is held without renewal; the range of a stopped instance is "
+             "reclaimed once its lease expires (see: --cooperative). "
+             "Default: {0}.".format(DEFAULT_LEASE_TTL))
+
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run continuously instead of scanning the database: follow the changes feed, detect newly conflicted "
+             "documents and delete their conflicted revisions in micro-batches until stopped (SIGINT / SIGTERM). "
+             "The health is served on --metrics-port (/health). Requires deletion mode. "
+             "Default: False.")
+
+    parser.add_argument(
+        "--daemon-state",
+        default=None,
+        help="The file of the changes feed sequence the daemon resumes from after a restart (see: --daemon). "
+             "Default: {0}.".format(
+                 os.path.join(DAEMON_STATE_DIRNAME, DAEMON_STATE_FILENAME_FORMAT.format("<database>"))))
+
+    parser.add_argument(
+        "--heartbeat",
+        type=float,
+        default=DEFAULT_HEARTBEAT,
+        help="The interval (in seconds) between heartbeats of the changes feed; the daemon reconnects after missing "
+             "several heartbeats (see: --daemon). "
+             "Default: {0}.".format(DEFAULT_HEARTBEAT))
+
+    parser.add_argument(
+        "--micro-batch-size",
+        type=int,
+        default=DEFAULT_MICRO_BATCH_SIZE,
+        help="The maximum number of conflicted documents resolved together by the daemon (see: --daemon). "
+             "Default: {0}.".format(DEFAULT_MICRO_BATCH_SIZE))
+
+    parser.add_argument(
+        "--micro-batch-delay",
+        type=float,
+        default=DEFAULT_MICRO_BATCH_DELAY,
+        help="The maximum time (in seconds) a conflicted document detected by the daemon waits for its micro-batch "
+             "to fill (see: --daemon). "
+             "Default: {0}.".format(DEFAULT_MICRO_BATCH_DELAY))
+
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Verify after the deletion phase that the documents it touched are conflict-free: re-read them in "
+             "chunks (_all_docs with keys and conflicts) and report the documents that still, or newly, have "
+             "conflicts. Requires deletion mode. "
+             "Default: False.")
+
+    parser.add_argument(
+        "--verify-chunk-size",
+        type=int,
+        default=DEFAULT_VERIFY_CHUNK_SIZE,
+        help="The number of documents verified per request (see: --verify). "
+             "Default: {0}.".format(DEFAULT_VERIFY_CHUNK_SIZE))
+
+    parser.add_argument(
+        "--requeue",
+        action="store_true",
+        help="Delete the conflicted revisions of the documents found conflicted by the verification and verify them "
+             "again, up to {0} rounds (see: --verify). "
+             "Default: False.".format(MAX_VERIFY_ROUNDS))
+
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Reclaim the disk space of the deleted revisions after the deletion phase: trigger the compaction of the "
+             "database and of the conflicts view, and the cleanup of unused view indexes (where the server permits "
+             "it), then wait for the compactions to finish. The database sizes before / after are recorded in the "
+             "summary. Requires deletion mode. "
+             "Default: False.")
+
+    parser.add_argument(
+        "--compact-timeout",
+        type=float,
+        default=DEFAULT_COMPACT_TIMEOUT,
+        help="The maximum time (in seconds) waiting for the compactions to finish; they keep running on the server "
+             "afterwards (see: --compact). "
+             "Default: {0}.".format(DEFAULT_COMPACT_TIMEOUT))
+
+    parser.add_argument(
+        "--merge",
+        default=None,
+        metavar="STRATEGY",
+        help="Resolve the conflicted documents by merging their revisions instead of deleting the conflicted ones: "
+             "fetch the winning and conflicted revisions of a batch of documents (_bulk_get), apply the strategy "
+             "(latest: the most recently updated revision wins; fields: field-wise merge, the most recently updated "
+             "value of every field wins; MODULE:FUNCTION: custom Python function called with the revisions, winner "
+             "first), then write the new winning revisions and the tombstones of the conflicted ones (_bulk_docs). "
+             "Strategy: {0}. Requires deletion mode. "
+             "Default: disabled.".format(constants.MERGE_STRATEGY_HELP))
+
+    parser.add_argument(
+        "--merge-field",
+        default=DEFAULT_MERGE_FIELD,
+        help="The document field holding the update timestamp (ISO 8601 or epoch) of the latest / fields strategies "
+             "(see: --merge). "
+             "Default: {0}.".format(DEFAULT_MERGE_FIELD))
+
+    parser.add_argument(
+        "--merge-batch-size",
+        type=int,
+        default=DEFAULT_MERGE_BATCH_SIZE,
+        help="The maximum number of revisions per _bulk_get / _bulk_docs request (see: --merge). "
+             "Default: {0}.".format(DEFAULT_MERGE_BATCH_SIZE))
+
+    parser.add_argument(
+        "--session-cache",
+        default=session_cache.DEFAULT_DIRECTORY,
+        help="The directory caching the session cookie between runs (owner only): a run against the same server "
+             "with the same credentials reuses the unexpired session instead of logging in again. "
+             "Default: {0}.".format(session_cache.DEFAULT_DIRECTORY))
+
+    parser.add_argument(
+        "--no-session-cache",
+        action="store_true",
+        help="Log in on every run instead of reusing a cached session cookie (see: --session-cache). "
+             "Default: False.")
+
+    args = parser.parse_args()
+
+    return args
+
+
+def _validate_command_line_args(args, logger=DEFAULT_LOGGER):
+    """
+    TODO
+    """
+
+    # pylint: disable=too-many-branches,too-many-statements
+
+    # Threshold
+
+    if args.threshold <= 0:
+        logger.error("Value specified for 'threshold' CLI option is invalid: %d.", args.threshold)
+        return False
+
+    # Page size
+
+    if args.page_size <= 0:
+        logger.error("Value specified for 'page-size' CLI option is invalid: %d.", args.page_size)
+        return False
+
+    # Concurrency
+
+    if args.concurrency <= 0:
+        logger.error("Value specified for 'concurrency' CLI option is invalid: %d.", args.concurrency)
+        return False
+
+    # Log every
+
+    if args.log_every < 0:
+        logger.error("Value specified for 'log-every' CLI option is invalid: %d.", args.log_every)
+        return False
+
+    # Progress interval
+
+    if args.progress_interval <= 0:
+        logger.error("Value specified for 'progress-interval' CLI option is invalid: %s.", args.progress_interval)
+        return False
+
+    # Metrics port
+
+    if args.metrics_port is not None and \
+            not 0 < args.metrics_port < 65536:
+        logger.error("Value specified for 'metrics-port' CLI option is invalid: %d.", args.metrics_port)
+        return False
+
+    # Record / replay
+
+    if args.record and args.replay:
+        logger.error("CLI options 'record' and 'replay' are mutually exclusive.")
+        return False
+
+    if args.replay_speed < 0:
+        logger.error("Value specified for 'replay-speed' CLI option is invalid: %s.", args.replay_speed)
+        return False
+
+    # Faults
+
+    if args.faults is not None:
+        from lib.classes import fault_injector # pylint: disable=import-outside-toplevel
+
+        try:
+            fault_injector.load_profile(args.faults)
+        except ValueError as err:
+            logger.error("Value specified for 'faults' CLI option is invalid: %s (%s).", args.faults, err)
+            return False
+
+    # Retries
+
+    if args.max_retries < 0:
+        logger.error("Value specified for 'max-retries' CLI option is invalid: %d.", args.max_retries)
+        return False
+
+    if args.retry_budget < 0:
+        logger.error("Value specified for 'retry-budget' CLI option is invalid: %s.", args.retry_budget)
+        return False
+
+    # Circuit breaker
+
+    if not 0 <= args.breaker_error_rate <= 1:
+        logger.error("Value specified for 'breaker-error-rate' CLI option is invalid: %s.", args.breaker_error_rate)
+        return False
+
+    if args.breaker_latency < 0:
+        logger.error("Value specified for 'breaker-latency' CLI option is invalid: %s.", args.breaker_latency)
+        return False
+
+    if args.breaker_probe_interval <= 0:
+        logger.error("Value specified for 'breaker-probe-interval' CLI option is invalid: %s.",
+            args.breaker_probe_interval)
+        return False
+
+    # Rate limit
+
+    if args.rate_limit < 0:
+        logger.error("Value specified for 'rate-limit' CLI option is invalid: %s.", args.rate_limit)
+        return False
+
+    if args.rate_limit_burst is not None and args.rate_limit_burst < 1:
+        logger.error("Value specified for 'rate-limit-burst' CLI option is invalid: %s.", args.rate_limit_burst)
+        return False
+
+    # Capacity classes
+
+    if min(args.read_rate, args.write_rate, args.query_rate) < 0:
+        logger.error("Values specified for 'read-rate' / 'write-rate' / 'query-rate' CLI options must not be "
+            "negative.")
+        return False
+
+    if not 0 < args.capacity_fraction <= 1:
+        logger.error("Value specified for 'capacity-fraction' CLI option is invalid: %s.", args.capacity_fraction)
+        return False
+
+    # Load-aware throttling
+
+    if args.load_interval <= 0:
+        logger.error("Value specified for 'load-interval' CLI option is invalid: %s.", args.load_interval)
+        return False
+
+    if args.load_max_tasks < 1:
+        logger.error("Value specified for 'load-max-tasks' CLI option is invalid: %d.", args.load_max_tasks)
+        return False
+
+    if args.load_latency_factor != 0 and args.load_latency_factor <= 1:
+        logger.error("Value specified for 'load-latency-factor' CLI option is invalid: %s.", args.load_latency_factor)
+        return False
+
+    # Maintenance schedule
+
+    if args.schedule is not None:
+        try:
+            maintenance_schedule.parse_schedule(args.schedule)
+        except ValueError as err:
+            logger.error("Value specified for 'schedule' CLI option is invalid: %s. %s", args.schedule, err)
+            return False
+
+    if args.resume is not None and not args.delete:
+        logger.error("The 'resume' CLI option requires deletion mode.")
+        return False
+
+    # Cooperative deletion
+
+    if args.cooperative is not None:
+        if not args.delete:
+            logger.error("The 'cooperative' CLI option requires deletion mode.")
+            return False
+
+        if args.resume is not None:
+            logger.error("The 'cooperative' and 'resume' CLI options are mutually exclusive.")
+            return False
+
+    if args.lease_dir is not None and args.cooperative is None:
+        logger.error("The 'lease-dir' CLI option requires the 'cooperative' CLI option.")
+        return False
+
+    # Daemon
+
+    if args.daemon:
+        if not args.delete:
+            logger.error("The 'daemon' CLI option requires deletion mode.")
+            return False
+
+        if args.resume is not None or args.cooperative is not None or args.schedule is not None:
+            logger.error("The 'daemon' CLI option cannot be combined with 'resume', 'cooperative' or 'schedule'.")
+            return False
+
+    if args.heartbeat <= 0:
+        logger.error("Value specified for 'heartbeat' CLI option is invalid: %s.", args.heartbeat)
+        return False
+
+    if args.micro_batch_size < 1:
+        logger.error("Value specified for 'micro-batch-size' CLI option is invalid: %d.", args.micro_batch_size)
+        return False
+
+    if args.micro_batch_delay < 0:
+        logger.error("Value specified for 'micro-batch-delay' CLI option is invalid: %s.", args.micro_batch_delay)
+        return False
+
+    # Verification
+
+    if args.verify and not args.delete:
+        logger.error("The 'verify' CLI option requires deletion mode.")
+        return False
+
+    if args.requeue and not args.verify:
+        logger.error("The 'requeue' CLI option requires the 'verify' CLI option.")
+        return False
+
+    if args.verify_chunk_size < 1:
+        logger.error("Value specified for 'verify-chunk-size' CLI option is invalid: %d.", args.verify_chunk_size)
+        return False
+
+    # Merge resolution
+
+    if args.merge is not None:
+        if not args.delete:
+            logger.error("The 'merge' CLI option requires deletion mode.")
+            return False
+
+        if args.resume is not None or args.cooperative is not None or args.schedule is not None or args.daemon:
+            logger.error("The 'merge' CLI option cannot be combined with 'resume', 'cooperative', 'schedule' or "
+                "'daemon'.")
+            return False
+
+        from lib.classes import merge_strategy # pylint: disable=import-outside-toplevel
+
+        try:
+            merge_strategy.load_strategy(args.merge, args.merge_field)
+        except ValueError as err:
+            logger.error("Value specified for 'merge' CLI option is invalid: %s. %s", args.merge, err)
+            return False
+
+    if args.merge_batch_size < 1:
+        logger.error("Value specified for 'merge-batch-size' CLI option is invalid: %d.", args.merge_batch_size)
+        return False
 
-    parser.add_argument(
-        "-t",
-        "--threshold",
-        type=int,
-        default=DEFAULT_THRESHOLD,
-        help="The maximum threshold of revisions used to determine whether a conflicted document "
-             "is included during the deletion phase. "
-             "Default: {0}.".format(DEFAULT_THRESHOLD))
+    # Documents exceeding the threshold
 
-    args = parser.parse_args()
+    if args.chunk_oversized:
+        if not args.delete:
+            logger.error("The 'chunk-oversized' CLI option requires deletion mode.")
+            return False
 
-    return args
+        if args.merge is not None or args.daemon:
+            logger.error("The 'chunk-oversized' CLI option cannot be combined with 'merge' or 'daemon'.")
+            return False
 
+    if args.chunk_size < 1:
+        logger.error("Value specified for 'chunk-size' CLI option is invalid: %d.", args.chunk_size)
+        return False
 
-def _validate_command_line_args(args, logger=DEFAULT_LOGGER):
-    """
-    TODO
-    """
+    # Compaction
 
-    # Threshold
+    if args.compact and not args.delete:
+        logger.error("The 'compact' CLI option requires deletion mode.")
+        return False
 
-    if args.threshold <= 0:
-        logger.error("Value specified for 'threshold' CLI option is invalid: %d.", args.threshold)
+    if args.compact_timeout <= 0:
+        logger.error("Value specified for 'compact-timeout' CLI option is invalid: %s.", args.compact_timeout)
+        return False
+
+    if args.ranges < 1:
+        logger.error("Value specified for 'ranges' CLI option is invalid: %d.", args.ranges)
+        return False
+
+    if args.lease_ttl <= 0:
+        logger.error("Value specified for 'lease-ttl' CLI option is invalid: %s.", args.lease_ttl)
         return False
 
     return True
@@ -172,34 +958,88 @@ def _display_command_line_args(args, logger=DEFAULT_LOGGER):
     string_buffer = (
         "Command-line Arguments:",
         "- Cloudant Database: {0}.".format(args.database_name),
+        "- Cloudant URL: {0}.".format(args.url),
         "- Deletion Mode: {0}.".format(args.delete),
         "- Results Directory: {0}.".format(args.results_dir),
-        "- Threshold: {0}.".format(args.threshold)
+        "- Threshold: {0}.".format(args.threshold),
+        "- Chunk Oversized: {0}.".format(args.chunk_oversized),
+        "- Chunk Size: {0}.".format(args.chunk_size),
+        "- Page Size: {0}.".format(args.page_size),
+        "- Concurrency: {0}.".format(args.concurrency),
+        "- Log Every: {0}.".format(args.log_every),
+        "- Progress Interval: {0} s.".format(args.progress_interval),
+        "- Metrics Port: {0}.".format(args.metrics_port),
+        "- Profile: {0}.".format(", ".join(args.profile) or None),
+        "- Record: {0}.".format(args.record),
+        "- Replay: {0}.".format(args.replay),
+        "- Replay Speed: {0}.".format(args.replay_speed),
+        "- Faults: {0}.".format(args.faults),
+        "- Max Retries: {0}.".format(args.max_retries),
+        "- Retry Budget: {0}.".format(args.retry_budget),
+        "- Breaker Error Rate: {0}.".format(args.breaker_error_rate),
+        "- Breaker Latency: {0} s.".format(args.breaker_latency),
+        "- Breaker Probe Interval: {0} s.".format(args.breaker_probe_interval),
+        "- Rate Limit: {0} requests/s.".format(args.rate_limit),
+        "- Rate Limit Burst: {0}.".format(args.rate_limit_burst),
+        "- Rate Limit File: {0}.".format(args.rate_limit_file),
+        "- Shared Rate Limit: {0}.".format(not args.no_shared_rate_limit),
+        "- Read Rate: {0} requests/s.".format(args.read_rate),
+        "- Write Rate: {0} requests/s.".format(args.write_rate),
+        "- Query Rate: {0} requests/s.".format(args.query_rate),
+        "- Capacity Auto: {0}.".format(args.capacity_auto),
+        "- Capacity Fraction: {0}.".format(args.capacity_fraction),
+        "- Load Aware: {0}.".format(args.load_aware),
+        "- Load Interval: {0} s.".format(args.load_interval),
+        "- Load Max Tasks: {0}.".format(args.load_max_tasks),
+        "- Load Latency Factor: {0}.".format(args.load_latency_factor),
+        "- Schedule: {0}.".format(args.schedule),
+        "- Resume: {0}.".format(args.resume),
+        "- Cooperative: {0}.".format(args.cooperative),
+        "- Lease Directory: {0}.".format(args.lease_dir),
+        "- Ranges: {0}.".format(args.ranges),
+        "- Lease TTL: {0} s.".format(args.lease_ttl),
+        "- Daemon: {0}.".format(args.daemon),
+        "- Daemon State: {0}.".format(args.daemon_state),
+        "- Heartbeat: {0} s.".format(args.heartbeat),
+        "- Micro-batch Size: {0}.".format(args.micro_batch_size),
+        "- Micro-batch Delay: {0} s.".format(args.micro_batch_delay),
+        "- Verify: {0}.".format(args.verify),
+        "- Verify Chunk Size: {0}.".format(args.verify_chunk_size),
+        "- Requeue: {0}.".format(args.requeue),
+        "- Compact: {0}.".format(args.compact),
+        "- Compact Timeout: {0} s.".format(args.compact_timeout),
+        "- Merge: {0}.".format(args.merge),
+        "- Merge Field: {0}.".format(args.merge_field),
+        "- Merge Batch Size: {0}.".format(args.merge_batch_size),
+        "- Session Cache: {0}.".format(None if args.no_session_cache else args.session_cache)
     )
     content = separator.join(string_buffer)
 
     logger.info(content)
 
 
-def _parse_environment_variables(logger=DEFAULT_LOGGER):
+def _parse_environment_variables(account_required=True, credentials_required=True, logger=DEFAULT_LOGGER):
     """
     Parse environment variables into dictionary
     """
 
-    if not ENV_CLOUDANT_ACCOUNT in os.environ:
+    if account_required and \
+            not ENV_CLOUDANT_ACCOUNT in os.environ:
         logger.error("Environment variable not defined: %s.", ENV_CLOUDANT_ACCOUNT)
         return None
-    elif not ENV_CLOUDANT_API_KEY in os.environ:
+    elif credentials_required and \
+            not ENV_CLOUDANT_API_KEY in os.environ:
         logger.error("Environment variable not defined: %s.", ENV_CLOUDANT_API_KEY)
         return None
-    elif not ENV_CLOUDANT_PASSWORD in os.environ:
+    elif credentials_required and \
+            not ENV_CLOUDANT_PASSWORD in os.environ:
         logger.error("Environment variable not defined: %s.", ENV_CLOUDANT_PASSWORD)
         return None
 
     env_dict = dict([
-        (PROP_CLOUDANT_ACCOUNT, os.environ[ENV_CLOUDANT_ACCOUNT]),
-        (PROP_CLOUDANT_API_KEY, os.environ[ENV_CLOUDANT_API_KEY]),
-        (PROP_CLOUDANT_PASSWORD, os.environ[ENV_CLOUDANT_PASSWORD])
+        (PROP_CLOUDANT_ACCOUNT, os.environ.get(ENV_CLOUDANT_ACCOUNT)),
+        (PROP_CLOUDANT_API_KEY, os.environ.get(ENV_CLOUDANT_API_KEY, "")),
+        (PROP_CLOUDANT_PASSWORD, os.environ.get(ENV_CLOUDANT_PASSWORD, ""))
     ])
 
     return env_dict
@@ -232,6 +1072,37 @@ def _get_qualified_filename(results_dir, filename):
     return pathlib.Path("{0}/{1}".format(results_dir, filename))
 
 
+def _run_task_with_progress(name, task, total, args, profiler, tracer):
+    """
+    Run the task (profiled as a phase) while periodically reporting its progress
+    """
+
+    # pylint: disable=too-many-arguments
+
+    progress_file = _get_qualified_filename(args.results_dir, PROGRESS_FILENAME)
+    reporter = ProgressReporter(
+        name=name,
+        task=task,
+        total=total,
+        ndjson_file=progress_file,
+        interval=args.progress_interval)
+
+    reporter.start()
+
+    try:
+        trace_timestamp = tracer.get_timestamp() if tracer else 0
+
+        with profiler.phase(name):
+            status = task.run()
+
+        if tracer:
+            tracer.add_complete_event(name, trace_recorder.CATEGORY_PHASE, trace_timestamp)
+    finally:
+        reporter.stop()
+
+    return status
+
+
 def _fatal_exit(logger=DEFAULT_LOGGER):
     """
     Exit script with fatal status
@@ -264,6 +1135,177 @@ def _get_overview_content(account, database_name, doc_count, elapsed_time):
     return "\n".join(result)
 
 
+def _get_cooperative_content(cooperative_summary):
+    """
+    Generate cooperative deletion content
+    """
+
+    coordination = cooperative_summary["coordination"]
+    merged = cooperative_summary["merged"]
+
+    line = '=' * 80
+    result = [
+        "",
+        line,
+        "Cooperative Details",
+        line,
+        "",
+        "- Run:                                {0}".format(coordination["run"]),
+        "- Instance:                           {0}".format(coordination["instance"]),
+        "- Completed Ranges (this instance):   {0} of {1}".format(
+            len(coordination["completed_ranges"]), coordination["ranges"]),
+        "- Lease Claims (reclaimed / lost):    {0} ({1} / {2})".format(
+            coordination["claims"], coordination["reclaims"], coordination["lost_leases"]),
+        "- Waiting Time (leases):              {0:.3f} s".format(coordination["waiting_s"])
+    ]
+
+    if merged:
+        result.extend([
+            "- Merged Instances:                   {0}".format(len(merged["instances"])),
+            "- Merged Status:                      {0}".format(
+                "complete" if merged["complete"] else "{0} ranges pending".format(len(merged["pending_ranges"]))),
+            "- Merged Conflicted Documents:        {0}".format(merged["totals"]["conflicted_documents"]),
+            "- Merged Resolved Documents:          {0}".format(merged["totals"]["resolved_documents"]),
+            "- Merged Deleted Revisions:           {0}".format(merged["totals"]["deleted_revisions"]),
+            "- Merged Failed Revisions:            {0}".format(merged["totals"]["failed_revisions"])
+        ])
+
+    result.append("")
+
+    return "\n".join(result)
+
+
+def _get_performance_content(requests_summary, resources_summary, breaker_summary=None, limiter_summary=None,
+        capacity_summary=None, monitor_summary=None):
+    """
+    Generate performance content
+    """
+
+    # pylint: disable=too-many-locals
+
+    total_requests = sum(item["requests"] for item in requests_summary.values())
+    total_retries = sum(item["retries"] for item in requests_summary.values())
+    total_throttled = sum(
+        item["status_codes"].get(HTTP_STATUS_TOO_MANY_REQUESTS, 0) for item in requests_summary.values())
+    total_bytes_sent = sum(item["bytes_sent"] for item in requests_summary.values())
+    total_bytes_received = sum(item["bytes_received"] for item in requests_summary.values())
+
+    peak_rss = resources_summary["peak_rss_bytes"]
+    peak_rss_content = "{0:.1f} MiB".format(peak_rss / BYTES_PER_MIB) if peak_rss is not None else "n/a"
+
+    line = '=' * 80
+    result = [
+        "",
+        line,
+        "Performance Details",
+        line,
+        "",
+        "- Peak RSS:                           {0}".format(peak_rss_content),
+        "- CPU Time (user / system):           {0} s / {1} s".format(
+            resources_summary["cpu_user_s"],
+            resources_summary["cpu_system_s"]),
+        "- Total Requests:                     {0}".format(total_requests),
+        "- Total Retries:                      {0}".format(total_retries),
+        "- Total Throttled Requests (429):     {0}".format(total_throttled),
+        "- Total Bytes Sent:                   {0}".format(total_bytes_sent),
+        "- Total Bytes Received:               {0}".format(total_bytes_received)
+    ]
+
+    if breaker_summary:
+        result.extend([
+            "- Circuit Breaker Trips:              {0}".format(breaker_summary["trips"]),
+            "- Circuit Breaker Pause Time:         {0:.1f} s".format(breaker_summary["paused_s"])
+        ])
+
+    if limiter_summary:
+        result.append("- Rate Limit Wait Time:               {0:.1f} s ({1} requests/s)".format(
+            limiter_summary["waited_s"],
+            limiter_summary["rate"]))
+
+    for capacity_class, item in (capacity_summary or {}).items():
+        result.append("{0:<38}{1:.1f} s ({2} requests/s)".format(
+            "- Capacity Wait Time ({0}):".format(capacity_class),
+            item["waited_s"],
+            item["rate"]))
+
+    if monitor_summary:
+        result.append("- Load-Aware Scale (min / final):     {0:.0f}% / {1:.0f}% ({2} of {3} samples under "
+            "pressure)".format(
+                monitor_summary["min_scale"] * 100,
+                monitor_summary["scale"] * 100,
+                monitor_summary["pressured_samples"],
+                monitor_summary["samples"]))
+
+    result.append("- Requests by Operation:")
+
+    for operation, item in requests_summary.items():
+        latency = item["latency_s"]
+        result.append(
+            "   - {0}: {1} requests. Latency: p50 {2:.1f} ms / p99 {3:.1f} ms / max {4:.1f} ms. "
+            "Status codes: {5}. Bytes received: {6}. Retries: {7}.".format(
+                operation,
+                item["requests"],
+                latency["p50"] * 1000,
+                latency["p99"] * 1000,
+                latency["max"] * 1000,
+                ", ".join("{0}={1}".format(status, count) for status, count in item["status_codes"].items()),
+                item["bytes_received"],
+                item["retries"]))
+
+    result.append("")
+
+    return "\n".join(result)
+
+
+def _get_capacity_rates(args, throughput=None):
+    """
+    Retrieve the capacity class budgets: the specified rates, completed by the provisioned throughput (if any)
+    """
+
+    rates = capacity_scheduler.get_provisioned_rates(throughput, args.capacity_fraction) if throughput else {}
+
+    for capacity_class, rate in (
+            (capacity_scheduler.CAPACITY_READ, args.read_rate),
+            (capacity_scheduler.CAPACITY_WRITE, args.write_rate),
+            (capacity_scheduler.CAPACITY_QUERY, args.query_rate)):
+        if rate > 0:
+            rates[capacity_class] = rate
+
+    return rates
+
+
+def _get_conflicts_view(database):
+    """
+    Retrieve the conflicts design document and the number of conflicted documents (view rows; None if unknown)
+    """
+
+    ddoc = database.get_design_document(
+        ddoc_name=constants.DDOC_NAME)
+
+    if ddoc is None:
+        return None, None
+
+    view_row_count = database.get_view_row_count(
+        ddoc=ddoc,
+        view_name=constants.VIEW_NAME)
+
+    return ddoc, view_row_count
+
+
+def _get_resources_summary():
+    """
+    Retrieve process resource usage
+    """
+
+    cpu_user, cpu_system = system_util.get_cpu_times()
+
+    return {
+        "peak_rss_bytes": system_util.get_peak_rss_bytes(),
+        "cpu_user_s": round(cpu_user, 3) if cpu_user is not None else None,
+        "cpu_system_s": round(cpu_system, 3) if cpu_system is not None else None
+    }
+
+
 def _main(logger=DEFAULT_LOGGER):
     """
     The main function.
@@ -273,6 +1315,8 @@ def _main(logger=DEFAULT_LOGGER):
     # pylint: disable=too-many-locals
     # TODO: FIXME
     # pylint: disable=too-many-statements
+    # TODO: FIXME
+    # pylint: disable=too-many-branches
 
     status = False
 
@@ -313,7 +1357,9 @@ def _main(logger=DEFAULT_LOGGER):
 
     # Parse environment Variables
 
-    env_dict = _parse_environment_variables()
+    env_dict = _parse_environment_variables(
+        account_required=args.url is None and args.replay is None,
+        credentials_required=args.replay is None)
 
     if env_dict is None:
         _fatal_exit()
@@ -335,15 +1381,198 @@ def _main(logger=DEFAULT_LOGGER):
 
     start_time = datetime.datetime.now()
 
-    # Configure database connection
+    # Profiling
+
+    profiler = PhaseProfiler(
+        results_dir=args.results_dir,
+        timestamp=CURRENT_TIME,
+        cpu=PROFILE_CPU in args.profile,
+        memory=PROFILE_MEMORY in args.profile)
+
+    tracer = TraceRecorder() if PROFILE_TRACE in args.profile else None
+
+    # Request metrics
+
+    metrics = RequestMetrics()
+    metrics_server = None
+
+    if args.metrics_port is not None:
+        # Imported on demand (http.server is not needed otherwise)
+        from lib.classes.metrics_server import MetricsServer # pylint: disable=import-outside-toplevel
+
+        metrics_server = MetricsServer(
+            metrics=metrics,
+            port=args.metrics_port)
+
+        status = metrics_server.start()
+
+        if status is False:
+            _fatal_exit()
+
+    # Record / replay HTTP traffic
 
     account = env_dict[PROP_CLOUDANT_ACCOUNT]
+    url = args.url
+    recorder = None
+    replay = None
+
+    if args.replay:
+        from lib.classes.http_cassette import CassetteReplay # pylint: disable=import-outside-toplevel
+
+        replay = CassetteReplay(
+            cassette_file=args.replay,
+            speed=args.replay_speed)
+
+        status = replay.load()
+
+        if status is False:
+            _fatal_exit()
+
+        url = url or replay.get_url()
+    elif args.record:
+        from lib.classes.http_cassette import CassetteRecorder # pylint: disable=import-outside-toplevel
+
+        recorder = CassetteRecorder(
+            cassette_file=_get_qualified_filename(args.results_dir, CASSETTE_FILENAME),
+            url=url or CLOUDANT_ACCOUNT_URL_FORMAT.format(account))
+
+        status = recorder.open()
+
+        if status is False:
+            _fatal_exit()
+
+    # Maintenance schedule / deletion checkpoint
+
+    schedule = maintenance_schedule.parse_schedule(args.schedule) if args.schedule else None
+    previous_checkpoint = None
+
+    if args.resume:
+        from lib.classes import deletion_checkpoint # pylint: disable=import-outside-toplevel
+
+        previous_checkpoint = deletion_checkpoint.load_checkpoint(args.resume)
+
+        if previous_checkpoint is None:
+            _fatal_exit()
+
+        if previous_checkpoint["database"] != args.database_name:
+            logger.error("Checkpoint file %s belongs to another database: %s.",
+                args.resume, previous_checkpoint["database"])
+            _fatal_exit()
+
+    # Leases are the progress record of a cooperative run (an expired range is reclaimed by another instance); the
+    # documents deleted in chunks are checkpointed between chunks
+
+    checkpoint = None
+
+    if ((schedule or args.chunk_oversized) and not args.cooperative) or previous_checkpoint:
+        from lib.classes.deletion_checkpoint import DeletionCheckpoint # pylint: disable=import-outside-toplevel
+
+        checkpoint = DeletionCheckpoint(
+            file=_get_qualified_filename(args.results_dir, CHECKPOINT_FILENAME),
+            database_name=args.database_name,
+            previous=previous_checkpoint)
+
+    # Fault injection
+
+    faults = None
+
+    if args.faults:
+        from lib.classes import fault_injector # pylint: disable=import-outside-toplevel
+
+        faults = fault_injector.FaultInjector(fault_injector.load_profile(args.faults))
+
+    # Retry policy
+
+    retry = None
+
+    if args.max_retries > 0:
+        retry = RetryPolicy(
+            max_retries=args.max_retries,
+            budget_ratio=args.retry_budget)
+
+    # Circuit breaker
+
+    breaker = None
+
+    if args.breaker_error_rate > 0:
+        breaker = CircuitBreaker(
+            error_rate=args.breaker_error_rate,
+            latency=args.breaker_latency,
+            probe_interval=args.breaker_probe_interval)
+
+    # Rate limiter
+
+    limiter = None
+
+    if args.rate_limit > 0:
+        shared_file = None
+
+        if not args.no_shared_rate_limit:
+            shared_file = args.rate_limit_file or rate_limiter.get_shared_file(
+                url or CLOUDANT_ACCOUNT_URL_FORMAT.format(account))
+
+        limiter = RateLimiter(
+            rate=args.rate_limit,
+            burst=args.rate_limit_burst,
+            shared_file=shared_file)
+
+        status = limiter.open()
+
+        if status is False:
+            _fatal_exit()
+
+    # Capacity class scheduler (budgets per capacity class, e.g. scan queries vs. deletion writes)
+
+    scheduler = None
+
+    if args.read_rate > 0 or args.write_rate > 0 or args.query_rate > 0 or args.capacity_auto:
+        shared_file = None
+
+        if not args.no_shared_rate_limit:
+            shared_file = args.rate_limit_file or rate_limiter.get_shared_file(
+                url or CLOUDANT_ACCOUNT_URL_FORMAT.format(account))
+
+        scheduler = CapacityScheduler(shared_file=shared_file)
+
+        status = scheduler.configure(_get_capacity_rates(args))
+
+        if status is False:
+            _fatal_exit()
+
+    # Load monitor (backs off while the cluster is busy with other work)
+
+    monitor = None
+
+    if args.load_aware:
+        monitor = LoadMonitor(
+            metrics=metrics,
+            concurrency=args.concurrency,
+            limiters=[item for item in (limiter, scheduler) if item],
+            interval=args.load_interval,
+            max_tasks=args.load_max_tasks,
+            latency_factor=args.load_latency_factor)
+
+    # Configure database connection
+
     database_name = args.database_name
     database = CloudantDatabase(
         account=account,
         api_key=env_dict[PROP_CLOUDANT_API_KEY],
         password=env_dict[PROP_CLOUDANT_PASSWORD],
-        database_name=database_name)
+        database_name=database_name,
+        metrics=metrics,
+        tracer=tracer,
+        url=url,
+        pool_size=max(args.concurrency, cloudant_database.DEFAULT_POOL_SIZE),
+        recorder=recorder,
+        replay=replay,
+        faults=faults,
+        retry=retry,
+        breaker=breaker,
+        limiter=limiter,
+        scheduler=scheduler,
+        monitor=monitor,
+        session_cache=None if args.no_session_cache else SessionCache(args.session_cache))
 
     # Initialize database client
 
@@ -352,62 +1581,251 @@ def _main(logger=DEFAULT_LOGGER):
     if status is False:
         _fatal_exit()
 
-    # Open database
+    # Preflight: the independent requests are issued concurrently (the provisioned throughput with the database
+    # check, then the document count with the conflicts view lookup)
 
-    status = database.open_database()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PREFLIGHT_WORKERS) as executor:
+        throughput_future = executor.submit(database.get_provisioned_throughput) if args.capacity_auto else None
 
-    if status is False:
-        _fatal_exit()
+        # Open database
+
+        status = database.open_database()
 
-    # Retrieve number of documents in database
+        if status is False:
+            _fatal_exit()
 
-    doc_count = database.get_doc_count()
+        # Retrieve number of documents in database / conflicts design document and view row count
 
-    # Retrieve conflicts design document
+        doc_count_future = executor.submit(database.get_doc_count)
+        view_future = executor.submit(_get_conflicts_view, database)
 
-    ddoc = database.get_design_document(
-        ddoc_name=constants.DDOC_NAME)
+        throughput = throughput_future.result() if throughput_future else None
+        doc_count = doc_count_future.result()
+        ddoc, view_row_count = view_future.result()
+
+    # Derive capacity class budgets from the provisioned throughput capacity
+
+    if args.capacity_auto:
+        if throughput is None:
+            logger.warning("Provisioned throughput capacity unavailable. Using the specified capacity budgets only.")
+        else:
+            status = scheduler.configure(_get_capacity_rates(args, throughput))
+
+            if status is False:
+                _fatal_exit()
 
     if ddoc is None:
         _fatal_exit()
 
-    # Scan database for conflicted documents
+    if view_row_count is None:
+        view_row_count = doc_count
 
-    scan_details_csv_file = _get_qualified_filename(args.results_dir, SCAN_DETAILS_CSV_FILENAME)
-    scan_conflicts_task = ScanConflictsTask(
-        deletion_mode=args.delete,
-        threshold=args.threshold,
-        ddoc=ddoc,
-        csv_file=scan_details_csv_file)
+    # Cooperative deletion (leases and result shards shared with the other instances)
 
-    status = scan_conflicts_task.run()
+    coordinator = None
 
-    if status is False:
-        _fatal_exit()
+    if args.cooperative:
+        from lib.classes.lease_coordinator import LeaseCoordinator # pylint: disable=import-outside-toplevel
+        from lib.classes.lease_store import DirectoryLeaseStore # pylint: disable=import-outside-toplevel
+        from lib.classes.lease_store import LocalDocumentLeaseStore # pylint: disable=import-outside-toplevel
+
+        store = DirectoryLeaseStore(args.lease_dir) if args.lease_dir else LocalDocumentLeaseStore(database)
+        status = store.open()
+
+        if status is False:
+            _fatal_exit()
+
+        coordinator = LeaseCoordinator(
+            store=store,
+            run_id=args.cooperative,
+            ranges=args.ranges,
+            ttl=args.lease_ttl)
+
+        logger.info("Cooperative deletion: %s.", coordinator)
+
+    # Start sampling the cluster activity
+
+    if monitor:
+        monitor.start(database)
+
+    # Follow the changes feed until stopped (daemon mode)
+
+    daemon = None
+
+    if args.daemon:
+        from lib.classes.conflicts_daemon import ConflictsDaemon # pylint: disable=import-outside-toplevel
+
+        daemon = ConflictsDaemon(
+            database=database,
+            state_file=args.daemon_state or os.path.expanduser(
+                os.path.join(DAEMON_STATE_DIRNAME, DAEMON_STATE_FILENAME_FORMAT.format(database_name))),
+            csv_file=_get_qualified_filename(args.results_dir, DAEMON_DETAILS_CSV_FILENAME),
+            threshold=args.threshold,
+            heartbeat=args.heartbeat,
+            batch_size=args.micro_batch_size,
+            batch_delay=args.micro_batch_delay)
+
+        if metrics_server:
+            metrics_server.set_health_check(daemon.get_health)
+
+        # SIGTERM (e.g. service manager) stops the daemon gracefully, like SIGINT
+
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+        status = _run_task_with_progress("daemon", daemon, 0, args, profiler, tracer)
+
+        if status is False:
+            _fatal_exit()
+
+    # Scan database for conflicted documents (unless resuming from a checkpoint or in daemon mode)
+
+    scan_conflicts_task = None
+
+    if daemon:
+        conflicts = []
+    elif previous_checkpoint:
+        conflicts = previous_checkpoint["remaining"]
+    else:
+        scan_details_csv_file = _get_qualified_filename(args.results_dir, SCAN_DETAILS_CSV_FILENAME)
+        scan_conflicts_task = ScanConflictsTask(
+            deletion_mode=args.delete,
+            threshold=args.threshold,
+            ddoc=ddoc,
+            csv_file=scan_details_csv_file,
+            log_every=args.log_every,
+            tracer=tracer,
+            page_size=args.page_size,
+            chunk_oversized=args.chunk_oversized)
+
+        status = _run_task_with_progress("scan", scan_conflicts_task, view_row_count, args, profiler, tracer)
+
+        if status is False:
+            _fatal_exit()
+
+        conflicts = scan_conflicts_task.get_conflicts()
 
     # Remove conflicted documents from database
 
-    conflicts = scan_conflicts_task.get_conflicts()
     delete_conflicts_task = None
 
+    # Cooperating instances claim ranges even without conflicts of their own (e.g. resolved by another instance)
+
     if args.delete and \
-            len(conflicts) != 0:
+            (len(conflicts) != 0 or coordinator):
 
         deletion_details_csv_file = _get_qualified_filename(args.results_dir, DELETION_DETAILS_CSV_FILENAME)
-        delete_conflicts_task = DeleteConflictsTask(
-            database=database,
-            conflicts=conflicts,
-            csv_file=deletion_details_csv_file)
 
-        status = delete_conflicts_task.run()
+        if args.merge:
+            from lib.classes import merge_strategy # pylint: disable=import-outside-toplevel
+            from lib.classes.merge_conflicts_task import MergeConflictsTask # pylint: disable=import-outside-toplevel
+
+            delete_conflicts_task = MergeConflictsTask(
+                database=database,
+                conflicts=conflicts,
+                csv_file=deletion_details_csv_file,
+                strategy=merge_strategy.load_strategy(args.merge, args.merge_field),
+                strategy_name=args.merge,
+                batch_size=args.merge_batch_size,
+                concurrency=args.concurrency,
+                tracer=tracer)
+        else:
+            delete_conflicts_task = DeleteConflictsTask(
+                database=database,
+                conflicts=conflicts,
+                csv_file=deletion_details_csv_file,
+                log_every=args.log_every,
+                tracer=tracer,
+                concurrency=args.concurrency,
+                schedule=schedule,
+                checkpoint=checkpoint,
+                coordinator=coordinator,
+                chunk_size=args.chunk_size)
+
+        status = _run_task_with_progress("delete", delete_conflicts_task, len(conflicts), args, profiler, tracer)
 
         if status is False:
             _fatal_exit()
 
+    # Verify that the documents touched by the deletion phase are conflict-free
+
+    verify_task = None
+    verified = True
+
+    if args.verify and delete_conflicts_task:
+        from lib.classes.verify_conflicts_task import VerifyConflictsTask # pylint: disable=import-outside-toplevel
+
+        touched_documents = delete_conflicts_task.get_touched_documents()
+        verify_task = VerifyConflictsTask(
+            database=database,
+            documents=touched_documents,
+            csv_file=_get_qualified_filename(args.results_dir, VERIFICATION_DETAILS_CSV_FILENAME),
+            threshold=args.threshold,
+            chunk_size=args.verify_chunk_size,
+            requeue=args.requeue,
+            tracer=tracer)
+
+        status = _run_task_with_progress("verify", verify_task, len(touched_documents), args, profiler, tracer)
+        verified = status is not False
+
+    # Merge the result shards of every instance
+
+    cooperative_summary = None
+
+    if coordinator:
+        cooperative_summary = {
+            "coordination": coordinator.get_summary(),
+            "merged": coordinator.merge_shards()
+        }
+
+    # Reclaim the disk space of the deleted revisions
+
+    compaction = None
+    compacted = True
+
+    if args.compact:
+        from lib.classes.compaction_task import CompactionTask # pylint: disable=import-outside-toplevel
+
+        compaction = CompactionTask(
+            database=database,
+            ddoc_name=constants.DDOC_NAME,
+            timeout=args.compact_timeout)
+
+        status = _run_task_with_progress("compact", compaction, 100, args, profiler, tracer)
+        compacted = status is not False
+
     # Close database account connection
 
+    if monitor:
+        monitor.stop()
+
     database.shutdown_client()
 
+    if recorder:
+        recorder.close()
+
+    if limiter:
+        limiter.close()
+
+    if scheduler:
+        scheduler.close()
+
+    # Export request metrics
+
+    metrics_file = _get_qualified_filename(args.results_dir, METRICS_FILENAME)
+    file_util.create_text_file(
+        file=metrics_file,
+        content=metrics.to_prometheus(),
+        logger=DEFAULT_LOGGER)
+
+    if metrics_server:
+        metrics_server.stop()
+
+    # Export trace events
+
+    if tracer:
+        trace_file = _get_qualified_filename(args.results_dir, TRACE_FILENAME)
+        tracer.write(trace_file)
+
     # Stop timer
 
     end_time = datetime.datetime.now()
@@ -416,22 +1834,77 @@ def _main(logger=DEFAULT_LOGGER):
     # Generate summary content
 
     overview_content = _get_overview_content(
-        account=account,
+        account=database.get_location(),
         database_name=database_name,
         doc_count=doc_count,
         elapsed_time=elapsed_time)
 
-    scan_details_content = str(scan_conflicts_task)
+    scan_details_content = str(scan_conflicts_task) if scan_conflicts_task else ""
 
     deletion_details_content = ""
 
     if delete_conflicts_task:
         deletion_details_content = str(delete_conflicts_task)
 
-    summary_content = "{0}{1}{2}".format(
+    verification_details_content = str(verify_task) if verify_task else ""
+
+    cooperative_content = _get_cooperative_content(cooperative_summary) if cooperative_summary else ""
+
+    daemon_content = str(daemon) if daemon else ""
+
+    compaction_content = str(compaction) if compaction else ""
+
+    requests_summary = metrics.get_summary()
+    resources_summary = _get_resources_summary()
+    breaker_summary = breaker.get_summary() if breaker else None
+    limiter_summary = limiter.get_summary() if limiter else None
+    capacity_summary = scheduler.get_summary() if scheduler else None
+    monitor_summary = monitor.get_summary() if monitor else None
+    performance_content = _get_performance_content(
+        requests_summary,
+        resources_summary,
+        breaker_summary,
+        limiter_summary,
+        capacity_summary,
+        monitor_summary)
+
+    summary_content = "{0}{1}{2}{3}{4}{5}{6}{7}".format(
         overview_content,
         scan_details_content,
-        deletion_details_content)
+        deletion_details_content,
+        verification_details_content,
+        cooperative_content,
+        daemon_content,
+        compaction_content,
+        performance_content)
+
+    summary_json_content = {
+        "overview": {
+            "account": database.get_location(),
+            "database": database_name,
+            "total_documents": doc_count,
+            "elapsed_s": elapsed_time.total_seconds()
+        },
+        "scan": scan_conflicts_task.get_summary() if scan_conflicts_task else None,
+        "deletion": delete_conflicts_task.get_summary() if delete_conflicts_task else None,
+        "verification": verify_task.get_summary() if verify_task else None,
+        "cooperative": cooperative_summary,
+        "daemon": daemon.get_summary() if daemon else None,
+        "compaction": compaction.get_summary() if compaction else None,
+        "requests": requests_summary,
+        "resources": resources_summary,
+        "replay": replay.get_summary() if replay else None,
+        "faults": faults.get_summary() if faults else None,
+        "retries": retry.get_summary() if retry else None,
+        "circuit_breaker": breaker_summary,
+        "rate_limiter": limiter_summary,
+        "capacity": capacity_summary,
+        "load_monitor": monitor_summary,
+        "schedule": {
+            "specification": str(schedule) if schedule else None,
+            "checkpoint": checkpoint.get_summary()
+        } if checkpoint else None
+    }
 
     # Create summary file
 
@@ -441,13 +1914,38 @@ def _main(logger=DEFAULT_LOGGER):
         content=summary_content,
         logger=DEFAULT_LOGGER)
 
+    summary_json_file = _get_qualified_filename(args.results_dir, SUMMARY_JSON_FILENAME)
+    file_util.create_json_file(
+        file=summary_json_file,
+        content=summary_json_content,
+        logger=DEFAULT_LOGGER)
+
+    # The run completes (compaction, summary) even if the verification or the compaction failed; its exit status
+    # reports it (unresolved documents first)
+
+    exit_status = 0
+
+    if not compacted:
+        exit_status = EXIT_STATUS_COMPACTION_FAILED
+        logger.error("Compaction failed: maintenance requests failed (see: Compaction Details). Exit script "
+            "status: %d.", exit_status)
+
+    if not verified:
+        exit_status = EXIT_STATUS_UNRESOLVED
+        logger.error("Verification failed: conflicted or unverified documents remain (see: %s). Exit script "
+            "status: %d.", VERIFICATION_DETAILS_CSV_FILENAME, exit_status)
+
+    # Flush pending log records before writing to the console directly
+
+    logger_util.shutdown_logging_subsystem()
+
     # Display summary content
 
     print(summary_content)
 
     # Exit process
 
-    sys.exit(0)
+    sys.exit(exit_status)
 
 
 # Main ------------------------------------------------------------------------>
@@ -0,0 +1,358 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import os
+import sys
+import json
+import socket
+import logging
+import pathlib
+import platform
+import itertools
+import subprocess
+import time
+import requests
+
+from lib.utils import timing_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("benchmark_suite")
+
+# Matrix dimensions (case parameters)
+CASE_DOCUMENTS = "documents"
+CASE_DISTRIBUTION = "distribution"
+CASE_PAGE_SIZE = "page_size"
+CASE_CONCURRENCY = "concurrency"
+CASE_LATENCY_MS = "latency_ms"
+CASE_FAULTS = "faults" # fault profile (see: fault_injector.PRESETS)
+CASE_PARAMETERS = (
+    CASE_DOCUMENTS, CASE_DISTRIBUTION, CASE_PAGE_SIZE, CASE_CONCURRENCY, CASE_LATENCY_MS, CASE_FAULTS
+)
+
+# Values of the case parameters missing from older results (baseline comparison)
+CASE_DEFAULTS = {
+    CASE_FAULTS: "none"
+}
+
+# Compared metrics: (section, metric, higher is better)
+COMPARED_METRICS = (
+    ("scan", "rows_per_s", True),
+    ("delete", "documents_per_s", True),
+    ("delete", "revisions_per_s", True),
+    ("resources", "peak_rss_bytes", False),
+    ("resources", "cpu_s", False)
+)
+
+DEFAULT_TOLERANCE = 0.1 # 10% slower / larger than the baseline is a regression
+
+# Time allowed for the stand-in server to seed its database and start listening
+SERVER_STARTUP_TIMEOUT_PER_DOCUMENT = 0.001 # seconds
+SERVER_STARTUP_MIN_TIMEOUT = 30 # seconds
+SERVER_POLL_INTERVAL = 0.1 # seconds
+
+BENCHMARK_DATABASE_NAME = "conflicts-benchmark"
+
+# Classes --------------------------------------------------------------------->
+
+class BenchmarkSuite: # pylint: disable=unused-variable
+    """
+    Runs the scan and deletion tasks end to end over a matrix of cases, each in a fresh process, against a
+    stand-in server (default) or a local CouchDB
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, matrix, work_dir, **kwargs):
+        """
+        Constructor
+
+        - matrix: Dictionary of case parameter -> list of values (see: CASE_PARAMETERS).
+        - work_dir: Directory receiving the per-case logs and CSV files.
+
+        Keyword arguments:
+        - url: Local CouchDB URL (default: a stand-in server is started for each case).
+        - conflicted_ratio: Fraction (0 - 1) of generated documents that carry conflicts.
+        - seed: Generator random seed.
+        - threshold: Scan threshold of revisions per document.
+        - max_retries: Maximum number of retries of a failed idempotent request (0 = no retries).
+        """
+
+        self._matrix = matrix
+        self._work_dir = pathlib.Path(work_dir)
+        self._url = kwargs.get("url")
+        self._conflicted_ratio = kwargs.get("conflicted_ratio")
+        self._seed = kwargs.get("seed")
+        self._threshold = kwargs.get("threshold")
+        self._max_retries = kwargs.get("max_retries")
+
+        self._root_dir = pathlib.Path(__file__).resolve().parents[2]
+        self._results = []
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def get_cases(self):
+        """
+        Expand the matrix into the list of cases
+        """
+
+        values = [self._matrix[parameter] for parameter in CASE_PARAMETERS]
+
+        return [dict(zip(CASE_PARAMETERS, combination)) for combination in itertools.product(*values)]
+
+
+    def run(self, logger=DEFAULT_LOGGER):
+        """
+        Run every case of the matrix; returns the results document
+        """
+
+        cases = self.get_cases()
+        start_time = timing_util.start_timer()
+
+        logger.info("Running benchmark suite: %d cases...", len(cases))
+
+        for number, case in enumerate(cases, start=1):
+            logger.info("Case [%d/%d]: %s...", number, len(cases), get_case_key(case))
+
+            result = self._run_case(number, case)
+            self._results.append(result)
+
+            if result.get("error"):
+                logger.error("Case [%d/%d]: Failed: %s.", number, len(cases), result["error"])
+            else:
+                logger.info("Case [%d/%d]: scan %.1f rows/s, delete %.1f docs/s / %.1f revs/s, peak RSS %s bytes, "
+                    "work lost %.1f%%.",
+                    number,
+                    len(cases),
+                    result["scan"]["rows_per_s"],
+                    result["delete"]["documents_per_s"],
+                    result["delete"]["revisions_per_s"],
+                    result["resources"]["peak_rss_bytes"],
+                    result["work_lost"]["ratio"] * 100)
+
+        logger.info("Successfully ran benchmark suite (%.1f s).", timing_util.get_elapsed_seconds(start_time))
+
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "server": self._url or "stand-in"
+            },
+            "settings": {
+                "conflicted_ratio": self._conflicted_ratio,
+                "seed": self._seed,
+                "threshold": self._threshold,
+                "max_retries": self._max_retries
+            },
+            "matrix": self._matrix,
+            "cases": self._results
+        }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _run_case(self, number, case, logger=DEFAULT_LOGGER):
+        """
+        Prepare the server / database and run the case in a fresh process (isolated peak RSS and CPU)
+        """
+
+        case_dir = self._work_dir / "case_{0:03d}".format(number)
+        case_dir.mkdir(parents=True, exist_ok=True)
+        result_file = case_dir / "result.json"
+        server = None
+        url = self._url
+        database_name = BENCHMARK_DATABASE_NAME
+
+        try:
+            if url:
+                if case[CASE_LATENCY_MS]:
+                    logger.warning("Latency injection requires the stand-in server. Ignored: %s ms.",
+                        case[CASE_LATENCY_MS])
+                database_name = "{0}-{1:03d}".format(BENCHMARK_DATABASE_NAME, number)
+                self._run_module(case_dir / "generate.log", [
+                    "tools.generate_conflicts",
+                    "--database-name", database_name,
+                    "--url", url,
+                    "--documents", str(case[CASE_DOCUMENTS]),
+                    "--distribution", case[CASE_DISTRIBUTION],
+                    "--conflicted-ratio", str(self._conflicted_ratio),
+                    "--seed", str(self._seed)
+                ]).check_returncode()
+            else:
+                server, url = self._start_stand_in_server(case, case_dir)
+
+            arguments = [
+                "tools.benchmark",
+                "--run-case", json.dumps(case),
+                "--url", url,
+                "--database-name", database_name,
+                "--threshold", str(self._threshold),
+                "--seed", str(self._seed),
+                "--max-retries", str(self._max_retries),
+                "--results-dir", str(case_dir)
+            ]
+
+            if self._url:
+                arguments.append("--drop-database")
+
+            self._run_module(case_dir / "case.log", arguments)
+
+            with open(result_file, "r", encoding="utf-8") as file_handle:
+                result = json.load(file_handle)
+        except (OSError, ValueError, subprocess.CalledProcessError, requests.exceptions.RequestException) as err:
+            result = {"error": str(err)}
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+        result["case"] = case
+
+        return result
+
+
+    def _start_stand_in_server(self, case, case_dir):
+        """
+        Start a seeded stand-in server subprocess; returns (process, URL)
+        """
+
+        port = _get_free_port()
+        url = "http://127.0.0.1:{0}".format(port)
+        log_file = open(case_dir / "stand_in.log", "w", encoding="utf-8") # pylint: disable=consider-using-with
+
+        process = subprocess.Popen( # pylint: disable=consider-using-with
+            [
+                sys.executable, "-m", "tools.stand_in_server",
+                "--database-name", BENCHMARK_DATABASE_NAME,
+                "--port", str(port),
+                "--documents", str(case[CASE_DOCUMENTS]),
+                "--distribution", case[CASE_DISTRIBUTION],
+                "--conflicted-ratio", str(self._conflicted_ratio),
+                "--seed", str(self._seed),
+                "--latency-ms", str(case[CASE_LATENCY_MS])
+            ],
+            cwd=self._root_dir,
+            stdout=log_file,
+            stderr=subprocess.STDOUT)
+        log_file.close()
+
+        timeout = max(case[CASE_DOCUMENTS] * SERVER_STARTUP_TIMEOUT_PER_DOCUMENT, SERVER_STARTUP_MIN_TIMEOUT)
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise OSError("Stand-in server exited with status: {0}.".format(process.returncode))
+            try:
+                requests.get(url, timeout=1)
+                return process, url
+            except requests.exceptions.ConnectionError:
+                time.sleep(SERVER_POLL_INTERVAL)
+
+        process.terminate()
+        process.wait()
+
+        raise OSError("Stand-in server did not start within {0:.0f} s.".format(timeout))
+
+
+    def _run_module(self, log_file, arguments):
+        """
+        Run a Python module of this repository in a subprocess (output captured in the log file)
+        """
+
+        environment = dict(os.environ)
+        environment.setdefault("CLOUDANT_API_KEY", "benchmark")
+        environment.setdefault("CLOUDANT_PASSWORD", "benchmark")
+
+        with open(log_file, "w", encoding="utf-8") as file_handle:
+            return subprocess.run(
+                [sys.executable, "-m"] + arguments,
+                cwd=self._root_dir,
+                env=environment,
+                stdout=file_handle,
+                stderr=subprocess.STDOUT,
+                check=False)
+
+
+# Public Functions ------------------------------------------------------------>
+
+def get_case_key(case): # pylint: disable=unused-variable
+    """
+    Stable identifier of a case (used to match cases against a baseline)
+    """
+
+    return ",".join(
+        "{0}={1}".format(parameter, case.get(parameter, CASE_DEFAULTS.get(parameter)))
+        for parameter in CASE_PARAMETERS)
+
+
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE): # pylint: disable=unused-variable
+    """
+    Compare the results against a baseline results document; returns the list of metric comparisons
+    """
+
+    baseline_cases = {
+        get_case_key(item["case"]): item
+        for item in baseline.get("cases", [])
+        if not item.get("error")
+    }
+    comparisons = []
+
+    for item in results.get("cases", []):
+        key = get_case_key(item["case"])
+        reference = baseline_cases.get(key)
+
+        if reference is None or item.get("error"):
+            continue
+
+        for section, metric, higher_is_better in COMPARED_METRICS:
+            current = item.get(section, {}).get(metric)
+            previous = reference.get(section, {}).get(metric)
+
+            if not current or not previous:
+                continue
+
+            change = (current - previous) / previous
+            regression = change < -tolerance if higher_is_better else change > tolerance
+
+            comparisons.append({
+                "case": key,
+                "metric": "{0}.{1}".format(section, metric),
+                "baseline": previous,
+                "current": current,
+                "change": round(change, 4),
+                "regression": regression
+            })
+
+    return comparisons
+
+
+# Private Functions ----------------------------------------------------------->
+
+def _get_free_port():
+    """
+    Reserve an ephemeral TCP port number
+    """
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
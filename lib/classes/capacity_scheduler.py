@@ -0,0 +1,180 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import logging
+
+from lib.classes.rate_limiter import RateLimiter
+from lib.utils import request_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("capacity_scheduler")
+
+# Cloudant provisioned throughput capacity classes
+# See: https://cloud.ibm.com/docs/Cloudant?topic=Cloudant-ibm-cloud-public#provisioned-throughput-capacity
+CAPACITY_READ = "read"
+CAPACITY_WRITE = "write"
+CAPACITY_QUERY = "query" # global queries (views, Cloudant Query, search)
+CAPACITY_CLASSES = (CAPACITY_READ, CAPACITY_WRITE, CAPACITY_QUERY)
+
+# Fraction of the provisioned throughput used in auto mode (the rest is left to the applications)
+DEFAULT_CAPACITY_FRACTION = 0.5
+
+QUERY_OPERATIONS = frozenset((request_util.OPERATION_VIEW, request_util.OPERATION_FIND))
+
+# Read-only requests sent as POST (e.g. _all_docs keys, _bulk_get)
+READ_POST_OPERATIONS = frozenset((request_util.OPERATION_ALL_DOCS, request_util.OPERATION_BULK_GET))
+
+# Requests not metered against the provisioned throughput (authentication, account API)
+UNMETERED_OPERATIONS = frozenset((request_util.OPERATION_SESSION, request_util.OPERATION_API))
+
+READ_METHODS = frozenset(("GET", "HEAD"))
+
+# Classes --------------------------------------------------------------------->
+
+class CapacityScheduler: # pylint: disable=unused-variable
+    """
+    Paces every request according to its capacity class (reads, writes, global queries), each with its own
+    budget (see: RateLimiter), so that the phases consuming different classes do not throttle one another
+    """
+
+    def __init__(self, rates=None, shared_file=None):
+        """
+        Constructor
+
+        - rates: Dictionary of capacity class -> maximum rate (requests/s); a class without a rate is not paced.
+        - shared_file: Base name of the bucket state files shared with the other processes (one per class:
+          <shared_file>.<class>); default: this process only.
+        """
+
+        self._shared_file = shared_file
+        self._limiters = {}
+        self._scale = 1.0
+
+        if rates:
+            self.configure(rates)
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def configure(self, rates, logger=DEFAULT_LOGGER):
+        """
+        Set the budget of each capacity class (e.g. once the provisioned throughput is known)
+        """
+
+        self.close()
+
+        limiters = {}
+
+        for capacity_class in CAPACITY_CLASSES:
+            rate = rates.get(capacity_class)
+
+            if not rate:
+                continue
+
+            limiter = RateLimiter(
+                rate=rate,
+                shared_file="{0}.{1}".format(self._shared_file, capacity_class) if self._shared_file else None)
+
+            if not limiter.open():
+                return False
+
+            limiter.set_scale(self._scale)
+            limiters[capacity_class] = limiter
+
+        self._limiters = limiters
+
+        logger.info("Capacity budgets (requests/s): %s.", ", ".join(
+            "{0}: {1}".format(capacity_class, rates.get(capacity_class) or "unlimited")
+            for capacity_class in CAPACITY_CLASSES))
+
+        return True
+
+
+    def close(self):
+        """
+        Release the capacity class budgets
+        """
+
+        for limiter in self._limiters.values():
+            limiter.close()
+
+
+    def acquire(self, request):
+        """
+        Wait until the budget of the request capacity class allows it
+        """
+
+        limiter = self._limiters.get(get_capacity_class(request.method, request.url))
+
+        if limiter:
+            limiter.acquire()
+
+
+    def set_scale(self, scale):
+        """
+        Scale the budget of every capacity class (see: RateLimiter.set_scale)
+        """
+
+        self._scale = scale
+
+        for limiter in self._limiters.values():
+            limiter.set_scale(scale)
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the pacing per capacity class
+        """
+
+        return {capacity_class: limiter.get_summary() for capacity_class, limiter in self._limiters.items()}
+
+
+# Public Functions ------------------------------------------------------------>
+
+def get_capacity_class(method, url): # pylint: disable=unused-variable
+    """
+    Classify a request into its capacity class (None if it is not metered)
+    """
+
+    operation = request_util.get_operation(method, url)
+
+    if operation in UNMETERED_OPERATIONS:
+        return None
+
+    if operation in QUERY_OPERATIONS:
+        return CAPACITY_QUERY
+
+    if method in READ_METHODS or operation in READ_POST_OPERATIONS:
+        return CAPACITY_READ
+
+    return CAPACITY_WRITE
+
+
+def get_provisioned_rates(throughput, fraction=DEFAULT_CAPACITY_FRACTION): # pylint: disable=unused-variable
+    """
+    Derive the capacity class budgets from the provisioned throughput (e.g. {"read": 100, "write": 50, "query": 5})
+    """
+
+    return {
+        capacity_class: max(throughput[capacity_class] * fraction, 1)
+        for capacity_class in CAPACITY_CLASSES
+        if throughput.get(capacity_class)
+    }
@@ -0,0 +1,246 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import time
+import logging
+import threading
+import collections
+
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("circuit_breaker")
+
+DEFAULT_ERROR_RATE = 0.5 # fraction of failed (or slow) attempts in the window that trips the breaker
+DEFAULT_LATENCY = 10 # seconds (an attempt slower than this counts as slow)
+DEFAULT_PROBE_INTERVAL = 10 # seconds between probes while open
+DEFAULT_WINDOW_SIZE = 50 # most recent attempts evaluated
+DEFAULT_MIN_ATTEMPTS = 20 # attempts in the window required before the breaker can trip
+DEFAULT_PROBE_TIMEOUT = 60 # seconds the outcome of a probe is awaited (the probe then counts as failed)
+
+# Failed attempts: 429 Too Many Requests, server errors (and exceptions, e.g. connection resets)
+STATUS_TOO_MANY_REQUESTS = 429
+STATUS_SERVER_ERROR = 500
+
+STATE_CLOSED = "closed" # requests flow
+STATE_OPEN = "open" # requests wait (all workers paused)
+STATE_HALF_OPEN = "half_open" # a single probe request is in flight
+
+# Classes --------------------------------------------------------------------->
+
+class CircuitOpenError(RequestsConnectionError): # pylint: disable=unused-variable
+    """
+    Request attempt not sent: the outcome of the probe was not received in time (the breaker stays open); a
+    connection error, so that it is retried like one
+    """
+
+
+class CircuitBreaker: # pylint: disable=unused-variable
+    """
+    Pauses every request attempt while the cluster is unhealthy: trips when the rate of failed (429, 5xx,
+    connection errors) or slow attempts over a sliding window exceeds a threshold, then lets a single probe attempt
+    through periodically and resumes all workers once a probe succeeds; safe to share between threads
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, error_rate=DEFAULT_ERROR_RATE, latency=DEFAULT_LATENCY, probe_interval=DEFAULT_PROBE_INTERVAL,
+            window_size=DEFAULT_WINDOW_SIZE, min_attempts=DEFAULT_MIN_ATTEMPTS, probe_timeout=DEFAULT_PROBE_TIMEOUT):
+        """
+        Constructor
+
+        - error_rate: Fraction (0 - 1) of failed or slow attempts in the window that trips the breaker.
+        - latency: Latency (seconds) beyond which an attempt counts as slow (0 = latency not evaluated).
+        - probe_interval: Time (seconds) between probe attempts while the breaker is open.
+        - window_size: Number of most recent attempts evaluated.
+        - min_attempts: Number of attempts in the window required before the breaker can trip.
+        - probe_timeout: Time (seconds) the outcome of a probe is awaited; a probe still in flight then counts as
+          failed, and the attempts waiting for it raise CircuitOpenError.
+        """
+
+        # pylint: disable=too-many-arguments
+
+        self._error_rate = error_rate
+        self._latency = latency
+        self._probe_interval = probe_interval
+        self._min_attempts = min_attempts
+        self._probe_timeout = probe_timeout
+
+        self._condition = threading.Condition()
+        self._state = STATE_CLOSED
+        self._window = collections.deque(maxlen=window_size) # True = failed or slow attempt
+        self._total_unhealthy = 0 # failed or slow attempts in the window
+        self._probe_time = 0 # monotonic time of the next probe (open)
+        self._probe_deadline = 0 # monotonic time by which the outcome of the probe is expected (half open)
+        self._probe_token = 0 # identifies the attempt that is the probe in flight (half open)
+        self._open_time = 0 # monotonic time at which the breaker tripped
+        self._total_trips = 0
+        self._total_probes = 0
+        self._total_paused = 0 # seconds
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def acquire(self, logger=DEFAULT_LOGGER):
+        """
+        Wait until a request attempt may be sent (returns immediately while the breaker is closed); returns the
+        probe token if the attempt is the probe (see: record), otherwise None; raises CircuitOpenError if the
+        outcome of the probe in flight is not received in time
+        """
+
+        with self._condition:
+            while True:
+                if self._state == STATE_CLOSED:
+                    return None
+
+                now = time.monotonic()
+
+                if self._state == STATE_OPEN:
+                    remaining = self._probe_time - now
+
+                    if remaining <= 0:
+                        # This attempt is the probe
+                        self._state = STATE_HALF_OPEN
+                        self._probe_token += 1
+                        self._probe_deadline = now + self._probe_timeout
+                        self._total_probes += 1
+                        return self._probe_token
+
+                    self._condition.wait(remaining)
+                    continue
+
+                # Wait for the outcome of the probe in flight (bounded: a hung probe counts as failed)
+
+                remaining = self._probe_deadline - now
+
+                if remaining <= 0:
+                    logger.warning("Circuit breaker probe timed out after %s s.", self._probe_timeout)
+                    self._record_probe(True, None)
+                    raise CircuitOpenError("Circuit breaker open: probe timed out after {0} s.".format(
+                        self._probe_timeout))
+
+                self._condition.wait(remaining)
+
+
+    def record(self, status, elapsed, probe=None, logger=DEFAULT_LOGGER):
+        """
+        Record the outcome of a request attempt
+
+        - status: HTTP status code (None if the attempt raised an exception).
+        - elapsed: Latency of the attempt (seconds).
+        - probe: Probe token returned by acquire (None if the attempt is not a probe).
+        """
+
+        unhealthy = self._is_unhealthy(status, elapsed)
+
+        with self._condition:
+            if self._state == STATE_HALF_OPEN:
+                # Only the probe in flight resolves the half open state (not an attempt sent before the breaker
+                # tripped, nor a probe that timed out)
+                if probe is not None and probe == self._probe_token:
+                    self._record_probe(unhealthy, status)
+                return
+
+            if self._state == STATE_OPEN:
+                # Attempt sent before the breaker tripped (or probe that timed out)
+                return
+
+            if len(self._window) == self._window.maxlen and self._window[0]:
+                self._total_unhealthy -= 1
+
+            self._window.append(unhealthy)
+            self._total_unhealthy += unhealthy
+
+            if len(self._window) < self._min_attempts or \
+                    self._total_unhealthy < self._error_rate * len(self._window):
+                return
+
+            self._state = STATE_OPEN
+            self._open_time = time.monotonic()
+            self._probe_time = self._open_time + self._probe_interval
+            self._total_trips += 1
+
+            logger.warning("Circuit breaker tripped: %d of the last %d request attempts failed or were slow. "
+                "Pausing all workers (probe every %s s)...",
+                self._total_unhealthy, len(self._window), self._probe_interval)
+
+
+    def get_state(self):
+        """
+        Retrieve the breaker state (closed, open or half_open)
+        """
+
+        with self._condition:
+            return self._state
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the breaker activity
+        """
+
+        with self._condition:
+            paused = self._total_paused
+
+            if self._state != STATE_CLOSED:
+                paused += time.monotonic() - self._open_time
+
+            return {
+                "state": self._state,
+                "trips": self._total_trips,
+                "probes": self._total_probes,
+                "paused_s": round(paused, 3)
+            }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _is_unhealthy(self, status, elapsed):
+        """
+        Determine whether an attempt failed (429, 5xx, exception) or was slow
+        """
+
+        if status is None or status == STATUS_TOO_MANY_REQUESTS or status >= STATUS_SERVER_ERROR:
+            return True
+
+        return 0 < self._latency <= elapsed
+
+
+    def _record_probe(self, unhealthy, status, logger=DEFAULT_LOGGER):
+        """
+        Close the breaker after a successful probe, otherwise schedule the next probe (lock held)
+        """
+
+        now = time.monotonic()
+
+        if unhealthy:
+            self._state = STATE_OPEN
+            self._probe_time = now + self._probe_interval
+            logger.info("Circuit breaker probe failed (status: %s). Next probe in %s s.", status, self._probe_interval)
+        else:
+            paused = now - self._open_time
+            self._total_paused += paused
+            self._state = STATE_CLOSED
+            self._window.clear()
+            self._total_unhealthy = 0
+            logger.info("Circuit breaker probe succeeded. Resuming all workers (paused %.1f s).", paused)
+
+        self._condition.notify_all()
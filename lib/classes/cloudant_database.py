@@ -16,30 +16,70 @@
 
 # Pylint Rule Overrides
 
+# pylint: disable=too-many-lines
+
 # Modules
 
 import logging
-import datetime
 import json
 from urllib.parse import quote
 from urllib.parse import quote_plus
-from pprint import pformat
 import requests
 from requests.exceptions import HTTPError
+from requests.exceptions import RequestException
 from cloudant.client import Cloudant
+from cloudant._common_util import append_response_error_content
+from cloudant.view import View
+from cloudant.design_document import DesignDocument
 from cloudant.error import CloudantDocumentException
+from cloudant.error import CloudantException
 
 from lib.constants import constants
+from lib.classes.cloudant_transport_adapter import CloudantTransportAdapter
+from lib.classes.session_cache import CachedCookieSession
 from lib.utils import error_util
 from lib.utils import logger_util
+from lib.utils import timing_util
 
 # Globals
 
 PROPERTY_BOOKMARK = "bookmark"
 PROPERTY_DOCS = "docs"
+PROPERTY_TOTAL_ROWS = "total_rows"
+
+STATUS_UNAUTHORIZED = 401
+STATUS_NOT_FOUND = 404
+STATUS_CONFLICT = 409
+
+REASON_MISSING_DATABASE = "Database does not exist."
+
+# Branch of a conflicted revision after a 409 Conflict (see: delete_document_revision)
+BRANCH_LIVE = "live" # the revision is still a leaf
+BRANCH_DELETED = "deleted" # the leaf of the branch is a tombstone (e.g. a retried deletion)
+BRANCH_UPDATED = "updated" # the leaf of the branch is a live descendant (e.g. a concurrent update)
+
+# See: https://cloud.ibm.com/apidocs/cloudant#getcapacitythroughputinformation
+THROUGHPUT_CAPACITY_PATH = "_api/v2/user/capacity/throughput"
+
+ACTIVE_TASKS_PATH = "_active_tasks"
+
+COMPACT_PATH = "_compact"
+VIEW_CLEANUP_PATH = "_view_cleanup"
+
+# Maintenance requests refused by the server (e.g. not a server admin, or IBM Cloudant: automatic compaction only)
+MAINTENANCE_REFUSED_STATUSES = frozenset((401, 403, 404, 405, 501))
+
+LOCAL_DOCUMENT_PREFIX = "_local/"
+
+# Continuous changes feed: a read times out once this many heartbeats were missed
+CHANGES_CONNECT_TIMEOUT = 30 # seconds
+CHANGES_MISSED_HEARTBEATS = 3
 
 DEFAULT_LOGGER = logging.getLogger("cloudant_database")
 
+# Maximum number of pooled (keep-alive) connections; should be at least the number of concurrent workers
+DEFAULT_POOL_SIZE = 10
+
 # Classes --------------------------------------------------------------------->
 
 class CloudantDatabase: # pylint: disable=unused-variable
@@ -47,15 +87,44 @@ class CloudantDatabase: # pylint: disable=unused-variable
     Manages Cloudant database connection
     """
 
-    def __init__(self, account, api_key, password, database_name):
+    # pylint: disable=too-many-instance-attributes,too-many-public-methods
+
+    def __init__(self, account, api_key, password, database_name, metrics=None, tracer=None, url=None,
+            pool_size=DEFAULT_POOL_SIZE, recorder=None, replay=None, faults=None, retry=None,
+            breaker=None, limiter=None, scheduler=None, monitor=None, session_cache=None):
         """
         Constructor
+
+        - recorder: CassetteRecorder capturing every request / response (record mode).
+        - replay: Loaded CassetteReplay serving the recorded responses instead of the server (replay mode).
+        - faults: FaultInjector failing or delaying request attempts (fault injection testing).
+        - retry: RetryPolicy retrying the transient failures of idempotent requests (default: no retries).
+        - breaker: CircuitBreaker pausing all requests while the cluster is unhealthy.
+        - limiter: RateLimiter capping the request rate (possibly shared with other processes).
+        - scheduler: CapacityScheduler pacing the requests of each capacity class (reads, writes, queries).
+        - monitor: LoadMonitor reducing the in-flight requests while the cluster is under pressure.
+        - session_cache: SessionCache reusing the session cookie of a previous run (skips the login request).
         """
 
+        # pylint: disable=too-many-arguments,too-many-locals
+
         self._account = account
+        self._url = url
+        self._pool_size = pool_size
         self._api_key = api_key
         self._password = password
         self._database_name = database_name
+        self._metrics = metrics
+        self._tracer = tracer
+        self._recorder = recorder
+        self._replay = replay
+        self._faults = faults
+        self._retry = retry
+        self._breaker = breaker
+        self._limiter = limiter
+        self._scheduler = scheduler
+        self._monitor = monitor
+        self._session_cache = session_cache
 
         self._client = None
         self._database = None
@@ -77,20 +146,70 @@ class CloudantDatabase: # pylint: disable=unused-variable
         Open the Cloudant account connection
         """
 
-        logger.info("Establishing a connection with the Cloudant account: %s...", self._account)
+        logger.info("Establishing a connection with the Cloudant account: %s...", self.get_location())
+
+        # An explicit URL (e.g. a local CouchDB or the stand-in server) takes precedence over the account name
+
+        location = {"url": self._url} if self._url else {"account": self._account}
+
+        if self._replay:
+            # Imported on demand (replay only)
+            from lib.classes import replay_transport_adapter # pylint: disable=import-outside-toplevel
+
+            adapter = replay_transport_adapter.ReplayTransportAdapter(
+                replay=self._replay,
+                metrics=self._metrics,
+                tracer=self._tracer,
+                faults=self._faults,
+                retry=self._retry,
+                breaker=self._breaker,
+                limiter=self._limiter,
+                scheduler=self._scheduler,
+                monitor=self._monitor)
+        else:
+            adapter = CloudantTransportAdapter(
+                metrics=self._metrics,
+                tracer=self._tracer,
+                recorder=self._recorder,
+                faults=self._faults,
+                retry=self._retry,
+                breaker=self._breaker,
+                limiter=self._limiter,
+                scheduler=self._scheduler,
+                monitor=self._monitor,
+                pool_maxsize=self._pool_size)
+
+        # The session is established here (not by the client), so that it can be cached and renewed in the background
+
+        self._client = Cloudant(
+            cloudant_user=self._api_key,
+            auth_token=self._password,
+            adapter=adapter,
+            connect=False,
+            auto_renew=True,
+            **location)
+
+        session = CachedCookieSession(
+            self._api_key,
+            self._password,
+            self._client.server_url,
+            cache=None if self._replay else self._session_cache,
+            auto_renew=True)
+
+        session.mount(self._client.server_url, adapter)
+        self._client.r_session = session
 
         try:
-            self._client = Cloudant(
-                cloudant_user=self._api_key,
-                auth_token=self._password,
-                account=self._account,
-                connect=True)
-        except requests.exceptions.HTTPError as err:
-            logger.error("Failed to establish a connection with the Cloudant account: %s.", self._account)
+            session.login()
+        except RequestException as err:
+            self._client = None
+            logger.error("Failed to establish a connection with the Cloudant account: %s.", self.get_location())
             error_util.log_exception(logger, err)
             return False
 
-        logger.info("Successfully established a connection with the Cloudant account: %s.", self._account)
+        session.hooks["response"].append(append_response_error_content)
+
+        logger.info("Successfully established a connection with the Cloudant account: %s.", self.get_location())
 
         return True
 
@@ -102,10 +221,26 @@ class CloudantDatabase: # pylint: disable=unused-variable
 
         if self._client:
             self._client.disconnect()
-            logger.info("Closed connection with the Cloudant account: %s.", self._account)
+            logger.info("Closed connection with the Cloudant account: %s.", self.get_location())
             self._client = None
 
 
+    def get_location(self):
+        """
+        Retrieve the Cloudant account name (or the server URL, if specified)
+        """
+
+        return self._url or self._account
+
+
+    def get_database_name(self):
+        """
+        Retrieve the Cloudant database name
+        """
+
+        return self._database_name
+
+
     def open_database(self, logger=DEFAULT_LOGGER):
         """
         Open Cloudant database
@@ -125,6 +260,46 @@ class CloudantDatabase: # pylint: disable=unused-variable
         return True
 
 
+    def create_database(self, logger=DEFAULT_LOGGER):
+        """
+        Create the Cloudant database (if it does not already exist) and open it
+        """
+
+        logger.info("Creating Cloudant database: %s...", self._database_name)
+
+        try:
+            self._database = self._client.create_database(self._database_name, throw_on_exists=False)
+        except (HTTPError, CloudantException) as err:
+            logger.error("Failed to create Cloudant database: %s.", self._database_name)
+            error_util.log_exception(logger, err)
+            return False
+
+        logger.info("Successfully created Cloudant database: %s.", self._database_name)
+
+        return True
+
+
+    def delete_database(self, logger=DEFAULT_LOGGER):
+        """
+        Delete the Cloudant database
+        """
+
+        logger.info("Deleting Cloudant database: %s...", self._database_name)
+
+        try:
+            self._client.delete_database(self._database_name)
+        except (HTTPError, CloudantException) as err:
+            logger.error("Failed to delete Cloudant database: %s.", self._database_name)
+            error_util.log_exception(logger, err)
+            return False
+
+        self._database = None
+
+        logger.info("Successfully deleted Cloudant database: %s.", self._database_name)
+
+        return True
+
+
     def get_doc_count(self, logger=DEFAULT_LOGGER):
         """
         Retrieve number of Cloudant documents in database
@@ -148,6 +323,32 @@ class CloudantDatabase: # pylint: disable=unused-variable
         return self._doc_count
 
 
+    def get_database_info(self, logger=DEFAULT_LOGGER):
+        """
+        Retrieve the Cloudant database metadata (e.g. update sequence, sizes); None on error
+        """
+
+        if self._database is None:
+            logger.error("Failed to retrieve Cloudant database metadata. Database connection is closed: %s.",
+                self._database_name)
+            return None
+
+        try:
+            response = self._database.r_session.get(self._database.database_url)
+            response.raise_for_status()
+            info = response.json()
+        except HTTPError as err:
+            logger.error("Failed to retrieve Cloudant database metadata: %s.", self._database_name)
+            error_util.log_http_error(logger, err)
+            return None
+        except (RequestException, ValueError) as err:
+            logger.error("Failed to retrieve Cloudant database metadata: %s.", self._database_name)
+            error_util.log_exception(logger, err)
+            return None
+
+        return info
+
+
     def get_design_document(self, ddoc_name, logger=DEFAULT_LOGGER):
         """
         Retrieve the Cloudant design document
@@ -185,6 +386,74 @@ class CloudantDatabase: # pylint: disable=unused-variable
         return None
 
 
+    def create_design_document(self, ddoc_name, view_name, map_function, logger=DEFAULT_LOGGER):
+        """
+        Create (or update) the Cloudant design document with the specified view
+        """
+
+        logger.info("Creating Cloudant design document: %s...", ddoc_name)
+
+        if self._database is None:
+            message = "Failed to create Cloudant design document: {0}. " \
+                "Database connection is closed: {1}.".format(ddoc_name, self._database_name)
+            logger.error(message)
+            return False
+
+        ddoc = DesignDocument(self._database, ddoc_name)
+
+        try:
+            if ddoc.exists():
+                ddoc.fetch()
+
+            if view_name in ddoc.views:
+                ddoc.update_view(view_name, map_function)
+            else:
+                ddoc.add_view(view_name, map_function)
+
+            ddoc.save()
+        except (HTTPError, CloudantException) as err:
+            logger.error("Failed to create Cloudant design document: %s.", ddoc_name)
+            error_util.log_exception(logger, err)
+            return False
+
+        logger.info("Successfully created Cloudant design document: %s.", ddoc_name)
+
+        return True
+
+
+    def get_view_row_count(self, ddoc, view_name, logger=DEFAULT_LOGGER):
+        """
+        Retrieve the total number of rows emitted by the Cloudant view
+        """
+
+        logger.info("Retrieving Cloudant view row count: %s...", view_name)
+
+        if self._database is None:
+            message = "Failed to retrieve Cloudant view row count: {0}. " \
+                "Database connection is closed: {1}.".format(view_name, self._database_name)
+            logger.error(message)
+            return None
+
+        try:
+            results = View(ddoc=ddoc, view_name=view_name)(limit=0)
+        except HTTPError as err:
+            logger.error("Failed to retrieve Cloudant view row count: %s.", view_name)
+            error_util.log_http_error(logger, err)
+            return None
+
+        if not PROPERTY_TOTAL_ROWS in results:
+            logger.error(
+                "Encountered Cloudant view result set with missing property: %s.",
+                PROPERTY_TOTAL_ROWS)
+            return None
+
+        row_count = results[PROPERTY_TOTAL_ROWS]
+
+        logger.info("Successfully retrieved Cloudant view row count: %s (%d).", view_name, row_count)
+
+        return row_count
+
+
     def get_document(self, document_id, logger=DEFAULT_LOGGER):
         """
         Retrieve the Cloudant document by ID (latest revision)
@@ -198,7 +467,7 @@ class CloudantDatabase: # pylint: disable=unused-variable
             logger.error(message)
             return None
 
-        start_time = datetime.datetime.now()
+        start_time = timing_util.start_timer()
 
         try:
             document = self._database[document_id]
@@ -219,8 +488,7 @@ class CloudantDatabase: # pylint: disable=unused-variable
             logger.error(message)
             return None
 
-        end_time = datetime.datetime.now()
-        elapsed_time = (end_time - start_time).total_seconds() * 1000  # ms
+        elapsed_time = timing_util.get_elapsed_ms(start_time)
 
         logger.debug("Successfully retrieved Cloudant document: %s (%d ms).", document_id, elapsed_time)
 
@@ -246,7 +514,7 @@ class CloudantDatabase: # pylint: disable=unused-variable
 
         # Fetch document
 
-        start_time = datetime.datetime.now()
+        start_time = timing_util.start_timer()
 
         document = self.get_document(document_id, logger)
 
@@ -273,8 +541,7 @@ class CloudantDatabase: # pylint: disable=unused-variable
             error_util.log_http_error(logger, err)
             return None
 
-        end_time = datetime.datetime.now()
-        elapsed_time = (end_time - start_time).total_seconds() * 1000  # ms
+        elapsed_time = timing_util.get_elapsed_ms(start_time)
 
         logger.info("Successfully deleted Cloudant document: %s (%d ms).", document_id, elapsed_time)
 
@@ -286,7 +553,7 @@ class CloudantDatabase: # pylint: disable=unused-variable
         Delete the Cloudant document revision
         """
 
-        logger.info("Deleting Cloudant document: %s. Revision: %s...", document_id, revision_id)
+        logger.debug("Deleting Cloudant document: %s. Revision: %s...", document_id, revision_id)
 
         if self._database is None:
             message = "Failed to delete Cloudant document: {0}. Revision: {1}. " \
@@ -294,7 +561,7 @@ class CloudantDatabase: # pylint: disable=unused-variable
             logger.error(message)
             return False
 
-        start_time = datetime.datetime.now()
+        start_time = timing_util.start_timer()
 
         document_url = self._get_document_url(document_id)
 
@@ -309,9 +576,43 @@ class CloudantDatabase: # pylint: disable=unused-variable
         }
 
         session = self._database.r_session
-        response = session.delete(document_url, params=params)
+
+        try:
+            response = session.delete(document_url, params=params)
+
+            # 409 Conflict: refetch the document leaves; the branch of the revision may already end with a
+            # tombstone (e.g. a retried attempt whose first response was lost), have been updated by another writer
+            # (still conflicted), or the revision may still be a leaf (e.g. a concurrent update of the winner)
+
+            if response.status_code == STATUS_CONFLICT:
+                branch = self._get_branch(document_url, revision_id)
+
+                if branch == BRANCH_DELETED:
+                    logger.debug("Cloudant document revision already deleted: %s. Revision: %s.",
+                        document_id, revision_id)
+                    return True
+
+                if branch == BRANCH_UPDATED:
+                    logger.error("Failed to delete Cloudant document: %s. Revision: %s. The conflicted revision was "
+                        "updated concurrently.", document_id, revision_id)
+                    return False
+
+                if branch == BRANCH_LIVE:
+                    response = session.delete(document_url, params=params)
+        except RequestException as err:
+            # e.g. connection reset, timeout (after retries)
+            logger.error("Failed to delete Cloudant document: %s. Revision: %s.", document_id, revision_id)
+            error_util.log_exception(logger, err)
+            return False
+
+        # 404 Not Found: the document (or revision) is already gone, which is the requested outcome
+
+        if response.status_code == STATUS_NOT_FOUND and not self._is_missing_database(response):
+            logger.debug("Cloudant document revision already deleted: %s. Revision: %s.", document_id, revision_id)
+            return True
 
         if logger_util.is_enabled_for_trace(logger):
+            from pprint import pformat # pylint: disable=import-outside-toplevel
             serialized_response = pformat(vars(response))
             logger_util.log_trace(logger, serialized_response)
 
@@ -322,15 +623,60 @@ class CloudantDatabase: # pylint: disable=unused-variable
             error_util.log_http_error(logger, err)
             return False
 
-        end_time = datetime.datetime.now()
-        elapsed_time = (end_time - start_time).total_seconds() * 1000  # ms
+        elapsed_time = timing_util.get_elapsed_ms(start_time)
 
-        logger.info("Successfully deleted Cloudant document: %s. Revision: %s (%d ms).",
+        logger.debug("Successfully deleted Cloudant document: %s. Revision: %s (%d ms).",
             document_id, revision_id, elapsed_time)
 
         return True
 
 
+    def write_revisions(self, docs, logger=DEFAULT_LOGGER):
+        """
+        Write document revisions as-is (_bulk_docs with new_edits=false), e.g. to create conflicts
+        """
+
+        logger.debug("Writing Cloudant document revisions: %d...", len(docs))
+
+        if self._database is None:
+            message = "Failed to write Cloudant document revisions. " \
+                "Database connection is closed: {0}.".format(self._database_name)
+            logger.error(message)
+            return False
+
+        start_time = timing_util.start_timer()
+
+        url = "/".join((self._database.database_url, "_bulk_docs"))
+        payload = {
+            "docs": docs,
+            "new_edits": False
+        }
+
+        session = self._database.r_session
+
+        try:
+            response = session.post(
+                url,
+                data=json.dumps(payload),
+                headers={"Content-Type": "application/json"})
+            response.raise_for_status()
+        except HTTPError as err:
+            logger.error("Failed to write Cloudant document revisions: %d.", len(docs))
+            error_util.log_http_error(logger, err)
+            return False
+        except RequestException as err:
+            # e.g. connection reset, timeout (after retries)
+            logger.error("Failed to write Cloudant document revisions: %d.", len(docs))
+            error_util.log_exception(logger, err)
+            return False
+
+        elapsed_time = timing_util.get_elapsed_ms(start_time)
+
+        logger.debug("Successfully wrote Cloudant document revisions: %d (%d ms).", len(docs), elapsed_time)
+
+        return True
+
+
     def get_query_results(self, query, logger=DEFAULT_LOGGER):
         """
         Retrieve a page of the Cloudant Query result set
@@ -348,20 +694,16 @@ class CloudantDatabase: # pylint: disable=unused-variable
 
         # Run Cloudant Query
 
-        # TODO: REFACTOR: Create timing utility
-
-        start_time = datetime.datetime.now()
+        start_time = timing_util.start_timer()
 
         options = query.get_query_json()
         results = self._database.get_query_result(**options)
 
-        end_time = datetime.datetime.now()
+        elapsed_time = timing_util.get_elapsed_ms(start_time)
 
         if not self._is_valid_results(results):
             return None
 
-        elapsed_time = (end_time - start_time).total_seconds() * 1000  # ms
-
         logger.debug("Page [%d]: Successfully retrieved Cloudant Query results (%d ms).", page, elapsed_time)
 
         docs = results[PROPERTY_DOCS]
@@ -372,6 +714,336 @@ class CloudantDatabase: # pylint: disable=unused-variable
         return docs
 
 
+    def get_provisioned_throughput(self, logger=DEFAULT_LOGGER):
+        """
+        Retrieve the provisioned throughput capacity of the Cloudant account (requests/s per capacity class)
+        """
+
+        logger.info("Retrieving Cloudant provisioned throughput capacity: %s...", self.get_location())
+
+        if self._client is None:
+            logger.error("Failed to retrieve Cloudant provisioned throughput capacity. Client connection is closed.")
+            return None
+
+        url = "/".join((self._client.server_url, THROUGHPUT_CAPACITY_PATH))
+
+        try:
+            response = self._client.r_session.get(url)
+            response.raise_for_status()
+            throughput = response.json()["current"]["throughput"]
+        except HTTPError as err:
+            # e.g. CouchDB (no provisioned throughput)
+            logger.error("Failed to retrieve Cloudant provisioned throughput capacity: %s.", self.get_location())
+            error_util.log_http_error(logger, err)
+            return None
+        except (RequestException, ValueError, KeyError, TypeError) as err:
+            logger.error("Failed to retrieve Cloudant provisioned throughput capacity: %s.", self.get_location())
+            error_util.log_exception(logger, err)
+            return None
+
+        logger.info("Successfully retrieved Cloudant provisioned throughput capacity: %s (blocks: %s, reads: %s/s, "
+            "writes: %s/s, global queries: %s/s).",
+            self.get_location(),
+            throughput.get("blocks"),
+            throughput.get("read"),
+            throughput.get("write"),
+            throughput.get("query"))
+
+        return throughput
+
+
+    def get_active_tasks(self, logger=DEFAULT_LOGGER):
+        """
+        Retrieve the tasks running on the cluster (e.g. indexing, compaction, replication); sampled periodically
+        """
+
+        if self._client is None:
+            logger.error("Failed to retrieve active tasks. Client connection is closed.")
+            return None
+
+        url = "/".join((self._client.server_url, ACTIVE_TASKS_PATH))
+
+        try:
+            response = self._client.r_session.get(url)
+            response.raise_for_status()
+            tasks = response.json()
+        except HTTPError as err:
+            # e.g. not permitted for the API key (requires _admin)
+            logger.error("Failed to retrieve active tasks: %s.", self.get_location())
+            error_util.log_http_error(logger, err)
+            return None
+        except (RequestException, ValueError) as err:
+            logger.error("Failed to retrieve active tasks: %s.", self.get_location())
+            error_util.log_exception(logger, err)
+            return None
+
+        if not isinstance(tasks, list):
+            logger.error("Failed to retrieve active tasks: %s. Unexpected response.", self.get_location())
+            return None
+
+        return tasks
+
+
+    def compact_database(self, logger=DEFAULT_LOGGER):
+        """
+        Trigger the compaction of the database (see: _request_maintenance)
+        """
+
+        return self._request_maintenance(COMPACT_PATH, "database compaction", logger)
+
+
+    def compact_views(self, ddoc_name, logger=DEFAULT_LOGGER):
+        """
+        Trigger the compaction of the view indexes of the design document (see: _request_maintenance)
+        """
+
+        return self._request_maintenance("/".join((COMPACT_PATH, ddoc_name)), "view compaction", logger)
+
+
+    def cleanup_views(self, logger=DEFAULT_LOGGER):
+        """
+        Trigger the removal of the view indexes no longer used by any design document (see: _request_maintenance)
+        """
+
+        return self._request_maintenance(VIEW_CLEANUP_PATH, "view cleanup", logger)
+
+
+    def get_documents(self, document_ids, conflicts=False, logger=DEFAULT_LOGGER):
+        """
+        Retrieve a batch of documents (winning revisions, with their _conflicts if requested) in a single request
+        (POST _all_docs with keys); returns a dictionary of document ID -> document (None if missing or deleted), or
+        None on error
+        """
+
+        if self._database is None:
+            logger.error("Failed to retrieve Cloudant documents: %d. Database connection is closed: %s.",
+                len(document_ids), self._database_name)
+            return None
+
+        url = "/".join((self._database.database_url, "_all_docs"))
+        params = {
+            "include_docs": "true",
+            "conflicts": "true" if conflicts else "false"
+        }
+
+        try:
+            response = self._database.r_session.post(
+                url,
+                params=params,
+                data=json.dumps({"keys": list(document_ids)}),
+                headers={"Content-Type": "application/json"})
+            response.raise_for_status()
+            rows = response.json()["rows"]
+        except HTTPError as err:
+            logger.error("Failed to retrieve Cloudant documents: %d.", len(document_ids))
+            error_util.log_http_error(logger, err)
+            return None
+        except (RequestException, ValueError, KeyError) as err:
+            logger.error("Failed to retrieve Cloudant documents: %d.", len(document_ids))
+            error_util.log_exception(logger, err)
+            return None
+
+        return {row["key"]: row.get("doc") for row in rows}
+
+
+    def get_revisions(self, revisions, logger=DEFAULT_LOGGER):
+        """
+        Retrieve a batch of document revisions in a single request (POST _bulk_get); a None revision ID stands for
+        the winning revision; returns a dictionary of (document ID, revision ID) -> document (None if missing or
+        deleted), or None on error
+        """
+
+        if self._database is None:
+            logger.error("Failed to retrieve Cloudant document revisions: %d. Database connection is closed: %s.",
+                len(revisions), self._database_name)
+            return None
+
+        url = "/".join((self._database.database_url, "_bulk_get"))
+        payload = {
+            "docs": [
+                {"id": document_id, "rev": revision_id} if revision_id else {"id": document_id}
+                for document_id, revision_id in revisions
+            ]
+        }
+
+        try:
+            response = self._database.r_session.post(
+                url,
+                data=json.dumps(payload),
+                headers={"Content-Type": "application/json"})
+            response.raise_for_status()
+            results = response.json()["results"]
+        except HTTPError as err:
+            logger.error("Failed to retrieve Cloudant document revisions: %d.", len(revisions))
+            error_util.log_http_error(logger, err)
+            return None
+        except (RequestException, ValueError, KeyError) as err:
+            logger.error("Failed to retrieve Cloudant document revisions: %d.", len(revisions))
+            error_util.log_exception(logger, err)
+            return None
+
+        if not isinstance(results, list) or len(results) != len(revisions):
+            logger.error("Failed to retrieve Cloudant document revisions: %d. Unexpected response.", len(revisions))
+            return None
+
+        # One result per requested revision, in order (docs: a single "ok" or "error" entry)
+
+        documents = {}
+
+        for revision, result in zip(revisions, results):
+            document = None
+
+            for entry in result.get("docs", []):
+                if "ok" in entry and not entry["ok"].get("_deleted"):
+                    document = entry["ok"]
+
+            documents[revision] = document
+
+        return documents
+
+
+    def update_documents(self, docs, logger=DEFAULT_LOGGER):
+        """
+        Write a batch of document updates and deletions (tombstones) with a single _bulk_docs request; returns the
+        result of each document in order (dictionary with "ok" and "rev", or "error"), or None on error
+        """
+
+        return self._post_bulk_docs(docs, "update Cloudant documents", logger)
+
+
+    def delete_revisions(self, revisions, logger=DEFAULT_LOGGER):
+        """
+        Delete a batch of document revisions (tombstones written with a single _bulk_docs request); returns the
+        result of each (document ID, revision ID) in order (dictionary with "ok" or "error"), or None on error
+        """
+
+        docs = [
+            {"_id": document_id, "_rev": revision_id, "_deleted": True}
+            for document_id, revision_id in revisions
+        ]
+
+        return self._post_bulk_docs(docs, "delete Cloudant document revisions", logger)
+
+
+    def follow_changes(self, since, heartbeat, logger=DEFAULT_LOGGER):
+        """
+        Follow the continuous changes feed (style=all_docs: every leaf revision of the changed documents); yields
+        each change as it happens, {} on every heartbeat and the final {"last_seq": ...} if the server ends the
+        feed; ends on error (e.g. connection lost, missed heartbeats)
+        """
+
+        if self._database is None:
+            logger.error("Failed to follow changes feed. Database connection is closed: %s.", self._database_name)
+            return
+
+        url = "/".join((self._database.database_url, "_changes"))
+        params = {
+            "feed": "continuous",
+            "style": "all_docs",
+            "heartbeat": int(heartbeat * 1000),
+            "since": since
+        }
+
+        session = self._database.r_session
+        response = None
+
+        try:
+            # The client session imposes its own (global) timeout; the feed needs a read timeout of a few heartbeats
+
+            response = requests.Session.request(
+                session,
+                "GET",
+                url,
+                params=params,
+                stream=True,
+                timeout=(CHANGES_CONNECT_TIMEOUT, heartbeat * CHANGES_MISSED_HEARTBEATS))
+
+            # Expired session: renew it (as the client session does) so that the next attempt is authorized
+
+            if response.status_code == STATUS_UNAUTHORIZED:
+                session.login()
+
+            response.raise_for_status()
+
+            # Chunks as they arrive (the default 512 byte chunks would hold back changes and heartbeats)
+
+            for line in response.iter_lines(chunk_size=None):
+                yield json.loads(line) if line else {}
+        except HTTPError as err:
+            logger.error("Failed to follow changes feed: %s.", self._database_name)
+            error_util.log_http_error(logger, err)
+        except (RequestException, ValueError) as err:
+            logger.error("Failed to follow changes feed: %s.", self._database_name)
+            error_util.log_exception(logger, err)
+        finally:
+            if response is not None:
+                response.close()
+
+
+    def get_local_document(self, name, logger=DEFAULT_LOGGER):
+        """
+        Retrieve a local (non-replicated) document, e.g. a work lease; returns {} if it does not exist, None on error
+        """
+
+        url = self._get_local_document_url(name)
+
+        if url is None:
+            logger.error("Failed to retrieve local document: %s. Client connection is closed.", name)
+            return None
+
+        try:
+            response = self._client.r_session.get(url)
+
+            if response.status_code == STATUS_NOT_FOUND and not self._is_missing_database(response):
+                return {}
+
+            response.raise_for_status()
+            document = response.json()
+        except HTTPError as err:
+            logger.error("Failed to retrieve local document: %s.", name)
+            error_util.log_http_error(logger, err)
+            return None
+        except (RequestException, ValueError) as err:
+            logger.error("Failed to retrieve local document: %s.", name)
+            error_util.log_exception(logger, err)
+            return None
+
+        return document
+
+
+    def save_local_document(self, name, document, logger=DEFAULT_LOGGER):
+        """
+        Create or update a local document (its _rev must be current); returns the new revision, or None on conflict
+        (updated concurrently) or error
+        """
+
+        url = self._get_local_document_url(name)
+
+        if url is None:
+            logger.error("Failed to save local document: %s. Client connection is closed.", name)
+            return None
+
+        try:
+            response = self._client.r_session.put(url, json=document)
+
+            if response.status_code == STATUS_CONFLICT:
+                logger.debug("Local document updated concurrently: %s.", name)
+                return None
+
+            response.raise_for_status()
+            revision = response.json()["rev"]
+        except HTTPError as err:
+            logger.error("Failed to save local document: %s.", name)
+            error_util.log_http_error(logger, err)
+            return None
+        except (RequestException, ValueError, KeyError) as err:
+            logger.error("Failed to save local document: %s.", name)
+            error_util.log_exception(logger, err)
+            return None
+
+        return revision
+
+
     def get_database_connection(self):
         """
         TODO
@@ -379,6 +1051,13 @@ class CloudantDatabase: # pylint: disable=unused-variable
         return self._database
 
 
+    def get_metrics(self):
+        """
+        Retrieve the HTTP request metrics collector (if any)
+        """
+        return self._metrics
+
+
     # Private Methods --------------------------------------------------------->
 
     def _is_valid_results(self, results):
@@ -399,6 +1078,79 @@ class CloudantDatabase: # pylint: disable=unused-variable
         return True
 
 
+    def _post_bulk_docs(self, docs, description, logger=DEFAULT_LOGGER):
+        """
+        Write a batch of documents (POST _bulk_docs); returns the result of each document in order, or None on error
+        """
+
+        if self._database is None:
+            logger.error("Failed to %s: %d. Database connection is closed: %s.",
+                description, len(docs), self._database_name)
+            return None
+
+        url = "/".join((self._database.database_url, "_bulk_docs"))
+
+        try:
+            response = self._database.r_session.post(
+                url,
+                data=json.dumps({"docs": docs}),
+                headers={"Content-Type": "application/json"})
+            response.raise_for_status()
+            results = response.json()
+        except HTTPError as err:
+            logger.error("Failed to %s: %d.", description, len(docs))
+            error_util.log_http_error(logger, err)
+            return None
+        except (RequestException, ValueError) as err:
+            logger.error("Failed to %s: %d.", description, len(docs))
+            error_util.log_exception(logger, err)
+            return None
+
+        if not isinstance(results, list) or len(results) != len(docs):
+            logger.error("Failed to %s: %d. Unexpected response.", description, len(docs))
+            return None
+
+        return results
+
+
+    def _request_maintenance(self, path, description, logger=DEFAULT_LOGGER):
+        """
+        Request a maintenance operation of the database (run in the background by the server); returns True if
+        accepted, False if the server does not permit it, None on error
+        """
+
+        logger.info("Requesting %s: %s...", description, self._database_name)
+
+        if self._database is None:
+            logger.error("Failed to request %s. Database connection is closed: %s.", description,
+                self._database_name)
+            return None
+
+        url = "/".join((self._database.database_url, path))
+
+        try:
+            response = self._database.r_session.post(url, headers={"Content-Type": "application/json"})
+
+            if response.status_code in MAINTENANCE_REFUSED_STATUSES:
+                logger.warning("The server does not permit %s: %s (status: %d).", description, self._database_name,
+                    response.status_code)
+                return False
+
+            response.raise_for_status()
+        except HTTPError as err:
+            logger.error("Failed to request %s: %s.", description, self._database_name)
+            error_util.log_http_error(logger, err)
+            return None
+        except RequestException as err:
+            logger.error("Failed to request %s: %s.", description, self._database_name)
+            error_util.log_exception(logger, err)
+            return None
+
+        logger.info("Successfully requested %s: %s.", description, self._database_name)
+
+        return True
+
+
     @staticmethod
     def _is_valid_docs(results, logger=DEFAULT_LOGGER):
         """
@@ -455,6 +1207,56 @@ class CloudantDatabase: # pylint: disable=unused-variable
         return True
 
 
+    def _get_branch(self, document_url, revision_id):
+        """
+        Determine the state of the branch of the revision from the leaves of the document and their revision
+        history (open_revs=all, revs=true): BRANCH_LIVE, BRANCH_DELETED or BRANCH_UPDATED; None if unknown
+        """
+
+        response = self._database.r_session.get(
+            document_url,
+            params={"open_revs": "all", "revs": "true"},
+            headers={"Accept": "application/json"})
+
+        if response.status_code == STATUS_NOT_FOUND and not self._is_missing_database(response):
+            return BRANCH_DELETED
+
+        if response.status_code != 200:
+            return None
+
+        try:
+            leaves = [entry["ok"] for entry in response.json() if "ok" in entry]
+        except (ValueError, TypeError, KeyError):
+            return None
+
+        for leaf in leaves:
+            if leaf.get("_rev") == revision_id:
+                return BRANCH_DELETED if leaf.get("_deleted") else BRANCH_LIVE
+
+            history = leaf.get("_revisions") or {}
+            start = history.get("start", 0)
+            ancestors = ["{0}-{1}".format(start - index, digest) for index, digest in enumerate(history.get("ids", []))]
+
+            if revision_id in ancestors:
+                return BRANCH_DELETED if leaf.get("_deleted") else BRANCH_UPDATED
+
+        return None
+
+
+    @staticmethod
+    def _is_missing_database(response):
+        """
+        Determine whether a 404 response reports a missing database (rather than a missing document)
+        """
+
+        try:
+            reason = response.json().get("reason", "")
+        except ValueError:
+            return False
+
+        return reason == REASON_MISSING_DATABASE
+
+
     def _get_document_url(self, document_id):
         """
         TODO
@@ -478,3 +1280,14 @@ class CloudantDatabase: # pylint: disable=unused-variable
         url = url = "/".join(url_parts)
 
         return url
+
+
+    def _get_local_document_url(self, name):
+        """
+        Retrieve the URL of a local document (None if the client connection is closed)
+        """
+
+        if not self._client or not self._client.server_url:
+            return None
+
+        return "/".join((self._client.server_url, quote_plus(self._database_name), LOCAL_DOCUMENT_PREFIX + quote(name)))
@@ -0,0 +1,269 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from lib.classes import trace_recorder
+from lib.utils import request_util
+from lib.utils import timing_util
+
+# Globals
+
+HEADER_CONTENT_LENGTH = "Content-Length"
+
+# Classes --------------------------------------------------------------------->
+
+class CloudantTransportAdapter(HTTPAdapter): # pylint: disable=unused-variable
+    """
+    Transport adapter mounted on the Cloudant client session; sees every HTTP request attempt
+    """
+
+    def __init__(self, metrics=None, tracer=None, recorder=None, faults=None, retry=None, breaker=None,
+            limiter=None, scheduler=None, monitor=None, **kwargs):
+        """
+        Constructor
+
+        - recorder: CassetteRecorder capturing every request attempt (record mode).
+        - faults: FaultInjector failing or delaying request attempts before they are sent.
+        - retry: RetryPolicy retrying the transient failures of idempotent requests.
+        - breaker: CircuitBreaker pausing request attempts while the cluster is unhealthy.
+        - limiter: RateLimiter capping the rate of request attempts.
+        - scheduler: CapacityScheduler pacing request attempts per capacity class (reads, writes, queries).
+        - monitor: LoadMonitor capping the in-flight request attempts while the cluster is under pressure.
+        """
+
+        # pylint: disable=too-many-arguments
+
+        super().__init__(**kwargs)
+
+        self._metrics = metrics
+        self._tracer = tracer
+        self._recorder = recorder
+        self._faults = faults
+        self._retry = retry
+        self._breaker = breaker
+        self._limiter = limiter
+        self._scheduler = scheduler
+        self._monitor = monitor
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        """
+        Send the HTTP request (retrying transient failures) and record the metrics of every attempt
+        """
+
+        # pylint: disable=too-many-arguments
+
+        operation = request_util.get_operation(request.method, request.url)
+        attempt = 0
+
+        if self._retry:
+            self._retry.record_request()
+
+        while True:
+            try:
+                response = self._send_attempt(
+                    operation,
+                    request,
+                    stream=stream,
+                    timeout=timeout,
+                    verify=verify,
+                    cert=cert,
+                    proxies=proxies)
+            except RequestException as err:
+                delay = self._retry.get_retry_delay(request, attempt, exception=err) if self._retry else None
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry.get_retry_delay(request, attempt, response=response) if self._retry else None
+                if delay is None:
+                    return response
+                response.close()
+
+            if self._metrics:
+                self._metrics.record_retry(operation)
+
+            time.sleep(delay)
+            attempt += 1
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _send_attempt(self, operation, request, stream=False, **kwargs):
+        """
+        Wait until the attempt is admitted (circuit breaker, rate limits, load), then send it
+        """
+
+        # Authentication is never paused: a session renewal may be part of the probe
+
+        breaker = self._breaker if operation != request_util.OPERATION_SESSION else None
+        probe = None
+
+        if breaker:
+            probe = breaker.acquire()
+
+        if self._limiter:
+            self._limiter.acquire()
+
+        if self._scheduler:
+            self._scheduler.acquire(request)
+
+        if self._monitor:
+            self._monitor.acquire(operation)
+
+        try:
+            return self._send_admitted_attempt(operation, request, breaker, probe, stream=stream, **kwargs)
+        finally:
+            if self._monitor:
+                self._monitor.release(operation)
+
+
+    def _send_admitted_attempt(self, operation, request, breaker, probe, stream=False, **kwargs):
+        """
+        Send a single attempt of the HTTP request and record its metrics (probe: token of the circuit breaker probe,
+        if the attempt is one)
+        """
+
+        # pylint: disable=too-many-arguments
+
+        trace_timestamp = self._tracer.get_timestamp() if self._tracer else 0
+        start_time = timing_util.start_timer()
+
+        try:
+            # Injected faults (if any) replace the attempt: the request is not sent
+
+            response = self._faults.apply(request) if self._faults else None
+
+            if response is None:
+                response = self._send_request(request, stream=stream, **kwargs)
+
+            # Read the body here (instead of in the session) so that latency includes the transfer
+
+            if not stream:
+                response.content # pylint: disable=pointless-statement
+
+        except RequestException as err:
+            elapsed = timing_util.get_elapsed_seconds(start_time)
+            self._record_request(operation, request, None, elapsed)
+            self._record_span(operation, request, None, trace_timestamp)
+            if breaker:
+                breaker.record(None, elapsed, probe=probe)
+            if self._recorder:
+                self._recorder.record(request, None, start_time, elapsed, exception=err)
+            raise
+
+        elapsed = timing_util.get_elapsed_seconds(start_time)
+        self._record_request(operation, request, response, elapsed)
+        self._record_span(operation, request, response, trace_timestamp)
+
+        if breaker:
+            breaker.record(response.status_code, elapsed, probe=probe)
+
+        if self._recorder:
+            self._recorder.record(request, response, start_time, elapsed)
+
+        return response
+
+
+    def _send_request(self, request, **kwargs):
+        """
+        Send the HTTP request over the network (overridden by the replay transport)
+        """
+
+        return super().send(request, **kwargs)
+
+
+    def _record_request(self, operation, request, response, elapsed):
+        """
+        Record the request metrics (if enabled)
+        """
+
+        if not self._metrics:
+            return
+
+        status = None
+        bytes_received = 0
+
+        if response is not None:
+            status = response.status_code
+            bytes_received = self._get_response_size(response)
+
+        self._metrics.record_request(
+            operation=operation,
+            status=status,
+            elapsed=elapsed,
+            bytes_sent=self._get_request_size(request),
+            bytes_received=bytes_received)
+
+
+    def _record_span(self, operation, request, response, trace_timestamp):
+        """
+        Record the request as a trace span (if enabled)
+        """
+
+        if not self._tracer:
+            return
+
+        self._tracer.add_complete_event(
+            name=operation,
+            category=trace_recorder.CATEGORY_HTTP,
+            start_timestamp=trace_timestamp,
+            args={
+                "method": request.method,
+                "status": response.status_code if response is not None else None
+            })
+
+
+    @staticmethod
+    def _get_request_size(request):
+        """
+        Retrieve the size of the request body (in bytes)
+        """
+
+        body = request.body
+
+        if not body:
+            return 0
+        if isinstance(body, str):
+            return len(body.encode("utf-8"))
+        if isinstance(body, (bytes, bytearray)):
+            return len(body)
+
+        return 0
+
+
+    @staticmethod
+    def _get_response_size(response):
+        """
+        Retrieve the size of the response body (in bytes)
+        """
+
+        if response._content_consumed: # pylint: disable=protected-access
+            return len(response.content or b"")
+
+        try:
+            return int(response.headers.get(HEADER_CONTENT_LENGTH, 0))
+        except ValueError:
+            return 0
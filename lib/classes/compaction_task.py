@@ -0,0 +1,302 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import time
+import logging
+import threading
+
+from lib.classes.task_interface import TaskInterface
+from lib.classes import progress_reporter
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("compaction_task")
+
+DEFAULT_TIMEOUT = 3600 # seconds waiting for the compactions to finish
+DEFAULT_POLL_INTERVAL = 5 # seconds between polls of the active tasks
+
+COMPACTION_TASK_TYPES = frozenset(("database_compaction", "view_compaction"))
+
+SIZE_PROPERTIES = ("file", "active", "external")
+
+SHARD_PREFIX = "shards/"
+
+# Operation outcomes (see: CloudantDatabase._request_maintenance)
+OUTCOME_STARTED = "started"
+OUTCOME_NOT_PERMITTED = "not permitted"
+OUTCOME_FAILED = "failed"
+
+# Classes --------------------------------------------------------------------->
+
+class CompactionTask(TaskInterface): # pylint: disable=unused-variable
+    """
+    Reclaims the disk space of the deleted revisions: triggers the compaction of the database and of the conflicts
+    view, and the cleanup of unused view indexes (where the server permits it), then polls the active tasks until the
+    compactions are done; the database sizes (file / active / external) are recorded before and after
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, database, ddoc_name, timeout=DEFAULT_TIMEOUT, poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        Constructor
+
+        - database: CloudantDatabase (opened).
+        - ddoc_name: Name of the design document of the conflicts view.
+        - timeout: Maximum time (seconds) waiting for the compactions to finish (they keep running on the server).
+        - poll_interval: Time (seconds) between polls of the active tasks and database metadata.
+        """
+
+        self._database = database
+        self._ddoc_name = ddoc_name
+        self._timeout = timeout
+        self._poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._outcomes = {}
+        self._sizes_before = None
+        self._sizes_after = None
+        self._progress = 0 # percent (mean of the running compaction tasks)
+        self._running_tasks = 0
+        self._sample_tasks = True # active tasks available (see: _wait)
+        self._total_polls = 0
+        self._timed_out = False
+        self._elapsed_time = 0 # seconds
+
+
+    def __str__(self):
+        """
+        Compaction details (summary content)
+        """
+
+        line = '=' * 80
+        result = [
+            "",
+            line,
+            "Compaction Details",
+            line,
+            "",
+            "- Database Compaction:                {0}".format(self._outcomes.get("database")),
+            "- View Compaction:                    {0} (_design/{1})".format(
+                self._outcomes.get("views"), self._ddoc_name),
+            "- View Cleanup:                       {0}".format(self._outcomes.get("view_cleanup")),
+            "- File Size (before / after):         {0}".format(self._get_sizes_content("file")),
+            "- Active Size (before / after):       {0}".format(self._get_sizes_content("active")),
+            "- External Size (before / after):     {0}".format(self._get_sizes_content("external")),
+            "- Reclaimed Disk Space:               {0}".format(self._get_reclaimed_content()),
+            "- Timed Out:                          {0}".format(self._timed_out),
+            "- Elapsed Time:                       {0:.3f} s".format(self._elapsed_time),
+            ""
+        ]
+
+        return "\n".join(result)
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def run(self, logger=DEFAULT_LOGGER):
+        """
+        Trigger the compactions and wait until done (or timed out); fails if a maintenance request failed (a
+        request the server does not permit is not a failure)
+        """
+
+        start_time = time.monotonic()
+
+        self._sizes_before = self._get_sizes()
+
+        self._outcomes = {
+            "database": self._get_outcome(self._database.compact_database()),
+            "views": self._get_outcome(self._database.compact_views(self._ddoc_name)),
+            "view_cleanup": self._get_outcome(self._database.cleanup_views())
+        }
+
+        if OUTCOME_STARTED in (self._outcomes["database"], self._outcomes["views"]):
+            self._wait(start_time)
+
+        self._sizes_after = self._get_sizes()
+        self._elapsed_time = time.monotonic() - start_time
+
+        logger.info("Compaction finished: %s (file size: %s; reclaimed: %s).",
+            self._database.get_database_name(),
+            self._get_sizes_content("file"),
+            self._get_reclaimed_content())
+
+        failed = [name for name, outcome in self._outcomes.items() if outcome == OUTCOME_FAILED]
+
+        if failed:
+            logger.error("Failed maintenance requests: %s (%s).", self._database.get_database_name(), ", ".join(failed))
+            return False
+
+        return True
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the compaction results
+        """
+
+        with self._lock:
+            return {
+                "operations": dict(self._outcomes),
+                "sizes_before": self._sizes_before,
+                "sizes_after": self._sizes_after,
+                "reclaimed_bytes": self._get_reclaimed_bytes(),
+                "polls": self._total_polls,
+                "timed_out": self._timed_out,
+                "elapsed_s": self._elapsed_time
+            }
+
+
+    def get_progress(self):
+        """
+        Snapshot of the compaction progress (percent; see: ProgressReporter)
+        """
+
+        return {
+            progress_reporter.PROGRESS_PROCESSED: self._progress,
+            progress_reporter.PROGRESS_QUEUE_DEPTH: self._running_tasks
+        }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _wait(self, start_time, logger=DEFAULT_LOGGER):
+        """
+        Poll the active tasks (progress) and the database metadata (compact_running) until the compactions are done
+        """
+
+        logger.info("Waiting for the compactions to finish: %s (timeout: %s s)...",
+            self._database.get_database_name(), self._timeout)
+
+        while True:
+            time.sleep(self._poll_interval)
+
+            info = self._database.get_database_info() or {}
+            tasks = self._database.get_active_tasks() if self._sample_tasks else None
+
+            if tasks is None and self._sample_tasks:
+                # Unavailable (e.g. not permitted for the API key)
+                self._sample_tasks = False
+                logger.warning("Active tasks unavailable. Following the database compaction only (compact_running).")
+
+            compactions = [task for task in tasks or [] if self._is_compaction_task(task)]
+
+            with self._lock:
+                self._total_polls += 1
+                self._running_tasks = len(compactions)
+
+                if compactions:
+                    self._progress = int(sum(task.get("progress", 0) for task in compactions) / len(compactions))
+
+            # Without active tasks (e.g. not permitted), only the database compaction can be followed
+
+            if not compactions and not info.get("compact_running"):
+                self._progress = 100
+                return
+
+            if time.monotonic() - start_time >= self._timeout:
+                logger.warning("Timed out waiting for the compactions to finish: %s (running tasks: %d). They keep "
+                    "running on the server.", self._database.get_database_name(), len(compactions))
+                self._timed_out = True
+                return
+
+
+    def _is_compaction_task(self, task):
+        """
+        Check whether the active task compacts the database (or one of its shards, e.g. shards/00000000-1fffffff/
+        name.1616959411) or its views
+        """
+
+        if task.get("type") not in COMPACTION_TASK_TYPES:
+            return False
+
+        name = task.get("database", "")
+
+        if name.startswith(SHARD_PREFIX):
+            name = name.split("/", 2)[-1].rpartition(".")[0]
+
+        return name == self._database.get_database_name()
+
+
+    def _get_sizes(self):
+        """
+        Retrieve the database sizes (file, active and external; in bytes); None on error
+        """
+
+        info = self._database.get_database_info()
+
+        if info is None or not isinstance(info.get("sizes"), dict):
+            return None
+
+        return {name: info["sizes"].get(name) for name in SIZE_PROPERTIES}
+
+
+    def _get_reclaimed_bytes(self):
+        """
+        File size reduction (bytes); None if unknown
+        """
+
+        if not self._sizes_before or not self._sizes_after:
+            return None
+
+        if self._sizes_before["file"] is None or self._sizes_after["file"] is None:
+            return None
+
+        return self._sizes_before["file"] - self._sizes_after["file"]
+
+
+    def _get_sizes_content(self, name):
+        """
+        Size before / after the compaction
+        """
+
+        before = self._sizes_before.get(name) if self._sizes_before else None
+        after = self._sizes_after.get(name) if self._sizes_after else None
+
+        return "{0} / {1} bytes".format(
+            before if before is not None else "n/a",
+            after if after is not None else "n/a")
+
+
+    def _get_reclaimed_content(self):
+        """
+        File size reduction (bytes and percent of the original size)
+        """
+
+        reclaimed = self._get_reclaimed_bytes()
+
+        if reclaimed is None:
+            return "n/a"
+
+        before = self._sizes_before["file"]
+
+        return "{0} bytes ({1:.1f}%)".format(reclaimed, 100 * reclaimed / before if before else 0)
+
+
+    @staticmethod
+    def _get_outcome(accepted):
+        """
+        Outcome of a maintenance request (True: started, False: not permitted, None: failed)
+        """
+
+        if accepted:
+            return OUTCOME_STARTED
+
+        return OUTCOME_NOT_PERMITTED if accepted is False else OUTCOME_FAILED
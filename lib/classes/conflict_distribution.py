@@ -0,0 +1,122 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import math
+
+# Globals
+
+KIND_FIXED = "fixed"
+KIND_UNIFORM = "uniform"
+KIND_PARETO = "pareto"
+
+# Named distributions
+PRESETS = { # pylint: disable=unused-variable
+    # Most conflicted documents carry 1 - 5 conflicts (~90%) with a long tail up to tens of thousands
+    "production": "pareto:1.5:50000",
+    "small": "uniform:1-5",
+    "single": "fixed:1"
+}
+
+# Command-line help text
+SPECIFICATION_HELP = "fixed:N | uniform:MIN-MAX | pareto:ALPHA:MAX | {0}".format( # pylint: disable=unused-variable
+    " | ".join(sorted(PRESETS)))
+
+# Classes --------------------------------------------------------------------->
+
+class ConflictDistribution: # pylint: disable=unused-variable
+    """
+    Distribution of the number of conflicts per conflicted document
+    """
+
+    def __init__(self, specification):
+        """
+        Constructor (raises ValueError for an invalid specification)
+
+        Specifications:
+        - fixed:N : Exactly N conflicts.
+        - uniform:MIN-MAX : Uniformly distributed between MIN and MAX conflicts.
+        - pareto:ALPHA:MAX : Bounded Pareto (power law) between 1 and MAX conflicts with shape ALPHA.
+        - production, small, single : Named presets (see PRESETS).
+        """
+
+        self._name = specification
+        specification = PRESETS.get(specification, specification)
+
+        kind, _, parameters = specification.partition(":")
+
+        if kind == KIND_FIXED:
+            self._minimum = self._maximum = int(parameters)
+            self._alpha = None
+        elif kind == KIND_UNIFORM:
+            minimum, _, maximum = parameters.partition("-")
+            self._minimum = int(minimum)
+            self._maximum = int(maximum)
+            self._alpha = None
+        elif kind == KIND_PARETO:
+            alpha, _, maximum = parameters.partition(":")
+            self._minimum = 1
+            self._maximum = int(maximum)
+            self._alpha = float(alpha)
+            if self._alpha <= 0:
+                raise ValueError("Invalid Pareto shape: {0}.".format(alpha))
+        else:
+            raise ValueError("Invalid conflict distribution: {0}.".format(specification))
+
+        if not 1 <= self._minimum <= self._maximum:
+            raise ValueError("Invalid conflict distribution bounds: {0}.".format(specification))
+
+        self._kind = kind
+
+
+    def __str__(self):
+        """
+        Distribution specification (as specified)
+        """
+
+        return self._name
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def sample(self, generator):
+        """
+        Draw a number of conflicts using the specified random.Random instance
+        """
+
+        if self._kind == KIND_FIXED:
+            return self._minimum
+
+        if self._kind == KIND_UNIFORM:
+            return generator.randint(self._minimum, self._maximum)
+
+        # Bounded Pareto (inverse transform sampling)
+
+        ratio = (self._minimum / self._maximum) ** self._alpha
+        value = self._minimum * (1 - generator.random() * (1 - ratio)) ** (-1.0 / self._alpha)
+
+        return min(int(math.floor(value)), self._maximum)
+
+
+    def get_maximum(self):
+        """
+        Retrieve the maximum number of conflicts
+        """
+
+        return self._maximum
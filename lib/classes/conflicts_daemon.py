@@ -0,0 +1,629 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import os
+import csv
+import json
+import time
+import logging
+import datetime
+import threading
+import collections
+
+from lib.constants import constants
+from lib.classes.task_interface import TaskInterface
+from lib.classes import progress_reporter
+from lib.classes import cloudant_database
+from lib.utils import error_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("conflicts_daemon")
+
+DEFAULT_HEARTBEAT = 5 # seconds between heartbeats of the changes feed
+DEFAULT_BATCH_SIZE = 20 # conflicted documents per micro-batch
+DEFAULT_BATCH_DELAY = 1.0 # seconds a detected document waits for its micro-batch to fill
+
+RECONNECT_DELAY = 5 # seconds before following the changes feed again after an error
+STATE_SAVE_INTERVAL = 10 # seconds between saves of the resume sequence
+
+STATE_VERSION = 1
+
+# Micro-batches a document takes part in before its failed deletions are given up (see: _resolve_batch)
+MAX_DOCUMENT_ATTEMPTS = 3
+
+# Documents recently resolved by the daemon (see: _is_own_change)
+MAX_RESOLVED_DOCUMENTS = 10000
+
+DESIGN_DOCUMENT_PREFIX = "_design/"
+
+# Classes --------------------------------------------------------------------->
+
+class ConflictsDaemon(TaskInterface): # pylint: disable=unused-variable
+    """
+    Keeps the conflicts of a database near zero: follows the continuous changes feed (style=all_docs), detects the
+    documents changed with several leaf revisions and deletes their losing revisions in micro-batches (one
+    _all_docs and one _bulk_docs request per batch); the sequence of the last change handled is saved to disk so
+    that a restarted daemon resumes where it stopped
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, database, state_file, csv_file, threshold, heartbeat=DEFAULT_HEARTBEAT,
+            batch_size=DEFAULT_BATCH_SIZE, batch_delay=DEFAULT_BATCH_DELAY):
+        """
+        Constructor
+
+        - database: CloudantDatabase (opened).
+        - state_file: JSON file of the resume sequence (loaded at start-up if it exists; replaced atomically).
+        - csv_file: CSV file of the resolved documents (same fields as the deletion details).
+        - threshold: Documents with more conflicted revisions are skipped (see: scan phase).
+        - heartbeat: Time (seconds) between heartbeats of the changes feed; missed heartbeats end the connection.
+        - batch_size: Maximum number of conflicted documents per micro-batch.
+        - batch_delay: Maximum time (seconds) a detected document waits for its micro-batch to fill.
+        """
+
+        # pylint: disable=too-many-arguments
+
+        self._database = database
+        self._state_file = state_file
+        self._csv_file = csv_file
+        self._threshold = threshold
+        self._heartbeat = heartbeat
+        self._batch_size = batch_size
+        self._batch_delay = batch_delay
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._since = "now"
+        self._resumed = False # state loaded (see: _load_state)
+        self._last_seq = None # sequence of the last change read
+        self._saved_seq = None
+        self._last_save_time = 0
+        # document ID -> (leaf revisions, detection time, attempts, deleted revisions, sequence before the change),
+        # in order of the changes
+        self._pending = collections.OrderedDict()
+        self._resolved = collections.OrderedDict() # document ID -> (winning revision, leaf count)
+        self._connected = False
+        self._last_activity_time = None
+        self._csv_file_handle = None
+        self._csv_file_writer = None
+
+        self._total_changes = 0
+        self._total_candidates = 0
+        self._total_batches = 0
+        self._total_conflicted_documents = 0
+        self._total_resolved_documents = 0
+        self._total_skipped_documents = 0
+        self._total_conflicted_revisions = 0
+        self._total_deleted_revisions = 0
+        self._total_failed_revisions = 0
+        self._total_reconnects = 0
+        self._total_lag = 0 # seconds between detection and deletion (all documents)
+        self._max_lag = 0 # seconds
+        self._elapsed_time = 0 # seconds
+
+
+    def __del__(self):
+        """
+        Destructor
+        """
+
+        self._shutdown_csv_file()
+
+
+    def __str__(self):
+        """
+        Daemon details (summary content)
+        """
+
+        line = '=' * 80
+        result = [
+            "",
+            line,
+            "Daemon Details",
+            line,
+            "",
+            "- {0} From Sequence:              {1}".format("Resumed" if self._resumed else "Started", self._since),
+            "- Last Sequence:                      {0}".format(self._saved_seq),
+            "- Total Changes:                      {0}".format(self._total_changes),
+            "- Total Micro-batches:                {0}".format(self._total_batches),
+            "- Total Conflicted Documents:         {0}".format(self._total_conflicted_documents),
+            "- Total Resolved Documents:           {0}".format(self._total_resolved_documents),
+            "- Total Skipped Documents:            {0}".format(self._total_skipped_documents),
+            "- Total Deleted Revisions:            {0}".format(self._total_deleted_revisions),
+            "- Total Failed Revisions:             {0}".format(self._total_failed_revisions),
+            "- Resolution Lag (mean / max):        {0:.3f} s / {1:.3f} s".format(
+                self._get_mean_lag(), self._max_lag),
+            "- Feed Reconnects:                    {0}".format(self._total_reconnects),
+            "- Elapsed Time:                       {0:.3f} s".format(self._elapsed_time),
+            ""
+        ]
+
+        return "\n".join(result)
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def run(self, logger=DEFAULT_LOGGER):
+        """
+        Follow the changes feed until stopped (stop() or KeyboardInterrupt, e.g. SIGINT / SIGTERM)
+        """
+
+        start_time = time.monotonic()
+
+        self._load_state()
+        self._init_csv_file()
+
+        logger.info("Following changes feed: %s (since: %s; heartbeat: %s s; micro-batches: %d documents / %s s)...",
+            self._database.get_location(), self._since, self._heartbeat, self._batch_size, self._batch_delay)
+
+        try:
+            while not self._stop_event.is_set():
+                self._follow()
+
+                if self._stop_event.is_set():
+                    break
+
+                self._total_reconnects += 1
+                logger.warning("Changes feed disconnected. Reconnecting in %d s...", RECONNECT_DELAY)
+                self._stop_event.wait(RECONNECT_DELAY)
+        except KeyboardInterrupt:
+            logger.info("Stopping conflicts daemon...")
+
+        self._connected = False
+
+        # Resolve the documents still pending, then save the final resume sequence
+
+        self._flush()
+        self._save_state(force=True)
+        self._shutdown_csv_file()
+
+        self._elapsed_time = time.monotonic() - start_time
+
+        logger.info("Stopped conflicts daemon (resolved documents: %d; last sequence: %s).",
+            self._total_resolved_documents, self._saved_seq)
+
+        return True
+
+
+    def stop(self):
+        """
+        Stop following the changes feed (after the next change or heartbeat)
+        """
+
+        self._stop_event.set()
+
+
+    def get_health(self):
+        """
+        Health of the daemon (see: MetricsServer); returns (healthy, details)
+        """
+
+        now = time.monotonic()
+        silence = now - self._last_activity_time if self._last_activity_time is not None else None
+        healthy = self._connected and silence is not None and \
+            silence <= self._heartbeat * cloudant_database.CHANGES_MISSED_HEARTBEATS
+
+        with self._lock:
+            details = {
+                "status": "ok" if healthy else "unhealthy",
+                "connected": self._connected,
+                "seconds_since_activity": round(silence, 3) if silence is not None else None,
+                "last_seq": self._last_seq,
+                "saved_seq": self._saved_seq,
+                "pending_documents": len(self._pending),
+                "resolved_documents": self._total_resolved_documents,
+                "deleted_revisions": self._total_deleted_revisions,
+                "failed_revisions": self._total_failed_revisions,
+                "reconnects": self._total_reconnects
+            }
+
+        return healthy, details
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the daemon results
+        """
+
+        with self._lock:
+            return {
+                "since": self._since,
+                "resumed": self._resumed,
+                "last_seq": self._saved_seq,
+                "changes": self._total_changes,
+                "candidates": self._total_candidates,
+                "batches": self._total_batches,
+                "conflicted_documents": self._total_conflicted_documents,
+                "resolved_documents": self._total_resolved_documents,
+                "skipped_documents": self._total_skipped_documents,
+                "conflicted_revisions": self._total_conflicted_revisions,
+                "deleted_revisions": self._total_deleted_revisions,
+                "failed_revisions": self._total_failed_revisions,
+                "mean_lag_s": round(self._get_mean_lag(), 3),
+                "max_lag_s": round(self._max_lag, 3),
+                "reconnects": self._total_reconnects,
+                "elapsed_s": self._elapsed_time
+            }
+
+
+    def get_progress(self):
+        """
+        Snapshot of the daemon progress counters (see: ProgressReporter)
+        """
+
+        return {
+            progress_reporter.PROGRESS_PROCESSED: self._total_conflicted_documents,
+            progress_reporter.PROGRESS_CONFLICTS: self._total_conflicted_revisions,
+            progress_reporter.PROGRESS_DELETED_REVISIONS: self._total_deleted_revisions,
+            progress_reporter.PROGRESS_ERRORS: self._total_failed_revisions,
+            progress_reporter.PROGRESS_ATTEMPTS: self._total_conflicted_revisions,
+            progress_reporter.PROGRESS_QUEUE_DEPTH: len(self._pending)
+        }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _follow(self):
+        """
+        Handle the changes of a single connection to the feed (until it ends or the daemon is stopped)
+        """
+
+        for change in self._database.follow_changes(self._last_seq, self._heartbeat):
+            self._connected = True
+            self._last_activity_time = time.monotonic()
+
+            if "last_seq" in change:
+                self._last_seq = change["last_seq"]
+                break
+
+            if change:
+                self._handle_change(change)
+
+            self._flush(due_only=True)
+            self._save_state()
+
+            if self._stop_event.is_set():
+                break
+
+        self._connected = False
+
+
+    def _handle_change(self, change):
+        """
+        Queue the changed document if it has several leaf revisions (conflicts or deleted conflicts)
+        """
+
+        previous_seq = self._last_seq
+        self._last_seq = change["seq"]
+        self._total_changes += 1
+
+        document_id = change["id"]
+        revisions = [item["rev"] for item in change.get("changes", [])]
+
+        if document_id.startswith(DESIGN_DOCUMENT_PREFIX) or change.get("deleted") or len(revisions) < 2:
+            return
+
+        if self._is_own_change(document_id, revisions):
+            return
+
+        with self._lock:
+            if document_id not in self._pending:
+                self._total_candidates += 1
+                self._pending[document_id] = (revisions, time.monotonic(), 0, [], previous_seq)
+
+
+    def _is_own_change(self, document_id, revisions):
+        """
+        Determine whether a change results from the deletions of the daemon itself (same winner and leaf count as
+        when resolved: the deleted conflicts remain leaves, as tombstones); a new conflict adds a leaf
+        """
+
+        resolved = self._resolved.get(document_id)
+
+        return resolved is not None and resolved == (revisions[0], len(revisions))
+
+
+    def _flush(self, due_only=False, logger=DEFAULT_LOGGER):
+        """
+        Resolve the pending documents in micro-batches (only once the oldest waited for the batch delay, or a batch
+        is full, if due only); documents of a failed batch stay pending, and documents requeued by a micro-batch
+        (failed deletions) are retried by the next flush
+        """
+
+        attempted = set()
+
+        while self._pending:
+            _, detection_time, _, _, _ = next(iter(self._pending.values()))
+
+            if due_only and len(self._pending) < self._batch_size and \
+                    time.monotonic() - detection_time < self._batch_delay:
+                return
+
+            document_ids = [document_id for document_id in self._pending if document_id not in attempted]
+            document_ids = document_ids[:self._batch_size]
+
+            if not document_ids:
+                return
+
+            attempted.update(document_ids)
+
+            if not self._resolve_batch(document_ids):
+                logger.warning("Micro-batch failed (%d documents). Retrying later.", len(document_ids))
+                return
+
+
+    def _resolve_batch(self, document_ids, logger=DEFAULT_LOGGER):
+        """
+        Delete the conflicted revisions of a micro-batch of documents; a document with failed deletions stays pending
+        in place (at most MAX_DOCUMENT_ATTEMPTS micro-batches)
+        """
+
+        # pylint: disable=too-many-locals,too-many-branches,too-many-statements
+
+        documents = self._database.get_documents(document_ids, conflicts=True)
+
+        if documents is None:
+            return False
+
+        conflicted = collections.OrderedDict() # document ID -> (name, conflicted revisions)
+        revisions = []
+
+        for document_id in document_ids:
+            document = documents.get(document_id) or {}
+            conflicts = document.get("_conflicts", [])
+
+            if not conflicts:
+                # e.g. deleted conflicts only, or resolved concurrently
+                continue
+
+            if len(conflicts) > self._threshold:
+                logger.warning("Skipping conflicted document: %s. Conflicted revisions: %d (threshold: %d).",
+                    document_id, len(conflicts), self._threshold)
+                with self._lock:
+                    self._total_skipped_documents += 1
+                continue
+
+            entity = document.get("entity")
+            name = entity.get("name") if isinstance(entity, dict) else None
+            conflicted[document_id] = (name, conflicts)
+            revisions.extend((document_id, revision) for revision in conflicts)
+
+        results = self._database.delete_revisions(revisions) if revisions else []
+
+        if results is None:
+            return False
+
+        deleted = {}
+
+        for (document_id, revision), result in zip(revisions, results):
+            if result.get("ok"):
+                deleted.setdefault(document_id, []).append(revision)
+            else:
+                logger.warning("Failed to delete conflicted revision: %s. Revision: %s (%s: %s).",
+                    document_id, revision, result.get("error"), result.get("reason"))
+
+        now = time.monotonic()
+        requeued = 0
+
+        with self._lock:
+            for document_id in document_ids:
+                leaf_revisions, detection_time, attempts, previously_deleted, since = self._pending[document_id]
+                name, conflicts = conflicted.get(document_id, (None, []))
+                deleted_revisions = deleted.get(document_id, [])
+                self._total_deleted_revisions += len(deleted_revisions)
+
+                if len(deleted_revisions) < len(conflicts) and attempts + 1 < MAX_DOCUMENT_ATTEMPTS:
+                    self._pending[document_id] = (leaf_revisions, detection_time, attempts + 1,
+                        previously_deleted + deleted_revisions, since)
+                    requeued += 1
+                    continue
+
+                del self._pending[document_id]
+
+                if not conflicts and not previously_deleted:
+                    continue
+
+                # Totals and details of the document over all its micro-batches
+
+                conflicts = previously_deleted + conflicts
+                deleted_revisions = previously_deleted + deleted_revisions
+                lag = now - detection_time
+
+                self._total_conflicted_documents += 1
+                self._total_conflicted_revisions += len(conflicts)
+                self._total_failed_revisions += len(conflicts) - len(deleted_revisions)
+                self._total_lag += lag
+                self._max_lag = max(self._max_lag, lag)
+
+                if len(deleted_revisions) == len(conflicts):
+                    self._total_resolved_documents += 1
+                    self._remember_resolved(document_id, leaf_revisions)
+
+                self._serialize_csv_fields(document_id, name, conflicts, deleted_revisions)
+
+            self._total_batches += 1
+
+        if conflicted:
+            logger.info("Resolved conflicted documents: %d (deleted revisions: %d).",
+                len(conflicted) - requeued, sum(len(items) for items in deleted.values()))
+
+        if requeued:
+            logger.warning("Requeued conflicted documents with failed deletions: %d.", requeued)
+
+        return True
+
+
+    def _remember_resolved(self, document_id, leaf_revisions):
+        """
+        Remember the winner and leaf count of a resolved document (see: _is_own_change); bounded
+        """
+
+        self._resolved[document_id] = (leaf_revisions[0], len(leaf_revisions))
+        self._resolved.move_to_end(document_id)
+
+        if len(self._resolved) > MAX_RESOLVED_DOCUMENTS:
+            self._resolved.popitem(last=False)
+
+
+    def _get_mean_lag(self):
+        """
+        Mean time (seconds) between the detection and the deletion of the conflicts of a document
+        """
+
+        if not self._total_conflicted_documents:
+            return 0.0
+
+        return self._total_lag / self._total_conflicted_documents
+
+
+    def _load_state(self, logger=DEFAULT_LOGGER):
+        """
+        Load the resume sequence (if saved by a previous run); a new daemon starts from the current update
+        sequence of the database (the existing conflicts are left to a regular run)
+        """
+
+        state = None
+
+        os.makedirs(os.path.dirname(self._state_file) or ".", exist_ok=True)
+
+        if os.path.exists(self._state_file):
+            try:
+                with open(self._state_file, "r", encoding="utf-8") as file_handle:
+                    state = json.load(file_handle)
+            except (OSError, ValueError) as err:
+                logger.error("Failed to load daemon state file: %s.", self._state_file)
+                error_util.log_exception(logger, err)
+
+        if state and (state.get("version") != STATE_VERSION or \
+                state.get("database") != self._database.get_database_name()):
+            logger.warning("Daemon state file belongs to another database: %s.", self._state_file)
+            state = None
+
+        if state:
+            self._since = state["last_seq"]
+            self._saved_seq = self._since
+            self._resumed = True
+            logger.info("Loaded daemon state file: %s (resuming from sequence: %s).", self._state_file, self._since)
+        else:
+            info = self._database.get_database_info()
+            self._since = info["update_seq"] if info else "now"
+            logger.info("No daemon state. Following the changes from now (sequence: %s).", self._since)
+
+        self._last_seq = self._since
+
+
+    def _save_state(self, force=False, logger=DEFAULT_LOGGER):
+        """
+        Save the resume sequence (periodically, or if forced): the sequence of the last change read, or the one
+        before the oldest pending change so that a restarted daemon never skips an unresolved document
+        """
+
+        with self._lock:
+            last_seq = next(iter(self._pending.values()))[4] if self._pending else self._last_seq
+
+        if last_seq is None or last_seq == self._saved_seq:
+            return
+
+        if not force and time.monotonic() - self._last_save_time < STATE_SAVE_INTERVAL:
+            return
+
+        state = {
+            "version": STATE_VERSION,
+            "database": self._database.get_database_name(),
+            "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+            "last_seq": last_seq
+        }
+
+        temporary_file = "{0}.tmp".format(self._state_file)
+
+        try:
+            with open(temporary_file, "w", encoding="utf-8") as file_handle:
+                json.dump(state, file_handle)
+            os.replace(temporary_file, self._state_file)
+        except (OSError, TypeError, ValueError) as err:
+            logger.error("Failed to save daemon state file: %s.", self._state_file)
+            error_util.log_exception(logger, err)
+            return
+
+        self._saved_seq = last_seq
+        self._last_save_time = time.monotonic()
+
+
+    def _init_csv_file(self, logger=DEFAULT_LOGGER):
+        """
+        Open CSV file
+        """
+
+        logger.info("Opening CSV file: %s...", self._csv_file)
+
+        self._csv_file_handle = open(self._csv_file, "w", newline="", encoding="utf-8")
+
+        fieldnames = [
+            constants.CSV_FIELD_ID,
+            constants.CSV_FIELD_NAME,
+            constants.CSV_FIELD_CONFLICTS,
+            constants.CSV_FIELD_DELETED,
+            constants.CSV_FIELD_REVISIONS
+        ]
+
+        self._csv_file_writer = csv.DictWriter(
+            f=self._csv_file_handle,
+            fieldnames=fieldnames,
+            dialect="excel")
+
+        self._csv_file_writer.writeheader()
+
+        logger.info("Successfully Opened CSV file: %s.", self._csv_file)
+
+
+    def _shutdown_csv_file(self, logger=DEFAULT_LOGGER):
+        """
+        Close CSV file
+        """
+
+        if self._csv_file_handle:
+            logger.info("Closing CSV file: %s...", self._csv_file)
+            self._csv_file_handle.close()
+            logger.info("Successfully closed CSV file: %s.", self._csv_file)
+            self._csv_file_handle = None
+
+
+    def _serialize_csv_fields(self, document_id, name, conflicts, deleted_revisions, logger=DEFAULT_LOGGER):
+        """
+        Serialize a resolved document to CSV file record (and flush: the daemon runs indefinitely)
+        """
+
+        # pylint: disable=too-many-arguments
+
+        try:
+            self._csv_file_writer.writerow({
+                constants.CSV_FIELD_ID: document_id,
+                constants.CSV_FIELD_NAME: name,
+                constants.CSV_FIELD_CONFLICTS: len(conflicts),
+                constants.CSV_FIELD_DELETED: len(deleted_revisions),
+                constants.CSV_FIELD_REVISIONS: "; ".join(deleted_revisions)
+            })
+            self._csv_file_handle.flush()
+        except ValueError as err:
+            message = "Failed to write CSV row to file: %s. Document ID: %s."
+            logger.error(message, self._csv_file, document_id)
+            error_util.log_exception(logger, err)
@@ -0,0 +1,208 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import logging
+import random
+
+from lib.classes.task_interface import TaskInterface
+from lib.classes import progress_reporter
+from lib.utils import timing_util
+from lib.utils import statistics_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("conflicts_generator")
+
+DEFAULT_CONFLICTED_RATIO = 0.1
+DEFAULT_SEED = 0
+DEFAULT_BATCH_SIZE = 1000 # revisions per _bulk_docs request
+DEFAULT_BODY_BYTES = 0
+
+DOCUMENT_ID_FORMAT = "doc-{0:09d}"
+ENTITY_NAME_FORMAT = "entity-{0:09d}"
+
+# Classes --------------------------------------------------------------------->
+
+class ConflictsGenerator(TaskInterface): # pylint: disable=unused-variable
+    """
+    Generates synthetic conflicted documents (deterministic per seed) and writes them as independent
+    revision branches (_bulk_docs with new_edits=false)
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, write_revisions, document_count, distribution, **kwargs):
+        """
+        Constructor
+
+        - write_revisions: Callable writing a batch of revisions (new_edits=false); returns True on success.
+        - distribution: ConflictDistribution of the number of conflicts per conflicted document.
+
+        Keyword arguments:
+        - conflicted_ratio: Fraction (0 - 1) of documents that carry conflicts.
+        - seed: Random seed. Each document is derived from (seed, index) only.
+        - batch_size: Maximum number of revisions per batch.
+        - body_bytes: Size of the padding property added to each revision.
+        """
+
+        self._write_revisions = write_revisions
+        self._document_count = document_count
+        self._distribution = distribution
+        self._conflicted_ratio = kwargs.get("conflicted_ratio", DEFAULT_CONFLICTED_RATIO)
+        self._seed = kwargs.get("seed", DEFAULT_SEED)
+        self._batch_size = kwargs.get("batch_size", DEFAULT_BATCH_SIZE)
+        self._padding = "x" * kwargs.get("body_bytes", DEFAULT_BODY_BYTES)
+
+        self._total_documents = 0
+        self._total_conflicted_documents = 0
+        self._total_conflicts = 0
+        self._total_revisions = 0
+        self._total_failed_revisions = 0
+        self._total_batches = 0
+        self._elapsed_time = 0 # seconds
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def run(self, logger=DEFAULT_LOGGER):
+        """
+        Generate and write all documents
+        """
+
+        logger.info("Generating %d documents (conflicts distribution: %s, conflicted ratio: %s, seed: %s)...",
+            self._document_count, self._distribution, self._conflicted_ratio, self._seed)
+
+        start_time = timing_util.start_timer()
+        batch = []
+
+        for index in range(self._document_count):
+            revisions = self.get_document_revisions(index)
+
+            self._total_documents += 1
+
+            if len(revisions) > 1:
+                self._total_conflicted_documents += 1
+                self._total_conflicts += len(revisions) - 1
+
+            # Very large documents are split across batches (each revision is an independent branch)
+
+            for revision in revisions:
+                batch.append(revision)
+
+                if len(batch) >= self._batch_size:
+                    self._write_batch(batch)
+                    batch = []
+
+        if batch:
+            self._write_batch(batch)
+
+        self._elapsed_time = timing_util.get_elapsed_seconds(start_time)
+
+        logger.info("Generated %d documents (%d conflicted, %d revisions) in %.3f s. Failed revisions: %d.",
+            self._total_documents,
+            self._total_conflicted_documents,
+            self._total_revisions,
+            self._elapsed_time,
+            self._total_failed_revisions)
+
+        return self._total_failed_revisions == 0
+
+
+    def get_document_revisions(self, index):
+        """
+        Generate the leaf revisions of the document at the specified index
+        """
+
+        generator = random.Random("{0}:{1}".format(self._seed, index))
+        conflicts = 0
+
+        if generator.random() < self._conflicted_ratio:
+            conflicts = self._distribution.sample(generator)
+
+        doc_id = DOCUMENT_ID_FORMAT.format(index)
+        name = ENTITY_NAME_FORMAT.format(index)
+        revisions = []
+
+        for leaf in range(conflicts + 1):
+            revision = {
+                "_id": doc_id,
+                "_rev": "1-{0:032x}".format(generator.getrandbits(128)),
+                "type": "synthetic",
+                "entity": {"name": name},
+                "leaf": leaf
+            }
+
+            if self._padding:
+                revision["padding"] = self._padding
+
+            revisions.append(revision)
+
+        return revisions
+
+
+    def get_progress(self):
+        """
+        Retrieve a snapshot of the generation progress
+        """
+
+        return {
+            progress_reporter.PROGRESS_PROCESSED: self._total_documents,
+            progress_reporter.PROGRESS_CONFLICTS: self._total_conflicts,
+            progress_reporter.PROGRESS_ERRORS: self._total_failed_revisions,
+            progress_reporter.PROGRESS_ATTEMPTS: self._total_revisions + self._total_failed_revisions
+        }
+
+
+    def get_summary(self):
+        """
+        Retrieve the generation results
+        """
+
+        return {
+            "documents": self._total_documents,
+            "conflicted_documents": self._total_conflicted_documents,
+            "conflicts": self._total_conflicts,
+            "revisions": self._total_revisions,
+            "failed_revisions": self._total_failed_revisions,
+            "batches": self._total_batches,
+            "distribution": str(self._distribution),
+            "conflicted_ratio": self._conflicted_ratio,
+            "seed": self._seed,
+            "elapsed_s": round(self._elapsed_time, 3),
+            "revisions_per_s": round(statistics_util.get_rate(self._total_revisions, self._elapsed_time), 1)
+        }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _write_batch(self, batch, logger=DEFAULT_LOGGER):
+        """
+        Write a batch of revisions
+        """
+
+        self._total_batches += 1
+
+        if self._write_revisions(batch):
+            self._total_revisions += len(batch)
+            logger.debug("Batch [%d]: Wrote %d revisions.", self._total_batches, len(batch))
+            return
+
+        self._total_failed_revisions += len(batch)
+        logger.error("Batch [%d]: Failed to write %d revisions.", self._total_batches, len(batch))
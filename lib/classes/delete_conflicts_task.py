@@ -18,19 +18,45 @@
 
 # Modules
 
+import time
 import logging
 import datetime
+import threading
+import concurrent.futures
 import csv
 
 from lib.constants import constants
 from lib.classes.task_interface import TaskInterface
+from lib.classes import progress_reporter
+from lib.classes import trace_recorder
 from lib.utils import logger_util
 from lib.utils import error_util
+from lib.utils import statistics_util
 
 # Globals
 
 DEFAULT_LOGGER = logging.getLogger("delete_conflicts_task")
 
+DEFAULT_LOG_EVERY = 0 # revisions (disabled)
+
+DEFAULT_CONCURRENCY = 1 # documents processed in parallel
+
+# Documents queued per worker (bounds memory while keeping workers busy)
+QUEUED_DOCUMENTS_PER_WORKER = 2
+
+# Maximum time (seconds) between schedule checks while paused
+PAUSE_POLL_INTERVAL = 60
+
+DEFAULT_CHUNK_SIZE = 500 # revisions per _bulk_docs request (documents exceeding the threshold)
+
+# Chunked deletion passes over the conflicted revisions of a document (fetched once; the later passes retry the
+# revisions whose deletion failed)
+MAX_CHUNK_PASSES = 3
+
+# Minimum time (seconds) between the checkpoints saved while deleting in chunks (each save writes all the remaining
+# documents)
+CHUNK_CHECKPOINT_INTERVAL = 30
+
 # Classes --------------------------------------------------------------------->
 
 class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
@@ -38,19 +64,56 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
     TODO
     """
 
-    def __init__(self, database, conflicts, csv_file):
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, database, conflicts, csv_file, log_every=DEFAULT_LOG_EVERY, tracer=None,
+            concurrency=DEFAULT_CONCURRENCY, schedule=None, checkpoint=None, coordinator=None,
+            chunk_size=DEFAULT_CHUNK_SIZE):
         """
         Constructor
+
+        - schedule: MaintenanceSchedule followed dynamically: throughput reduced (duty cycle of every worker) or
+          paused outside of the maintenance windows.
+        - checkpoint: DeletionCheckpoint saved at every window boundary and once done.
+        - coordinator: LeaseCoordinator sharing the deletion with other instances: only the documents of the
+          keyspace ranges leased by this instance are processed.
+        - chunk_size: Number of revisions deleted per request for the documents exceeding the threshold (rows with a
+          conflicts count instead of revisions, see: ScanConflictsTask); a checkpoint is saved between chunks
+          (at most every CHUNK_CHECKPOINT_INTERVAL seconds).
         """
 
+        # pylint: disable=too-many-arguments
+
         self._database = database
         self._conflicts = conflicts or []
         self._csv_file = csv_file
-
+        self._log_every = log_every
+        self._tracer = tracer
+        self._concurrency = concurrency
+        self._schedule = schedule
+        self._checkpoint = checkpoint
+        self._coordinator = coordinator
+        self._chunk_size = chunk_size
+
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock() # serializes the checkpoint saves (see: _save_checkpoint)
+        self._last_checkpoint_time = time.monotonic()
         self._total_conflicted_documents = 0
         self._total_resolved_documents = 0
         self._total_conflicted_revisions = 0
         self._total_deleted_revisions = 0
+        self._total_processed_revisions = 0
+        self._elapsed_time = 0 # seconds
+        self._scale = 1.0 # fraction of full speed (see: schedule)
+        self._paused_time = 0 # seconds
+        self._rows = self._conflicts # documents being processed (all, or those of the leased range)
+        self._total_queued_documents = len(self._conflicts)
+        self._next_index = 0 # lowest index of the documents not processed yet
+        self._processed_indexes = set() # documents processed out of order (above the next index)
+        self._touched_rows = [] # documents processed by this run (see: VerifyConflictsTask)
+        self._chunk_progress = {} # index -> revisions deleted so far (documents deleted in chunks, see: checkpoint)
+        self._total_chunked_documents = 0
+        self._total_chunks = 0
         self._csv_file_handle = None
         self._csv_file_writer = None
 
@@ -79,9 +142,23 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
             "- Total Resolved Documents:           {0}".format(self._total_resolved_documents),
             "- Total Conflicted Revisions:         {0}".format(self._total_conflicted_revisions),
             "- Total Deleted Revisions:            {0}".format(self._total_deleted_revisions),
-            ""
+            "- Total Failed Revisions:             {0}".format(
+                self._total_processed_revisions - self._total_deleted_revisions),
+            "- Elapsed Time:                       {0:.3f} s".format(self._elapsed_time),
+            "- Throughput:                         {0:.1f} docs/s, {1:.1f} revs/s".format(
+                statistics_util.get_rate(self._total_conflicted_documents, self._elapsed_time),
+                statistics_util.get_rate(self._total_deleted_revisions, self._elapsed_time))
         ]
 
+        if self._total_chunked_documents:
+            result.append("- Total Chunked Documents:            {0} ({1} chunks)".format(
+                self._total_chunked_documents, self._total_chunks))
+
+        if self._schedule:
+            result.append("- Paused Time (schedule):             {0:.3f} s".format(self._paused_time))
+
+        result.append("")
+
         return "\n".join(result)
 
 
@@ -104,11 +181,15 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
 
         # Iterate over conflicted documents
 
-        index = 0
+        if self._coordinator:
+            self._process_leased_ranges()
+        else:
+            self._process_rows()
 
-        for row in self._conflicts:
-            self._process_row(index, row)
-            index += 1
+        # Save final checkpoint (nothing remaining)
+
+        if self._checkpoint:
+            self._checkpoint.save([], self.get_summary())
 
         # Close CSV file
 
@@ -117,7 +198,8 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
         # Stop timer
 
         end_time = datetime.datetime.now()
-        elapsed_time = (end_time - start_time).total_seconds() * 1000  # ms
+        self._elapsed_time = (end_time - start_time).total_seconds()
+        elapsed_time = self._elapsed_time * 1000  # ms
 
         # Print status message
 
@@ -126,6 +208,51 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
         return True
 
 
+    def get_summary(self):
+        """
+        Serializable summary of the deletion results
+        """
+
+        return {
+            "conflicted_documents": self._total_conflicted_documents,
+            "resolved_documents": self._total_resolved_documents,
+            "conflicted_revisions": self._total_conflicted_revisions,
+            "deleted_revisions": self._total_deleted_revisions,
+            "failed_revisions": self._total_processed_revisions - self._total_deleted_revisions,
+            "elapsed_s": self._elapsed_time,
+            "documents_per_s": statistics_util.get_rate(self._total_conflicted_documents, self._elapsed_time),
+            "revisions_per_s": statistics_util.get_rate(self._total_deleted_revisions, self._elapsed_time),
+            "paused_s": round(self._paused_time, 3),
+            "chunked_documents": self._total_chunked_documents,
+            "chunks": self._total_chunks
+        }
+
+
+    def get_touched_documents(self):
+        """
+        Retrieve the conflicts view rows of the documents processed by this run (e.g. only those of the leased
+        ranges when cooperating)
+        """
+
+        with self._lock:
+            return list(self._touched_rows)
+
+
+    def get_progress(self):
+        """
+        Snapshot of the deletion progress counters (see: ProgressReporter)
+        """
+
+        return {
+            progress_reporter.PROGRESS_PROCESSED: self._total_conflicted_documents,
+            progress_reporter.PROGRESS_CONFLICTS: self._total_conflicted_revisions,
+            progress_reporter.PROGRESS_DELETED_REVISIONS: self._total_deleted_revisions,
+            progress_reporter.PROGRESS_ERRORS: self._total_processed_revisions - self._total_deleted_revisions,
+            progress_reporter.PROGRESS_ATTEMPTS: self._total_processed_revisions,
+            progress_reporter.PROGRESS_QUEUE_DEPTH: self._total_queued_documents - self._total_conflicted_documents
+        }
+
+
     # Private Methods --------------------------------------------------------->
 
     def _init_csv_file(self, logger=DEFAULT_LOGGER):
@@ -167,11 +294,203 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
             self._csv_file_handle = None
 
 
+    def _process_rows(self):
+        """
+        Process the conflicted documents (sequentially or with a pool of workers)
+        """
+
+        if self._concurrency > 1:
+            self._process_rows_concurrently()
+            return
+
+        index = 0
+
+        for row in self._rows:
+            if not self._is_lease_held():
+                break
+            self._follow_schedule(set())
+            self._process_row(index, row)
+            index += 1
+
+
+    def _process_leased_ranges(self, logger=DEFAULT_LOGGER):
+        """
+        Process the conflicted documents one keyspace range at a time, as long as ranges can be claimed
+        """
+
+        from lib.classes import lease_coordinator # pylint: disable=import-outside-toplevel
+
+        rows_by_range = {}
+
+        for row in self._conflicts:
+            range_id = self._coordinator.get_range(row[constants.PROPERTY_ID])
+            rows_by_range.setdefault(range_id, []).append(row)
+
+        while True:
+            range_id = self._coordinator.claim()
+
+            if range_id is None:
+                break
+
+            self._rows = rows_by_range.get(range_id, [])
+            self._next_index = 0
+            self._processed_indexes = set()
+            self._total_queued_documents = self._total_conflicted_documents + len(self._rows)
+
+            logger.info("Deleting document conflicts of range %d (%d documents)...", range_id, len(self._rows))
+
+            previous_summary = self.get_summary()
+            self._process_rows()
+
+            if not self._is_lease_held():
+                self._coordinator.release()
+                continue
+
+            summary = self.get_summary()
+
+            self._coordinator.complete({
+                name: summary[name] - previous_summary[name]
+                for name in lease_coordinator.SHARD_TOTALS
+            })
+
+        self._rows = []
+        self._total_queued_documents = self._total_conflicted_documents
+
+
+    def _is_lease_held(self):
+        """
+        Check whether the documents may still be processed (lease of the range renewed in time, if cooperating)
+        """
+
+        return not self._coordinator or self._coordinator.is_held()
+
+
+    def _process_rows_concurrently(self, logger=DEFAULT_LOGGER):
+        """
+        Process conflicted documents with a pool of workers (bounded number of queued documents)
+        """
+
+        logger.info("Processing conflicted documents with %d workers...", self._concurrency)
+
+        max_pending = self._concurrency * QUEUED_DOCUMENTS_PER_WORKER
+        pending = set()
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._concurrency,
+                thread_name_prefix="delete-worker") as executor:
+
+            for index, row in enumerate(self._rows):
+                if not self._is_lease_held():
+                    break
+
+                pending = self._follow_schedule(pending)
+
+                if len(pending) >= max_pending:
+                    done, pending = concurrent.futures.wait(
+                        pending,
+                        return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+
+                pending.add(executor.submit(self._process_row, index, row))
+
+            for future in concurrent.futures.as_completed(pending):
+                future.result()
+
+
+    def _follow_schedule(self, pending, logger=DEFAULT_LOGGER):
+        """
+        Apply the schedule before processing the next document: at a window boundary, save a checkpoint and
+        adjust the throughput, or drain the pending documents and pause until the next window opens; returns the
+        documents still pending
+        """
+
+        if not self._schedule:
+            return pending
+
+        scale = self._schedule.get_scale()
+
+        if scale == self._scale:
+            return pending
+
+        self._scale = scale
+
+        if scale > 0:
+            logger.info("Maintenance window boundary. Deleting at %d%% of full speed until %s.",
+                round(scale * 100), self._schedule.get_next_change())
+            self._save_checkpoint()
+            return pending
+
+        # Paused: finish the documents in progress so that the checkpoint is exact
+
+        for future in concurrent.futures.as_completed(pending):
+            future.result()
+
+        self._save_checkpoint()
+
+        logger.info("Maintenance window closed. Pausing deletion until %s...", self._schedule.get_next_change())
+
+        pause_start_time = time.monotonic()
+
+        while scale == 0:
+            next_change = self._schedule.get_next_change()
+            delay = (next_change - datetime.datetime.now()).total_seconds() if next_change else PAUSE_POLL_INTERVAL
+            time.sleep(min(max(delay, 1), PAUSE_POLL_INTERVAL))
+            scale = self._schedule.get_scale()
+
+        self._scale = scale
+        self._paused_time += time.monotonic() - pause_start_time
+
+        logger.info("Maintenance window opened. Resuming deletion at %d%% of full speed.", round(scale * 100))
+
+        return set()
+
+
+    def _save_checkpoint(self):
+        """
+        Save the documents not processed yet (if checkpointing)
+        """
+
+        if not self._checkpoint:
+            return
+
+        # A document being deleted in chunks is saved with its remaining conflicts count (its revisions are fetched
+        # again when resumed); concurrent saves are serialized, so that a stale snapshot never replaces a newer one
+
+        with self._checkpoint_lock:
+            self._last_checkpoint_time = time.monotonic()
+
+            with self._lock:
+                remaining = [
+                    self._get_remaining_row(index, row)
+                    for index, row in enumerate(self._rows[self._next_index:], self._next_index)
+                    if index not in self._processed_indexes
+                ]
+
+            self._checkpoint.save(remaining, self.get_summary())
+
+
+    def _mark_processed(self, index):
+        """
+        Track the processed documents (see: checkpoint)
+        """
+
+        with self._lock:
+            self._processed_indexes.add(index)
+            self._chunk_progress.pop(index, None)
+
+            while self._next_index in self._processed_indexes:
+                self._processed_indexes.remove(self._next_index)
+                self._next_index += 1
+
+
     def _process_row(self, index, row, logger=DEFAULT_LOGGER):
         """
         TODO
         """
 
+        start_time = time.monotonic()
+
         # e.g.
         # {
         #    "id":"agapic@ca.ibm.com",
@@ -185,26 +504,49 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
         if logger_util.is_enabled_for_trace(logger):
             logger_util.log_trace(logger, str(row))
 
-        # Print row
+        # Track number of conflicted document revisions (documents exceeding the threshold: counted by the scan)
 
-        display_row = self._get_display_row(index, row)
-        logger.info(display_row)
+        chunked = constants.PROPERTY_CHUNKED in row
+        field_conflicts = row[constants.PROPERTY_CHUNKED] if chunked else len(row[constants.PROPERTY_VALUE])
 
-        # Track total number of conflicted documents
+        # Print row (sampled)
 
-        self._total_conflicted_documents += 1
+        if logger_util.is_sampled(index, self._log_every) and \
+                logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "[%d] Document ID: %s. %s: %s. %s: %d.",
+                index,
+                row[constants.PROPERTY_ID],
+                constants.CSV_FIELD_NAME,
+                row[constants.PROPERTY_KEY],
+                constants.CSV_FIELD_CONFLICTS,
+                field_conflicts)
 
-        # Track number of conflicted document revisions
+        # Track total number of conflicted documents / revisions
 
-        field_conflicts = len(row[constants.PROPERTY_VALUE])
+        with self._lock:
+            self._total_conflicted_documents += 1
+            self._total_conflicted_revisions += field_conflicts
+            self._touched_rows.append(row)
 
-        # Track total number of conflicted document revisions
+        # Delete conflicted document revisions
 
-        self._total_conflicted_revisions += field_conflicts
+        trace_timestamp = self._tracer.get_timestamp() if self._tracer else 0
 
-        # Delete conflicted document revisions
+        if chunked:
+            # The deleted revisions of a chunked document are counted only (bounded memory)
+            deleted_revisions = []
+            deleted_revision_count = self._delete_revisions_in_chunks(index, row)
+        else:
+            deleted_revisions = self._delete_conflicted_revisions(index, row)
+            deleted_revision_count = len(deleted_revisions)
 
-        deleted_revisions = self._delete_conflicted_revisions(index, row)
+        if self._tracer:
+            self._tracer.add_complete_event(
+                "delete_batch",
+                trace_recorder.CATEGORY_DELETE,
+                trace_timestamp,
+                {"revisions": field_conflicts, "deleted": deleted_revision_count, "chunked": chunked})
 
         # Generate CSV fields
 
@@ -212,30 +554,21 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
         fields[constants.CSV_FIELD_ID] = row[constants.PROPERTY_ID]
         fields[constants.CSV_FIELD_NAME] = row[constants.PROPERTY_KEY]
         fields[constants.CSV_FIELD_CONFLICTS] = field_conflicts
-        fields[constants.CSV_FIELD_DELETED] = len(deleted_revisions)
+        fields[constants.CSV_FIELD_DELETED] = deleted_revision_count
         fields[constants.CSV_FIELD_REVISIONS] = deleted_revisions
 
         # Serialize document to CSV file record
 
         self._serialize_csv_fields(fields)
 
+        self._mark_processed(index)
 
-    @staticmethod
-    def _get_display_row(index, row):
-        """
-        TODO
-        """
+        # Reduced throughput (see: schedule): rest in proportion to the time spent working
 
-        conflicts_count = len(row[constants.PROPERTY_VALUE])
-        display_row = "[{0}] Document ID: {1}. {2}: {3}. {4}: {5}.".format(
-            index,
-            row[constants.PROPERTY_ID],
-            constants.CSV_FIELD_NAME,
-            row[constants.PROPERTY_KEY],
-            constants.CSV_FIELD_CONFLICTS,
-            conflicts_count)
+        scale = self._scale
 
-        return display_row
+        if 0 < scale < 1:
+            time.sleep((time.monotonic() - start_time) * (1 - scale) / scale)
 
 
     def _delete_conflicted_revisions(self, document_index, row, logger=DEFAULT_LOGGER):
@@ -250,14 +583,18 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
         deleted_revisions = []
         revision_index = 0
 
-        logger.info("Deleting all conflicted revisions: %s (%d)...", document_id, conflicted_revision_count)
+        logger.debug("Deleting all conflicted revisions: %s (%d)...", document_id, conflicted_revision_count)
 
         for revision_id in revisions:
 
-            # Print revision
+            # Print revision (sampled)
 
-            display_revision = self._get_display_revision(document_index, revision_index, revision_id)
-            logger.info(display_revision)
+            with self._lock:
+                processed_revisions = self._total_processed_revisions
+                self._total_processed_revisions += 1
+
+            if logger_util.is_sampled(processed_revisions, self._log_every):
+                logger.info("[%d][%d] Revision ID: %s.", document_index, revision_index, revision_id)
 
             # Delete revision
 
@@ -273,15 +610,17 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
 
         # Track total number of deleted revisions
 
-        self._total_deleted_revisions += deleted_revision_count
+        with self._lock:
+            self._total_deleted_revisions += deleted_revision_count
 
         # Track total number of resolved documents
 
         if conflicted_revision_count == deleted_revision_count:
-            logger.info("Successfully deleted all conflicted revisions: %s (deleted: %d out of %d).",
+            logger.debug("Successfully deleted all conflicted revisions: %s (deleted: %d out of %d).",
                 document_id, deleted_revision_count, conflicted_revision_count)
 
-            self._total_resolved_documents += 1
+            with self._lock:
+                self._total_resolved_documents += 1
         else:
             logger.error("Failed to delete all conflicted revisions: %s (deleted %d out of %d).",
                 document_id, deleted_revision_count, conflicted_revision_count)
@@ -289,18 +628,151 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
         return deleted_revisions
 
 
-    @staticmethod
-    def _get_display_revision(document_index, revision_index, revision_id):
+    def _delete_revisions_in_chunks(self, document_index, row, logger=DEFAULT_LOGGER):
         """
-        TODO
+        Delete the conflicted revisions of a document exceeding the threshold: its current conflicts are fetched
+        once, then deleted chunk by chunk (one _bulk_docs request per chunk, checkpoint saved after each), and the
+        failed ones retried by the next passes until none remain; returns the number of deleted revisions
+        """
+
+        document_id = row[constants.PROPERTY_ID]
+        deleted_revision_count = 0
+        attempted_revisions = set() # a revision retried by a later pass is processed once
+
+        logger.info("Deleting conflicted revisions in chunks: %s (%d; chunks of %d)...",
+            document_id, row[constants.PROPERTY_CHUNKED], self._chunk_size)
+
+        with self._lock:
+            self._total_chunked_documents += 1
+
+        documents = self._database.get_documents([document_id], conflicts=True)
+
+        if documents is None:
+            logger.error("Failed to retrieve the conflicted revisions of document: %s.", document_id)
+            return 0
+
+        document = documents.get(document_id)
+        remaining_revisions = document.get("_conflicts", []) if document else []
+
+        for _ in range(MAX_CHUNK_PASSES):
+            if not remaining_revisions or not self._is_lease_held():
+                break
+
+            failed_revisions = self._delete_chunks(
+                document_index, document_id, remaining_revisions, attempted_revisions, deleted_revision_count)
+            deleted = len(remaining_revisions) - len(failed_revisions)
+            deleted_revision_count += deleted
+
+            # A failed deletion may target a revision deleted or updated concurrently: only the live ones are retried
+
+            remaining_revisions = self._get_live_revisions(document_id, failed_revisions)
+
+            if deleted == 0:
+                break
+
+        resolved = not remaining_revisions
+
+        with self._lock:
+            if resolved:
+                self._total_resolved_documents += 1
+
+        if resolved:
+            logger.info("Successfully deleted all conflicted revisions in chunks: %s (deleted: %d).",
+                document_id, deleted_revision_count)
+        else:
+            logger.error("Failed to delete all conflicted revisions in chunks: %s (deleted: %d).",
+                document_id, deleted_revision_count)
+
+        return deleted_revision_count
+
+
+    def _delete_chunks(self, document_index, document_id, conflicts, attempted_revisions, previously_deleted,
+            logger=DEFAULT_LOGGER):
+        """
+        Delete the conflicted revisions chunk by chunk (tracking the attempted revisions, so that the processed
+        revisions are counted once across passes); returns the revisions not deleted (failed, or not attempted once
+        the lease is lost)
+        """
+
+        # pylint: disable=too-many-arguments
+
+        deleted_revision_count = 0
+        failed_revisions = []
+
+        for offset in range(0, len(conflicts), self._chunk_size):
+            chunk = conflicts[offset:offset + self._chunk_size]
+
+            if not self._is_lease_held():
+                failed_revisions.extend(conflicts[offset:])
+                break
+
+            new_revisions = [revision for revision in chunk if revision not in attempted_revisions]
+            attempted_revisions.update(new_revisions)
+
+            results = self._database.delete_revisions([(document_id, revision) for revision in chunk])
+
+            if results is None:
+                failed = chunk
+            else:
+                failed = [revision for revision, result in zip(chunk, results) if not result.get("ok")]
+
+            failed_revisions.extend(failed)
+            deleted = len(chunk) - len(failed)
+
+            logger.debug("Deleted chunk of conflicted revisions: %s (%d out of %d).", document_id, deleted, len(chunk))
+
+            deleted_revision_count += deleted
+
+            with self._lock:
+                self._total_chunks += 1
+                self._total_processed_revisions += len(new_revisions)
+                self._total_deleted_revisions += deleted
+                self._chunk_progress[document_index] = previously_deleted + deleted_revision_count
+
+            self._save_chunk_checkpoint()
+
+        return failed_revisions
+
+
+    def _get_live_revisions(self, document_id, revisions):
+        """
+        Filter the revisions that are still live (checked chunk by chunk with _bulk_get; kept if the check fails)
+        """
+
+        live_revisions = []
+
+        for offset in range(0, len(revisions), self._chunk_size):
+            chunk = revisions[offset:offset + self._chunk_size]
+            documents = self._database.get_revisions([(document_id, revision) for revision in chunk])
+
+            if documents is None:
+                live_revisions.extend(chunk)
+            else:
+                live_revisions.extend(revision for revision in chunk if documents.get((document_id, revision)))
+
+        return live_revisions
+
+
+    def _save_chunk_checkpoint(self):
+        """
+        Save the checkpoint after a chunk, unless one was saved within the chunk checkpoint interval
         """
 
-        display_revision = "[{0}][{1}] Revision ID: {2}.".format(
-            document_index,
-            revision_index,
-            revision_id)
+        if self._checkpoint and time.monotonic() - self._last_checkpoint_time >= CHUNK_CHECKPOINT_INTERVAL:
+            self._save_checkpoint()
 
-        return display_revision
+
+    def _get_remaining_row(self, index, row):
+        """
+        Checkpoint row of a document not processed yet (lock held)
+        """
+
+        deleted = self._chunk_progress.get(index)
+
+        if deleted is None:
+            return row
+
+        return dict(row, **{constants.PROPERTY_CHUNKED: max(row[constants.PROPERTY_CHUNKED] - deleted, 0)})
 
 
     def _serialize_csv_fields(self, fields, logger=DEFAULT_LOGGER):
@@ -317,13 +789,14 @@ class DeleteConflictsTask(TaskInterface): # pylint: disable=unused-variable
         # Write CSV row
 
         try:
-            self._csv_file_writer.writerow({
-                constants.CSV_FIELD_ID: field_id,
-                constants.CSV_FIELD_NAME: fields[constants.CSV_FIELD_NAME],
-                constants.CSV_FIELD_CONFLICTS: fields[constants.CSV_FIELD_CONFLICTS],
-                constants.CSV_FIELD_DELETED:  fields[constants.CSV_FIELD_DELETED],
-                constants.CSV_FIELD_REVISIONS: field_revisions
-            })
+            with self._lock:
+                self._csv_file_writer.writerow({
+                    constants.CSV_FIELD_ID: field_id,
+                    constants.CSV_FIELD_NAME: fields[constants.CSV_FIELD_NAME],
+                    constants.CSV_FIELD_CONFLICTS: fields[constants.CSV_FIELD_CONFLICTS],
+                    constants.CSV_FIELD_DELETED:  fields[constants.CSV_FIELD_DELETED],
+                    constants.CSV_FIELD_REVISIONS: field_revisions
+                })
         except ValueError as err:
             message = "Failed to write CSV row to file: %s. Document ID: %s."
             logger.error(message, self._csv_file, field_id)
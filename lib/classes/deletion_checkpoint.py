@@ -0,0 +1,157 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import os
+import json
+import logging
+import datetime
+import tempfile
+import threading
+
+from lib.utils import error_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("deletion_checkpoint")
+
+CHECKPOINT_VERSION = 1
+
+# Counters accumulated across resumed runs (see: DeleteConflictsTask.get_summary)
+CHECKPOINT_TOTALS = (
+    "conflicted_documents",
+    "resolved_documents",
+    "conflicted_revisions",
+    "deleted_revisions",
+    "failed_revisions"
+)
+
+# Classes --------------------------------------------------------------------->
+
+class DeletionCheckpoint: # pylint: disable=unused-variable
+    """
+    Deletion progress saved to a JSON file (e.g. at maintenance window boundaries): the conflicts view rows not
+    processed yet and the totals so far, so that an interrupted run can be resumed without scanning again
+    """
+
+    def __init__(self, file, database_name, previous=None):
+        """
+        Constructor
+
+        - file: Checkpoint file (replaced atomically on every save; saves from concurrent workers are serialized).
+        - database_name: Name of the database being cleaned up.
+        - previous: Checkpoint content of the resumed run (see: load_checkpoint); its totals are carried over.
+        """
+
+        self._file = file
+        self._database_name = database_name
+        self._previous_totals = previous["totals"] if previous else {}
+        self._resumed_from = previous["file"] if previous else None
+        self._lock = threading.Lock()
+        self._total_saves = 0
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def save(self, remaining, totals, logger=DEFAULT_LOGGER):
+        """
+        Save the conflicts view rows not processed yet and the totals of this run (plus those of the resumed run)
+        """
+
+        content = {
+            "version": CHECKPOINT_VERSION,
+            "database": self._database_name,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "completed": not remaining,
+            "resumed_from": str(self._resumed_from) if self._resumed_from else None,
+            "totals": {
+                name: self._previous_totals.get(name, 0) + totals.get(name, 0)
+                for name in CHECKPOINT_TOTALS
+            },
+            "remaining": remaining
+        }
+
+        with self._lock:
+            temporary_file = None
+
+            try:
+                descriptor, temporary_file = tempfile.mkstemp(
+                    dir=os.path.dirname(os.path.abspath(self._file)),
+                    suffix=".tmp")
+
+                with os.fdopen(descriptor, "w", encoding="utf-8") as file_handle:
+                    json.dump(content, file_handle)
+                os.replace(temporary_file, self._file)
+            except (OSError, TypeError, ValueError) as err:
+                logger.error("Failed to save deletion checkpoint: %s.", self._file)
+                error_util.log_exception(logger, err)
+
+                if temporary_file and os.path.exists(temporary_file):
+                    os.remove(temporary_file)
+
+                return False
+
+            self._total_saves += 1
+
+        logger.info("Saved deletion checkpoint: %s (%d documents remaining).", self._file, len(remaining))
+
+        return True
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the checkpoints
+        """
+
+        return {
+            "file": str(self._file),
+            "saves": self._total_saves,
+            "resumed_from": str(self._resumed_from) if self._resumed_from else None,
+            "previous_totals": self._previous_totals or None
+        }
+
+
+# Public Functions ------------------------------------------------------------>
+
+def load_checkpoint(file, logger=DEFAULT_LOGGER): # pylint: disable=unused-variable
+    """
+    Load a deletion checkpoint; returns its content (with the "file" it was loaded from) or None if invalid
+    """
+
+    logger.info("Loading deletion checkpoint: %s...", file)
+
+    try:
+        with open(file, "r", encoding="utf-8") as file_handle:
+            content = json.load(file_handle)
+    except (OSError, ValueError) as err:
+        logger.error("Failed to load deletion checkpoint: %s.", file)
+        error_util.log_exception(logger, err)
+        return None
+
+    if not isinstance(content, dict) or content.get("version") != CHECKPOINT_VERSION or \
+            not isinstance(content.get("remaining"), list) or not isinstance(content.get("totals"), dict):
+        logger.error("Failed to load deletion checkpoint: %s. Unsupported content.", file)
+        return None
+
+    content["file"] = file
+
+    logger.info("Successfully loaded deletion checkpoint: %s (database: %s, %d documents remaining).",
+        file, content.get("database"), len(content["remaining"]))
+
+    return content
@@ -0,0 +1,296 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import json
+import time
+import random
+import threading
+
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+from lib.utils import request_util
+
+# Globals
+
+# Fault kinds (probability per request attempt)
+FAULT_THROTTLE = "throttle" # 429 Too Many Requests
+FAULT_ERROR = "error" # 500 Internal Server Error
+FAULT_RESET = "reset" # connection reset (no response)
+FAULT_SLOW = "slow" # additional latency (see: PROPERTY_SLOW_LATENCY)
+FAULTS = (FAULT_THROTTLE, FAULT_ERROR, FAULT_RESET, FAULT_SLOW)
+
+# Latency distributions (milliseconds)
+PROPERTY_LATENCY = "latency_ms" # added to every request of the endpoint
+PROPERTY_SLOW_LATENCY = "slow_latency_ms" # added to slow requests
+
+# Profile key applying to every operation (except the session, so that clients can always authenticate)
+ALL_OPERATIONS = "*"
+
+DEFAULT_SLOW_LATENCY = "exponential:500"
+
+FAULT_RESPONSES = {
+    FAULT_THROTTLE: (429, {"error": "too_many_requests", "reason": "Injected fault."}),
+    FAULT_ERROR: (500, {"error": "internal_server_error", "reason": "Injected fault."})
+}
+
+# Named fault profiles: operation (see: request_util.OPERATION_*) or "*" -> fault probabilities / latencies
+PRESETS = { # pylint: disable=unused-variable
+    "none": {},
+    "throttling": {ALL_OPERATIONS: {FAULT_THROTTLE: 0.2}},
+    "errors": {ALL_OPERATIONS: {FAULT_ERROR: 0.02}},
+    "resets": {ALL_OPERATIONS: {FAULT_RESET: 0.01}},
+    "slow": {ALL_OPERATIONS: {FAULT_SLOW: 0.05, PROPERTY_SLOW_LATENCY: "exponential:500"}},
+    "mixed": {
+        ALL_OPERATIONS: {
+            FAULT_THROTTLE: 0.05,
+            FAULT_ERROR: 0.01,
+            FAULT_RESET: 0.005,
+            FAULT_SLOW: 0.02,
+            PROPERTY_LATENCY: "uniform:0-10"
+        },
+        request_util.OPERATION_VIEW: {FAULT_SLOW: 0.1, PROPERTY_SLOW_LATENCY: "exponential:2000"}
+    }
+}
+
+# Classes --------------------------------------------------------------------->
+
+class FaultInjector: # pylint: disable=unused-variable
+    """
+    Injects faults (429, 500, connection resets, slow responses) into request attempts with configurable
+    probabilities and latency distributions per endpoint (see: CloudantTransportAdapter); safe to share
+    between threads
+    """
+
+    def __init__(self, profile, seed=None, enabled=True):
+        """
+        Constructor (raises ValueError for an invalid profile)
+
+        - profile: Dictionary of operation (or "*") -> fault settings, e.g.
+          {"*": {"throttle": 0.05, "slow": 0.01, "slow_latency_ms": "exponential:500"},
+           "view": {"error": 0.02, "latency_ms": "uniform:5-20"}}
+        - seed: Random seed (reproducible fault sequence for a single thread).
+        - enabled: Whether faults are injected from the start (see: set_enabled).
+        """
+
+        self._settings = {operation: _get_settings(settings) for operation, settings in profile.items()}
+        self._enabled = enabled
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._counts = {}
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def apply(self, request):
+        """
+        Apply the faults of the request endpoint: sleeps (latency), raises ConnectionError (reset) or returns the
+        injected response (429, 500); returns None when the request should be sent
+        """
+
+        if not self._enabled:
+            return None
+
+        operation = request_util.get_operation(request.method, request.url)
+        settings = self._settings.get(operation)
+
+        if settings is None and operation != request_util.OPERATION_SESSION:
+            settings = self._settings.get(ALL_OPERATIONS)
+
+        if not settings:
+            return None
+
+        fault, delay = self._draw(operation, settings)
+
+        if delay > 0:
+            time.sleep(delay)
+
+        if fault == FAULT_RESET:
+            raise RequestsConnectionError(
+                ConnectionResetError(104, "Connection reset by peer (injected fault)"),
+                request=request)
+
+        if fault in FAULT_RESPONSES:
+            status, body = FAULT_RESPONSES[fault]
+            return request_util.build_response(
+                request=request,
+                status=status,
+                body=json.dumps(body).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                elapsed=delay)
+
+        return None
+
+
+    def set_enabled(self, enabled):
+        """
+        Enable or disable the injection (e.g. to set up a benchmark case without faults)
+        """
+
+        self._enabled = enabled
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the injected faults: operation -> fault -> count
+        """
+
+        with self._lock:
+            return {operation: dict(counts) for operation, counts in sorted(self._counts.items())}
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _draw(self, operation, settings):
+        """
+        Draw the fault (if any) and the latency (seconds) of a request attempt
+        """
+
+        with self._lock:
+            delay = settings[PROPERTY_LATENCY].sample(self._random) if settings[PROPERTY_LATENCY] else 0
+            value = self._random.random()
+            fault = None
+
+            # Faults are mutually exclusive: their probabilities are cumulative
+
+            for kind in FAULTS:
+                value -= settings[kind]
+                if value < 0:
+                    fault = kind
+                    break
+
+            if fault == FAULT_SLOW:
+                delay += settings[PROPERTY_SLOW_LATENCY].sample(self._random)
+
+            if fault:
+                counts = self._counts.setdefault(operation, {})
+                counts[fault] = counts.get(fault, 0) + 1
+
+        return fault, delay
+
+
+class LatencyDistribution: # pylint: disable=unused-variable
+    """
+    Distribution of an injected latency (specified in milliseconds)
+    """
+
+    def __init__(self, specification):
+        """
+        Constructor (raises ValueError for an invalid specification)
+
+        Specifications:
+        - fixed:MS : Exactly MS milliseconds.
+        - uniform:MIN-MAX : Uniformly distributed between MIN and MAX milliseconds.
+        - exponential:MEAN : Exponentially distributed with a mean of MEAN milliseconds (long tail).
+        """
+
+        kind, _, parameters = str(specification).partition(":")
+
+        if kind == "fixed":
+            self._sample = lambda generator, value=float(parameters): value
+        elif kind == "uniform":
+            minimum, _, maximum = parameters.partition("-")
+            minimum, maximum = float(minimum), float(maximum)
+            if not 0 <= minimum <= maximum:
+                raise ValueError("Invalid latency distribution bounds: {0}.".format(specification))
+            self._sample = lambda generator: generator.uniform(minimum, maximum)
+        elif kind == "exponential":
+            mean = float(parameters)
+            if mean <= 0:
+                raise ValueError("Invalid latency distribution mean: {0}.".format(specification))
+            self._sample = lambda generator: generator.expovariate(1.0 / mean)
+        else:
+            raise ValueError("Invalid latency distribution: {0}.".format(specification))
+
+        self._specification = specification
+
+
+    def __str__(self):
+        """
+        Distribution specification
+        """
+
+        return self._specification
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def sample(self, generator):
+        """
+        Draw a latency (in seconds) using the specified random.Random instance
+        """
+
+        return max(self._sample(generator), 0) / 1000
+
+
+# Public Functions ------------------------------------------------------------>
+
+def load_profile(specification): # pylint: disable=unused-variable
+    """
+    Load a fault profile from a preset name, a JSON file or a JSON document (raises ValueError when invalid)
+    """
+
+    if specification in PRESETS:
+        profile = PRESETS[specification]
+    elif specification.lstrip().startswith("{"):
+        profile = json.loads(specification)
+    else:
+        try:
+            with open(specification, "r", encoding="utf-8") as file_handle:
+                profile = json.load(file_handle)
+        except OSError as err:
+            raise ValueError("Invalid fault profile: {0} ({1}).".format(specification, err)) from err
+
+    if not isinstance(profile, dict) or not all(isinstance(settings, dict) for settings in profile.values()):
+        raise ValueError("Invalid fault profile: {0}.".format(specification))
+
+    # Validate
+
+    for settings in profile.values():
+        _get_settings(settings)
+
+    return profile
+
+
+# Private Functions ----------------------------------------------------------->
+
+def _get_settings(settings):
+    """
+    Parse the fault settings of an endpoint (raises ValueError when invalid)
+    """
+
+    unknown = set(settings) - set(FAULTS) - {PROPERTY_LATENCY, PROPERTY_SLOW_LATENCY}
+
+    if unknown:
+        raise ValueError("Unknown fault settings: {0}.".format(", ".join(sorted(unknown))))
+
+    try:
+        parsed = {kind: float(settings.get(kind, 0)) for kind in FAULTS}
+    except (TypeError, ValueError) as err:
+        raise ValueError("Invalid fault probabilities: {0}.".format(settings)) from err
+
+    if any(not 0 <= probability <= 1 for probability in parsed.values()) or sum(parsed.values()) > 1:
+        raise ValueError("Invalid fault probabilities: {0}.".format(settings))
+
+    latency = settings.get(PROPERTY_LATENCY)
+    parsed[PROPERTY_LATENCY] = LatencyDistribution(latency) if latency else None
+    parsed[PROPERTY_SLOW_LATENCY] = LatencyDistribution(settings.get(PROPERTY_SLOW_LATENCY, DEFAULT_SLOW_LATENCY))
+
+    return parsed
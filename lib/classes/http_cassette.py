@@ -0,0 +1,426 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import re
+import json
+import gzip
+import base64
+import logging
+import threading
+import collections
+from urllib.parse import urlsplit
+from urllib.parse import urlunsplit
+from urllib.parse import parse_qsl
+from urllib.parse import urlencode
+
+from lib.utils import error_util
+from lib.utils import timing_util
+from lib.utils.obfuscation_util import obfuscate
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("http_cassette")
+
+CASSETTE_VERSION = 1
+
+# Interaction properties (short names keep the cassette compact)
+PROPERTY_OFFSET = "t" # seconds since the start of the recording
+PROPERTY_ELAPSED = "e" # seconds
+PROPERTY_METHOD = "m"
+PROPERTY_PATH = "p" # path and query string
+PROPERTY_REQUEST_BODY = "q"
+PROPERTY_STATUS = "s"
+PROPERTY_HEADERS = "h"
+PROPERTY_BODY = "b"
+PROPERTY_BODY_BASE64 = "b64"
+PROPERTY_EXCEPTION = "x"
+
+# Response headers kept in the cassette (all request headers are dropped: Authorization, Cookie)
+RECORDED_HEADERS = ("Content-Type", "ETag", "Retry-After", "Set-Cookie", "X-Couch-Request-ID")
+
+# Request / response properties holding credentials (e.g. POST /_session)
+CREDENTIAL_PROPERTIES = ("name", "password", "username", "apikey", "api_key")
+
+SESSION_SEGMENTS = ("_session", "_iam_session")
+
+AUTH_SESSION_REGEX = re.compile(r"(AuthSession=)([^;]*)")
+
+# Classes --------------------------------------------------------------------->
+
+class CassetteRecorder: # pylint: disable=unused-variable
+    """
+    Records HTTP request / response pairs and their timings to a cassette (gzip-compressed NDJSON), with the
+    credentials scrubbed; safe to share between threads
+    """
+
+    def __init__(self, cassette_file, url=None):
+        """
+        Constructor
+
+        - url: Server URL stored in the cassette header (credentials removed).
+        """
+
+        self._cassette_file = cassette_file
+        self._url = url
+
+        self._lock = threading.Lock()
+        self._file_handle = None
+        self._start_time = 0
+        self._total_interactions = 0
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def open(self, logger=DEFAULT_LOGGER):
+        """
+        Create the cassette file and write its header
+        """
+
+        logger.info("Opening cassette file: %s...", self._cassette_file)
+
+        try:
+            self._file_handle = gzip.open(self._cassette_file, "wt", encoding="utf-8")
+            self._file_handle.write(json.dumps({
+                "cassette": CASSETTE_VERSION,
+                "url": get_scrubbed_url(self._url) if self._url else None
+            }) + "\n")
+        except OSError as err:
+            logger.error("Failed to open cassette file: %s.", self._cassette_file)
+            error_util.log_exception(logger, err)
+            self._file_handle = None
+            return False
+
+        self._start_time = timing_util.start_timer()
+
+        logger.info("Successfully opened cassette file: %s.", self._cassette_file)
+
+        return True
+
+
+    def close(self, logger=DEFAULT_LOGGER):
+        """
+        Close the cassette file
+        """
+
+        with self._lock:
+            if self._file_handle is None:
+                return
+
+            self._file_handle.close()
+            self._file_handle = None
+
+        logger.info("Closed cassette file: %s (%d interactions).", self._cassette_file, self._total_interactions)
+
+
+    def record(self, request, response, start_time, elapsed, exception=None):
+        """
+        Record a request attempt and its response (or the exception raised by the attempt)
+
+        - start_time: Timer value (see: timing_util.start_timer) at which the request was sent.
+        """
+
+        path = get_path(request.url)
+        interaction = {
+            PROPERTY_OFFSET: round(start_time - self._start_time, 6),
+            PROPERTY_ELAPSED: round(elapsed, 6),
+            PROPERTY_METHOD: request.method,
+            PROPERTY_PATH: path,
+            PROPERTY_REQUEST_BODY: _get_scrubbed_request_body(path, request.body)
+        }
+
+        if response is None:
+            interaction[PROPERTY_EXCEPTION] = type(exception).__name__
+        else:
+            interaction[PROPERTY_STATUS] = response.status_code
+            interaction[PROPERTY_HEADERS] = _get_scrubbed_headers(response.headers)
+            _set_scrubbed_response_body(interaction, path, response)
+
+        line = json.dumps(interaction, separators=(",", ":")) + "\n"
+
+        with self._lock:
+            if self._file_handle is None:
+                return
+
+            self._file_handle.write(line)
+            self._total_interactions += 1
+
+
+class CassetteReplay: # pylint: disable=unused-variable
+    """
+    Serves the interactions of a cassette back in recorded order per request (method and path); safe to share
+    between threads
+    """
+
+    def __init__(self, cassette_file, speed=1.0):
+        """
+        Constructor
+
+        - speed: Replay speed relative to the recorded latencies (e.g. 2 = twice as fast); 0 = no delays.
+        """
+
+        self._cassette_file = cassette_file
+        self._speed = speed
+
+        self._lock = threading.Lock()
+        self._url = None
+        self._interactions = {}
+        self._total_interactions = 0
+        self._total_served = 0
+        self._total_missing = 0
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def load(self, logger=DEFAULT_LOGGER):
+        """
+        Load the cassette file
+        """
+
+        logger.info("Loading cassette file: %s...", self._cassette_file)
+
+        try:
+            with gzip.open(self._cassette_file, "rt", encoding="utf-8") as file_handle:
+                header = json.loads(file_handle.readline())
+
+                if header.get("cassette") != CASSETTE_VERSION:
+                    logger.error("Unsupported cassette file version: %s.", header.get("cassette"))
+                    return False
+
+                self._url = header.get("url")
+
+                for line in file_handle:
+                    interaction = json.loads(line)
+                    key = (interaction[PROPERTY_METHOD], interaction[PROPERTY_PATH])
+                    self._interactions.setdefault(key, collections.deque()).append(interaction)
+                    self._total_interactions += 1
+        except (OSError, ValueError, KeyError) as err:
+            logger.error("Failed to load cassette file: %s.", self._cassette_file)
+            error_util.log_exception(logger, err)
+            return False
+
+        logger.info("Successfully loaded cassette file: %s (%d interactions).",
+            self._cassette_file, self._total_interactions)
+
+        return True
+
+
+    def get_url(self):
+        """
+        Retrieve the recorded server URL
+        """
+
+        return self._url
+
+
+    def get_delay(self, interaction):
+        """
+        Retrieve the time (in seconds) to wait before serving the interaction
+        """
+
+        if self._speed <= 0:
+            return 0
+
+        return interaction[PROPERTY_ELAPSED] / self._speed
+
+
+    def next_interaction(self, method, url, logger=DEFAULT_LOGGER):
+        """
+        Retrieve the next recorded interaction for the request (None if not recorded)
+        """
+
+        key = (method, get_path(url))
+
+        with self._lock:
+            interactions = self._interactions.get(key)
+
+            if interactions:
+                self._total_served += 1
+                return interactions.popleft()
+
+            self._total_missing += 1
+
+        logger.warning("Request not recorded in cassette: %s %s.", method, key[1])
+
+        return None
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the replay
+        """
+
+        with self._lock:
+            return {
+                "cassette": str(self._cassette_file),
+                "speed": self._speed,
+                "interactions": self._total_interactions,
+                "served": self._total_served,
+                "missing": self._total_missing,
+                "unused": self._total_interactions - self._total_served
+            }
+
+
+# Public Functions ------------------------------------------------------------>
+
+def get_path(url): # pylint: disable=unused-variable
+    """
+    Retrieve the path and query string of the URL (the matching key of an interaction)
+    """
+
+    parts = urlsplit(url)
+
+    if parts.query:
+        return "{0}?{1}".format(parts.path, parts.query)
+
+    return parts.path
+
+
+def get_scrubbed_url(url): # pylint: disable=unused-variable
+    """
+    Remove the user information (credentials) from the URL
+    """
+
+    parts = urlsplit(url)
+    netloc = parts.netloc.rpartition("@")[2]
+
+    return urlunsplit((parts.scheme, netloc, parts.path, parts.query, parts.fragment))
+
+
+def get_response_body(interaction): # pylint: disable=unused-variable
+    """
+    Retrieve the recorded response body (bytes)
+    """
+
+    body = interaction.get(PROPERTY_BODY)
+
+    if body is None:
+        return b""
+
+    if interaction.get(PROPERTY_BODY_BASE64):
+        return base64.b64decode(body)
+
+    return body.encode("utf-8")
+
+
+# Private Functions ----------------------------------------------------------->
+
+def _is_session_path(path):
+    """
+    Determine whether the path is a session (authentication) endpoint
+    """
+
+    return path.split("?", 1)[0].strip("/") in SESSION_SEGMENTS
+
+
+def _get_scrubbed_request_body(path, body):
+    """
+    Decode the request body, obfuscating the credentials of session requests
+    """
+
+    if not body:
+        return None
+
+    if isinstance(body, (bytes, bytearray)):
+        body = bytes(body).decode("utf-8", errors="replace")
+    elif not isinstance(body, str):
+        # Streamed / file bodies are not recorded
+        return None
+
+    if not _is_session_path(path):
+        return body
+
+    try:
+        document = json.loads(body)
+    except ValueError:
+        # Form encoded (e.g. name=...&password=...)
+        fields = [
+            (name, obfuscate(value) if name in CREDENTIAL_PROPERTIES else value)
+            for name, value in parse_qsl(body, keep_blank_values=True)
+        ]
+        return urlencode(fields)
+
+    return json.dumps(_get_scrubbed_document(document))
+
+
+def _get_scrubbed_document(document):
+    """
+    Obfuscate the credential properties of a (session) JSON document, recursively
+    """
+
+    if isinstance(document, dict):
+        return {
+            name: obfuscate(str(value)) if name in CREDENTIAL_PROPERTIES and value else _get_scrubbed_document(value)
+            for name, value in document.items()
+        }
+
+    if isinstance(document, list):
+        return [_get_scrubbed_document(value) for value in document]
+
+    return document
+
+
+def _get_scrubbed_headers(headers):
+    """
+    Retrieve the recorded response headers, obfuscating the session cookie
+    """
+
+    recorded = {}
+
+    for name in RECORDED_HEADERS:
+        value = headers.get(name)
+
+        if value is None:
+            continue
+
+        if name == "Set-Cookie":
+            value = AUTH_SESSION_REGEX.sub(lambda match: match.group(1) + obfuscate(match.group(2)), value)
+
+        recorded[name] = value
+
+    return recorded
+
+
+def _set_scrubbed_response_body(interaction, path, response):
+    """
+    Store the response body in the interaction (text when possible, otherwise base64)
+    """
+
+    # pylint: disable=protected-access
+
+    if not response._content_consumed:
+        # Streamed response: the body was not read
+        return
+
+    content = response.content or b""
+
+    try:
+        body = content.decode("utf-8")
+    except UnicodeDecodeError:
+        interaction[PROPERTY_BODY] = base64.b64encode(content).decode("ascii")
+        interaction[PROPERTY_BODY_BASE64] = True
+        return
+
+    if _is_session_path(path) and body:
+        try:
+            body = json.dumps(_get_scrubbed_document(json.loads(body)))
+        except ValueError:
+            pass
+
+    interaction[PROPERTY_BODY] = body
@@ -0,0 +1,155 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import math
+
+# Globals
+
+# Number of significant bits kept per recorded value (relative error <= 1 / 2^(bits - 1))
+SIGNIFICANT_BITS = 6
+
+# Recorded value resolution
+UNITS_PER_SECOND = 1000000 # microseconds
+
+# Classes --------------------------------------------------------------------->
+
+class LatencyHistogram: # pylint: disable=unused-variable
+    """
+    Log-linear (HDR-style) latency histogram with bounded relative error
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+
+        self._buckets = {}
+        self._count = 0
+        self._sum = 0
+        self._min = None
+        self._max = None
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def record(self, seconds):
+        """
+        Record a latency value (in seconds)
+        """
+
+        value = max(int(seconds * UNITS_PER_SECOND), 0)
+        shift = max(value.bit_length() - SIGNIFICANT_BITS, 0)
+        bucket = (value >> shift) << shift
+
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+        self._count += 1
+        self._sum += value
+
+        if self._min is None or value < self._min:
+            self._min = value
+
+        if self._max is None or value > self._max:
+            self._max = value
+
+
+    def get_count(self):
+        """
+        Retrieve the number of recorded values
+        """
+
+        return self._count
+
+
+    def get_sum(self):
+        """
+        Retrieve the sum of all recorded values (in seconds)
+        """
+
+        return self._sum / UNITS_PER_SECOND
+
+
+    def get_min(self):
+        """
+        Retrieve the minimum recorded value (in seconds)
+        """
+
+        return (self._min or 0) / UNITS_PER_SECOND
+
+
+    def get_max(self):
+        """
+        Retrieve the maximum recorded value (in seconds)
+        """
+
+        return (self._max or 0) / UNITS_PER_SECOND
+
+
+    def get_percentile(self, percentile):
+        """
+        Retrieve the value (in seconds) at the specified percentile (0 - 100)
+        """
+
+        if self._count == 0:
+            return 0.0
+
+        rank = max(math.ceil(percentile / 100.0 * self._count), 1)
+        cumulative = 0
+
+        for bucket in sorted(self._buckets):
+            cumulative += self._buckets[bucket]
+            if cumulative >= rank:
+                return min(self._get_bucket_upper_bound(bucket), self._max) / UNITS_PER_SECOND
+
+        return self._max / UNITS_PER_SECOND
+
+
+    def get_cumulative_counts(self, bounds):
+        """
+        Retrieve the cumulative number of values less than or equal to each bound (in seconds)
+        """
+
+        counts = []
+        buckets = sorted(self._buckets.items())
+        index = 0
+        cumulative = 0
+
+        for bound in bounds:
+            limit = bound * UNITS_PER_SECOND
+
+            while index < len(buckets) and self._get_bucket_upper_bound(buckets[index][0]) <= limit:
+                cumulative += buckets[index][1]
+                index += 1
+
+            counts.append(cumulative)
+
+        return counts
+
+
+    # Private Methods --------------------------------------------------------->
+
+    @staticmethod
+    def _get_bucket_upper_bound(bucket):
+        """
+        Retrieve the highest value that maps to the specified bucket
+        """
+
+        shift = max(bucket.bit_length() - SIGNIFICANT_BITS, 0)
+
+        return bucket + (1 << shift) - 1
@@ -0,0 +1,477 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import os
+import time
+import socket
+import hashlib
+import logging
+import datetime
+import threading
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("lease_coordinator")
+
+DEFAULT_RANGES = 16 # ranges of the document ID keyspace
+DEFAULT_LEASE_TTL = 60 # seconds a lease is held without renewal
+
+RENEWALS_PER_TTL = 3 # lease renewals per time to live
+
+DOCUMENT_NAME_PREFIX = "conflict-remover"
+
+STATE_CLAIMED = "claimed"
+STATE_DONE = "done"
+
+# Deletion counters added up across the instances (see: DeleteConflictsTask.get_summary)
+SHARD_TOTALS = (
+    "conflicted_documents",
+    "resolved_documents",
+    "conflicted_revisions",
+    "deleted_revisions",
+    "failed_revisions"
+)
+
+# Classes --------------------------------------------------------------------->
+
+class LeaseCoordinator: # pylint: disable=unused-variable
+    """
+    Splits the deletion between cooperating instances: the document ID keyspace is hashed into ranges, each range
+    is claimed through a lease (renewed in the background while it is worked on; reclaimed by another instance once
+    expired), and every instance keeps a result shard (updated as ranges complete) that are merged into the summary
+    of the whole run
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, store, run_id, instance_id=None, ranges=DEFAULT_RANGES, ttl=DEFAULT_LEASE_TTL):
+        """
+        Constructor
+
+        - store: LocalDocumentLeaseStore / DirectoryLeaseStore shared by the instances.
+        - run_id: Identifier of the cooperative run (same for every instance).
+        - instance_id: Identifier of this instance (default: host name and process ID).
+        - ranges: Number of ranges of the document ID keyspace (same for every instance).
+        - ttl: Time (seconds) a lease is held without renewal.
+        """
+
+        # pylint: disable=too-many-arguments
+
+        self._store = store
+        self._run_id = run_id
+        self._instance_id = instance_id or get_instance_id()
+        self._ranges = ranges
+        self._ttl = ttl
+
+        self._lock = threading.Lock()
+        self._lease_range = None
+        self._lease = None # lease document of the range being worked on (with its current _rev)
+        self._lease_lost = False
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        # Instances start claiming at different ranges (fewer conflicting claims)
+
+        self._first_range = _get_hash(self._instance_id) % ranges
+
+        self._start_time = time.monotonic()
+        self._shard_revision = None
+        self._completed_ranges = []
+        self._totals = dict.fromkeys(SHARD_TOTALS, 0) # deletion counters of the completed ranges
+        self._total_claims = 0
+        self._total_reclaims = 0
+        self._total_conflicts = 0
+        self._total_renewals = 0
+        self._total_lost_leases = 0
+        self._waiting_time = 0 # seconds
+
+
+    def __str__(self):
+        """
+        Description of the coordination
+        """
+
+        return "run: {0}; instance: {1}; ranges: {2}; lease TTL: {3} s; store: {4}".format(
+            self._run_id, self._instance_id, self._ranges, self._ttl, self._store)
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def get_range(self, document_id):
+        """
+        Retrieve the keyspace range of a document (stable across instances)
+        """
+
+        return _get_hash(document_id) * self._ranges >> 32
+
+
+    def claim(self, logger=DEFAULT_LOGGER):
+        """
+        Claim the next available range (free, expired or previously held by this instance), waiting while the
+        remaining ranges are leased by other instances; returns None once every range is done
+        """
+
+        waiting_start_time = None
+
+        while True:
+            busy = False
+
+            for offset in range(self._ranges):
+                range_id = (self._first_range + offset) % self._ranges
+                status = self._try_claim(range_id)
+
+                if status is True:
+                    if waiting_start_time is not None:
+                        self._waiting_time += time.monotonic() - waiting_start_time
+                    return range_id
+
+                busy = busy or status is None
+
+            if not busy:
+                if waiting_start_time is not None:
+                    self._waiting_time += time.monotonic() - waiting_start_time
+                return None
+
+            if waiting_start_time is None:
+                waiting_start_time = time.monotonic()
+                logger.info("Remaining ranges leased by other instances. Waiting for them to complete or expire...")
+
+            time.sleep(self._ttl / RENEWALS_PER_TTL)
+
+
+    def is_held(self):
+        """
+        Check whether the lease of the current range is still held (renewed in time)
+        """
+
+        return not self._lease_lost
+
+
+    def complete(self, summary, logger=DEFAULT_LOGGER):
+        """
+        Mark the current range as done (with the deletion counters of the range)
+        """
+
+        self._stop_renewal()
+
+        with self._lock:
+            range_id = self._lease_range
+            lease = self._lease
+            self._lease = None
+            self._lease_range = None
+
+            if self._lease_lost:
+                logger.warning("Lease of range %d lost before completion. Range left to its new owner.", range_id)
+                return False
+
+            range_summary = {name: summary.get(name, 0) for name in SHARD_TOTALS}
+            document = dict(
+                lease,
+                state=STATE_DONE,
+                expires=None,
+                done_by=self._instance_id,
+                completed=datetime.datetime.now().isoformat(timespec="seconds"),
+                summary=range_summary)
+
+            if not self._store.write(self._get_range_name(range_id), document):
+                logger.error("Failed to complete range %d.", range_id)
+                return False
+
+            self._completed_ranges.append(range_id)
+
+            for name in SHARD_TOTALS:
+                self._totals[name] += range_summary[name]
+
+        logger.info("Completed range %d of %d.", range_id, self._ranges)
+
+        # Written after every range (not only once done): the work of a stopped instance is still merged
+
+        return self._write_shard()
+
+
+    def release(self):
+        """
+        Stop renewing the current lease (if any), e.g. when it was lost; it expires unless completed
+        """
+
+        self._stop_renewal()
+
+        with self._lock:
+            self._lease = None
+            self._lease_range = None
+
+
+    def merge_shards(self, logger=DEFAULT_LOGGER):
+        """
+        Merge the result shards of every instance that completed a range; returns the summary of the whole run
+        ("complete" once every range is done) or None on error
+        """
+
+        logger.info("Merging result shards...")
+
+        instances = set()
+        pending_ranges = []
+
+        for range_id in range(self._ranges):
+            lease = self._store.read(self._get_range_name(range_id))
+
+            if lease is None:
+                return None
+
+            if lease.get("state") == STATE_DONE:
+                instances.add(lease["done_by"])
+            else:
+                pending_ranges.append(range_id)
+
+        shards = {}
+
+        for instance_id in sorted(instances):
+            shard = self._store.read(self._get_shard_name(instance_id))
+
+            if shard is None:
+                return None
+
+            if not shard:
+                logger.warning("Result shard of instance %s not found.", instance_id)
+
+            shards[instance_id] = {
+                "ranges": shard.get("ranges", []),
+                "totals": shard.get("totals", {}),
+                "elapsed_s": shard.get("elapsed_s", 0)
+            }
+
+        merged = {
+            "run": self._run_id,
+            "ranges": self._ranges,
+            "complete": not pending_ranges,
+            "pending_ranges": pending_ranges,
+            "instances": shards,
+            "totals": {
+                name: sum(shard["totals"].get(name, 0) for shard in shards.values())
+                for name in SHARD_TOTALS
+            },
+            "elapsed_s": max((shard["elapsed_s"] for shard in shards.values()), default=0)
+        }
+
+        logger.info("Successfully merged result shards (instances: %d; ranges pending: %d).",
+            len(shards), len(pending_ranges))
+
+        return merged
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the coordination (this instance)
+        """
+
+        with self._lock:
+            return {
+                "run": self._run_id,
+                "instance": self._instance_id,
+                "ranges": self._ranges,
+                "lease_ttl_s": self._ttl,
+                "store": str(self._store),
+                "completed_ranges": sorted(self._completed_ranges),
+                "claims": self._total_claims,
+                "reclaims": self._total_reclaims,
+                "conflicting_claims": self._total_conflicts,
+                "renewals": self._total_renewals,
+                "lost_leases": self._total_lost_leases,
+                "waiting_s": round(self._waiting_time, 3)
+            }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _try_claim(self, range_id, logger=DEFAULT_LOGGER):
+        """
+        Try to claim a range; returns True if claimed, False if done, None if leased by another instance (or
+        claimed concurrently)
+        """
+
+        name = self._get_range_name(range_id)
+        lease = self._store.read(name)
+
+        if lease is None:
+            return None
+
+        if lease.get("state") == STATE_DONE:
+            return False
+
+        now = time.time()
+        owner = lease.get("owner")
+
+        if lease.get("state") == STATE_CLAIMED and owner != self._instance_id and lease.get("expires", 0) > now:
+            return None
+
+        document = dict(
+            lease,
+            run=self._run_id,
+            range=range_id,
+            ranges=self._ranges,
+            state=STATE_CLAIMED,
+            owner=self._instance_id,
+            expires=now + self._ttl,
+            claims=lease.get("claims", 0) + 1)
+
+        revision = self._store.write(name, document)
+
+        if not revision:
+            self._total_conflicts += 1
+            return None
+
+        reclaimed = lease.get("state") == STATE_CLAIMED and owner != self._instance_id
+
+        with self._lock:
+            self._lease_range = range_id
+            self._lease = dict(document, _rev=revision)
+            self._lease_lost = False
+            self._total_claims += 1
+            self._total_reclaims += reclaimed
+
+        if reclaimed:
+            logger.warning("Reclaimed expired lease of range %d (previous owner: %s).", range_id, owner)
+        else:
+            logger.info("Claimed range %d of %d.", range_id, self._ranges)
+
+        self._start_renewal()
+
+        return True
+
+
+    def _write_shard(self, logger=DEFAULT_LOGGER):
+        """
+        Write the result shard of this instance (ranges completed and their deletion counters)
+        """
+
+        name = self._get_shard_name(self._instance_id)
+
+        with self._lock:
+            document = {
+                "run": self._run_id,
+                "instance": self._instance_id,
+                "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+                "ranges": sorted(self._completed_ranges),
+                "totals": dict(self._totals),
+                "elapsed_s": round(time.monotonic() - self._start_time, 3)
+            }
+
+        if self._shard_revision:
+            document["_rev"] = self._shard_revision
+
+        revision = self._store.write(name, document)
+
+        if not revision:
+            logger.error("Failed to write result shard: %s.", name)
+            return False
+
+        self._shard_revision = revision
+
+        logger.debug("Successfully wrote result shard: %s.", name)
+
+        return True
+
+
+    def _start_renewal(self):
+        """
+        Start renewing the current lease in the background
+        """
+
+        self._stop_event.clear()
+
+        self._thread = threading.Thread(
+            target=self._renew,
+            name="lease-renewal",
+            daemon=True)
+        self._thread.start()
+
+
+    def _stop_renewal(self):
+        """
+        Stop renewing the current lease
+        """
+
+        if not self._thread:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+
+    def _renew(self, logger=DEFAULT_LOGGER):
+        """
+        Renewal loop: extend the lease every fraction of its time to live; a failed renewal (e.g. the lease expired
+        and was reclaimed by another instance) marks it as lost
+        """
+
+        while not self._stop_event.wait(self._ttl / RENEWALS_PER_TTL):
+            with self._lock:
+                range_id = self._lease_range
+                document = dict(self._lease, expires=time.time() + self._ttl)
+
+                revision = self._store.write(self._get_range_name(range_id), document)
+
+                if revision:
+                    self._lease = dict(document, _rev=revision)
+                    self._total_renewals += 1
+                    continue
+
+                self._lease_lost = True
+                self._total_lost_leases += 1
+
+            logger.warning("Failed to renew lease of range %d. Stopping work on the range.", range_id)
+            return
+
+
+    def _get_range_name(self, range_id):
+        """
+        Retrieve the document name of a range lease
+        """
+
+        return "{0}-{1}-range-{2}".format(DOCUMENT_NAME_PREFIX, self._run_id, range_id)
+
+
+    def _get_shard_name(self, instance_id):
+        """
+        Retrieve the document name of the result shard of an instance
+        """
+
+        return "{0}-{1}-shard-{2}".format(DOCUMENT_NAME_PREFIX, self._run_id, instance_id)
+
+
+# Public Functions ------------------------------------------------------------>
+
+def get_instance_id(): # pylint: disable=unused-variable
+    """
+    Retrieve the default identifier of this instance (host name and process ID)
+    """
+
+    return "{0}-{1}".format(socket.gethostname(), os.getpid())
+
+
+# Private Functions ----------------------------------------------------------->
+
+def _get_hash(value):
+    """
+    Hash a value into 32 bits (stable across processes, unlike hash())
+    """
+
+    return int(hashlib.sha1(value.encode("utf-8")).hexdigest()[:8], 16)
@@ -0,0 +1,205 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import os
+import json
+import logging
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+from lib.utils import error_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("lease_store")
+
+PROPERTY_REV = "_rev"
+
+LOCK_FILENAME = ".lock"
+DOCUMENT_FILE_EXTENSION = ".json"
+
+# Classes --------------------------------------------------------------------->
+
+class LocalDocumentLeaseStore: # pylint: disable=unused-variable
+    """
+    Lease and result shard documents stored as _local documents of the target database (never replicated); updates
+    are conditional on the current _rev, so that concurrent claims of the same lease conflict
+    """
+
+    def __init__(self, database):
+        """
+        Constructor
+
+        - database: CloudantDatabase being cleaned up (client initialized).
+        """
+
+        self._database = database
+
+
+    def __str__(self):
+        """
+        Description of the store
+        """
+
+        return "_local documents of {0}".format(self._database.get_location())
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def open(self):
+        """
+        Prepare the store (nothing to do)
+        """
+
+        return True
+
+
+    def read(self, name):
+        """
+        Retrieve a document; returns {} if it does not exist, None on error
+        """
+
+        return self._database.get_local_document(name)
+
+
+    def write(self, name, document):
+        """
+        Create or update a document (its _rev must be current); returns the new revision, None on conflict / error
+        """
+
+        return self._database.save_local_document(name, document)
+
+
+class DirectoryLeaseStore: # pylint: disable=unused-variable
+    """
+    Lease and result shard documents stored as JSON files of a directory shared by the instances (e.g. for testing
+    on a single host, or over a shared file system); updates are conditional on the current _rev, checked under an
+    exclusive lock of the directory
+    """
+
+    def __init__(self, directory):
+        """
+        Constructor
+
+        - directory: Shared directory (created if needed).
+        """
+
+        self._directory = directory
+
+
+    def __str__(self):
+        """
+        Description of the store
+        """
+
+        return "directory {0}".format(self._directory)
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def open(self, logger=DEFAULT_LOGGER):
+        """
+        Create the shared directory (if needed)
+        """
+
+        if fcntl is None:
+            logger.error("Directory lease store is not supported on this platform.")
+            return False
+
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+        except OSError as err:
+            logger.error("Failed to create lease directory: %s.", self._directory)
+            error_util.log_exception(logger, err)
+            return False
+
+        return True
+
+
+    def read(self, name, logger=DEFAULT_LOGGER):
+        """
+        Retrieve a document; returns {} if it does not exist, None on error
+        """
+
+        try:
+            return self._read_file(self._get_file(name))
+        except (OSError, ValueError) as err:
+            logger.error("Failed to read lease document: %s.", name)
+            error_util.log_exception(logger, err)
+            return None
+
+
+    def write(self, name, document, logger=DEFAULT_LOGGER):
+        """
+        Create or update a document (its _rev must be current); returns the new revision, None on conflict / error
+        """
+
+        file = self._get_file(name)
+
+        try:
+            with open(os.path.join(self._directory, LOCK_FILENAME), "a", encoding="utf-8") as lock_handle:
+                fcntl.flock(lock_handle, fcntl.LOCK_EX)
+
+                current = self._read_file(file)
+
+                if document.get(PROPERTY_REV) != current.get(PROPERTY_REV):
+                    logger.debug("Lease document updated concurrently: %s.", name)
+                    return None
+
+                generation = int(current[PROPERTY_REV].split("-")[1]) + 1 if current else 1
+                revision = "0-{0}".format(generation)
+                temporary_file = "{0}.tmp".format(file)
+
+                with open(temporary_file, "w", encoding="utf-8") as file_handle:
+                    json.dump(dict(document, _rev=revision), file_handle)
+
+                os.replace(temporary_file, file)
+        except (OSError, ValueError, TypeError) as err:
+            logger.error("Failed to write lease document: %s.", name)
+            error_util.log_exception(logger, err)
+            return None
+
+        return revision
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _get_file(self, name):
+        """
+        Retrieve the file of a document
+        """
+
+        return os.path.join(self._directory, name + DOCUMENT_FILE_EXTENSION)
+
+
+    @staticmethod
+    def _read_file(file):
+        """
+        Read a document file ({} if it does not exist)
+        """
+
+        try:
+            with open(file, "r", encoding="utf-8") as file_handle:
+                return json.load(file_handle)
+        except FileNotFoundError:
+            return {}
@@ -0,0 +1,291 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import logging
+import threading
+
+from lib.utils import request_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("load_monitor")
+
+DEFAULT_INTERVAL = 10 # seconds between samples
+DEFAULT_MAX_TASKS = 2 # background tasks at which the cluster is considered under pressure
+DEFAULT_LATENCY_FACTOR = 2.0 # latency (relative to the baseline) at which the cluster is considered under pressure
+DEFAULT_MIN_SCALE = 0.1 # lowest fraction of the configured concurrency / rate
+
+SCALE_DOWN_FACTOR = 0.5 # multiplicative decrease under pressure
+SCALE_UP_STEP = 0.25 # additive increase while idle
+
+MIN_LATENCY_SAMPLES = 5 # requests of an operation in a sample interval required to evaluate its latency
+BASELINE_SMOOTHING = 0.2 # weight of a new (healthy) sample in the latency baseline
+
+# Cluster activity competing with the cleanup for I/O
+BACKGROUND_TASK_TYPES = frozenset(("indexer", "database_compaction", "view_compaction", "replication"))
+
+# Requests neither gated nor evaluated (authentication, the monitor samples themselves)
+UNMONITORED_OPERATIONS = frozenset((request_util.OPERATION_SESSION, request_util.OPERATION_ACTIVE_TASKS))
+
+# Classes --------------------------------------------------------------------->
+
+class LoadMonitor: # pylint: disable=unused-variable
+    """
+    Backs off while the cluster is busy with other work: a background thread periodically samples the cluster
+    activity (/_active_tasks: indexing, compaction, replication) and the latency trend of the recent requests,
+    halves the concurrency (in-flight request attempts) and rates while the cluster is under pressure and restores
+    them gradually once it is idle; safe to share between threads
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, metrics, concurrency, limiters=(), interval=DEFAULT_INTERVAL, max_tasks=DEFAULT_MAX_TASKS,
+            latency_factor=DEFAULT_LATENCY_FACTOR, min_scale=DEFAULT_MIN_SCALE):
+        """
+        Constructor
+
+        - metrics: RequestMetrics of the requests sent (latency trend).
+        - concurrency: Configured number of in-flight request attempts (full speed).
+        - limiters: RateLimiter / CapacityScheduler instances scaled along with the concurrency.
+        - interval: Time (seconds) between samples.
+        - max_tasks: Number of background tasks (indexing, compaction, replication) at which the cluster is
+          considered under pressure.
+        - latency_factor: Latency, relative to the baseline of each operation, at which the cluster is considered
+          under pressure (0 = latency not evaluated).
+        - min_scale: Lowest fraction (0 - 1) of the configured concurrency and rates.
+        """
+
+        # pylint: disable=too-many-arguments
+
+        self._metrics = metrics
+        self._concurrency = concurrency
+        self._limiters = limiters
+        self._interval = interval
+        self._max_tasks = max_tasks
+        self._latency_factor = latency_factor
+        self._min_scale = min_scale
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._concurrency_limit = concurrency
+        self._scale = 1.0
+
+        self._database = None
+        self._sample_tasks = True
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._latency_totals = {} # operation -> (requests, total latency) at the previous sample
+        self._latency_baselines = {} # operation -> healthy mean latency (seconds)
+
+        self._total_samples = 0
+        self._total_pressured_samples = 0
+        self._total_scale_downs = 0
+        self._total_scale_ups = 0
+        self._min_observed_scale = 1.0
+        self._max_background_tasks = 0
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def start(self, database):
+        """
+        Start sampling the cluster activity (see: CloudantDatabase.get_active_tasks)
+        """
+
+        self._database = database
+        self._stop_event.clear()
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name="load-monitor",
+            daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        """
+        Stop sampling (the current scale is kept)
+        """
+
+        if not self._thread:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+
+    def acquire(self, operation):
+        """
+        Wait until a request attempt may be sent (in-flight attempts below the current concurrency limit)
+        """
+
+        if operation in UNMONITORED_OPERATIONS:
+            return
+
+        with self._condition:
+            while self._in_flight >= self._concurrency_limit:
+                self._condition.wait()
+
+            self._in_flight += 1
+
+
+    def release(self, operation):
+        """
+        Release the slot of a completed request attempt
+        """
+
+        if operation in UNMONITORED_OPERATIONS:
+            return
+
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the load-aware throttling
+        """
+
+        with self._condition:
+            return {
+                "scale": self._scale,
+                "min_scale": self._min_observed_scale,
+                "samples": self._total_samples,
+                "pressured_samples": self._total_pressured_samples,
+                "scale_downs": self._total_scale_downs,
+                "scale_ups": self._total_scale_ups,
+                "max_background_tasks": self._max_background_tasks
+            }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _run(self):
+        """
+        Sampling loop
+        """
+
+        while not self._stop_event.wait(self._interval):
+            self._sample()
+
+
+    def _sample(self, logger=DEFAULT_LOGGER):
+        """
+        Sample the cluster activity and latency trend, then scale down (pressure), up (idle) or hold
+        """
+
+        tasks = self._database.get_active_tasks() if self._sample_tasks else None
+        task_counts = {}
+
+        if tasks is None and self._sample_tasks:
+            # Unavailable (e.g. not permitted for the API key)
+            self._sample_tasks = False
+            logger.warning("Active tasks unavailable. Evaluating the request latency trend only.")
+
+        for task in tasks or []:
+            task_type = task.get("type")
+            if task_type in BACKGROUND_TASK_TYPES:
+                task_counts[task_type] = task_counts.get(task_type, 0) + 1
+
+        background_tasks = sum(task_counts.values())
+        latency_ratio = self._get_latency_ratio()
+
+        pressured = background_tasks >= self._max_tasks or 0 < self._latency_factor <= latency_ratio
+        idle = background_tasks == 0 and not pressured
+
+        with self._condition:
+            self._total_samples += 1
+            self._total_pressured_samples += pressured
+            self._max_background_tasks = max(self._max_background_tasks, background_tasks)
+
+        if pressured and self._scale > self._min_scale:
+            scale = max(self._scale * SCALE_DOWN_FACTOR, self._min_scale)
+            self._set_scale(scale)
+            logger.warning("Cluster under pressure (background tasks: %s; latency: x%.1f). Scaling down to %d%% "
+                "(concurrency: %d).",
+                ", ".join("{0} {1}".format(name, count) for name, count in sorted(task_counts.items())) or "none",
+                latency_ratio,
+                round(scale * 100),
+                self._concurrency_limit)
+        elif idle and self._scale < 1.0:
+            scale = min(self._scale + SCALE_UP_STEP, 1.0)
+            self._set_scale(scale)
+            logger.info("Cluster idle. Scaling up to %d%% (concurrency: %d).",
+                round(scale * 100),
+                self._concurrency_limit)
+
+
+    def _set_scale(self, scale):
+        """
+        Apply a new fraction of the configured concurrency and rates
+        """
+
+        with self._condition:
+            if scale < self._scale:
+                self._total_scale_downs += 1
+            else:
+                self._total_scale_ups += 1
+
+            self._scale = scale
+            self._min_observed_scale = min(self._min_observed_scale, scale)
+            self._concurrency_limit = max(1, round(self._concurrency * scale))
+            self._condition.notify_all()
+
+        for limiter in self._limiters:
+            limiter.set_scale(scale)
+
+
+    def _get_latency_ratio(self):
+        """
+        Compare the mean latency of each operation since the previous sample with its baseline; returns the highest
+        ratio (1 = as usual)
+        """
+
+        ratio = 1.0
+
+        for operation, item in self._metrics.get_summary().items():
+            if operation in UNMONITORED_OPERATIONS:
+                continue
+
+            requests = item["requests"]
+            total_latency = item["latency_s"]["mean"] * requests
+            previous_requests, previous_total_latency = self._latency_totals.get(operation, (0, 0))
+            self._latency_totals[operation] = (requests, total_latency)
+
+            if requests - previous_requests < MIN_LATENCY_SAMPLES:
+                continue
+
+            latency = (total_latency - previous_total_latency) / (requests - previous_requests)
+            baseline = self._latency_baselines.get(operation)
+
+            if baseline is None or baseline <= 0:
+                self._latency_baselines[operation] = latency
+                continue
+
+            ratio = max(ratio, latency / baseline)
+
+            # Only healthy samples move the baseline (a sustained slowdown must not become the new normal)
+
+            if self._latency_factor <= 0 or latency < baseline * self._latency_factor:
+                self._latency_baselines[operation] = baseline + BASELINE_SMOOTHING * (latency - baseline)
+
+        return ratio
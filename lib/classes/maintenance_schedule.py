@@ -0,0 +1,173 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import datetime
+
+# Globals
+
+MINUTES_PER_DAY = 24 * 60
+
+DEFAULT_SCALE = 1.0 # outside of every window (full speed)
+
+DEFAULT_WINDOW = "*"
+
+SPECIFICATION_HELP = "HH:MM-HH:MM=PERCENT[,HH:MM-HH:MM=PERCENT...][,*=PERCENT]" # pylint: disable=unused-variable
+
+# Classes --------------------------------------------------------------------->
+
+class MaintenanceSchedule: # pylint: disable=unused-variable
+    """
+    Daily throughput curve: windows of the local time of day (e.g. 01:00-05:00), each with the fraction of full
+    speed allowed while it is open (0 = paused); the first matching window wins
+    """
+
+    def __init__(self, windows, default_scale=DEFAULT_SCALE):
+        """
+        Constructor
+
+        - windows: List of (start minute, end minute, scale) of the day; a window ending before it starts wraps
+          around midnight.
+        - default_scale: Fraction of full speed outside of every window.
+        """
+
+        self._windows = windows
+        self._default_scale = default_scale
+
+
+    def __str__(self):
+        """
+        Specification of the schedule (see: parse_schedule)
+        """
+
+        items = [
+            "{0}-{1}={2:g}".format(_format_minute(start), _format_minute(end), scale * 100)
+            for start, end, scale in self._windows
+        ]
+        items.append("{0}={1:g}".format(DEFAULT_WINDOW, self._default_scale * 100))
+
+        return ",".join(items)
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def get_scale(self, now=None):
+        """
+        Retrieve the fraction (0 - 1) of full speed allowed at the specified local time (default: now)
+        """
+
+        now = now or datetime.datetime.now()
+        minute = now.hour * 60 + now.minute
+
+        for start, end, scale in self._windows:
+            if start <= end:
+                if start <= minute < end:
+                    return scale
+            elif minute >= start or minute < end:
+                return scale
+
+        return self._default_scale
+
+
+    def get_next_change(self, now=None):
+        """
+        Retrieve the local time of the next window boundary (None if there is no window)
+        """
+
+        now = now or datetime.datetime.now()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        boundaries = []
+
+        for start, end, _ in self._windows:
+            for minute in (start, end):
+                boundary = today + datetime.timedelta(minutes=minute)
+                if boundary <= now:
+                    boundary += datetime.timedelta(days=1)
+                boundaries.append(boundary)
+
+        return min(boundaries) if boundaries else None
+
+
+# Public Functions ------------------------------------------------------------>
+
+def parse_schedule(specification): # pylint: disable=unused-variable
+    """
+    Parse a schedule specification (e.g. "01:00-05:00=100,07:00-19:00=0,*=10": full speed from 1 to 5 AM, paused
+    during business hours, 10% otherwise); raises ValueError if invalid
+    """
+
+    windows = []
+    default_scale = DEFAULT_SCALE
+
+    for item in specification.split(","):
+        window, separator, percent = item.strip().partition("=")
+
+        if not separator:
+            raise ValueError("Missing throughput percentage: {0}.".format(item))
+
+        try:
+            scale = float(percent) / 100
+        except ValueError:
+            raise ValueError("Invalid throughput percentage: {0}.".format(item)) from None
+
+        if not 0 <= scale <= 1:
+            raise ValueError("Throughput percentage out of range (0 - 100): {0}.".format(item))
+
+        if window == DEFAULT_WINDOW:
+            default_scale = scale
+            continue
+
+        start, separator, end = window.partition("-")
+
+        if not separator:
+            raise ValueError("Invalid window (expected HH:MM-HH:MM): {0}.".format(item))
+
+        start = _parse_minute(start)
+        end = _parse_minute(end)
+
+        if start == end:
+            raise ValueError("Empty window: {0}.".format(item))
+
+        windows.append((start, end, scale))
+
+    return MaintenanceSchedule(windows, default_scale)
+
+
+# Private Functions ----------------------------------------------------------->
+
+def _parse_minute(value):
+    """
+    Parse a time of day (HH:MM) into the minute of the day; raises ValueError if invalid
+    """
+
+    hours, separator, minutes = value.strip().partition(":")
+
+    if not separator or not hours.isdigit() or not minutes.isdigit() or \
+            not 0 <= int(hours) <= 24 or not 0 <= int(minutes) < 60:
+        raise ValueError("Invalid time of day (expected HH:MM): {0}.".format(value))
+
+    return (int(hours) * 60 + int(minutes)) % MINUTES_PER_DAY
+
+
+def _format_minute(minute):
+    """
+    Format a minute of the day (HH:MM)
+    """
+
+    return "{0:02d}:{1:02d}".format(minute // 60, minute % 60)
@@ -0,0 +1,547 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import csv
+import time
+import logging
+import threading
+import concurrent.futures
+
+from lib.constants import constants
+from lib.classes.task_interface import TaskInterface
+from lib.classes import progress_reporter
+from lib.classes import trace_recorder
+from lib.classes import merge_strategy
+from lib.utils import error_util
+from lib.utils import statistics_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("merge_conflicts_task")
+
+DEFAULT_BATCH_SIZE = 500 # leaf revisions per _bulk_get / _bulk_docs request
+
+DEFAULT_CONCURRENCY = 1 # batches processed in parallel
+
+# Batches queued per worker (bounds memory while keeping workers busy)
+QUEUED_BATCHES_PER_WORKER = 2
+
+PROPERTY_ATTACHMENTS = "_attachments"
+
+# Classes --------------------------------------------------------------------->
+
+class MergeConflictsTask(TaskInterface): # pylint: disable=unused-variable
+    """
+    Resolves the conflicted documents by merging their leaf revisions instead of keeping the winner picked by the
+    server: fetches the winning and conflicted revisions of a batch of documents with a single _bulk_get request,
+    applies the merge strategy to each document, then writes the new winning revisions with a single _bulk_docs
+    request, and the tombstones of the conflicted revisions of the documents merged with a second one
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, database, conflicts, csv_file, strategy, strategy_name, batch_size=DEFAULT_BATCH_SIZE,
+            concurrency=DEFAULT_CONCURRENCY, tracer=None):
+        """
+        Constructor
+
+        - database: CloudantDatabase (opened).
+        - conflicts: Conflicts view rows of the documents to resolve (ID, name, conflicted revisions).
+        - csv_file: CSV file of the resolved documents.
+        - strategy: Callable merging the leaf revisions of a document (winner first) into the content of the new
+          winning revision; None leaves the document unresolved (see: merge_strategy).
+        - strategy_name: Merge strategy specification (summary).
+        - batch_size: Maximum number of leaf revisions per request (a larger document is processed on its own).
+        - concurrency: Number of batches processed in parallel.
+        - tracer: TraceRecorder (optional).
+        """
+
+        # pylint: disable=too-many-arguments
+
+        self._database = database
+        self._conflicts = conflicts or []
+        self._csv_file = csv_file
+        self._strategy = strategy
+        self._strategy_name = strategy_name
+        self._batch_size = batch_size
+        self._concurrency = concurrency
+        self._tracer = tracer
+
+        self._lock = threading.Lock()
+        self._touched_rows = [] # documents processed by this run (see: VerifyConflictsTask)
+        self._csv_file_handle = None
+        self._csv_file_writer = None
+
+        self._total_conflicted_documents = 0
+        self._total_resolved_documents = 0
+        self._total_merged_documents = 0
+        self._total_unresolved_documents = 0
+        self._total_conflicted_revisions = 0
+        self._total_deleted_revisions = 0
+        self._total_failed_revisions = 0
+        self._total_batches = 0
+        self._elapsed_time = 0 # seconds
+
+
+    def __del__(self):
+        """
+        Destructor
+        """
+
+        self._shutdown_csv_file()
+
+
+    def __str__(self):
+        """
+        Merge details (summary content)
+        """
+
+        line = '=' * 80
+        result = [
+            "",
+            line,
+            "Merge Details",
+            line,
+            "",
+            "- Merge Strategy:                     {0}".format(self._strategy_name),
+            "- Total Conflicted Documents:         {0}".format(self._total_conflicted_documents),
+            "- Total Resolved Documents:           {0}".format(self._total_resolved_documents),
+            "- Total Merged Documents:             {0}".format(self._total_merged_documents),
+            "- Total Unresolved Documents:         {0}".format(self._total_unresolved_documents),
+            "- Total Conflicted Revisions:         {0}".format(self._total_conflicted_revisions),
+            "- Total Deleted Revisions:            {0}".format(self._total_deleted_revisions),
+            "- Total Failed Revisions:             {0}".format(self._total_failed_revisions),
+            "- Total Requests (batches):           {0}".format(self._total_batches),
+            "- Elapsed Time:                       {0:.3f} s".format(self._elapsed_time),
+            "- Throughput:                         {0:.1f} docs/s, {1:.1f} revs/s".format(
+                statistics_util.get_rate(self._total_conflicted_documents, self._elapsed_time),
+                statistics_util.get_rate(self._total_deleted_revisions, self._elapsed_time)),
+            ""
+        ]
+
+        return "\n".join(result)
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def run(self, logger=DEFAULT_LOGGER):
+        """
+        Merge the conflicted documents batch by batch (sequentially or with a pool of workers)
+        """
+
+        logger.info("Merging document conflicts: %d (strategy: %s; batches of %d revisions)...",
+            len(self._conflicts), self._strategy_name, self._batch_size)
+
+        start_time = time.monotonic()
+
+        self._init_csv_file()
+
+        batches = self._get_batches()
+
+        if self._concurrency > 1:
+            self._process_batches_concurrently(batches)
+        else:
+            for batch in batches:
+                self._process_batch(batch)
+
+        self._shutdown_csv_file()
+
+        self._elapsed_time = time.monotonic() - start_time
+
+        if self._total_unresolved_documents:
+            logger.warning("Merged document conflicts: %d resolved. Unresolved documents: %d.",
+                self._total_resolved_documents, self._total_unresolved_documents)
+        else:
+            logger.info("Successfully merged document conflicts: %d resolved (%d ms).",
+                self._total_resolved_documents, self._elapsed_time * 1000)
+
+        return True
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the merge results (same totals as the deletion results)
+        """
+
+        with self._lock:
+            return {
+                "strategy": self._strategy_name,
+                "conflicted_documents": self._total_conflicted_documents,
+                "resolved_documents": self._total_resolved_documents,
+                "merged_documents": self._total_merged_documents,
+                "unresolved_documents": self._total_unresolved_documents,
+                "conflicted_revisions": self._total_conflicted_revisions,
+                "deleted_revisions": self._total_deleted_revisions,
+                "failed_revisions": self._total_failed_revisions,
+                "batches": self._total_batches,
+                "elapsed_s": self._elapsed_time,
+                "documents_per_s": statistics_util.get_rate(self._total_conflicted_documents, self._elapsed_time),
+                "revisions_per_s": statistics_util.get_rate(self._total_deleted_revisions, self._elapsed_time)
+            }
+
+
+    def get_touched_documents(self):
+        """
+        Retrieve the conflicts view rows of the documents processed by this run
+        """
+
+        with self._lock:
+            return list(self._touched_rows)
+
+
+    def get_progress(self):
+        """
+        Snapshot of the merge progress counters (see: ProgressReporter)
+        """
+
+        return {
+            progress_reporter.PROGRESS_PROCESSED: self._total_conflicted_documents,
+            progress_reporter.PROGRESS_CONFLICTS: self._total_conflicted_revisions,
+            progress_reporter.PROGRESS_DELETED_REVISIONS: self._total_deleted_revisions,
+            progress_reporter.PROGRESS_ERRORS: self._total_failed_revisions,
+            progress_reporter.PROGRESS_ATTEMPTS: self._total_deleted_revisions + self._total_failed_revisions,
+            progress_reporter.PROGRESS_QUEUE_DEPTH: len(self._conflicts) - self._total_conflicted_documents
+        }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _get_batches(self):
+        """
+        Group the documents into batches of at most batch size leaf revisions (winner included)
+        """
+
+        batches = []
+        batch = []
+        revision_count = 0
+
+        for row in self._conflicts:
+            leaves = len(row[constants.PROPERTY_VALUE]) + 1
+
+            if batch and revision_count + leaves > self._batch_size:
+                batches.append(batch)
+                batch = []
+                revision_count = 0
+
+            batch.append(row)
+            revision_count += leaves
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+
+    def _process_batches_concurrently(self, batches, logger=DEFAULT_LOGGER):
+        """
+        Process the batches with a pool of workers (bounded number of queued batches)
+        """
+
+        logger.info("Processing merge batches with %d workers...", self._concurrency)
+
+        max_pending = self._concurrency * QUEUED_BATCHES_PER_WORKER
+        pending = set()
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._concurrency,
+                thread_name_prefix="merge-worker") as executor:
+
+            for batch in batches:
+                if len(pending) >= max_pending:
+                    done, pending = concurrent.futures.wait(
+                        pending,
+                        return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+
+                pending.add(executor.submit(self._process_batch, batch))
+
+            for future in concurrent.futures.as_completed(pending):
+                future.result()
+
+
+    def _process_batch(self, rows, logger=DEFAULT_LOGGER):
+        """
+        Merge a batch of documents: one _bulk_get request (winning and conflicted revisions), one _bulk_docs
+        request for the new winning revisions, then one for the tombstones of the documents whose new winning
+        revision was written (_bulk_docs is not atomic: the conflicted revisions of a document whose merge failed
+        are left for a later run)
+        """
+
+        trace_timestamp = self._tracer.get_timestamp() if self._tracer else 0
+
+        with self._lock:
+            self._total_batches += 1
+            self._total_conflicted_documents += len(rows)
+            self._total_conflicted_revisions += sum(len(row[constants.PROPERTY_VALUE]) for row in rows)
+            self._touched_rows.extend(rows)
+
+        revisions = []
+
+        for row in rows:
+            revisions.append((row[constants.PROPERTY_ID], None))
+            revisions.extend((row[constants.PROPERTY_ID], revision) for revision in row[constants.PROPERTY_VALUE])
+
+        documents = self._database.get_revisions(revisions)
+
+        if documents is None:
+            logger.error("Failed to retrieve the revisions of the merge batch: %d documents (from: %s).",
+                len(rows), rows[0][constants.PROPERTY_ID])
+            self._track_failed_rows(rows)
+            return
+
+        resolutions = []
+
+        for row in rows:
+            resolution = self._resolve(row, documents)
+
+            if resolution is None:
+                self._track_failed_rows([row])
+                continue
+
+            resolutions.append(resolution)
+
+        # New winning revisions first: a document whose new winning revision is not written keeps its conflicts
+
+        merged = [resolution for resolution in resolutions if resolution["winner"] is not None]
+        results = self._database.update_documents([resolution["winner"] for resolution in merged]) if merged else []
+
+        if results is None:
+            logger.error("Failed to write the new winning revisions of the merge batch: %d documents (from: %s).",
+                len(merged), rows[0][constants.PROPERTY_ID])
+            results = [{}] * len(merged)
+
+        for resolution, result in zip(merged, results):
+            resolution["winner_result"] = result
+
+        written = [resolution for resolution in resolutions if self._is_winner_written(resolution)]
+
+        for resolution in resolutions:
+            if resolution not in written:
+                self._track_failed_rows([resolution["row"]])
+
+        # Then the tombstones of the conflicted revisions, in order
+
+        tombstones = []
+
+        for resolution in written:
+            resolution["offset"] = len(tombstones)
+            tombstones.extend(resolution["tombstones"])
+
+        results = self._database.update_documents(tombstones) if tombstones else []
+
+        if results is None:
+            logger.error("Failed to write the tombstones of the merge batch: %d documents (from: %s).",
+                len(written), rows[0][constants.PROPERTY_ID])
+            results = [{}] * len(tombstones)
+
+        for resolution in written:
+            offset = resolution["offset"]
+            self._track_results(resolution, results[offset:offset + len(resolution["tombstones"])])
+
+        if self._tracer:
+            self._tracer.add_complete_event(
+                "merge_batch",
+                trace_recorder.CATEGORY_DELETE,
+                trace_timestamp,
+                {"documents": len(rows), "revisions": len(revisions), "writes": len(merged) + len(tombstones)})
+
+
+    def _resolve(self, row, documents, logger=DEFAULT_LOGGER):
+        """
+        Apply the merge strategy to a document; returns its resolution (row, new winning revision, if merged, and
+        tombstones to write), or None if the document cannot be resolved
+        """
+
+        document_id = row[constants.PROPERTY_ID]
+        winner = documents.get((document_id, None))
+
+        if winner is None:
+            logger.warning("Not merging document: %s. Winning revision missing or deleted.", document_id)
+            return None
+
+        # Conflicted revisions already gone (e.g. deleted in the meantime) need no tombstone
+
+        losers = [
+            documents[(document_id, revision)] for revision in row[constants.PROPERTY_VALUE]
+            if documents.get((document_id, revision)) is not None and revision != winner["_rev"]
+        ]
+
+        try:
+            content = self._strategy([winner] + losers)
+        except Exception as err: # pylint: disable=broad-except
+            logger.error("Merge strategy failed: %s. Document ID: %s.", self._strategy_name, document_id)
+            error_util.log_exception(logger, err)
+            return None
+
+        if content is None:
+            logger.warning("Not merging document: %s. Left unresolved by the merge strategy.", document_id)
+            return None
+
+        # The new winning revision extends the current one (whose attachments are kept); unchanged content is not
+        # written again
+
+        body = None
+
+        if content != merge_strategy.get_content(winner):
+            body = dict(content, _id=document_id, _rev=winner["_rev"])
+
+            if PROPERTY_ATTACHMENTS in winner:
+                body[PROPERTY_ATTACHMENTS] = winner[PROPERTY_ATTACHMENTS]
+
+        return {
+            "row": row,
+            "winner": body,
+            "winner_result": None,
+            "tombstones": [{"_id": document_id, "_rev": loser["_rev"], "_deleted": True} for loser in losers]
+        }
+
+
+    @staticmethod
+    def _is_winner_written(resolution, logger=DEFAULT_LOGGER):
+        """
+        Check whether the new winning revision of a document was written (or none was needed)
+        """
+
+        if resolution["winner"] is None:
+            return True
+
+        result = resolution["winner_result"]
+
+        if result.get("ok"):
+            return True
+
+        logger.warning("Failed to write merged revision: %s. Revision: %s (%s: %s). Conflicted revisions left for a "
+            "later run.", resolution["row"][constants.PROPERTY_ID], resolution["winner"]["_rev"],
+            result.get("error"), result.get("reason"))
+
+        return False
+
+
+    def _track_results(self, resolution, results, logger=DEFAULT_LOGGER):
+        """
+        Track the tombstone write results of a document whose new winning revision (if merged) was written, and
+        serialize it
+        """
+
+        row = resolution["row"]
+        document_id = row[constants.PROPERTY_ID]
+        winner_revision = resolution["winner_result"].get("rev") if resolution["winner"] is not None else None
+        deleted_revisions = []
+
+        for doc, result in zip(resolution["tombstones"], results):
+            if result.get("ok"):
+                deleted_revisions.append(doc["_rev"])
+            else:
+                logger.warning("Failed to write merged revision: %s. Revision: %s (%s: %s).",
+                    document_id, doc["_rev"], result.get("error"), result.get("reason"))
+
+        # Conflicted revisions already gone (no tombstone written) are not failures
+
+        failed = len(resolution["tombstones"]) - len(deleted_revisions)
+
+        with self._lock:
+            self._total_deleted_revisions += len(deleted_revisions)
+            self._total_failed_revisions += failed
+
+            if failed:
+                self._total_unresolved_documents += 1
+            else:
+                self._total_resolved_documents += 1
+                if resolution["winner"] is not None:
+                    self._total_merged_documents += 1
+
+        self._serialize_csv_fields(row, deleted_revisions, winner_revision)
+
+
+    def _track_failed_rows(self, rows):
+        """
+        Track documents left unresolved (none of their conflicted revisions deleted)
+        """
+
+        with self._lock:
+            self._total_unresolved_documents += len(rows)
+            self._total_failed_revisions += sum(len(row[constants.PROPERTY_VALUE]) for row in rows)
+
+        for row in rows:
+            self._serialize_csv_fields(row, [], None)
+
+
+    def _init_csv_file(self, logger=DEFAULT_LOGGER):
+        """
+        Open CSV file
+        """
+
+        logger.info("Opening CSV file: %s...", self._csv_file)
+
+        self._csv_file_handle = open(self._csv_file, "w", newline="", encoding="utf-8")
+
+        fieldnames = [
+            constants.CSV_FIELD_ID,
+            constants.CSV_FIELD_NAME,
+            constants.CSV_FIELD_CONFLICTS,
+            constants.CSV_FIELD_DELETED,
+            constants.CSV_FIELD_REVISIONS,
+            constants.CSV_FIELD_WINNER
+        ]
+
+        self._csv_file_writer = csv.DictWriter(
+            f=self._csv_file_handle,
+            fieldnames=fieldnames,
+            dialect="excel")
+
+        self._csv_file_writer.writeheader()
+
+        logger.info("Successfully Opened CSV file: %s.", self._csv_file)
+
+
+    def _shutdown_csv_file(self, logger=DEFAULT_LOGGER):
+        """
+        Close CSV file
+        """
+
+        if self._csv_file_handle:
+            logger.info("Closing CSV file: %s...", self._csv_file)
+            self._csv_file_handle.close()
+            logger.info("Successfully closed CSV file: %s.", self._csv_file)
+            self._csv_file_handle = None
+
+
+    def _serialize_csv_fields(self, row, deleted_revisions, winner_revision, logger=DEFAULT_LOGGER):
+        """
+        Serialize a document to CSV file record (winner: new winning revision, if merged)
+        """
+
+        document_id = row[constants.PROPERTY_ID]
+
+        try:
+            with self._lock:
+                self._csv_file_writer.writerow({
+                    constants.CSV_FIELD_ID: document_id,
+                    constants.CSV_FIELD_NAME: row[constants.PROPERTY_KEY],
+                    constants.CSV_FIELD_CONFLICTS: len(row[constants.PROPERTY_VALUE]),
+                    constants.CSV_FIELD_DELETED: len(deleted_revisions),
+                    constants.CSV_FIELD_REVISIONS: "; ".join(deleted_revisions),
+                    constants.CSV_FIELD_WINNER: winner_revision or ""
+                })
+        except ValueError as err:
+            message = "Failed to write CSV row to file: %s. Document ID: %s."
+            logger.error(message, self._csv_file, document_id)
+            error_util.log_exception(logger, err)
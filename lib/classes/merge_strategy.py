@@ -0,0 +1,137 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import datetime
+import functools
+import importlib
+
+from lib.constants import constants
+
+# Globals
+
+# Built-in strategies (a strategy maps the leaf revisions of a document, winner first, to the content of the new
+# winning revision; None leaves the document unresolved)
+STRATEGY_LATEST = "latest" # the most recently updated revision wins
+STRATEGY_FIELDS = "fields" # field-wise merge: the most recently updated value of every (top-level) field wins
+
+DEFAULT_TIMESTAMP_FIELD = "updated"
+
+# Public Functions ------------------------------------------------------------>
+
+def load_strategy(specification, timestamp_field=DEFAULT_TIMESTAMP_FIELD): # pylint: disable=unused-variable
+    """
+    Load a merge strategy from a built-in strategy name or a custom callable (MODULE:FUNCTION, called with the leaf
+    revisions of a document, winner first); raises ValueError when invalid
+    """
+
+    if specification == STRATEGY_LATEST:
+        return functools.partial(merge_latest, timestamp_field=timestamp_field)
+
+    if specification == STRATEGY_FIELDS:
+        return functools.partial(merge_fields, timestamp_field=timestamp_field)
+
+    module_name, _, function_name = specification.partition(":")
+
+    if not module_name or not function_name:
+        raise ValueError("Unknown merge strategy: {0} (expected: {1}).".format(specification,
+            constants.MERGE_STRATEGY_HELP))
+
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as err:
+        raise ValueError("Invalid merge strategy: {0} ({1}).".format(specification, err)) from err
+
+    strategy = getattr(module, function_name, None)
+
+    if not callable(strategy):
+        raise ValueError("Invalid merge strategy: {0} (not a function).".format(specification))
+
+    return strategy
+
+
+def merge_latest(revisions, timestamp_field=DEFAULT_TIMESTAMP_FIELD): # pylint: disable=unused-variable
+    """
+    Content of the most recently updated revision (the current winner on a tie, or without timestamps)
+    """
+
+    return get_content(_sort_by_timestamp(revisions, timestamp_field)[-1])
+
+
+def merge_fields(revisions, timestamp_field=DEFAULT_TIMESTAMP_FIELD): # pylint: disable=unused-variable
+    """
+    Field-wise merge: the value of every top-level field comes from the most recently updated revision that has it
+    (a field removed by the latest revision is kept from the older ones)
+    """
+
+    merged = {}
+
+    for revision in _sort_by_timestamp(revisions, timestamp_field):
+        merged.update(get_content(revision))
+
+    return merged
+
+
+def get_content(document): # pylint: disable=unused-variable
+    """
+    Document content, without the special (underscore) properties
+    """
+
+    return {name: value for name, value in document.items() if not name.startswith("_")}
+
+
+# Private Functions ----------------------------------------------------------->
+
+def _sort_by_timestamp(revisions, timestamp_field):
+    """
+    Revisions from the least to the most recently updated; revisions without a (valid) timestamp come first, and
+    the current winner (first revision) comes last among equal timestamps
+    """
+
+    keys = [_get_timestamp(revision.get(timestamp_field)) for revision in revisions]
+    order = sorted(
+        range(len(revisions)),
+        key=lambda index: (keys[index] is not None, keys[index] or 0, index == 0))
+
+    return [revisions[index] for index in order]
+
+
+def _get_timestamp(value):
+    """
+    Timestamp (epoch seconds) of a number (epoch seconds or milliseconds) or an ISO 8601 string; None if invalid
+    """
+
+    if isinstance(value, bool):
+        return None
+
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+
+    if not isinstance(value, str):
+        return None
+
+    try:
+        timestamp = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+
+    return timestamp.timestamp()
@@ -0,0 +1,166 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from lib.utils import error_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("metrics_server")
+
+DEFAULT_HOST = "127.0.0.1"
+
+METRICS_PATH = "/metrics"
+HEALTH_PATH = "/health"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+JSON_CONTENT_TYPE = "application/json"
+
+# Classes --------------------------------------------------------------------->
+
+class MetricsServer: # pylint: disable=unused-variable
+    """
+    Local HTTP endpoint exposing the request metrics in the Prometheus text format (and the health of a long-running
+    task, if any)
+    """
+
+    def __init__(self, metrics, port, host=DEFAULT_HOST):
+        """
+        Constructor
+        """
+
+        self._metrics = metrics
+        self._port = port
+        self._host = host
+        self._health_check = None
+
+        self._server = None
+        self._thread = None
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def start(self, logger=DEFAULT_LOGGER):
+        """
+        Start serving metrics in a background thread
+        """
+
+        logger.info("Starting metrics server: http://%s:%d%s...", self._host, self._port, METRICS_PATH)
+
+        try:
+            self._server = ThreadingHTTPServer((self._host, self._port), self._get_handler_class())
+        except OSError as err:
+            logger.error("Failed to start metrics server on port: %d.", self._port)
+            error_util.log_exception(logger, err)
+            return False
+
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="metrics-server",
+            daemon=True)
+        self._thread.start()
+
+        logger.info("Successfully started metrics server: http://%s:%d%s.", self._host, self._port, METRICS_PATH)
+
+        return True
+
+
+    def stop(self, logger=DEFAULT_LOGGER):
+        """
+        Stop serving metrics
+        """
+
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+            logger.info("Stopped metrics server: http://%s:%d%s.", self._host, self._port, METRICS_PATH)
+
+
+    def set_health_check(self, health_check):
+        """
+        Serve GET /health: health_check() returns (healthy, JSON serializable details); 200 if healthy, else 503
+        """
+
+        self._health_check = health_check
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _get_handler_class(self):
+        """
+        Create the HTTP request handler class bound to this server's metrics
+        """
+
+        metrics = self._metrics
+        server = self
+
+        class _MetricsRequestHandler(BaseHTTPRequestHandler):
+            """
+            Serves GET /metrics and GET /health
+            """
+
+            def do_GET(self): # pylint: disable=invalid-name
+                """
+                Handle GET requests
+                """
+
+                path = self.path.split("?")[0]
+
+                if path == HEALTH_PATH and server._health_check: # pylint: disable=protected-access
+                    healthy, details = server._health_check() # pylint: disable=protected-access
+                    self._send(200 if healthy else 503, JSON_CONTENT_TYPE, json.dumps(details).encode("utf-8"))
+                    return
+
+                if path != METRICS_PATH:
+                    self.send_error(404)
+                    return
+
+                self._send(200, PROMETHEUS_CONTENT_TYPE, metrics.to_prometheus().encode("utf-8"))
+
+
+            def _send(self, status, content_type, body):
+                """
+                Write the response
+                """
+
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+
+            def log_message(self, format, *args): # pylint: disable=redefined-builtin
+                """
+                Route access logs to the module logger
+                """
+
+                DEFAULT_LOGGER.debug(format, *args)
+
+
+        return _MetricsRequestHandler
@@ -0,0 +1,152 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import logging
+import contextlib
+import cProfile
+import tracemalloc
+import pathlib
+
+from lib.constants import constants
+from lib.utils import file_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("phase_profiler")
+
+PSTATS_FILE_EXTENSION = ".pstats"
+
+# Number of frames stored per tracemalloc allocation traceback
+TRACEMALLOC_FRAMES = 5
+
+# Number of allocation sites reported per phase
+TRACEMALLOC_TOP_STATS = 25
+
+# Classes --------------------------------------------------------------------->
+
+class PhaseProfiler: # pylint: disable=unused-variable,too-few-public-methods
+    """
+    Wraps task phases in cProfile and/or tracemalloc and writes the results to the results directory
+    """
+
+    def __init__(self, results_dir, timestamp, cpu=False, memory=False):
+        """
+        Constructor
+        """
+
+        self._results_dir = results_dir
+        self._timestamp = timestamp
+        self._cpu = cpu
+        self._memory = memory
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    @contextlib.contextmanager
+    def phase(self, name, logger=DEFAULT_LOGGER):
+        """
+        Profile the enclosed block as the specified phase
+        """
+
+        profiler = None
+        snapshot = None
+
+        if self._memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            tracemalloc.reset_peak()
+            snapshot = tracemalloc.take_snapshot()
+
+        if self._cpu:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                self._dump_cpu_profile(name, profiler)
+
+            if snapshot:
+                self._dump_memory_profile(name, snapshot)
+
+        logger.debug("Profiled phase: %s.", name)
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _get_filename(self, kind, phase, extension):
+        """
+        Gets the path of a profile file qualified with the results directory
+        """
+
+        filename = "{0}{1}_{2}_{3}{4}".format(
+            constants.FILE_PREFIX,
+            kind,
+            phase,
+            self._timestamp,
+            extension)
+
+        return pathlib.Path(self._results_dir, filename)
+
+
+    def _dump_cpu_profile(self, phase, profiler, logger=DEFAULT_LOGGER):
+        """
+        Write cProfile statistics (pstats format) for the phase
+        """
+
+        file = self._get_filename("profile", phase, PSTATS_FILE_EXTENSION)
+
+        logger.info("Creating CPU profile file: %s...", file)
+
+        try:
+            profiler.dump_stats(file)
+        except OSError as err:
+            logger.error("Failed to create CPU profile file: %s (%s).", file, err)
+            return
+
+        logger.info("Successfully created CPU profile file: %s.", file)
+
+
+    def _dump_memory_profile(self, phase, start_snapshot):
+        """
+        Write the top allocation sites (relative to the start of the phase) for the phase
+        """
+
+        end_snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        statistics = end_snapshot.compare_to(start_snapshot, "lineno")
+
+        lines = [
+            "Phase: {0}".format(phase),
+            "Traced Memory (current): {0} bytes".format(current),
+            "Traced Memory (peak): {0} bytes".format(peak),
+            "",
+            "Top {0} allocation sites (growth since start of phase):".format(TRACEMALLOC_TOP_STATS),
+            ""
+        ]
+        lines.extend(str(statistic) for statistic in statistics[:TRACEMALLOC_TOP_STATS])
+        lines.append("")
+
+        file = self._get_filename("memory", phase, constants.TEXT_FILE_EXTENSION)
+        file_util.create_text_file(
+            file=file,
+            content="\n".join(lines))
@@ -0,0 +1,215 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import logging
+import datetime
+import threading
+import time
+import json
+
+from lib.utils import error_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("progress_reporter")
+
+DEFAULT_INTERVAL = 10 # seconds
+
+# Progress snapshot properties (see: get_progress() of each task)
+PROGRESS_PROCESSED = "processed"
+PROGRESS_CONFLICTS = "conflicts"
+PROGRESS_DELETED_REVISIONS = "deleted_revisions"
+PROGRESS_ERRORS = "errors"
+PROGRESS_ATTEMPTS = "attempts" # Error rate denominator (default: processed)
+PROGRESS_QUEUE_DEPTH = "queue_depth"
+
+# Classes --------------------------------------------------------------------->
+
+class ProgressReporter: # pylint: disable=unused-variable
+    """
+    Periodically reports the throughput, error rate and ETA of a running task
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, name, task, total, ndjson_file=None, interval=DEFAULT_INTERVAL):
+        """
+        Constructor
+        """
+
+        self._name = name
+        self._task = task
+        self._total = total
+        self._ndjson_file = ndjson_file
+        self._interval = interval
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._start_time = None
+        self._last_time = None
+        self._last_progress = {}
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def start(self):
+        """
+        Start the background reporting thread
+        """
+
+        self._start_time = time.monotonic()
+        self._last_time = self._start_time
+        self._last_progress = {}
+        self._stop_event.clear()
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name="progress-reporter-{0}".format(self._name),
+            daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        """
+        Stop the background reporting thread and emit a final report
+        """
+
+        if not self._thread:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+        self._report()
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _run(self):
+        """
+        Reporting loop
+        """
+
+        while not self._stop_event.wait(self._interval):
+            self._report()
+
+
+    def _report(self):
+        """
+        Sample the task progress and emit a report
+        """
+
+        now = time.monotonic()
+        progress = self._task.get_progress()
+        record = self._get_record(now, progress)
+
+        self._last_time = now
+        self._last_progress = progress
+
+        self._log_record(record)
+        self._write_record(record)
+
+
+    def _get_record(self, now, progress):
+        """
+        Compute rates and ETA from the current and previous progress snapshots
+        """
+
+        elapsed = max(now - self._start_time, 1e-9)
+        interval = max(now - self._last_time, 1e-9)
+
+        processed = progress.get(PROGRESS_PROCESSED, 0)
+        deleted_revisions = progress.get(PROGRESS_DELETED_REVISIONS, 0)
+        errors = progress.get(PROGRESS_ERRORS, 0)
+        attempts = progress.get(PROGRESS_ATTEMPTS, processed)
+
+        processed_delta = processed - self._last_progress.get(PROGRESS_PROCESSED, 0)
+        deleted_delta = deleted_revisions - self._last_progress.get(PROGRESS_DELETED_REVISIONS, 0)
+
+        average_rate = processed / elapsed
+        eta = None
+
+        if self._total and average_rate > 0:
+            eta = max(self._total - processed, 0) / average_rate
+
+        return {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "task": self._name,
+            "elapsed_s": round(elapsed, 3),
+            "processed": processed,
+            "total": self._total,
+            "percent": round(100.0 * processed / self._total, 2) if self._total else None,
+            "processed_per_s": round(processed_delta / interval, 2),
+            "average_processed_per_s": round(average_rate, 2),
+            "conflicts": progress.get(PROGRESS_CONFLICTS, 0),
+            "deleted_revisions": deleted_revisions,
+            "deleted_revisions_per_s": round(deleted_delta / interval, 2),
+            "errors": errors,
+            "error_rate": round(errors / attempts, 4) if attempts else 0.0,
+            "queue_depth": progress.get(PROGRESS_QUEUE_DEPTH, 0),
+            "eta_s": round(eta, 1) if eta is not None else None
+        }
+
+
+    @staticmethod
+    def _log_record(record, logger=DEFAULT_LOGGER):
+        """
+        Log a human-readable progress line
+        """
+
+        eta = "n/a"
+
+        if record["eta_s"] is not None:
+            eta = str(datetime.timedelta(seconds=int(record["eta_s"])))
+
+        logger.info(
+            "[%s] Processed: %d / %s (%s%%). Rate: %.1f/s. Conflicts: %d. "
+            "Deleted revisions: %d (%.1f/s). Errors: %d (%.2f%%). Queue depth: %d. ETA: %s.",
+            record["task"],
+            record["processed"],
+            record["total"] if record["total"] else "?",
+            record["percent"] if record["percent"] is not None else "?",
+            record["processed_per_s"],
+            record["conflicts"],
+            record["deleted_revisions"],
+            record["deleted_revisions_per_s"],
+            record["errors"],
+            100.0 * record["error_rate"],
+            record["queue_depth"],
+            eta)
+
+
+    def _write_record(self, record, logger=DEFAULT_LOGGER):
+        """
+        Append the progress record to the NDJSON progress file
+        """
+
+        if not self._ndjson_file:
+            return
+
+        try:
+            with open(self._ndjson_file, "a", encoding="utf-8") as file_handle:
+                file_handle.write(json.dumps(record))
+                file_handle.write("\n")
+        except OSError as err:
+            logger.error("Failed to write progress record to file: %s.", self._ndjson_file)
+            error_util.log_exception(logger, err)
+            self._ndjson_file = None
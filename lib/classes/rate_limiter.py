@@ -0,0 +1,211 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import os
+import time
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+from lib.utils import error_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("rate_limiter")
+
+# Bucket state shared through a file: available tokens (may be negative: reserved), last refill (epoch seconds)
+STATE_FORMAT = "dd"
+STATE_SIZE = struct.calcsize(STATE_FORMAT)
+
+SHARED_FILE_FORMAT = "couchdb_conflict_remover_rate_{0}.bucket"
+
+# Classes --------------------------------------------------------------------->
+
+class RateLimiter: # pylint: disable=unused-variable
+    """
+    Token bucket capping the request rate of every worker thread and, through a shared state file (locked with
+    flock), of every process using the same file on the host; each caller reserves a token and waits for its turn
+    """
+
+    def __init__(self, rate, burst=None, shared_file=None):
+        """
+        Constructor
+
+        - rate: Maximum sustained rate (requests per second).
+        - burst: Bucket capacity (default: one second of requests).
+        - shared_file: Bucket state file shared with the other processes (see: get_shared_file); default: this
+          process only.
+        """
+
+        self._base_rate = float(rate)
+        self._rate = self._base_rate
+        self._burst = float(burst) if burst else max(self._rate, 1.0)
+        self._shared_file = shared_file
+
+        self._lock = threading.Lock()
+        self._file_descriptor = None
+        self._tokens = self._burst
+        self._last_refill = time.time()
+        self._total_acquired = 0
+        self._total_waited = 0 # seconds
+
+
+    def __del__(self):
+        """
+        Destructor
+        """
+
+        self.close()
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def open(self, logger=DEFAULT_LOGGER):
+        """
+        Open the shared bucket state file (if any)
+        """
+
+        if not self._shared_file:
+            return True
+
+        if fcntl is None:
+            logger.warning("Shared rate limiting is not supported on this platform. Limiting this process only.")
+            self._shared_file = None
+            return True
+
+        try:
+            self._file_descriptor = os.open(self._shared_file, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as err:
+            logger.error("Failed to open rate limiter state file: %s.", self._shared_file)
+            error_util.log_exception(logger, err)
+            return False
+
+        logger.info("Sharing rate limit (%.1f requests/s) through state file: %s.", self._rate, self._shared_file)
+
+        return True
+
+
+    def close(self):
+        """
+        Close the shared bucket state file
+        """
+
+        if self._file_descriptor is not None:
+            os.close(self._file_descriptor)
+            self._file_descriptor = None
+
+
+    def acquire(self):
+        """
+        Take a token, waiting until the rate allows it
+        """
+
+        with self._lock:
+            if self._file_descriptor is not None:
+                delay = self._reserve_shared()
+            else:
+                self._tokens, self._last_refill, delay = self._reserve(self._tokens, self._last_refill)
+
+            self._total_acquired += 1
+            self._total_waited += delay
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+    def set_scale(self, scale):
+        """
+        Scale the rate (e.g. 0.5 = half the configured rate) while the cluster is under pressure
+        """
+
+        with self._lock:
+            self._rate = self._base_rate * scale
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the rate limiting
+        """
+
+        with self._lock:
+            return {
+                "rate": self._base_rate,
+                "burst": self._burst,
+                "shared_file": str(self._shared_file) if self._shared_file else None,
+                "acquired": self._total_acquired,
+                "waited_s": round(self._total_waited, 3)
+            }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _reserve(self, tokens, last_refill):
+        """
+        Refill the bucket and reserve a token; returns (tokens, last refill, delay before the reserved token)
+        """
+
+        now = time.time()
+        tokens = min(self._burst, tokens + max(now - last_refill, 0) * self._rate) - 1
+
+        return tokens, now, max(-tokens / self._rate, 0)
+
+
+    def _reserve_shared(self):
+        """
+        Reserve a token from the bucket shared with the other processes (exclusive file lock held while updating)
+        """
+
+        fcntl.flock(self._file_descriptor, fcntl.LOCK_EX)
+
+        try:
+            data = os.pread(self._file_descriptor, STATE_SIZE, 0)
+
+            if len(data) == STATE_SIZE:
+                tokens, last_refill = struct.unpack(STATE_FORMAT, data)
+            else:
+                # New bucket (first process)
+                tokens, last_refill = self._burst, time.time()
+
+            tokens, last_refill, delay = self._reserve(tokens, last_refill)
+
+            os.pwrite(self._file_descriptor, struct.pack(STATE_FORMAT, tokens, last_refill), 0)
+        finally:
+            fcntl.flock(self._file_descriptor, fcntl.LOCK_UN)
+
+        return delay
+
+
+# Public Functions ------------------------------------------------------------>
+
+def get_shared_file(location): # pylint: disable=unused-variable
+    """
+    Retrieve the default bucket state file of a Cloudant account / server (shared by every process on the host)
+    """
+
+    key = hashlib.sha256(location.encode("utf-8")).hexdigest()[:16]
+
+    return os.path.join(tempfile.gettempdir(), SHARED_FILE_FORMAT.format(key))
@@ -0,0 +1,92 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import json
+import time
+
+from requests import exceptions
+
+from lib.classes.cloudant_transport_adapter import CloudantTransportAdapter
+from lib.classes import http_cassette
+from lib.utils import request_util
+
+# Globals
+
+# Response served for requests missing from the cassette
+NOT_RECORDED_STATUS = 404
+NOT_RECORDED_BODY = json.dumps({"error": "not_found", "reason": "Request not recorded in cassette."}).encode("utf-8")
+
+# Classes --------------------------------------------------------------------->
+
+class ReplayTransportAdapter(CloudantTransportAdapter): # pylint: disable=unused-variable
+    """
+    Transport adapter serving the responses of a cassette (see: CassetteReplay) instead of the network, with the
+    recorded (or scaled) latencies; request metrics and tracing work as usual
+    """
+
+    def __init__(self, replay, metrics=None, tracer=None, **kwargs):
+        """
+        Constructor
+
+        - replay: Loaded CassetteReplay.
+        """
+
+        super().__init__(metrics=metrics, tracer=tracer, **kwargs)
+
+        self._replay = replay
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _send_request(self, request, **kwargs):
+        """
+        Serve the next recorded interaction of the request
+        """
+
+        interaction = self._replay.next_interaction(request.method, request.url)
+
+        if interaction is None:
+            return request_util.build_response(
+                request=request,
+                status=NOT_RECORDED_STATUS,
+                body=NOT_RECORDED_BODY,
+                connection=self)
+
+        delay = self._replay.get_delay(interaction)
+
+        if delay > 0:
+            time.sleep(delay)
+
+        exception_name = interaction.get(http_cassette.PROPERTY_EXCEPTION)
+
+        if exception_name:
+            # e.g. ConnectionError, ReadTimeout
+            exception_class = getattr(exceptions, exception_name, None)
+            if not isinstance(exception_class, type) or not issubclass(exception_class, exceptions.RequestException):
+                exception_class = exceptions.ConnectionError
+            raise exception_class("Replayed exception: {0}.".format(exception_name), request=request)
+
+        return request_util.build_response(
+            request=request,
+            status=interaction[http_cassette.PROPERTY_STATUS],
+            body=http_cassette.get_response_body(interaction),
+            headers=interaction.get(http_cassette.PROPERTY_HEADERS),
+            elapsed=delay,
+            connection=self)
@@ -0,0 +1,238 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import threading
+
+from lib.classes.latency_histogram import LatencyHistogram
+
+# Globals
+
+METRIC_PREFIX = "couchdb_conflict_remover"
+
+# Status label used for requests that failed without an HTTP response (e.g. connection reset)
+STATUS_NO_RESPONSE = "none"
+
+# Prometheus histogram bucket upper bounds (seconds)
+PROMETHEUS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Exported latency quantiles (percent)
+EXPORTED_PERCENTILES = (50, 90, 99, 99.9)
+
+# Classes --------------------------------------------------------------------->
+
+class RequestMetrics: # pylint: disable=unused-variable
+    """
+    Thread-safe collection of per-operation HTTP request metrics
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._status_counts = {}
+        self._bytes_sent = {}
+        self._bytes_received = {}
+        self._retries = {}
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def record_request(self, operation, status, elapsed, bytes_sent=0, bytes_received=0):
+        """
+        Record a completed HTTP request attempt
+        """
+
+        status = str(status) if status is not None else STATUS_NO_RESPONSE
+
+        with self._lock:
+            histogram = self._latencies.get(operation)
+
+            if histogram is None:
+                histogram = LatencyHistogram()
+                self._latencies[operation] = histogram
+
+            histogram.record(elapsed)
+
+            key = (operation, status)
+            self._status_counts[key] = self._status_counts.get(key, 0) + 1
+            self._bytes_sent[operation] = self._bytes_sent.get(operation, 0) + bytes_sent
+            self._bytes_received[operation] = self._bytes_received.get(operation, 0) + bytes_received
+
+
+    def record_retry(self, operation):
+        """
+        Record a retried HTTP request attempt
+        """
+
+        with self._lock:
+            self._retries[operation] = self._retries.get(operation, 0) + 1
+
+
+    def get_summary(self):
+        """
+        Retrieve a serializable summary of the recorded metrics, keyed by operation
+        """
+
+        summary = {}
+
+        with self._lock:
+            for operation, histogram in sorted(self._latencies.items()):
+                summary[operation] = {
+                    "requests": histogram.get_count(),
+                    "status_codes": {
+                        status: count
+                        for (name, status), count in sorted(self._status_counts.items())
+                        if name == operation
+                    },
+                    "latency_s": {
+                        "min": histogram.get_min(),
+                        "mean": histogram.get_sum() / histogram.get_count(),
+                        "p50": histogram.get_percentile(50),
+                        "p90": histogram.get_percentile(90),
+                        "p99": histogram.get_percentile(99),
+                        "max": histogram.get_max()
+                    },
+                    "bytes_sent": self._bytes_sent.get(operation, 0),
+                    "bytes_received": self._bytes_received.get(operation, 0),
+                    "retries": self._retries.get(operation, 0)
+                }
+
+        return summary
+
+
+    def to_prometheus(self):
+        """
+        Serialize the recorded metrics in the Prometheus text exposition format
+        """
+
+        with self._lock:
+            lines = []
+            lines.extend(self._get_request_count_lines())
+            lines.extend(self._get_latency_histogram_lines())
+            lines.extend(self._get_latency_quantile_lines())
+            lines.extend(self._get_bytes_lines())
+            lines.extend(self._get_retry_lines())
+
+        return "\n".join(lines) + "\n"
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _get_request_count_lines(self):
+        """
+        Prometheus lines: request counts by operation and status code
+        """
+
+        name = "{0}_requests_total".format(METRIC_PREFIX)
+        lines = [
+            "# HELP {0} HTTP requests by operation and status code.".format(name),
+            "# TYPE {0} counter".format(name)
+        ]
+
+        for (operation, status), count in sorted(self._status_counts.items()):
+            lines.append('{0}{{operation="{1}",status="{2}"}} {3}'.format(name, operation, status, count))
+
+        return lines
+
+
+    def _get_latency_histogram_lines(self):
+        """
+        Prometheus lines: request latency histograms by operation
+        """
+
+        name = "{0}_request_duration_seconds".format(METRIC_PREFIX)
+        lines = [
+            "# HELP {0} HTTP request latency by operation.".format(name),
+            "# TYPE {0} histogram".format(name)
+        ]
+
+        for operation, histogram in sorted(self._latencies.items()):
+            counts = histogram.get_cumulative_counts(PROMETHEUS_BUCKETS)
+
+            for bound, count in zip(PROMETHEUS_BUCKETS, counts):
+                lines.append('{0}_bucket{{operation="{1}",le="{2}"}} {3}'.format(name, operation, bound, count))
+
+            lines.append('{0}_bucket{{operation="{1}",le="+Inf"}} {2}'.format(name, operation, histogram.get_count()))
+            lines.append('{0}_sum{{operation="{1}"}} {2:.6f}'.format(name, operation, histogram.get_sum()))
+            lines.append('{0}_count{{operation="{1}"}} {2}'.format(name, operation, histogram.get_count()))
+
+        return lines
+
+
+    def _get_latency_quantile_lines(self):
+        """
+        Prometheus lines: request latency quantiles by operation
+        """
+
+        name = "{0}_request_duration_quantile_seconds".format(METRIC_PREFIX)
+        lines = [
+            "# HELP {0} HTTP request latency quantiles by operation.".format(name),
+            "# TYPE {0} gauge".format(name)
+        ]
+
+        for operation, histogram in sorted(self._latencies.items()):
+            for percentile in EXPORTED_PERCENTILES:
+                lines.append('{0}{{operation="{1}",quantile="{2}"}} {3:.6f}'.format(
+                    name,
+                    operation,
+                    percentile / 100.0,
+                    histogram.get_percentile(percentile)))
+
+        return lines
+
+
+    def _get_bytes_lines(self):
+        """
+        Prometheus lines: bytes transferred by operation and direction
+        """
+
+        name = "{0}_transferred_bytes_total".format(METRIC_PREFIX)
+        lines = [
+            "# HELP {0} HTTP payload bytes transferred by operation and direction.".format(name),
+            "# TYPE {0} counter".format(name)
+        ]
+
+        for operation in sorted(self._latencies):
+            lines.append('{0}{{operation="{1}",direction="sent"}} {2}'.format(
+                name, operation, self._bytes_sent.get(operation, 0)))
+            lines.append('{0}{{operation="{1}",direction="received"}} {2}'.format(
+                name, operation, self._bytes_received.get(operation, 0)))
+
+        return lines
+
+
+    def _get_retry_lines(self):
+        """
+        Prometheus lines: retried requests by operation
+        """
+
+        name = "{0}_retries_total".format(METRIC_PREFIX)
+        lines = [
+            "# HELP {0} Retried HTTP requests by operation.".format(name),
+            "# TYPE {0} counter".format(name)
+        ]
+
+        for operation, count in sorted(self._retries.items()):
+            lines.append('{0}{{operation="{1}"}} {2}'.format(name, operation, count))
+
+        return lines
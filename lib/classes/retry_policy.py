@@ -0,0 +1,205 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import random
+import logging
+import threading
+
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import Timeout
+
+from lib.utils import request_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("retry_policy")
+
+DEFAULT_MAX_RETRIES = 5 # per request
+DEFAULT_BASE_DELAY = 0.25 # seconds (first backoff ceiling)
+DEFAULT_MAX_DELAY = 30 # seconds (backoff and Retry-After cap)
+DEFAULT_BUDGET_RATIO = 0.2 # retries earned per request
+DEFAULT_BUDGET_RESERVE = 20 # retries always available (e.g. at start-up)
+
+# 429 Too Many Requests and transient server errors
+RETRYABLE_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+# Connection errors (e.g. resets) and connect / read timeouts
+RETRYABLE_EXCEPTIONS = (RequestsConnectionError, Timeout)
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "DELETE"))
+
+# Read-only operations sent as POST (e.g. view keys, _all_docs keys, _bulk_get, _find)
+IDEMPOTENT_POST_OPERATIONS = frozenset((
+    request_util.OPERATION_VIEW,
+    request_util.OPERATION_ALL_DOCS,
+    request_util.OPERATION_BULK_GET,
+    request_util.OPERATION_FIND
+))
+
+HEADER_RETRY_AFTER = "Retry-After"
+
+# Classes --------------------------------------------------------------------->
+
+class RetryPolicy: # pylint: disable=unused-variable
+    """
+    Decides whether (and when) a failed attempt of an idempotent request is retried: 429, 5xx, connection errors
+    and timeouts are retried with exponential backoff and full jitter (or the Retry-After delay), up to a number of
+    retries per request and within a global retry budget shared by every worker; safe to share between threads
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+            budget_ratio=DEFAULT_BUDGET_RATIO, budget_reserve=DEFAULT_BUDGET_RESERVE, seed=None):
+        """
+        Constructor
+
+        - max_retries: Maximum number of retries per request (0 = never retry).
+        - base_delay: Backoff ceiling (seconds) of the first retry; doubled for every further retry.
+        - max_delay: Maximum backoff (seconds), also applied to Retry-After.
+        - budget_ratio: Retries earned by every request: bounds the retries to a fraction of the traffic so that an
+          outage does not turn into a retry storm.
+        - budget_reserve: Retries available regardless of the traffic.
+        """
+
+        # pylint: disable=too-many-arguments
+
+        self._max_retries = max_retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._budget_ratio = budget_ratio
+        self._budget_reserve = budget_reserve
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._total_requests = 0
+        self._total_retries = 0
+        self._total_exhausted = 0 # retryable failures given up after max_retries
+        self._total_over_budget = 0 # retryable failures not retried (budget spent)
+        self._total_backoff = 0 # seconds
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def record_request(self):
+        """
+        Record a new request (first attempt): earns retry budget
+        """
+
+        with self._lock:
+            self._total_requests += 1
+
+
+    def get_retry_delay(self, request, attempt, response=None, exception=None, logger=DEFAULT_LOGGER):
+        """
+        Decide whether the failed attempt is retried; returns the backoff (seconds) before the next attempt, or
+        None when the response / exception is final
+
+        - attempt: Number of the failed attempt (0 = first attempt).
+        """
+
+        # pylint: disable=too-many-arguments
+
+        if not self._is_retryable(request, response, exception):
+            return None
+
+        operation = request_util.get_operation(request.method, request.url)
+
+        with self._lock:
+            if attempt >= self._max_retries:
+                self._total_exhausted += 1
+                return None
+
+            if self._total_retries >= self._budget_reserve + self._budget_ratio * self._total_requests:
+                self._total_over_budget += 1
+                if self._total_over_budget == 1:
+                    logger.warning("Retry budget spent (%d retries for %d requests). Failures are now final.",
+                        self._total_retries, self._total_requests)
+                return None
+
+            # Full jitter: uniform between 0 and the exponential ceiling (spreads the retries of all workers)
+
+            delay = self._random.uniform(0, min(self._max_delay, self._base_delay * 2 ** attempt))
+            delay = max(delay, self._get_retry_after(response))
+
+            self._total_retries += 1
+            self._total_backoff += delay
+
+        logger.debug("Retrying request: %s %s (attempt: %d, %s) in %.3f s...",
+            request.method,
+            operation,
+            attempt + 1,
+            "status: {0}".format(response.status_code) if response is not None else type(exception).__name__,
+            delay)
+
+        return delay
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the retries
+        """
+
+        with self._lock:
+            return {
+                "requests": self._total_requests,
+                "retries": self._total_retries,
+                "exhausted": self._total_exhausted,
+                "over_budget": self._total_over_budget,
+                "backoff_s": round(self._total_backoff, 3)
+            }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    @staticmethod
+    def _is_retryable(request, response, exception):
+        """
+        Determine whether the request is idempotent and its failure transient
+        """
+
+        if response is not None:
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                return False
+        elif not isinstance(exception, RETRYABLE_EXCEPTIONS):
+            return False
+
+        if request.method in IDEMPOTENT_METHODS:
+            return True
+
+        if request.method == "POST":
+            return request_util.get_operation(request.method, request.url) in IDEMPOTENT_POST_OPERATIONS
+
+        return False
+
+
+    def _get_retry_after(self, response):
+        """
+        Retrieve the server-requested delay (seconds) of a 429 / 503 response, capped at the maximum backoff
+        """
+
+        if response is None:
+            return 0
+
+        try:
+            return min(float(response.headers.get(HEADER_RETRY_AFTER, 0)), self._max_delay)
+        except ValueError:
+            # HTTP date format: not used by Cloudant
+            return 0
@@ -21,19 +21,40 @@
 import logging
 import datetime
 import csv
+import collections
 
 from cloudant.view import View
+from cloudant.result import Result
+from requests.exceptions import HTTPError
+from requests.exceptions import RequestException
 
 from lib.constants import constants
 from lib.classes.task_interface import TaskInterface
+from lib.classes import progress_reporter
+from lib.classes import trace_recorder
 from lib.utils import logger_util
 from lib.utils import string_util
 from lib.utils import error_util
+from lib.utils import statistics_util
 
 # Globals
 
 DEFAULT_LOGGER = logging.getLogger("scan_conflicts_task")
 
+DEFAULT_LOG_EVERY = 0 # rows (disabled)
+
+DEFAULT_PAGE_SIZE = 100 # rows per view request
+
+# Per-row hot path: resolved once (each constants attribute access is a property call)
+PROPERTY_ID = constants.PROPERTY_ID
+PROPERTY_KEY = constants.PROPERTY_KEY
+PROPERTY_VALUE = constants.PROPERTY_VALUE
+PROPERTY_CHUNKED = constants.PROPERTY_CHUNKED
+VALUE_UNRESOLVED = constants.VALUE_UNRESOLVED
+REVISIONS_SEPARATOR = "; "
+
+CSV_BUFFER_SIZE = 1024 * 1024 # bytes
+
 # Classes --------------------------------------------------------------------->
 
 class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
@@ -41,21 +62,48 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
     TODO
     """
 
-    def __init__(self, deletion_mode, threshold, ddoc, csv_file):
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, deletion_mode, threshold, ddoc, csv_file, log_every=DEFAULT_LOG_EVERY, tracer=None,
+            page_size=DEFAULT_PAGE_SIZE, view_source=None, chunk_oversized=False):
         """
         Constructor
+
+        - view_source: Iterable of conflicts view rows (default: the conflicts view of ddoc, paged).
+        - chunk_oversized: Queue the documents exceeding the threshold for chunked deletion (their conflicted
+          revisions are fetched again when deleted, so only their ID, name and conflicts count are kept) instead of
+          omitting them.
         """
 
+        # pylint: disable=too-many-arguments
+
         self._deletion_mode = deletion_mode
         self._threshold = threshold
         self._ddoc = ddoc
         self._csv_file = csv_file
-
+        self._log_every = log_every
+        self._tracer = tracer
+        self._page_size = page_size
+        self._view_source = view_source
+        self._chunk_oversized = chunk_oversized
+
+        self._total_rows = 0
+        self._total_invalid_rows = 0
         self._total_conflicted_documents = 0
         self._total_conflicted_revisions = 0
+        self._total_omitted_documents = 0
+        self._total_chunked_documents = 0
+        self._aborted = False
+        self._elapsed_time = 0 # seconds
+        self._conflict_counts = collections.Counter() # conflicts count -> documents (bounded by the distinct counts)
+        self._conflicts_distribution = statistics_util.get_histogram_distribution(self._conflict_counts)
         self._csv_file_handle = None
         self._csv_file_writer = None
         self._conflicts = []
+        self._trace_enabled = False
+        self._log_rows = False
+
+        self._init_logging_flags()
 
 
     def __del__(self):
@@ -71,6 +119,7 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
         TODO
         """
 
+        distribution = self._conflicts_distribution
         line = '=' * 80
         result = [
             "",
@@ -80,6 +129,17 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
             "",
             "- Total Conflicted Documents:         {0}".format(self._total_conflicted_documents),
             "- Total Conflicted Revisions:         {0}".format(self._total_conflicted_revisions),
+            "- Total Omitted Documents:            {0}".format(self._total_omitted_documents),
+            "- Total Chunked Documents:            {0}".format(self._total_chunked_documents),
+            "- Total Invalid Rows:                 {0}".format(self._total_invalid_rows),
+            "- Elapsed Time:                       {0:.3f} s".format(self._elapsed_time),
+            "- Throughput:                         {0:.1f} rows/s".format(
+                statistics_util.get_rate(self._total_rows, self._elapsed_time)),
+            "- Conflicts per Document:             min {0} / median {1} / p99 {2} / max {3}".format(
+                distribution["min"],
+                distribution["median"],
+                distribution["p99"],
+                distribution["max"]),
             ""
         ]
 
@@ -95,6 +155,8 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
 
         logger.info("Scanning database for conflicted documents...")
 
+        self._init_logging_flags()
+
         # Start timer
 
         start_time = datetime.datetime.now()
@@ -105,19 +167,41 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
 
         # Iterate over conflicted documents in view result set
 
-        # TODO: QUESTION: Will this work for rate-limited Cloudant accounts (e.g. HTTP 429)?
+        # Note: HTTP 429 / 5xx responses of the view requests are retried by the transport (see: RetryPolicy)
 
-        view = View(
-            ddoc=self._ddoc,
-            view_name=constants.VIEW_NAME)
+        view_source = self._view_source
 
-        index = 0
+        if view_source is None:
+            view = View(
+                ddoc=self._ddoc,
+                view_name=constants.VIEW_NAME)
+            view_source = Result(view, page_size=self._page_size)
 
-        for row in view.result:
-            self._process_row(index, row)
-            index += 1
+        index = 0
+        self._aborted = False
 
-        if index == 0:
+        try:
+            for row in view_source:
+
+                if self._tracer:
+                    trace_timestamp = self._tracer.get_timestamp()
+                    self._process_row(index, row)
+                    self._tracer.add_complete_event("process_row", trace_recorder.CATEGORY_SCAN, trace_timestamp)
+                else:
+                    self._process_row(index, row)
+
+                index += 1
+                self._total_rows = index
+        except RequestException as err:
+            # e.g. HTTP 429 / 5xx or connection reset while paging the view: the rows scanned so far are kept
+            logger.error("Failed to scan database for conflicted documents (aborted after %d rows).", index)
+            if isinstance(err, HTTPError):
+                error_util.log_http_error(logger, err)
+            else:
+                error_util.log_exception(logger, err)
+            self._aborted = True
+
+        if index == 0 and not self._aborted:
             logger.info("No conflicted documents found in database.")
 
         # Close CSV file
@@ -127,7 +211,15 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
         # Stop timer
 
         end_time = datetime.datetime.now()
-        elapsed_time = (end_time - start_time).total_seconds() * 1000  # ms
+        self._elapsed_time = (end_time - start_time).total_seconds()
+        elapsed_time = self._elapsed_time * 1000  # ms
+
+        # Compute conflicts per document distribution
+
+        self._conflicts_distribution = statistics_util.get_histogram_distribution(self._conflict_counts)
+
+        if self._aborted:
+            return False
 
         # Print status message
 
@@ -144,8 +236,49 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
         return self._conflicts
 
 
+    def get_summary(self):
+        """
+        Serializable summary of the scan results
+        """
+
+        return {
+            "total_rows": self._total_rows,
+            "invalid_rows": self._total_invalid_rows,
+            "conflicted_documents": self._total_conflicted_documents,
+            "conflicted_revisions": self._total_conflicted_revisions,
+            "omitted_documents": self._total_omitted_documents,
+            "chunked_documents": self._total_chunked_documents,
+            "aborted": self._aborted,
+            "elapsed_s": self._elapsed_time,
+            "rows_per_s": statistics_util.get_rate(self._total_rows, self._elapsed_time),
+            "conflicts_per_document": self._conflicts_distribution
+        }
+
+
+    def get_progress(self):
+        """
+        Snapshot of the scan progress counters (see: ProgressReporter)
+        """
+
+        return {
+            progress_reporter.PROGRESS_PROCESSED: self._total_rows,
+            progress_reporter.PROGRESS_CONFLICTS: self._total_conflicted_documents,
+            progress_reporter.PROGRESS_ERRORS: self._total_invalid_rows,
+            progress_reporter.PROGRESS_QUEUE_DEPTH: len(self._conflicts)
+        }
+
+
     # Private Methods --------------------------------------------------------->
 
+    def _init_logging_flags(self, logger=DEFAULT_LOGGER):
+        """
+        Resolve the per-row logging decisions once (logging levels do not change during a scan)
+        """
+
+        self._trace_enabled = logger_util.is_enabled_for_trace(logger)
+        self._log_rows = self._log_every > 0 and logger.isEnabledFor(logging.INFO)
+
+
     def _init_csv_file(self, logger=DEFAULT_LOGGER):
         """
         Open CSV file
@@ -153,7 +286,7 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
 
         logger.info("Opening CSV file: %s...", self._csv_file)
 
-        self._csv_file_handle = open(self._csv_file, "w", newline="", encoding="utf-8")
+        self._csv_file_handle = open(self._csv_file, "w", newline="", encoding="utf-8", buffering=CSV_BUFFER_SIZE)
 
         fieldnames = [
             constants.CSV_FIELD_ID,
@@ -162,12 +295,13 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
             constants.CSV_FIELD_REVISIONS
         ]
 
-        self._csv_file_writer = csv.DictWriter(
-            f=self._csv_file_handle,
-            fieldnames=fieldnames,
+        # Note: Rows are written as lists (in field name order); csv.DictWriter re-validates the keys of each row
+
+        self._csv_file_writer = csv.writer(
+            self._csv_file_handle,
             dialect="excel")
 
-        self._csv_file_writer.writeheader()
+        self._csv_file_writer.writerow(fieldnames)
 
         logger.info("Successfully Opened CSV file: %s.", self._csv_file)
 
@@ -199,31 +333,28 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
         #    ]
         # }
 
-        if logger_util.is_enabled_for_trace(logger):
+        if self._trace_enabled:
             logger_util.log_trace(logger, str(row))
 
-        # Validate row
-        # TODO: REVISIT: Should we abort the entire scan when an exception is encountered ?
+        # Validate and normalize row (single pass)
 
-        error = self._validate_row(
-            row=row,
-            index=self._total_conflicted_documents)
+        normalized_row = self._get_normalized_row(row)
 
-        if error:
-            logger.error(error)
+        if normalized_row is None:
+            # Slow path: describe the invalid row
+            # TODO: REVISIT: Should we abort the entire scan when an exception is encountered ?
+            logger.error(self._validate_row(
+                row=row,
+                index=self._total_conflicted_documents))
+            self._total_invalid_rows += 1
             return
 
-        # Normalize row
-
-        normalized_row = self._get_normalized_row(row)
-
-        # Print row
+        conflicts_count = len(normalized_row[PROPERTY_VALUE])
 
-        display_row = self._get_display_row(
-            index=index,
-            row=normalized_row)
+        # Print row (sampled)
 
-        logger.info(display_row)
+        if self._log_rows and index % self._log_every == 0:
+            self._log_row(index, normalized_row, conflicts_count)
 
         # Track total number of conflicted documents
 
@@ -231,11 +362,12 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
 
         # Store conflicted document in memory
 
-        self._store_conflicted_document(normalized_row)
+        if self._deletion_mode:
+            self._store_conflicted_document(normalized_row, conflicts_count)
 
         # Serialize document to CSV file record
 
-        self._serialize_row(normalized_row)
+        self._serialize_row(normalized_row, conflicts_count)
 
 
     @staticmethod
@@ -286,73 +418,72 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
     @staticmethod
     def _get_normalized_row(row):
         """
-        TODO
+        Validate and normalize the row in a single pass; returns None for an invalid row (see: _validate_row)
         """
 
-        # Sanitize name
+        try:
+            doc_id = row[PROPERTY_ID]
+            key = row[PROPERTY_KEY]
+            value = row[PROPERTY_VALUE]
+        except (KeyError, TypeError):
+            return None
 
-        key = row[constants.PROPERTY_KEY]
-        field_name = None
+        if not isinstance(value, list) or not value:
+            return None
+
+        # Sanitize name
 
-        if string_util.is_defined_string(key):
+        if isinstance(key, str) and key:
             field_name = string_util.sanitize_control_characters(
                 text=key,
                 substitute_char=string_util.SUBSTITUTE_BLOCK_CHAR)
         else:
-            field_name = constants.VALUE_UNRESOLVED
+            field_name = VALUE_UNRESOLVED
 
-        normalized_row = {}
-        normalized_row[constants.PROPERTY_ID] = row[constants.PROPERTY_ID]
-        normalized_row[constants.PROPERTY_KEY] = field_name
-        normalized_row[constants.PROPERTY_VALUE] = row[constants.PROPERTY_VALUE]
+        return {
+            PROPERTY_ID: doc_id,
+            PROPERTY_KEY: field_name,
+            PROPERTY_VALUE: value
+        }
 
-        return normalized_row
 
-
-    def _get_display_row(self, index, row):
+    @staticmethod
+    def _log_row(index, row, conflicts_count, logger=DEFAULT_LOGGER):
         """
-        Serialize row to CSV file record
+        Log row (formatted lazily by the logging subsystem)
         """
 
-        conflicts_count = self._get_conflicts_count(row)
-        display_row = "[{0}] Document ID: {1}. {2}: {3}. {4}: {5}.".format(
+        logger.info(
+            "[%d] Document ID: %s. %s: %s. %s: %d.",
             index,
-            row[constants.PROPERTY_ID],
+            row[PROPERTY_ID],
             constants.CSV_FIELD_NAME,
-            row[constants.PROPERTY_KEY],
+            row[PROPERTY_KEY],
             constants.CSV_FIELD_CONFLICTS,
             conflicts_count)
 
-        return display_row
-
 
-    @staticmethod
-    def _get_conflicts_count(row):
+    def _store_conflicted_document(self, row, conflicts_count, logger=DEFAULT_LOGGER):
         """
-        TODO
+        Queue the conflicted document for the deletion phase (deletion mode)
         """
 
-        value = row[constants.PROPERTY_VALUE]
-        conflicts_count = len(value)
-
-        return conflicts_count
-
-
-    def _store_conflicted_document(self, row, logger=DEFAULT_LOGGER):
-        """
-        TODO
-        """
-
-        if not self._deletion_mode:
-            # Scan Mode
+        if conflicts_count <= self._threshold:
+            self._conflicts.append(row)
             return
 
-        # Deletion Mode
-
-        conflicts_count = self._get_conflicts_count(row)
+        if self._chunk_oversized:
+            logger.info("Conflicted document queued for chunked deletion due to exceeding revision threshold. "
+                "Document ID: %s. %s: %d > %d.",
+                row[PROPERTY_ID], constants.CSV_FIELD_CONFLICTS, conflicts_count, self._threshold)
 
-        if conflicts_count <= self._threshold:
-            self._conflicts.append(row)
+            self._conflicts.append({
+                PROPERTY_ID: row[PROPERTY_ID],
+                PROPERTY_KEY: row[PROPERTY_KEY],
+                PROPERTY_VALUE: [],
+                PROPERTY_CHUNKED: conflicts_count
+            })
+            self._total_chunked_documents += 1
             return
 
         message = "Conflicted document omitted from deletion phase due to exceeding revision threshold. " \
@@ -366,38 +497,29 @@ class ScanConflictsTask(TaskInterface): # pylint: disable=unused-variable
 
         logger.warning(message)
 
+        self._total_omitted_documents += 1
+
 
-    def _serialize_row(self, row, logger=DEFAULT_LOGGER):
+    def _serialize_row(self, row, conflicts_count, logger=DEFAULT_LOGGER):
         """
         Serialize row to CSV file record
         """
 
-        field_id = row[constants.PROPERTY_ID]
-        field_name = row[constants.PROPERTY_KEY]
-
-        # Number of conflicted document revisions
-
-        field_conflicts = self._get_conflicts_count(row)
-
         # Track total number of conflicted document revisions
 
-        self._total_conflicted_revisions += field_conflicts
-
-        # List of conflicted document revisions
+        self._total_conflicted_revisions += conflicts_count
+        self._conflict_counts[conflicts_count] += 1
 
-        value = row[constants.PROPERTY_VALUE]
-        field_revisions = "; ".join(value)
-
-        # Write CSV row
+        # Write CSV row (ID, Name, Conflicts, Revisions)
 
         try:
-            self._csv_file_writer.writerow({
-                constants.CSV_FIELD_ID: field_id,
-                constants.CSV_FIELD_NAME: field_name,
-                constants.CSV_FIELD_CONFLICTS: field_conflicts,
-                constants.CSV_FIELD_REVISIONS: field_revisions
-            })
-        except ValueError as err:
+            self._csv_file_writer.writerow((
+                row[PROPERTY_ID],
+                row[PROPERTY_KEY],
+                conflicts_count,
+                REVISIONS_SEPARATOR.join(row[PROPERTY_VALUE])
+            ))
+        except (ValueError, csv.Error) as err:
             message = "Failed to write CSV row to file: %s. Document ID: %s."
-            logger.error(message, self._csv_file, field_id)
+            logger.error(message, self._csv_file, row[PROPERTY_ID])
             error_util.log_exception(logger, err)
@@ -0,0 +1,354 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+from requests.exceptions import RequestException
+from cloudant._client_session import CookieSession
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("session_cache")
+
+DEFAULT_DIRECTORY = os.path.join("~", ".cache", "couchdb_conflict_remover")
+
+CACHE_VERSION = 1
+CACHE_FILE_SUFFIX = ".session.json"
+
+DIRECTORY_MODE = 0o700
+FILE_MODE = 0o600
+
+# CouchDB default session timeout ([chttpd_auth] timeout), used when the cookie carries no expiry
+DEFAULT_SESSION_LIFETIME = 600 # seconds
+
+# A cached session expiring sooner than this is not reused (a new one is requested instead)
+MIN_REMAINING_LIFETIME = 60 # seconds
+
+# Fraction of the session lifetime after which the session is renewed in the background
+REFRESH_FRACTION = 0.8
+
+# Delay before retrying a failed background renewal (the expired session is still renewed on a 401 response)
+REFRESH_RETRY_INTERVAL = 30 # seconds
+
+# Classes --------------------------------------------------------------------->
+
+class SessionCache: # pylint: disable=unused-variable
+    """
+    On-disk cache of the session cookies, so that consecutive runs against the same server (and credentials) skip the
+    login request; one file (owner read / write only) per server URL and credentials, written atomically
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        """
+        Constructor
+
+        - directory: Cache directory (created owner only, if missing; ~ is expanded).
+        """
+
+        self._directory = os.path.expanduser(directory)
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def load(self, key, logger=DEFAULT_LOGGER):
+        """
+        Retrieve the cached session (cookies, issue and expiry times); None if missing, expiring soon or unreadable
+        """
+
+        path = self._get_path(key)
+
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as err:
+            logger.warning("Ignoring unreadable cached session: %s (%s).", path, err)
+            return None
+
+        if not isinstance(entry, dict) or entry.get("version") != CACHE_VERSION:
+            return None
+
+        if entry.get("expires", 0) - time.time() < MIN_REMAINING_LIFETIME:
+            logger.debug("Cached session expired (or expiring soon): %s.", path)
+            return None
+
+        return entry
+
+
+    def save(self, key, cookies, issued, expires, logger=DEFAULT_LOGGER):
+        """
+        Store the session cookies (readable by the owner only); returns False on error
+        """
+
+        entry = {
+            "version": CACHE_VERSION,
+            "issued": issued,
+            "expires": expires,
+            "cookies": cookies
+        }
+
+        path = self._get_path(key)
+        temp_path = None
+
+        try:
+            os.makedirs(self._directory, mode=DIRECTORY_MODE, exist_ok=True)
+
+            descriptor, temp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+            os.fchmod(descriptor, FILE_MODE)
+
+            with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                json.dump(entry, file)
+
+            os.replace(temp_path, path)
+        except OSError as err:
+            logger.warning("Failed to cache the session: %s (%s).", path, err)
+
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+            return False
+
+        logger.debug("Cached the session: %s (expires in %d s).", path, expires - time.time())
+
+        return True
+
+
+    @staticmethod
+    def get_key(server_url, username, password):
+        """
+        Cache key of the server URL and credentials (the password itself is never stored)
+        """
+
+        password_digest = hashlib.sha256((password or "").encode("utf-8")).hexdigest()
+        content = "\n".join((server_url or "", username or "", password_digest))
+
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _get_path(self, key):
+        """
+        Cache file of the key
+        """
+
+        return os.path.join(self._directory, key + CACHE_FILE_SUFFIX)
+
+
+class CachedCookieSession(CookieSession): # pylint: disable=unused-variable
+    """
+    Cookie authentication session that reuses a cached session cookie (skipping the login request) and renews the
+    session in the background before it expires, so that the workers never wait on (or fail with) an expired session
+    """
+
+    def __init__(self, username, password, server_url, cache=None, **kwargs):
+        """
+        Constructor
+
+        - cache: SessionCache storing the session cookie between runs (default: no caching).
+        """
+
+        super().__init__(username, password, server_url, **kwargs)
+
+        self._cache = cache
+        self._cache_key = SessionCache.get_key(server_url, username, password)
+        self._login_lock = threading.Lock()
+        self._refresh_timer = None
+        self._cache_checked = False
+        self._reused = False
+        self._total_logins = 0
+        self._total_refreshes = 0
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def login(self, logger=DEFAULT_LOGGER): # pylint: disable=arguments-differ
+        """
+        Reuse the cached session cookie (first login only), or request a new session
+        """
+
+        with self._login_lock:
+            if not self._cache_checked:
+                self._cache_checked = True
+
+                if self._cache is not None and self._load_cached_session():
+                    logger.info("Reusing the cached session (skipped the login request).")
+                    return
+
+            self._login()
+
+
+    def logout(self):
+        """
+        Stop the background renewal; a cached session is kept valid on the server (for the next run)
+        """
+
+        self._cancel_refresh()
+
+        if self._cache is not None:
+            self.cookies.clear()
+            return
+
+        super().logout()
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the session activity
+        """
+
+        return {
+            "cached": self._cache is not None,
+            "reused": self._reused,
+            "logins": self._total_logins,
+            "refreshes": self._total_refreshes
+        }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _login(self, logger=DEFAULT_LOGGER):
+        """
+        Request a new session (POST /_session), cache its cookie and schedule its renewal (lock held)
+        """
+
+        super().login()
+
+        self._total_logins += 1
+
+        issued = time.time()
+        expires = self._get_expiry(issued)
+
+        if self._cache is not None:
+            self._cache.save(self._cache_key, self._get_cookies(), issued, expires)
+
+        logger.debug("Established a new session (expires in %d s).", expires - issued)
+
+        self._schedule_refresh(issued, expires)
+
+
+    def _load_cached_session(self):
+        """
+        Install the cached session cookies; returns False if there is no usable cached session (lock held)
+        """
+
+        entry = self._cache.load(self._cache_key)
+
+        if entry is None:
+            return False
+
+        for cookie in entry.get("cookies", []):
+            self.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain", ""),
+                path=cookie.get("path", "/"),
+                secure=cookie.get("secure", False),
+                expires=cookie.get("expires"))
+
+        self._reused = True
+        self._schedule_refresh(entry["issued"], entry["expires"])
+
+        return True
+
+
+    def _schedule_refresh(self, issued, expires):
+        """
+        Renew the session once the refresh fraction of its lifetime has elapsed
+        """
+
+        delay = max(0, issued + (expires - issued) * REFRESH_FRACTION - time.time())
+
+        self._start_refresh_timer(delay)
+
+
+    def _start_refresh_timer(self, delay):
+        """
+        Start the background renewal timer (daemon; replaces a pending one)
+        """
+
+        self._cancel_refresh()
+
+        self._refresh_timer = threading.Timer(delay, self._refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+
+    def _cancel_refresh(self):
+        """
+        Cancel the pending background renewal
+        """
+
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+
+
+    def _refresh(self, logger=DEFAULT_LOGGER):
+        """
+        Background renewal: the workers keep using the current session cookie until the new one is set
+        """
+
+        with self._login_lock:
+            try:
+                self._login()
+            except RequestException as err:
+                logger.warning("Failed to renew the session (retrying in %d s): %s.", REFRESH_RETRY_INTERVAL, err)
+                self._start_refresh_timer(REFRESH_RETRY_INTERVAL)
+                return
+
+            self._total_refreshes += 1
+
+        logger.info("Renewed the session in the background.")
+
+
+    def _get_expiry(self, issued):
+        """
+        Expiry time of the session cookie (epoch seconds; default: CouchDB session timeout)
+        """
+
+        expiries = [cookie.expires for cookie in self.cookies if cookie.expires]
+
+        return min(expiries) if expiries else issued + DEFAULT_SESSION_LIFETIME
+
+
+    def _get_cookies(self):
+        """
+        Serializable session cookies
+        """
+
+        return [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "secure": cookie.secure,
+                "expires": cookie.expires
+            }
+            for cookie in self.cookies
+        ]
@@ -0,0 +1,850 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import logging
+import threading
+import secrets
+import random
+import base64
+import time
+import json
+import types
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlsplit
+from urllib.parse import parse_qsl
+
+from lib.utils import error_util
+from lib.utils import request_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("stand_in_server")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5984
+
+DEFAULT_SESSION_TIMEOUT = 600 # seconds
+
+SESSION_COOKIE_NAME = "AuthSession"
+
+JSON_CONTENT_TYPE = "application/json"
+FORM_CONTENT_TYPE = "application/x-www-form-urlencoded"
+
+SERVER_VERSION = "3.1.1"
+
+# Query parameters whose values are JSON encoded (all others are plain strings)
+JSON_PARAMETERS = frozenset([
+    "key", "keys", "startkey", "start_key", "endkey", "end_key",
+    "limit", "skip", "descending", "include_docs", "inclusive_end",
+    "conflicts", "deleted_conflicts", "open_revs", "revs", "new_edits"
+])
+
+# Endpoints that are never throttled (so that clients can always authenticate)
+THROTTLE_EXEMPT_OPERATIONS = frozenset([request_util.OPERATION_SESSION])
+
+# Provisioned throughput capacity (see: IBM Cloudant Standard plan)
+THROUGHPUT_CAPACITY_SEGMENTS = ["_api", "v2", "user", "capacity", "throughput"]
+THROUGHPUT_PER_BLOCK = {"read": 100, "write": 50, "query": 5} # requests/s per capacity block
+DEFAULT_THROUGHPUT_BLOCKS = 1
+
+# Continuous changes feed (see: _changes?feed=continuous)
+DEFAULT_CHANGES_TIMEOUT = 60 # seconds without changes before the feed ends (no heartbeat)
+
+# Compactions (see: _compact): reported by /_active_tasks until done, then applied to the store
+DEFAULT_COMPACTION_TIME = 5 # seconds
+
+# Background tasks reported by /_active_tasks (simulated cluster activity)
+BACKGROUND_TASK_TYPES = ( # pylint: disable=unused-variable
+    "indexer", "database_compaction", "view_compaction", "replication"
+)
+
+# Private Functions ----------------------------------------------------------->
+
+def _get_error(error, reason):
+    """
+    CouchDB error response body
+    """
+
+    return {"error": error, "reason": reason}
+
+
+def _get_shard_name(database_name):
+    """
+    Name of the (single) shard of a database, as reported by /_active_tasks
+    """
+
+    return "shards/00000000-ffffffff/{0}.0".format(database_name)
+
+
+def _get_query_options(url):
+    """
+    Parse the query string of the URL (JSON encoded parameters are decoded)
+    """
+
+    options = {}
+
+    for name, value in parse_qsl(urlsplit(url).query, keep_blank_values=True):
+        if name in JSON_PARAMETERS:
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        options[name] = value
+
+    return options
+
+
+# Classes --------------------------------------------------------------------->
+
+class StandInServer: # pylint: disable=unused-variable
+    """
+    In-process CouchDB / Cloudant stand-in (HTTP) server backed by an in-memory store, for offline benchmarking
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, store, port=DEFAULT_PORT, host=DEFAULT_HOST, username=None, password=None, **kwargs):
+        """
+        Constructor
+
+        Keyword arguments:
+        - latency: Fixed delay added to every response (in seconds).
+        - latency_jitter: Uniformly distributed extra delay added to every response (in seconds).
+        - bandwidth: Maximum response transfer rate (in bytes per second). Default: unlimited.
+        - throttle_probability: Probability (0 - 1) of answering a request with 429 Too Many Requests.
+        - session_timeout: Session cookie lifetime (in seconds).
+        - throughput_blocks: Provisioned throughput capacity blocks reported by the capacity API.
+        - background_tasks: Dictionary of task type (e.g. indexer) -> number of tasks reported by /_active_tasks.
+        - background_cycle: Period (in seconds) alternating between busy (background tasks running) and idle
+          phases. Default: 0 (always busy).
+        - compaction_time: Duration (in seconds) of a database / view compaction.
+        - seed: Random seed (latency jitter, throttling).
+        """
+
+        # pylint: disable=too-many-arguments
+
+        self._store = store
+        self._port = port
+        self._host = host
+        self._username = username
+        self._password = password
+
+        self._latency = kwargs.get("latency", 0.0)
+        self._latency_jitter = kwargs.get("latency_jitter", 0.0)
+        self._bandwidth = kwargs.get("bandwidth")
+        self._throttle_probability = kwargs.get("throttle_probability", 0.0)
+        self._session_timeout = kwargs.get("session_timeout", DEFAULT_SESSION_TIMEOUT)
+        self._throughput_blocks = kwargs.get("throughput_blocks", DEFAULT_THROUGHPUT_BLOCKS)
+        self._background_tasks = kwargs.get("background_tasks") or {}
+        self._background_cycle = kwargs.get("background_cycle", 0)
+        self._compaction_time = kwargs.get("compaction_time", DEFAULT_COMPACTION_TIME)
+
+        self._random = random.Random(kwargs.get("seed"))
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._compactions = {} # (database name, design document name or None) -> start time
+        self._server = None
+        self._thread = None
+        self._start_time = time.monotonic()
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def start(self, logger=DEFAULT_LOGGER):
+        """
+        Start serving requests in a background thread
+        """
+
+        logger.info("Starting stand-in server: http://%s:%d...", self._host, self._port)
+
+        try:
+            self._server = ThreadingHTTPServer((self._host, self._port), self._get_handler_class())
+        except OSError as err:
+            logger.error("Failed to start stand-in server on port: %d.", self._port)
+            error_util.log_exception(logger, err)
+            return False
+
+        self._server.daemon_threads = True
+        self._port = self._server.server_address[1]
+        self._start_time = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="stand-in-server",
+            daemon=True)
+        self._thread.start()
+
+        logger.info("Successfully started stand-in server: %s.", self.get_url())
+
+        return True
+
+
+    def stop(self, logger=DEFAULT_LOGGER):
+        """
+        Stop serving requests
+        """
+
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+            logger.info("Stopped stand-in server: %s.", self.get_url())
+
+
+    def get_url(self):
+        """
+        Retrieve the server URL (the actual port is known once started)
+        """
+
+        return "http://{0}:{1}".format(self._host, self._port)
+
+
+    def get_store(self):
+        """
+        Retrieve the backing store
+        """
+
+        return self._store
+
+
+    def handle_request(self, method, url, headers, body):
+        """
+        Handle a request; returns (status, JSON body, extra headers)
+        """
+
+        operation = request_util.get_operation(method, url)
+
+        if operation not in THROTTLE_EXEMPT_OPERATIONS and self._is_throttled():
+            return 429, _get_error("too_many_requests", "You've exceeded your rate limit allowance."), {}
+
+        if operation == request_util.OPERATION_SESSION:
+            return self._handle_session(method, headers, body)
+
+        if not self._is_authorized(headers):
+            return 401, _get_error("unauthorized", "You are not authorized to access this db."), {}
+
+        segments = request_util.get_path_segments(url)
+        options = _get_query_options(url)
+
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            return 400, _get_error("bad_request", "Request body is not valid JSON."), {}
+
+        status, result = self._route(method, segments, options, payload)
+
+        return status, result, {}
+
+
+    def get_delay(self, response_size):
+        """
+        Compute the simulated network delay (in seconds) of a response
+        """
+
+        delay = self._latency
+
+        if self._latency_jitter:
+            with self._lock:
+                delay += self._random.uniform(0, self._latency_jitter)
+
+        if self._bandwidth:
+            delay += response_size / self._bandwidth
+
+        return delay
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _is_throttled(self):
+        """
+        Decide whether to reject the request with 429 Too Many Requests
+        """
+
+        if self._throttle_probability <= 0:
+            return False
+
+        with self._lock:
+            return self._random.random() < self._throttle_probability
+
+
+    def _is_authorized(self, headers):
+        """
+        Validate the session cookie or basic authentication credentials (if credentials are configured)
+        """
+
+        if self._username is None:
+            return True
+
+        cookie = SimpleCookie(headers.get("Cookie", ""))
+
+        if SESSION_COOKIE_NAME in cookie:
+            with self._lock:
+                session = self._sessions.get(cookie[SESSION_COOKIE_NAME].value)
+            if session and session[1] > time.monotonic():
+                return True
+
+        authorization = headers.get("Authorization", "")
+
+        if authorization.startswith("Basic "):
+            try:
+                credentials = base64.b64decode(authorization[6:]).decode("utf-8")
+            except (ValueError, UnicodeDecodeError):
+                return False
+            return credentials == "{0}:{1}".format(self._username, self._password)
+
+        return False
+
+
+    def _handle_session(self, method, headers, body):
+        """
+        Handle /_session (cookie authentication)
+        """
+
+        if method == "POST":
+            if headers.get("Content-Type", "").startswith(FORM_CONTENT_TYPE):
+                credentials = dict(parse_qsl(body.decode("utf-8")))
+            else:
+                try:
+                    credentials = json.loads(body) if body else {}
+                except ValueError:
+                    return 400, _get_error("bad_request", "Request body is not valid JSON."), {}
+
+            name = credentials.get("name")
+
+            if self._username is not None and \
+                    (name != self._username or credentials.get("password") != self._password):
+                return 401, _get_error("unauthorized", "Name or password is incorrect."), {}
+
+            token = secrets.token_hex(16)
+
+            with self._lock:
+                self._sessions[token] = (name, time.monotonic() + self._session_timeout)
+
+            cookie = "{0}={1}; Version=1; Max-Age={2}; Path=/; HttpOnly".format(
+                SESSION_COOKIE_NAME,
+                token,
+                self._session_timeout)
+
+            return 200, {"ok": True, "name": name, "roles": []}, {"Set-Cookie": cookie}
+
+        cookie = SimpleCookie(headers.get("Cookie", ""))
+        token = cookie[SESSION_COOKIE_NAME].value if SESSION_COOKIE_NAME in cookie else None
+
+        if method == "DELETE":
+            with self._lock:
+                self._sessions.pop(token, None)
+            return 200, {"ok": True}, {}
+
+        with self._lock:
+            session = self._sessions.get(token)
+
+        name = session[0] if session and session[1] > time.monotonic() else None
+
+        return 200, {
+            "ok": True,
+            "userCtx": {"name": name, "roles": []},
+            "info": {"authentication_handlers": ["cookie", "default"], "authenticated": "cookie"}
+        }, {}
+
+
+    def _route(self, method, segments, options, payload):
+        """
+        Route an authorized request to the store; returns (status, JSON body)
+        """
+
+        # pylint: disable=too-many-return-statements,too-many-branches
+
+        if not segments:
+            return 200, {"couchdb": "Welcome", "version": SERVER_VERSION, "vendor": {"name": "stand-in"}}
+
+        if segments == ["_all_dbs"]:
+            return 200, self._store.list_databases()
+
+        if segments == THROUGHPUT_CAPACITY_SEGMENTS and method == "GET":
+            return 200, self._get_throughput_capacity()
+
+        if segments == ["_active_tasks"] and method == "GET":
+            return 200, self._get_active_tasks()
+
+        database_name = segments[0]
+
+        if len(segments) == 1:
+            return self._route_database(method, database_name, payload)
+
+        endpoint = segments[1]
+
+        if endpoint == "_design" and len(segments) == 5 and segments[3] == "_view":
+            return self._route_view(database_name, "_design/" + segments[2], segments[4], options, payload)
+
+        if endpoint == "_bulk_docs" and method == "POST":
+            return self._store.bulk_docs(database_name, payload.get("docs", []), payload.get("new_edits", True))
+
+        if endpoint == "_bulk_get" and method == "POST":
+            return self._store.bulk_get(database_name, payload.get("docs", []))
+
+        if endpoint == "_find" and method == "POST":
+            return self._store.find(database_name, payload)
+
+        if endpoint == "_all_docs" and method in ("GET", "POST"):
+            return self._store.all_docs(
+                database_name,
+                keys=payload.get("keys", options.get("keys")),
+                include_docs=bool(options.get("include_docs")),
+                conflicts=bool(options.get("conflicts")))
+
+        if endpoint == "_changes" and method == "GET":
+            return self._route_changes(database_name, options)
+
+        if endpoint == "_compact" and method == "POST" and len(segments) <= 3:
+            return self._start_compaction(database_name, segments[2] if len(segments) == 3 else None)
+
+        if endpoint == "_view_cleanup" and method == "POST":
+            if not self._store.has_database(database_name):
+                return 404, _get_error("not_found", "Database does not exist.")
+            return 202, {"ok": True}
+
+        if endpoint == "_design" and len(segments) == 3:
+            return self._route_document(method, database_name, "_design/" + segments[2], options, payload)
+
+        if endpoint == "_local" and len(segments) == 3:
+            return self._route_local_document(method, database_name, "_local/" + segments[2], options, payload)
+
+        if endpoint.startswith("_") or len(segments) != 2:
+            return 404, _get_error("not_found", "Unsupported endpoint.")
+
+        return self._route_document(method, database_name, endpoint, options, payload)
+
+
+    def _get_throughput_capacity(self):
+        """
+        Provisioned throughput capacity response body (current and target capacities are identical)
+        """
+
+        throughput = {"blocks": self._throughput_blocks}
+        throughput.update({
+            capacity_class: rate * self._throughput_blocks for capacity_class, rate in THROUGHPUT_PER_BLOCK.items()
+        })
+
+        return {"current": {"throughput": throughput}, "target": {"throughput": dict(throughput)}}
+
+
+    def _get_active_tasks(self):
+        """
+        Active tasks response body: the compactions in progress, and the simulated background tasks while in a busy
+        phase
+        """
+
+        tasks = self._get_compaction_tasks()
+        elapsed = time.monotonic() - self._start_time
+
+        if self._background_cycle and int(elapsed / self._background_cycle) % 2 == 1:
+            return tasks
+
+        started_on = int(time.time() - elapsed)
+        progress = int(elapsed) % 100
+
+        return tasks + [
+            {
+                "type": task_type,
+                "node": "stand-in@127.0.0.1",
+                "pid": "<0.{0}.{1}>".format(index, len(task_type)),
+                "progress": progress,
+                "started_on": started_on,
+                "updated_on": started_on + int(elapsed)
+            }
+            for task_type, count in sorted(self._background_tasks.items())
+            for index in range(count)
+        ]
+
+
+    def _start_compaction(self, database_name, ddoc_name):
+        """
+        Start the compaction of a database (or of the views of a design document) unless already running
+        """
+
+        if not self._store.has_database(database_name):
+            return 404, _get_error("not_found", "Database does not exist.")
+
+        if ddoc_name is not None:
+            status, _ = self._store.get_document(database_name, "_design/" + ddoc_name)
+            if status != 200:
+                return 404, _get_error("not_found", "Design document does not exist.")
+
+        with self._lock:
+            self._compactions.setdefault((database_name, ddoc_name), time.monotonic())
+
+        return 202, {"ok": True}
+
+
+    def _get_compaction_tasks(self):
+        """
+        Active tasks of the compactions in progress (clustered format: one shard per database); the finished
+        database compactions are applied to the store
+        """
+
+        now = time.monotonic()
+        tasks = []
+
+        with self._lock:
+            for key, start_time in list(self._compactions.items()):
+                database_name, ddoc_name = key
+                elapsed = now - start_time
+
+                if elapsed >= self._compaction_time:
+                    del self._compactions[key]
+                    if ddoc_name is None:
+                        self._store.compact_database(database_name)
+                    continue
+
+                task = {
+                    "type": "view_compaction" if ddoc_name else "database_compaction",
+                    "node": "stand-in@127.0.0.1",
+                    "pid": "<0.{0}.0>".format(len(tasks)),
+                    "database": _get_shard_name(database_name),
+                    "progress": int(elapsed / self._compaction_time * 100),
+                    "started_on": int(time.time() - elapsed),
+                    "updated_on": int(time.time())
+                }
+
+                if ddoc_name:
+                    task["design_document"] = "_design/" + ddoc_name
+
+                tasks.append(task)
+
+        return tasks
+
+
+    def _route_changes(self, database_name, options):
+        """
+        Changes feed: normal (single response) or continuous (streamed lines, see: _get_continuous_changes)
+        """
+
+        since = options.get("since", "0")
+        all_docs = options.get("style") == "all_docs"
+
+        if since == "now":
+            since = self._store.get_update_seq(database_name) or 0
+
+        try:
+            since = int(since)
+        except ValueError:
+            return 400, _get_error("bad_request", "Malformed sequence supplied in 'since' parameter.")
+
+        if options.get("feed") != "continuous":
+            return self._store.get_changes(database_name, since, all_docs)
+
+        if not self._store.has_database(database_name):
+            return 404, _get_error("not_found", "Database does not exist.")
+
+        try:
+            heartbeat = float(options.get("heartbeat", 0)) / 1000
+            timeout = float(options.get("timeout", DEFAULT_CHANGES_TIMEOUT * 1000)) / 1000
+        except ValueError:
+            return 400, _get_error("bad_request", "Invalid heartbeat / timeout value.")
+
+        return 200, self._get_continuous_changes(database_name, since, all_docs, heartbeat, timeout)
+
+
+    def _get_continuous_changes(self, database_name, since, all_docs, heartbeat, timeout):
+        """
+        Continuous changes feed: one JSON line per change as they happen, an empty line every heartbeat while idle;
+        without heartbeat, ends with the last sequence once idle for the timeout
+        """
+
+        # pylint: disable=too-many-arguments
+
+        idle_time = 0
+
+        while True:
+            status, result = self._store.get_changes(database_name, since, all_docs)
+
+            if status != 200:
+                return
+
+            for change in result["results"]:
+                yield json.dumps(change) + "\n"
+                idle_time = 0
+
+            since = int(result["last_seq"])
+
+            if not heartbeat and idle_time >= timeout:
+                yield json.dumps({"last_seq": str(since), "pending": 0}) + "\n"
+                return
+
+            wait_time = heartbeat or timeout - idle_time
+
+            if not self._store.wait_for_changes(database_name, since, wait_time):
+                idle_time += wait_time
+                if heartbeat:
+                    yield "\n"
+
+
+    def _route_database(self, method, database_name, payload):
+        """
+        Database level requests
+        """
+
+        if method in ("GET", "HEAD"):
+            compactions = [task for task in self._get_compaction_tasks() if task["type"] == "database_compaction"]
+            status, info = self._store.get_database_info(database_name)
+            if status == 200:
+                info["compact_running"] = any(task["database"] == _get_shard_name(database_name)
+                    for task in compactions)
+            return status, info
+
+        if method == "POST":
+            doc_id = payload.get("_id") or secrets.token_hex(16)
+            return self._store.put_document(database_name, doc_id, dict(payload, _id=doc_id))
+
+        if method == "PUT":
+            return self._store.create_database(database_name)
+
+        if method == "DELETE":
+            return self._store.delete_database(database_name)
+
+        return 405, _get_error("method_not_allowed", "Only DELETE,GET,HEAD,POST,PUT allowed")
+
+
+    def _route_view(self, database_name, ddoc_id, view_name, options, payload):
+        """
+        View requests (only the conflicts view is computed natively)
+        """
+
+        # pylint: disable=too-many-arguments
+
+        status, ddoc = self._store.get_document(database_name, ddoc_id)
+
+        if status != 200:
+            return status, ddoc
+
+        if view_name not in ddoc.get("views", {}):
+            return 404, _get_error("not_found", "missing_named_view")
+
+        if view_name != "conflicts":
+            return 501, _get_error("not_implemented", "Only the conflicts view is supported by the stand-in.")
+
+        if "keys" in payload:
+            options = dict(options, keys=payload["keys"])
+
+        if "keys" in options:
+            rows = []
+            total_rows = 0
+            for key in options["keys"]:
+                _, results = self._store.query_conflicts_view(database_name, dict(options, key=key))
+                rows.extend(results["rows"])
+                total_rows = results["total_rows"]
+            return 200, {"total_rows": total_rows, "offset": 0, "rows": rows}
+
+        return self._store.query_conflicts_view(database_name, options)
+
+
+    def _route_document(self, method, database_name, doc_id, options, payload):
+        """
+        Document level requests
+        """
+
+        # pylint: disable=too-many-arguments
+
+        if method in ("GET", "HEAD"):
+            if "open_revs" in options:
+                revisions = options["open_revs"]
+                return self._store.get_open_revisions(
+                    database_name,
+                    doc_id,
+                    revisions if isinstance(revisions, list) else None,
+                    revs=options.get("revs", False) is True)
+
+            return self._store.get_document(
+                database_name,
+                doc_id,
+                revision=options.get("rev"),
+                conflicts=options.get("conflicts", False) is True,
+                deleted_conflicts=options.get("deleted_conflicts", False) is True)
+
+        if method == "PUT":
+            body = dict(payload, _id=doc_id)
+            if "rev" in options:
+                body["_rev"] = options["rev"]
+            return self._store.put_document(database_name, doc_id, body)
+
+        if method == "DELETE":
+            if "rev" not in options:
+                return 409, _get_error("conflict", "Document update conflict.")
+            return self._store.delete_document(database_name, doc_id, options["rev"])
+
+        return 405, _get_error("method_not_allowed", "Only DELETE,GET,HEAD,PUT allowed")
+
+
+    def _route_local_document(self, method, database_name, doc_id, options, payload):
+        """
+        Local document requests (e.g. work leases)
+        """
+
+        # pylint: disable=too-many-arguments
+
+        if method == "GET":
+            return self._store.get_local_document(database_name, doc_id)
+
+        if method == "PUT":
+            body = dict(payload)
+            if "rev" in options:
+                body["_rev"] = options["rev"]
+            return self._store.put_local_document(database_name, doc_id, body)
+
+        return 405, _get_error("method_not_allowed", "Only GET,PUT allowed")
+
+
+    def _get_handler_class(self):
+        """
+        Create the HTTP request handler class bound to this server
+        """
+
+        server = self
+
+        class _StandInRequestHandler(BaseHTTPRequestHandler):
+            """
+            Serves the CouchDB / Cloudant HTTP API subset
+            """
+
+            protocol_version = "HTTP/1.1"
+
+            # Headers and body are written separately; avoid Nagle / delayed ACK stalls on keep-alive connections
+            disable_nagle_algorithm = True
+
+            def do_GET(self): # pylint: disable=invalid-name
+                """
+                Handle GET requests
+                """
+
+                self._handle("GET")
+
+
+            def do_HEAD(self): # pylint: disable=invalid-name
+                """
+                Handle HEAD requests
+                """
+
+                self._handle("HEAD")
+
+
+            def do_PUT(self): # pylint: disable=invalid-name
+                """
+                Handle PUT requests
+                """
+
+                self._handle("PUT")
+
+
+            def do_POST(self): # pylint: disable=invalid-name
+                """
+                Handle POST requests
+                """
+
+                self._handle("POST")
+
+
+            def do_DELETE(self): # pylint: disable=invalid-name
+                """
+                Handle DELETE requests
+                """
+
+                self._handle("DELETE")
+
+
+            def log_message(self, format, *args): # pylint: disable=redefined-builtin
+                """
+                Route access logs to the module logger
+                """
+
+                DEFAULT_LOGGER.debug(format, *args)
+
+
+            def _handle(self, method):
+                """
+                Read the request, delegate to the server and write the JSON response
+                """
+
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+
+                status, result, headers = server.handle_request(method, self.path, self.headers, body)
+
+                if isinstance(result, types.GeneratorType):
+                    self._stream(status, result)
+                    return
+
+                content = json.dumps(result).encode("utf-8")
+
+                if status == 200 and isinstance(result, dict) and "_rev" in result and "_id" in result:
+                    headers = dict(headers, ETag='"{0}"'.format(result["_rev"]))
+
+                delay = server.get_delay(len(content))
+
+                if delay > 0:
+                    time.sleep(delay)
+
+                self.send_response(status)
+                self.send_header("Content-Type", JSON_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(content)))
+                self.send_header("Cache-Control", "must-revalidate")
+
+                for name, value in headers.items():
+                    self.send_header(name, value)
+
+                self.end_headers()
+
+                if method != "HEAD":
+                    self.wfile.write(content)
+
+
+            def _stream(self, status, lines):
+                """
+                Write a streamed response (chunked transfer encoding), e.g. a continuous changes feed
+                """
+
+                delay = server.get_delay(0)
+
+                if delay > 0:
+                    time.sleep(delay)
+
+                self.send_response(status)
+                self.send_header("Content-Type", JSON_CONTENT_TYPE)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.send_header("Cache-Control", "must-revalidate")
+                self.end_headers()
+
+                try:
+                    for line in lines:
+                        data = line.encode("utf-8")
+                        self.wfile.write("{0:X}\r\n".format(len(data)).encode("ascii") + data + b"\r\n")
+                        self.wfile.flush()
+
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client disconnected (e.g. the feed follower stopped)
+                    self.close_connection = True
+                finally:
+                    lines.close()
+
+
+        return _StandInRequestHandler
@@ -0,0 +1,1036 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# pylint: disable=too-many-lines
+
+# Modules
+
+import threading
+import hashlib
+import bisect
+import base64
+import operator
+import json
+
+from lib.constants import constants
+
+# Globals
+
+PROPERTY_ID = "_id"
+PROPERTY_REV = "_rev"
+PROPERTY_DELETED = "_deleted"
+PROPERTY_CONFLICTS = "_conflicts"
+PROPERTY_DELETED_CONFLICTS = "_deleted_conflicts"
+PROPERTY_REVISIONS = "_revisions"
+
+DESIGN_DOCUMENT_PREFIX = "_design/"
+
+# Equivalent of design_docs/conflicts.js (the stand-in computes this view natively)
+CONFLICTS_DESIGN_DOCUMENT = {
+    "language": "javascript",
+    "views": {
+        constants.VIEW_NAME: {
+            "map": constants.VIEW_MAP_FUNCTION
+        }
+    }
+}
+
+DEFAULT_FIND_LIMIT = 25
+
+# Cloudant Query comparison operators
+_COMPARISON_OPERATORS = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le
+}
+
+# Approximate on-disk overhead of a revision tombstone / tree entry (bytes)
+REVISION_OVERHEAD = 64
+
+# Private Classes ------------------------------------------------------------->
+
+class _Maximum: # pylint: disable=too-few-public-methods
+    """
+    Sentinel that collates after any value (used as an open upper bound)
+    """
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+    def __eq__(self, other):
+        return isinstance(other, _Maximum)
+
+    def __hash__(self):
+        return 0
+
+
+_MAXIMUM = _Maximum()
+
+# Private Functions ----------------------------------------------------------->
+
+def _get_error(error, reason):
+    """
+    CouchDB error response body
+    """
+
+    return {"error": error, "reason": reason}
+
+
+def _get_revision_sort_key(revision):
+    """
+    Sort key of a revision ID (position, hash)
+    """
+
+    position, _, digest = revision.partition("-")
+
+    return (int(position), digest)
+
+
+def _get_next_revision(parent_revision, body, deleted):
+    """
+    Generate the child revision ID of the specified parent revision
+    """
+
+    position = _get_revision_sort_key(parent_revision)[0] if parent_revision else 0
+    payload = json.dumps([parent_revision, deleted, body], sort_keys=True).encode("utf-8")
+
+    return "{0}-{1}".format(position + 1, hashlib.md5(payload).hexdigest())
+
+
+def _get_collation_key(value):
+    """
+    Approximation of the CouchDB view collation order (null < booleans < numbers < strings < arrays < objects)
+    """
+
+    # pylint: disable=too-many-return-statements
+
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, list):
+        return (4, tuple(_get_collation_key(item) for item in value))
+    if isinstance(value, dict):
+        return (5, tuple((key, _get_collation_key(item)) for key, item in value.items()))
+
+    return (6, str(value))
+
+
+def _get_field(document, path):
+    """
+    Retrieve a (dotted) field value; returns (found, value)
+    """
+
+    value = document
+
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return False, None
+        value = value[part]
+
+    return True, value
+
+
+def _matches_condition(found, value, condition):
+    """
+    Determine whether a field value satisfies a Cloudant Query condition
+    """
+
+    # pylint: disable=too-many-return-statements
+
+    if not isinstance(condition, dict):
+        return found and value == condition
+
+    for name, operand in condition.items():
+        if name == "$exists":
+            if found != bool(operand):
+                return False
+        elif not found:
+            return False
+        elif name == "$eq" and value != operand:
+            return False
+        elif name == "$ne" and value == operand:
+            return False
+        elif name == "$in" and value not in operand:
+            return False
+        elif name == "$nin" and value in operand:
+            return False
+        elif name in _COMPARISON_OPERATORS:
+            if type(value) is not type(operand): # pylint: disable=unidiomatic-typecheck
+                return False
+            if not _COMPARISON_OPERATORS[name](value, operand):
+                return False
+
+    return True
+
+
+def _matches_selector(document, selector):
+    """
+    Determine whether a document satisfies a (subset of the) Cloudant Query selector syntax
+    """
+
+    for field, condition in selector.items():
+        if field == "$and":
+            if not all(_matches_selector(document, item) for item in condition):
+                return False
+        elif field == "$or":
+            if not any(_matches_selector(document, item) for item in condition):
+                return False
+        else:
+            found, value = _get_field(document, field)
+            if not _matches_condition(found, value, condition):
+                return False
+
+    return True
+
+
+# Classes --------------------------------------------------------------------->
+
+class StandInStore: # pylint: disable=unused-variable
+    """
+    Thread-safe in-memory CouchDB-like document store (revision leaves, conflicts, conflicts view)
+    """
+
+    # pylint: disable=too-many-public-methods
+
+    def __init__(self):
+        """
+        Constructor
+        """
+
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock) # notified on every new leaf revision (changes feeds)
+        self._databases = {}
+
+
+    # Public Methods: Databases ----------------------------------------------->
+
+    def create_database(self, database_name):
+        """
+        Create a database; returns (status, body)
+        """
+
+        with self._lock:
+            if database_name in self._databases:
+                return 412, _get_error("file_exists", "The database could not be created, the file already exists.")
+
+            self._databases[database_name] = {
+                "docs": {},
+                "local_docs": {},
+                "seq": 0,
+                "file_size": 0,
+                "version": 0,
+                "view_cache": None
+            }
+
+        return 201, {"ok": True}
+
+
+    def delete_database(self, database_name):
+        """
+        Delete a database; returns (status, body)
+        """
+
+        with self._lock:
+            if self._databases.pop(database_name, None) is None:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+        return 200, {"ok": True}
+
+
+    def list_databases(self):
+        """
+        List database names
+        """
+
+        with self._lock:
+            return sorted(self._databases)
+
+
+    def has_database(self, database_name):
+        """
+        Determine whether the database exists
+        """
+
+        with self._lock:
+            return database_name in self._databases
+
+
+    def get_database_info(self, database_name):
+        """
+        Retrieve database metadata; returns (status, body)
+        """
+
+        with self._lock:
+            database = self._databases.get(database_name)
+
+            if database is None:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+            doc_count = 0
+            doc_del_count = 0
+            active_size = 0
+            external_size = 0
+
+            for document in database["docs"].values():
+                leaves = document["leaves"]
+                winner = self._get_winner(leaves)
+
+                if leaves[winner]["deleted"]:
+                    doc_del_count += 1
+                else:
+                    doc_count += 1
+                    external_size += document["sizes"][winner]
+
+                active_size += sum(document["sizes"].values()) + REVISION_OVERHEAD * len(leaves)
+
+            return 200, {
+                "db_name": database_name,
+                "doc_count": doc_count,
+                "doc_del_count": doc_del_count,
+                "update_seq": str(database["seq"]),
+                "sizes": {
+                    "file": max(database["file_size"], active_size),
+                    "active": active_size,
+                    "external": external_size
+                }
+            }
+
+
+    def compact_database(self, database_name):
+        """
+        Compact a database: the file size shrinks to the active size (leaf revisions only); returns (status, body)
+        """
+
+        with self._lock:
+            status, info = self.get_database_info(database_name)
+
+            if status != 200:
+                return status, info
+
+            self._databases[database_name]["file_size"] = info["sizes"]["active"]
+
+        return 200, {"ok": True}
+
+
+    # Public Methods: Documents ----------------------------------------------->
+
+    def get_document(self, database_name, doc_id, revision=None, conflicts=False, deleted_conflicts=False):
+        """
+        Retrieve the winning (or specified) revision of a document; returns (status, body)
+        """
+
+        # pylint: disable=too-many-arguments
+
+        with self._lock:
+            _, document, error = self._get_existing_document(database_name, doc_id)
+
+            if error:
+                return error
+
+            leaves = document["leaves"]
+            winner = self._get_winner(leaves)
+
+            if revision is None:
+                if leaves[winner]["deleted"]:
+                    return 404, _get_error("not_found", "deleted")
+                revision = winner
+            elif revision not in leaves:
+                return 404, _get_error("not_found", "missing")
+
+            body = self._get_body(doc_id, revision, leaves[revision])
+
+            if conflicts and revision == winner:
+                conflicted_revisions = self._get_conflicts(leaves, winner)
+                if conflicted_revisions:
+                    body[PROPERTY_CONFLICTS] = conflicted_revisions
+
+            if deleted_conflicts and revision == winner:
+                deleted_revisions = self._get_deleted_conflicts(leaves, winner)
+                if deleted_revisions:
+                    body[PROPERTY_DELETED_CONFLICTS] = deleted_revisions
+
+            return 200, body
+
+
+    def get_open_revisions(self, database_name, doc_id, revisions=None, revs=False):
+        """
+        Retrieve the specified (or all) leaf revisions of a document (with their revision history if revs); returns
+        (status, body)
+        """
+
+        with self._lock:
+            _, document, error = self._get_existing_document(database_name, doc_id)
+
+            if error:
+                return error
+
+            leaves = document["leaves"]
+            results = []
+
+            for revision in revisions if revisions is not None else sorted(leaves, key=_get_revision_sort_key):
+                if revision in leaves:
+                    results.append({"ok": self._get_body(doc_id, revision, leaves[revision], revs=revs)})
+                else:
+                    results.append({"missing": revision})
+
+            return 200, results
+
+
+    def bulk_get(self, database_name, requests):
+        """
+        Retrieve a batch of document revisions (the winning revision if none is specified); returns (status, body)
+        """
+
+        with self._lock:
+            if database_name not in self._databases:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+            results = []
+
+            for request in requests:
+                doc_id = request.get("id")
+                revision = request.get("rev")
+                status, body = self.get_document(database_name, doc_id, revision=revision)
+
+                if status == 200:
+                    entry = {"ok": body}
+                else:
+                    entry = {"error": dict(body, id=doc_id, rev=revision or "undefined")}
+
+                results.append({"id": doc_id, "docs": [entry]})
+
+            return 200, {"results": results}
+
+
+    def put_document(self, database_name, doc_id, body):
+        """
+        Create or update a document (interactive edit); returns (status, body)
+        """
+
+        with self._lock:
+            database = self._databases.get(database_name)
+
+            if database is None:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+            return self._update_document(database, doc_id, body)
+
+
+    def delete_document(self, database_name, doc_id, revision):
+        """
+        Delete a document revision (replace the leaf with a tombstone); returns (status, body)
+        """
+
+        with self._lock:
+            database = self._databases.get(database_name)
+
+            if database is None:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+            if doc_id not in database["docs"]:
+                return 404, _get_error("not_found", "missing")
+
+            status, result = self._update_document(database, doc_id, {PROPERTY_REV: revision, PROPERTY_DELETED: True})
+
+            return (200 if status == 201 else status), result
+
+
+    def write_revisions(self, database_name, docs):
+        """
+        Replicator-style batch write (_bulk_docs with new_edits=false); returns True on success
+        """
+
+        status, _ = self.bulk_docs(database_name, docs, new_edits=False)
+
+        return status == 201
+
+
+    def bulk_docs(self, database_name, docs, new_edits=True):
+        """
+        Write a batch of documents; returns (status, body)
+        """
+
+        with self._lock:
+            database = self._databases.get(database_name)
+
+            if database is None:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+            results = []
+
+            for body in docs:
+                doc_id = body.get(PROPERTY_ID)
+
+                if not doc_id:
+                    results.append({"error": "bad_request", "reason": "Document must have an _id."})
+                    continue
+
+                if new_edits:
+                    status, result = self._update_document(database, doc_id, body)
+
+                    if status >= 400:
+                        result = dict(result, id=doc_id)
+
+                    results.append(result)
+                    continue
+
+                if not body.get(PROPERTY_REV):
+                    results.append({"id": doc_id, "error": "bad_request", "reason": "Missing _rev."})
+                    continue
+
+                self._insert_revision(database, doc_id, body)
+
+            if new_edits:
+                return 201, results
+
+            return 201, []
+
+
+    # Public Methods: Queries ------------------------------------------------->
+
+    def query_conflicts_view(self, database_name, options):
+        """
+        Query the (natively computed) conflicts view: key = entity.name, value = _conflicts; returns (status, body)
+        """
+
+        # pylint: disable=too-many-locals
+
+        with self._lock:
+            database = self._databases.get(database_name)
+
+            if database is None:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+            rows, sort_keys = self._get_conflicts_view(database)
+            start, stop, step = self._get_view_range(sort_keys, options)
+
+            skip = int(options.get("skip", 0))
+            limit = options.get("limit")
+            indexes = range(start, stop, step)[skip:]
+
+            if limit is not None:
+                indexes = indexes[:int(limit)]
+
+            selected = []
+
+            for index in indexes:
+                row = dict(rows[index])
+
+                if options.get("include_docs"):
+                    _, row["doc"] = self.get_document(database_name, row["id"])
+
+                selected.append(row)
+
+            offset = (indexes[0] if step > 0 else len(rows) - 1 - indexes[0]) if indexes else len(rows)
+
+            return 200, {
+                "total_rows": len(rows),
+                "offset": offset,
+                "rows": selected
+            }
+
+
+    def all_docs(self, database_name, keys=None, include_docs=False, conflicts=False):
+        """
+        List the documents (all, or the specified keys in order) with their winning revisions; returns (status, body)
+        """
+
+        with self._lock:
+            database = self._databases.get(database_name)
+
+            if database is None:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+            doc_ids = keys if keys is not None else sorted(database["docs"])
+            rows = []
+
+            for doc_id in doc_ids:
+                document = database["docs"].get(doc_id)
+
+                if document is None:
+                    rows.append({"key": doc_id, "error": "not_found"})
+                    continue
+
+                winner = self._get_winner(document["leaves"])
+                deleted = document["leaves"][winner]["deleted"]
+
+                if deleted and keys is None:
+                    continue
+
+                row = {"id": doc_id, "key": doc_id, "value": {"rev": winner}}
+
+                if deleted:
+                    row["value"]["deleted"] = True
+
+                if include_docs:
+                    row["doc"] = None if deleted else self.get_document(database_name, doc_id, conflicts=conflicts)[1]
+
+                rows.append(row)
+
+            total_rows = sum(
+                1 for document in database["docs"].values()
+                if not document["leaves"][self._get_winner(document["leaves"])]["deleted"]
+            )
+
+            return 200, {"total_rows": total_rows, "offset": 0, "rows": rows}
+
+
+    def get_changes(self, database_name, since=0, all_docs=False, limit=None):
+        """
+        List the documents changed after the specified sequence (latest change of each document); returns (status,
+        body)
+        """
+
+        with self._lock:
+            database = self._databases.get(database_name)
+
+            if database is None:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+            changed = sorted(
+                (document["seq"], doc_id) for doc_id, document in database["docs"].items()
+                if document["seq"] > since
+            )
+
+            if limit is not None:
+                changed = changed[:limit]
+
+            results = []
+
+            for seq, doc_id in changed:
+                leaves = database["docs"][doc_id]["leaves"]
+                winner = self._get_winner(leaves)
+                revisions = [winner]
+
+                # style=all_docs: every leaf revision (conflicts and deleted conflicts), winner first
+
+                if all_docs:
+                    revisions.extend(sorted(
+                        (revision for revision in leaves if revision != winner),
+                        key=_get_revision_sort_key,
+                        reverse=True))
+
+                change = {"seq": str(seq), "id": doc_id, "changes": [{"rev": revision} for revision in revisions]}
+
+                if leaves[winner]["deleted"]:
+                    change["deleted"] = True
+
+                results.append(change)
+
+            last_seq = changed[-1][0] if changed else max(since, 0)
+
+            return 200, {"results": results, "last_seq": str(last_seq), "pending": 0}
+
+
+    def wait_for_changes(self, database_name, since, timeout):
+        """
+        Wait until the database has changed after the specified sequence; returns False on timeout (or if the
+        database does not exist)
+        """
+
+        with self._changed:
+            return self._changed.wait_for(
+                lambda: database_name in self._databases and self._databases[database_name]["seq"] > since,
+                timeout)
+
+
+    def get_update_seq(self, database_name):
+        """
+        Retrieve the current sequence of the database (None if it does not exist)
+        """
+
+        with self._lock:
+            database = self._databases.get(database_name)
+
+            return database["seq"] if database else None
+
+
+    def find(self, database_name, query):
+        """
+        Run a Cloudant Query (subset of the selector syntax, bookmark paging); returns (status, body)
+        """
+
+        selector = query.get("selector")
+
+        if not isinstance(selector, dict):
+            return 400, _get_error("bad_request", "The selector must be an object.")
+
+        limit = int(query.get("limit", DEFAULT_FIND_LIMIT))
+        skip = int(query.get("skip", 0))
+        fields = query.get("fields")
+        offset = 0
+
+        if query.get("bookmark") and query["bookmark"] != "nil":
+            try:
+                offset = int(base64.urlsafe_b64decode(query["bookmark"].encode("ascii")).decode("ascii"))
+            except (ValueError, UnicodeDecodeError):
+                return 400, _get_error("bad_request", "Invalid bookmark value.")
+
+        with self._lock:
+            database = self._databases.get(database_name)
+
+            if database is None:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+            matches = []
+
+            for doc_id in sorted(database["docs"]):
+                if doc_id.startswith(DESIGN_DOCUMENT_PREFIX):
+                    continue
+
+                status, body = self.get_document(database_name, doc_id, conflicts=query.get("conflicts", False))
+
+                if status == 200 and _matches_selector(body, selector):
+                    matches.append(body)
+
+        page = matches[offset + skip:offset + skip + limit]
+
+        if fields:
+            page = [{field: doc[field] for field in fields if field in doc} for doc in page]
+
+        bookmark = base64.urlsafe_b64encode(str(offset + skip + len(page)).encode("ascii")).decode("ascii")
+
+        return 200, {"docs": page, "bookmark": bookmark}
+
+
+    # Public Methods: Local Documents ----------------------------------------->
+
+    def get_local_document(self, database_name, doc_id):
+        """
+        Retrieve a local (non-replicated) document; returns (status, body)
+        """
+
+        with self._lock:
+            database = self._databases.get(database_name)
+
+            if database is None:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+            body = database["local_docs"].get(doc_id)
+
+            if body is None:
+                return 404, _get_error("not_found", "missing")
+
+            return 200, dict(body)
+
+
+    def put_local_document(self, database_name, doc_id, body):
+        """
+        Create or update a local document (revisions 0-N, no history); returns (status, body)
+        """
+
+        with self._lock:
+            database = self._databases.get(database_name)
+
+            if database is None:
+                return 404, _get_error("not_found", "Database does not exist.")
+
+            current = database["local_docs"].get(doc_id)
+
+            if body.get(PROPERTY_REV) != (current[PROPERTY_REV] if current else None):
+                return 409, _get_error("conflict", "Document update conflict.")
+
+            generation = int(current[PROPERTY_REV].split("-")[1]) + 1 if current else 1
+            revision = "0-{0}".format(generation)
+            database["local_docs"][doc_id] = dict(body, _id=doc_id, _rev=revision)
+
+            return 201, {"ok": True, "id": doc_id, "rev": revision}
+
+
+    # Public Methods: Design Documents ---------------------------------------->
+
+    def install_design_document(self, database_name, ddoc_id, ddoc=None):
+        """
+        Create or replace a design document (default: the conflicts design document)
+        """
+
+        with self._lock:
+            status, current = self.get_document(database_name, ddoc_id)
+            body = dict(ddoc or CONFLICTS_DESIGN_DOCUMENT, _id=ddoc_id)
+
+            if status == 200:
+                body[PROPERTY_REV] = current[PROPERTY_REV]
+
+            return self.put_document(database_name, ddoc_id, body)
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _get_existing_document(self, database_name, doc_id):
+        """
+        Lookup a database and document; returns (database, document, error)
+        """
+
+        database = self._databases.get(database_name)
+
+        if database is None:
+            return None, None, (404, _get_error("not_found", "Database does not exist."))
+
+        document = database["docs"].get(doc_id)
+
+        if document is None:
+            return database, None, (404, _get_error("not_found", "missing"))
+
+        return database, document, None
+
+
+    @staticmethod
+    def _get_winner(leaves):
+        """
+        Deterministic winning revision: highest (position, hash) among live leaves, else among deleted leaves
+        """
+
+        live = [revision for revision, leaf in leaves.items() if not leaf["deleted"]]
+
+        return max(live or leaves, key=_get_revision_sort_key)
+
+
+    @staticmethod
+    def _get_conflicts(leaves, winner):
+        """
+        Live, non-winning leaf revisions
+        """
+
+        conflicts = [
+            revision for revision, leaf in leaves.items()
+            if revision != winner and not leaf["deleted"]
+        ]
+
+        return sorted(conflicts, key=_get_revision_sort_key, reverse=True)
+
+
+    @staticmethod
+    def _get_deleted_conflicts(leaves, winner):
+        """
+        Deleted, non-winning leaf revisions
+        """
+
+        deleted = [
+            revision for revision, leaf in leaves.items()
+            if revision != winner and leaf["deleted"]
+        ]
+
+        return sorted(deleted, key=_get_revision_sort_key, reverse=True)
+
+
+    @staticmethod
+    def _get_body(doc_id, revision, leaf, revs=False):
+        """
+        Materialize a leaf revision as a JSON document (with its revision history, _revisions, if revs)
+        """
+
+        body = {PROPERTY_ID: doc_id, PROPERTY_REV: revision}
+
+        if leaf["deleted"]:
+            body[PROPERTY_DELETED] = True
+        else:
+            body.update(leaf["body"])
+
+        if revs:
+            body[PROPERTY_REVISIONS] = {
+                "start": _get_revision_sort_key(revision)[0],
+                "ids": [_get_revision_sort_key(ancestor)[1] for ancestor in leaf["history"]]
+            }
+
+        return body
+
+
+    def _update_document(self, database, doc_id, body):
+        """
+        Interactive edit (new_edits=true) of a document; returns (status, body)
+        """
+
+        revision = body.get(PROPERTY_REV)
+        deleted = bool(body.get(PROPERTY_DELETED, False))
+        content = {key: value for key, value in body.items() if not key.startswith("_")}
+        document = database["docs"].get(doc_id)
+
+        if document is None:
+            if revision:
+                return 409, _get_error("conflict", "Document update conflict.")
+            parent = None
+        elif revision:
+            leaf = document["leaves"].get(revision)
+            if leaf is None or (leaf["deleted"] and not deleted):
+                return 409, _get_error("conflict", "Document update conflict.")
+            parent = revision
+        else:
+            winner = self._get_winner(document["leaves"])
+            if not document["leaves"][winner]["deleted"]:
+                return 409, _get_error("conflict", "Document update conflict.")
+            parent = winner
+
+        new_revision = _get_next_revision(parent, content, deleted)
+
+        if document is None:
+            document = {"leaves": {}, "sizes": {}, "seq": 0}
+            database["docs"][doc_id] = document
+
+        ancestors = []
+
+        if parent is not None:
+            ancestors = document["leaves"][parent]["history"]
+            del document["leaves"][parent]
+            del document["sizes"][parent]
+
+        self._add_leaf(database, document, new_revision, content, deleted, ancestors)
+
+        return 201, {"ok": True, "id": doc_id, "rev": new_revision}
+
+
+    def _insert_revision(self, database, doc_id, body):
+        """
+        Replicator-style write (new_edits=false): add the revision as a leaf as-is
+        """
+
+        revision = body[PROPERTY_REV]
+        deleted = bool(body.get(PROPERTY_DELETED, False))
+        content = {key: value for key, value in body.items() if not key.startswith("_")}
+        document = database["docs"].get(doc_id)
+
+        if document is None:
+            document = {"leaves": {}, "sizes": {}, "seq": 0}
+            database["docs"][doc_id] = document
+
+        if revision in document["leaves"]:
+            return
+
+        self._add_leaf(database, document, revision, content, deleted)
+
+
+    def _add_leaf(self, database, document, revision, content, deleted, ancestors=()):
+        """
+        Store a leaf revision (with its revision history, most recent first) and update the database sequence /
+        size accounting
+        """
+
+        # pylint: disable=too-many-arguments
+
+        size = len(json.dumps(content)) if not deleted else 0
+
+        document["leaves"][revision] = {"body": content, "deleted": deleted, "history": [revision] + list(ancestors)}
+        document["sizes"][revision] = size
+
+        database["seq"] += 1
+        database["version"] += 1
+        database["file_size"] += size + REVISION_OVERHEAD
+        document["seq"] = database["seq"]
+
+        self._changed.notify_all()
+
+
+    def _get_conflicts_view(self, database):
+        """
+        Retrieve the (cached) sorted rows of the conflicts view and their sort keys
+        """
+
+        cache = database["view_cache"]
+
+        if cache and cache[0] == database["version"]:
+            return cache[1], cache[2]
+
+        entries = []
+
+        for doc_id, document in database["docs"].items():
+            if doc_id.startswith(DESIGN_DOCUMENT_PREFIX):
+                continue
+
+            leaves = document["leaves"]
+            winner = self._get_winner(leaves)
+
+            if leaves[winner]["deleted"]:
+                continue
+
+            conflicts = self._get_conflicts(leaves, winner)
+
+            if not conflicts:
+                continue
+
+            entity = leaves[winner]["body"].get("entity")
+            name = entity.get("name") if isinstance(entity, dict) and entity.get("name") else None
+            entries.append(((_get_collation_key(name), doc_id), {"id": doc_id, "key": name, "value": conflicts}))
+
+        entries.sort(key=lambda entry: entry[0])
+
+        rows = [entry[1] for entry in entries]
+        sort_keys = [entry[0] for entry in entries]
+        database["view_cache"] = (database["version"], rows, sort_keys)
+
+        return rows, sort_keys
+
+
+    @staticmethod
+    def _get_view_range(sort_keys, options):
+        """
+        Compute the (start, stop, step) index range selected by the view key options
+        """
+
+        descending = bool(options.get("descending", False))
+        inclusive_end = options.get("inclusive_end", True)
+
+        if "key" in options:
+            options = dict(options, startkey=options["key"], endkey=options["key"])
+            inclusive_end = True
+
+        start_key = options.get("startkey", options.get("start_key"))
+        start_doc_id = options.get("startkey_docid", options.get("start_key_doc_id"))
+        end_key = options.get("endkey", options.get("end_key"))
+        end_doc_id = options.get("endkey_docid", options.get("end_key_doc_id"))
+        has_start = "startkey" in options or "start_key" in options
+        has_end = "endkey" in options or "end_key" in options
+
+        if not descending:
+            start = 0
+            stop = len(sort_keys)
+
+            if has_start:
+                start = bisect.bisect_left(sort_keys, (_get_collation_key(start_key), start_doc_id or ""))
+
+            if has_end:
+                bound = (_get_collation_key(end_key), end_doc_id if end_doc_id is not None else _MAXIMUM)
+                if inclusive_end:
+                    stop = bisect.bisect_right(sort_keys, bound)
+                else:
+                    stop = bisect.bisect_left(sort_keys, (_get_collation_key(end_key), end_doc_id or ""))
+
+            return start, max(stop, start), 1
+
+        start = len(sort_keys) - 1
+        stop = -1
+
+        if has_start:
+            bound = (_get_collation_key(start_key), start_doc_id if start_doc_id is not None else _MAXIMUM)
+            start = bisect.bisect_right(sort_keys, bound) - 1
+
+        if has_end:
+            if inclusive_end:
+                stop = bisect.bisect_left(sort_keys, (_get_collation_key(end_key), end_doc_id or "")) - 1
+            else:
+                bound = (_get_collation_key(end_key), end_doc_id if end_doc_id is not None else _MAXIMUM)
+                stop = bisect.bisect_right(sort_keys, bound) - 1
+
+        return start, min(stop, start), -1
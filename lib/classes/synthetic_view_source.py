@@ -0,0 +1,75 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import random
+
+from lib.constants import constants
+from lib.classes import conflicts_generator
+
+# Globals
+
+REVISION_FORMAT = "1-{0:032x}"
+
+# Classes --------------------------------------------------------------------->
+
+class SyntheticViewSource: # pylint: disable=unused-variable
+    """
+    Streams synthetic conflicts view rows (as emitted by design_docs/conflicts.js) without a server; rows are
+    generated lazily so that the source itself holds no memory per row
+    """
+
+    def __init__(self, row_count, distribution, seed=conflicts_generator.DEFAULT_SEED):
+        """
+        Constructor
+
+        - distribution: ConflictDistribution of the number of conflicts per row.
+        """
+
+        self._row_count = row_count
+        self._distribution = distribution
+        self._seed = seed
+
+
+    def __iter__(self):
+        """
+        Generate the rows (the same sequence for the same seed)
+        """
+
+        generator = random.Random(self._seed)
+        property_id = constants.PROPERTY_ID
+        property_key = constants.PROPERTY_KEY
+        property_value = constants.PROPERTY_VALUE
+
+        for index in range(self._row_count):
+            conflicts = self._distribution.sample(generator)
+
+            yield {
+                property_id: conflicts_generator.DOCUMENT_ID_FORMAT.format(index),
+                property_key: conflicts_generator.ENTITY_NAME_FORMAT.format(index),
+                property_value: [REVISION_FORMAT.format(generator.getrandbits(128)) for _ in range(conflicts)]
+            }
+
+
+    def __len__(self):
+        """
+        Number of rows
+        """
+
+        return self._row_count
@@ -0,0 +1,144 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import os
+import logging
+import threading
+import time
+import json
+
+from lib.utils import error_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("trace_recorder")
+
+# Upper bound on the number of recorded events (bounds memory usage on huge runs)
+DEFAULT_MAX_EVENTS = 1000000
+
+CATEGORY_PHASE = "phase" # pylint: disable=unused-variable
+CATEGORY_HTTP = "http" # pylint: disable=unused-variable
+CATEGORY_SCAN = "scan" # pylint: disable=unused-variable
+CATEGORY_DELETE = "delete" # pylint: disable=unused-variable
+
+# See: https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+EVENT_PHASE_COMPLETE = "X"
+EVENT_PHASE_METADATA = "M"
+
+# Classes --------------------------------------------------------------------->
+
+class TraceRecorder: # pylint: disable=unused-variable
+    """
+    Records timed spans in the Chrome trace event format (chrome://tracing, Perfetto)
+    """
+
+    def __init__(self, max_events=DEFAULT_MAX_EVENTS):
+        """
+        Constructor
+        """
+
+        self._max_events = max_events
+
+        self._lock = threading.Lock()
+        self._events = []
+        self._thread_names = {}
+        self._dropped_events = 0
+        self._pid = os.getpid()
+        self._origin = time.perf_counter_ns()
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def get_timestamp(self):
+        """
+        Retrieve the current trace timestamp (in microseconds)
+        """
+
+        return (time.perf_counter_ns() - self._origin) // 1000
+
+
+    def add_complete_event(self, name, category, start_timestamp, args=None):
+        """
+        Record a span that started at the specified trace timestamp and ends now
+        """
+
+        end_timestamp = self.get_timestamp()
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": EVENT_PHASE_COMPLETE,
+            "ts": start_timestamp,
+            "dur": max(end_timestamp - start_timestamp, 0),
+            "pid": self._pid,
+            "tid": thread.ident
+        }
+
+        if args:
+            event["args"] = args
+
+        with self._lock:
+            if len(self._events) >= self._max_events:
+                self._dropped_events += 1
+                return
+
+            self._events.append(event)
+            self._thread_names.setdefault(thread.ident, thread.name)
+
+
+    def write(self, file, logger=DEFAULT_LOGGER):
+        """
+        Write the recorded events to a Chrome trace event JSON file
+        """
+
+        logger.info("Creating trace file: %s...", file)
+
+        with self._lock:
+            metadata = [
+                {
+                    "name": "thread_name",
+                    "ph": EVENT_PHASE_METADATA,
+                    "pid": self._pid,
+                    "tid": tid,
+                    "args": {"name": name}
+                }
+                for tid, name in self._thread_names.items()
+            ]
+            content = {
+                "traceEvents": metadata + self._events,
+                "displayTimeUnit": "ms",
+                "otherData": {"droppedEvents": self._dropped_events}
+            }
+
+        try:
+            with open(file, "w", encoding="utf-8") as file_handle:
+                json.dump(content, file_handle)
+        except OSError as err:
+            logger.error("Failed to create trace file: %s.", file)
+            error_util.log_exception(logger, err)
+            return False
+
+        if self._dropped_events:
+            logger.warning("Trace event limit reached (%d). Dropped events: %d.",
+                self._max_events, self._dropped_events)
+
+        logger.info("Successfully created trace file: %s.", file)
+
+        return True
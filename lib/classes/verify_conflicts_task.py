@@ -0,0 +1,410 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import csv
+import time
+import logging
+import threading
+import collections
+
+from lib.constants import constants
+from lib.classes.task_interface import TaskInterface
+from lib.classes import progress_reporter
+from lib.classes import trace_recorder
+from lib.utils import error_util
+from lib.utils import statistics_util
+
+# Globals
+
+DEFAULT_LOGGER = logging.getLogger("verify_conflicts_task")
+
+DEFAULT_CHUNK_SIZE = 200 # documents per _all_docs request
+
+# Verification rounds: the first one, then one per requeue of the documents still conflicted
+MAX_ROUNDS = 3
+
+STATUS_STILL_CONFLICTED = "still_conflicted" # conflicted revisions that were meant to be deleted remain
+STATUS_NEWLY_CONFLICTED = "newly_conflicted" # conflicts created after the deletion (e.g. replication)
+
+# Classes --------------------------------------------------------------------->
+
+class VerifyConflictsTask(TaskInterface): # pylint: disable=unused-variable
+    """
+    Proves that the documents touched by the deletion phase are conflict-free: re-reads their winning revisions with
+    their _conflicts in large chunks (one POST _all_docs request with keys per chunk) and reports the documents that
+    still, or newly, have conflicts; optionally requeues them, i.e. deletes their remaining conflicted revisions (one
+    _bulk_docs request per chunk) and verifies them again
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, database, documents, csv_file, threshold, chunk_size=DEFAULT_CHUNK_SIZE, requeue=False,
+            tracer=None):
+        """
+        Constructor
+
+        - database: CloudantDatabase (opened).
+        - documents: Conflicts view rows of the documents touched by the deletion phase (ID, name, revisions).
+        - csv_file: CSV file of the documents found conflicted.
+        - threshold: Documents with more conflicted revisions are not requeued (see: scan phase).
+        - chunk_size: Number of documents verified (or requeued) per request.
+        - requeue: Delete the remaining conflicted revisions and verify again (up to MAX_ROUNDS rounds).
+        - tracer: TraceRecorder (optional).
+        """
+
+        # pylint: disable=too-many-arguments
+
+        self._database = database
+        self._documents = documents or []
+        self._csv_file = csv_file
+        self._threshold = threshold
+        self._chunk_size = chunk_size
+        self._requeue = requeue
+        self._tracer = tracer
+
+        self._lock = threading.Lock()
+        self._conflicted = collections.OrderedDict() # document ID -> details of the documents found conflicted
+        self._csv_file_handle = None
+        self._csv_file_writer = None
+
+        self._total_verified_documents = 0
+        self._total_chunks = 0
+        self._total_missing_documents = 0
+        self._total_unverified_documents = 0
+        self._total_still_conflicted = 0
+        self._total_newly_conflicted = 0
+        self._total_remaining_revisions = 0
+        self._total_requeued_documents = 0
+        self._total_deleted_revisions = 0
+        self._total_failed_revisions = 0
+        self._total_unresolved_documents = 0
+        self._rounds = 0
+        self._elapsed_time = 0 # seconds
+
+
+    def __del__(self):
+        """
+        Destructor
+        """
+
+        self._shutdown_csv_file()
+
+
+    def __str__(self):
+        """
+        Verification details (summary content)
+        """
+
+        line = '=' * 80
+        result = [
+            "",
+            line,
+            "Verification Details",
+            line,
+            "",
+            "- Total Verified Documents:           {0}".format(self._total_verified_documents),
+            "- Total Requests (chunks):            {0}".format(self._total_chunks),
+            "- Total Missing Documents:            {0}".format(self._total_missing_documents),
+            "- Total Unverified Documents:         {0}".format(self._total_unverified_documents),
+            "- Total Still Conflicted Documents:   {0}".format(self._total_still_conflicted),
+            "- Total Newly Conflicted Documents:   {0}".format(self._total_newly_conflicted),
+            "- Total Remaining Revisions:          {0}".format(self._total_remaining_revisions),
+            "- Total Requeued Documents:           {0}".format(self._total_requeued_documents),
+            "- Total Deleted Revisions (requeue):  {0}".format(self._total_deleted_revisions),
+            "- Total Failed Revisions (requeue):   {0}".format(self._total_failed_revisions),
+            "- Total Unresolved Documents:         {0}".format(self._total_unresolved_documents),
+            "- Rounds:                             {0}".format(self._rounds),
+            "- Elapsed Time:                       {0:.3f} s".format(self._elapsed_time),
+            "- Throughput:                         {0:.1f} docs/s".format(
+                statistics_util.get_rate(self._total_verified_documents, self._elapsed_time)),
+            ""
+        ]
+
+        return "\n".join(result)
+
+
+    # Public Methods ---------------------------------------------------------->
+
+    def run(self, logger=DEFAULT_LOGGER):
+        """
+        Verify the touched documents (and requeue the conflicted ones, if enabled); returns False if any document
+        is left unresolved or unverified
+        """
+
+        logger.info("Verifying documents: %d (chunks of %d; requeue: %s)...",
+            len(self._documents), self._chunk_size, self._requeue)
+
+        start_time = time.monotonic()
+
+        self._init_csv_file()
+
+        rows = self._documents
+
+        while rows and self._rounds < MAX_ROUNDS:
+            self._rounds += 1
+            conflicted = self._verify(rows)
+
+            # Documents still conflicted after the last round (or without requeue) are unresolved
+
+            if not self._requeue or self._rounds == MAX_ROUNDS:
+                self._total_unresolved_documents += len(conflicted)
+                break
+
+            rows = self._requeue_documents(conflicted)
+
+        for document_id, details in self._conflicted.items():
+            self._serialize_csv_fields(document_id, details)
+
+        self._shutdown_csv_file()
+
+        self._elapsed_time = time.monotonic() - start_time
+
+        if self._total_unresolved_documents or self._total_unverified_documents:
+            logger.warning("Verified documents: %d. Unresolved conflicted documents: %d. Unverified documents: %d.",
+                self._total_verified_documents, self._total_unresolved_documents, self._total_unverified_documents)
+            return False
+
+        logger.info("Successfully verified documents: %d (conflict-free).", self._total_verified_documents)
+
+        return True
+
+
+    def get_summary(self):
+        """
+        Serializable summary of the verification results
+        """
+
+        with self._lock:
+            return {
+                "verified_documents": self._total_verified_documents,
+                "chunks": self._total_chunks,
+                "missing_documents": self._total_missing_documents,
+                "unverified_documents": self._total_unverified_documents,
+                "still_conflicted_documents": self._total_still_conflicted,
+                "newly_conflicted_documents": self._total_newly_conflicted,
+                "remaining_revisions": self._total_remaining_revisions,
+                "requeued_documents": self._total_requeued_documents,
+                "deleted_revisions": self._total_deleted_revisions,
+                "failed_revisions": self._total_failed_revisions,
+                "unresolved_documents": self._total_unresolved_documents,
+                "rounds": self._rounds,
+                "elapsed_s": self._elapsed_time,
+                "documents_per_s": statistics_util.get_rate(self._total_verified_documents, self._elapsed_time)
+            }
+
+
+    def get_progress(self):
+        """
+        Snapshot of the verification progress counters (see: ProgressReporter)
+        """
+
+        return {
+            progress_reporter.PROGRESS_PROCESSED: self._total_verified_documents,
+            progress_reporter.PROGRESS_CONFLICTS: self._total_remaining_revisions,
+            progress_reporter.PROGRESS_DELETED_REVISIONS: self._total_deleted_revisions,
+            progress_reporter.PROGRESS_ERRORS: self._total_unverified_documents,
+            progress_reporter.PROGRESS_QUEUE_DEPTH: len(self._documents) - self._total_verified_documents
+        }
+
+
+    # Private Methods --------------------------------------------------------->
+
+    def _verify(self, rows, logger=DEFAULT_LOGGER):
+        """
+        Verify the documents chunk by chunk; returns the documents found conflicted (row, remaining conflicts)
+        """
+
+        conflicted = []
+
+        for offset in range(0, len(rows), self._chunk_size):
+            chunk = rows[offset:offset + self._chunk_size]
+            document_ids = [row[constants.PROPERTY_ID] for row in chunk]
+
+            trace_timestamp = self._tracer.get_timestamp() if self._tracer else 0
+
+            documents = self._database.get_documents(document_ids, conflicts=True)
+
+            if self._tracer:
+                self._tracer.add_complete_event(
+                    "verify_chunk", trace_recorder.CATEGORY_PHASE, trace_timestamp, {"documents": len(chunk)})
+
+            if documents is None:
+                logger.error("Failed to verify documents: %d (from: %s).", len(chunk), document_ids[0])
+                with self._lock:
+                    self._total_chunks += 1
+                    self._total_unverified_documents += len(chunk)
+                continue
+
+            with self._lock:
+                self._total_chunks += 1
+
+                for row in chunk:
+                    document = documents.get(row[constants.PROPERTY_ID])
+                    conflicts = document.get("_conflicts", []) if document else []
+
+                    if self._rounds == 1:
+                        self._total_verified_documents += 1
+                        if document is None:
+                            self._total_missing_documents += 1
+
+                    if conflicts:
+                        self._track_conflicted(row, conflicts)
+                        conflicted.append((row, conflicts))
+
+        return conflicted
+
+
+    def _track_conflicted(self, row, conflicts, logger=DEFAULT_LOGGER):
+        """
+        Track a document found conflicted: still conflicted if any of the revisions meant to be deleted remains (all
+        of them, for a document deleted in chunks)
+        """
+
+        document_id = row[constants.PROPERTY_ID]
+        details = self._conflicted.get(document_id)
+
+        if details is None:
+            still = constants.PROPERTY_CHUNKED in row or bool(set(conflicts) & set(row[constants.PROPERTY_VALUE]))
+            details = {
+                "name": row[constants.PROPERTY_KEY],
+                "status": STATUS_STILL_CONFLICTED if still else STATUS_NEWLY_CONFLICTED,
+                "conflicts": [],
+                "deleted": []
+            }
+            self._conflicted[document_id] = details
+
+            if still:
+                self._total_still_conflicted += 1
+            else:
+                self._total_newly_conflicted += 1
+
+            logger.warning("Conflicted document found: %s (%s; conflicted revisions: %d).",
+                document_id, details["status"], len(conflicts))
+
+        new_conflicts = [revision for revision in conflicts if revision not in details["conflicts"]]
+        details["conflicts"].extend(new_conflicts)
+        self._total_remaining_revisions += len(new_conflicts)
+
+
+    def _requeue_documents(self, conflicted, logger=DEFAULT_LOGGER):
+        """
+        Delete the remaining conflicted revisions of the documents (chunk by chunk); returns the rows to verify again
+        """
+
+        rows = []
+        eligible = []
+
+        for row, conflicts in conflicted:
+            if len(conflicts) > self._threshold:
+                logger.warning("Not requeuing conflicted document: %s. Conflicted revisions: %d (threshold: %d).",
+                    row[constants.PROPERTY_ID], len(conflicts), self._threshold)
+                with self._lock:
+                    self._total_unresolved_documents += 1
+                continue
+
+            eligible.append((row, conflicts))
+
+        for offset in range(0, len(eligible), self._chunk_size):
+            chunk = eligible[offset:offset + self._chunk_size]
+            revisions = [(row[constants.PROPERTY_ID], revision) for row, conflicts in chunk for revision in conflicts]
+
+            results = self._database.delete_revisions(revisions)
+
+            with self._lock:
+                self._total_requeued_documents += len(chunk)
+
+                if results is None:
+                    self._total_failed_revisions += len(revisions)
+                    continue
+
+                for (document_id, revision), result in zip(revisions, results):
+                    if result.get("ok"):
+                        self._conflicted[document_id]["deleted"].append(revision)
+                        self._total_deleted_revisions += 1
+                    else:
+                        self._total_failed_revisions += 1
+                        logger.warning("Failed to delete conflicted revision: %s. Revision: %s (%s: %s).",
+                            document_id, revision, result.get("error"), result.get("reason"))
+
+            rows.extend(row for row, _ in chunk)
+
+        logger.info("Requeued conflicted documents: %d (round: %d).", len(rows), self._rounds)
+
+        return rows
+
+
+    def _init_csv_file(self, logger=DEFAULT_LOGGER):
+        """
+        Open CSV file
+        """
+
+        logger.info("Opening CSV file: %s...", self._csv_file)
+
+        self._csv_file_handle = open(self._csv_file, "w", newline="", encoding="utf-8")
+
+        fieldnames = [
+            constants.CSV_FIELD_ID,
+            constants.CSV_FIELD_NAME,
+            constants.CSV_FIELD_STATUS,
+            constants.CSV_FIELD_CONFLICTS,
+            constants.CSV_FIELD_DELETED,
+            constants.CSV_FIELD_REVISIONS
+        ]
+
+        self._csv_file_writer = csv.DictWriter(
+            f=self._csv_file_handle,
+            fieldnames=fieldnames,
+            dialect="excel")
+
+        self._csv_file_writer.writeheader()
+
+        logger.info("Successfully Opened CSV file: %s.", self._csv_file)
+
+
+    def _shutdown_csv_file(self, logger=DEFAULT_LOGGER):
+        """
+        Close CSV file
+        """
+
+        if self._csv_file_handle:
+            logger.info("Closing CSV file: %s...", self._csv_file)
+            self._csv_file_handle.close()
+            logger.info("Successfully closed CSV file: %s.", self._csv_file)
+            self._csv_file_handle = None
+
+
+    def _serialize_csv_fields(self, document_id, details, logger=DEFAULT_LOGGER):
+        """
+        Serialize a conflicted document to CSV file record
+        """
+
+        try:
+            self._csv_file_writer.writerow({
+                constants.CSV_FIELD_ID: document_id,
+                constants.CSV_FIELD_NAME: details["name"],
+                constants.CSV_FIELD_STATUS: details["status"],
+                constants.CSV_FIELD_CONFLICTS: len(details["conflicts"]),
+                constants.CSV_FIELD_DELETED: len(details["deleted"]),
+                constants.CSV_FIELD_REVISIONS: "; ".join(details["conflicts"])
+            })
+        except ValueError as err:
+            message = "Failed to write CSV row to file: %s. Document ID: %s."
+            logger.error(message, self._csv_file, document_id)
+            error_util.log_exception(logger, err)
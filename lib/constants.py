@@ -75,6 +75,13 @@ class _Constants():
     def VIEW_NAME():
         return "conflicts"
 
+    @const
+    def VIEW_MAP_FUNCTION():
+        # See: design_docs/conflicts.js
+        return "function (doc) { if (doc._conflicts) { var name = null; " \
+            "if (doc.entity && doc.entity.name) { name = doc.entity.name; } " \
+            "emit(name, doc._conflicts); } }"
+
     @const
     def PROPERTY_ID():
         return "id"
@@ -87,6 +94,10 @@ class _Constants():
     def PROPERTY_VALUE():
         return "value"
 
+    @const
+    def PROPERTY_CHUNKED():
+        return "chunked"
+
     @const
     def CSV_FILE_EXTENSION():
         return ".csv"
@@ -95,6 +106,22 @@ class _Constants():
     def TEXT_FILE_EXTENSION():
         return ".txt"
 
+    @const
+    def NDJSON_FILE_EXTENSION():
+        return ".ndjson"
+
+    @const
+    def JSON_FILE_EXTENSION():
+        return ".json"
+
+    @const
+    def GZIP_FILE_EXTENSION():
+        return ".gz"
+
+    @const
+    def PROMETHEUS_FILE_EXTENSION():
+        return ".prom"
+
     @const
     def FILE_PREFIX():
         return "conflicts_"
@@ -119,9 +146,27 @@ class _Constants():
     def CSV_FIELD_REVISIONS():
         return "Revisions"
 
+    @const
+    def CSV_FIELD_STATUS():
+        return "Status"
+
+    @const
+    def CSV_FIELD_WINNER():
+        return "Winner"
+
     @const
     def VALUE_UNRESOLVED():
         return "__UNRESOLVED__"
 
+    @const
+    def FAULTS_HELP():
+        # See: fault_injector (command-line help text of the presets; the module is only loaded with --faults)
+        return "none | throttling | errors | resets | slow | mixed | JSON file | JSON document"
+
+    @const
+    def MERGE_STRATEGY_HELP():
+        # See: merge_strategy (command-line help text; the module is only loaded with --merge)
+        return "latest | fields | MODULE:FUNCTION"
+
 
 constants = _Constants() # pylint: disable=unused-variable
@@ -24,6 +24,25 @@ from cloudant.error import CloudantDocumentException
 
 # Globals
 
+# Cloudant / CouchDB meaning of the common HTTP error status codes
+# See: https://docs.couchdb.org/en/stable/api/basics.html#http-status-codes
+STATUS_CODE_DESCRIPTIONS = {
+    400: "Bad request: the request body or parameters are invalid",
+    401: "Unauthorized: the credentials are invalid or the session expired",
+    403: "Forbidden: the credentials lack the required permissions",
+    404: "Not found: the database, document or revision does not exist (or was deleted)",
+    409: "Conflict: the revision is not the current leaf revision (update conflict)",
+    412: "Precondition failed: the database already exists or a header check failed",
+    413: "Request entity too large: the document or request exceeds the size limit",
+    429: "Too many requests: the provisioned throughput capacity was exceeded (retryable)",
+    500: "Internal server error (retryable)",
+    502: "Bad gateway (retryable)",
+    503: "Service unavailable (retryable)",
+    504: "Gateway timeout (retryable)"
+}
+
+HEADER_RETRY_AFTER = "Retry-After"
+
 # Public Functions ------------------------------------------------------------>
 
 def log_exception(logger, err): # pylint: disable=unused-variable
@@ -91,19 +110,29 @@ def log_http_error(logger, err): # pylint: disable=unused-variable
         log_exception(logger, err)
         return
 
-    # TODO: Handle individual status codes: e.g. 400, 401, 403, 404, 409, 500
+    if err.response is None:
+        log_exception(logger, err)
+        return
 
     separator = "\n"
     exception_message = str(err)
     status_code = err.response.status_code
     url = err.response.url
-    string_buffer = (
+    description = STATUS_CODE_DESCRIPTIONS.get(status_code, "Unexpected status code")
+    string_buffer = [
         "Exception:",
         "Name: {0}.".format(exception_name),
         "Status Code: {0}.".format(status_code),
+        "Description: {0}.".format(description),
         "URL: {0}.".format(url),
         "Message: {0}.".format(exception_message)
-    )
+    ]
+
+    retry_after = err.response.headers.get(HEADER_RETRY_AFTER)
+
+    if retry_after:
+        string_buffer.append("Retry After: {0} s.".format(retry_after))
+
     content = separator.join(string_buffer)
 
     logger.error(content)
@@ -19,7 +19,9 @@
 # Modules
 
 import logging
+import json
 
+from lib.constants import constants
 from lib.utils import error_util
 
 # Globals
@@ -52,3 +54,21 @@ def create_text_file(file, content, logger=DEFAULT_LOGGER):  # pylint: disable=u
     logger.info("Successfully created text file: %s.", file)
 
     return True
+
+
+def create_json_file(file, content, logger=DEFAULT_LOGGER):  # pylint: disable=unused-variable
+    """
+    Create a JSON file from the specified serializable content
+    """
+
+    try:
+        serialized_content = json.dumps(content, indent=constants.JSON_FORMAT_INDENT)
+    except (TypeError, ValueError) as err:
+        logger.error("Failed to serialize JSON file content: %s.", file)
+        error_util.log_exception(logger, err)
+        return False
+
+    return create_text_file(
+        file=file,
+        content=serialized_content + "\n",
+        logger=logger)
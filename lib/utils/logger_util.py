@@ -20,8 +20,11 @@
 
 import os
 import json
+import queue
+import atexit
 import logging
 import logging.config
+import logging.handlers
 
 # Globals
 
@@ -31,6 +34,29 @@ LOG_LEVEL_VALUE_TRACE = 5
 # TODO: REVISIT: Specify logging configuration file name as an option
 LOG_CONF_FILE = "config/logging.json"
 
+# Custom (non dictConfig) section of the logging configuration file
+LOG_CONF_QUEUE_PROPERTY = "queue"
+LOG_CONF_QUEUE_ENABLED_PROPERTY = "enabled"
+
+_QUEUE_LISTENER = None
+
+# Private Classes ------------------------------------------------------------->
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that defers message formatting to the queue listener thread
+    """
+
+    def prepare(self, record):
+        """
+        Enqueue the record as-is (in-process queue) unless it carries exception information
+        """
+
+        if record.exc_info:
+            return super().prepare(record)
+
+        return record
+
 # Public Functions ------------------------------------------------------------>
 
 def is_enabled_for_trace(logger): # pylint: disable=unused-variable
@@ -49,6 +75,14 @@ def log_trace(logger, msg, *args, **kwargs): # pylint: disable=unused-variable
     logger.log(LOG_LEVEL_VALUE_TRACE, msg, *args, **kwargs)
 
 
+def is_sampled(index, log_every): # pylint: disable=unused-variable
+    """
+    Determine whether the item at the specified index is selected for per-item logging
+    """
+
+    return log_every > 0 and index % log_every == 0
+
+
 def init_logging_subsystem(logger): # pylint: disable=unused-variable
     """
     Initialize logging subsystem
@@ -74,10 +108,20 @@ def init_logging_subsystem(logger): # pylint: disable=unused-variable
         with open(LOG_CONF_FILE, "rt") as file_handle:
             json_file_contents = json.load(file_handle)
 
+        # Extract custom queue configuration (unknown to dictConfig)
+
+        queue_config = json_file_contents.pop(LOG_CONF_QUEUE_PROPERTY, {})
+
         # Load JSON configuration as a dictionary
 
         logging.config.dictConfig(json_file_contents)
 
+        # Route log records through a background queue listener
+
+        if queue_config.get(LOG_CONF_QUEUE_ENABLED_PROPERTY, False):
+            logger_names = list(json_file_contents.get("loggers", {}).keys())
+            _init_queue_listener(logger_names)
+
     except (OSError, ValueError, TypeError, AttributeError, ImportError) as err:
         message = "Failed to load logging configuration file: {0}.".format(
             LOG_CONF_FILE)
@@ -88,3 +132,50 @@ def init_logging_subsystem(logger): # pylint: disable=unused-variable
     log_trace(logger, "Successfully initialized the logging subsystem.")
 
     return True
+
+
+def shutdown_logging_subsystem(): # pylint: disable=unused-variable
+    """
+    Flush and stop the background queue listener (if any)
+    """
+
+    global _QUEUE_LISTENER # pylint: disable=global-statement
+
+    if _QUEUE_LISTENER:
+        _QUEUE_LISTENER.stop()
+        _QUEUE_LISTENER = None
+
+
+# Private Functions ----------------------------------------------------------->
+
+def _init_queue_listener(logger_names):
+    """
+    Replace the configured handlers of the root and named loggers with a single queue handler
+    """
+
+    global _QUEUE_LISTENER # pylint: disable=global-statement
+
+    record_queue = queue.SimpleQueue()
+    queue_handler = _LazyQueueHandler(record_queue)
+    handlers = []
+
+    for target in [logging.getLogger()] + [logging.getLogger(name) for name in logger_names]:
+
+        if not target.handlers:
+            continue
+
+        for handler in list(target.handlers):
+            if handler not in handlers:
+                handlers.append(handler)
+            target.removeHandler(handler)
+
+        target.addHandler(queue_handler)
+
+    _QUEUE_LISTENER = logging.handlers.QueueListener(
+        record_queue,
+        *handlers,
+        respect_handler_level=True)
+    _QUEUE_LISTENER.start()
+
+    # Note: Registered after the logging module, therefore runs before logging.shutdown()
+    atexit.register(shutdown_logging_subsystem)
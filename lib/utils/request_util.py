@@ -0,0 +1,147 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import datetime
+from http.client import responses
+from urllib.parse import urlsplit
+from urllib.parse import unquote
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Globals
+
+OPERATION_SESSION = "session"
+OPERATION_SERVER = "server"
+OPERATION_DATABASE = "database"
+OPERATION_DESIGN_DOCUMENT = "design_document"
+OPERATION_VIEW = "view"
+OPERATION_FIND = "find"
+OPERATION_ALL_DOCS = "all_docs"
+OPERATION_BULK_DOCS = "bulk_docs"
+OPERATION_BULK_GET = "bulk_get"
+OPERATION_CHANGES = "changes"
+OPERATION_ACTIVE_TASKS = "active_tasks"
+OPERATION_COMPACT = "compact"
+OPERATION_VIEW_CLEANUP = "view_cleanup"
+OPERATION_LOCAL_DOCUMENT = "local_document"
+OPERATION_API = "api"
+OPERATION_GET_DOCUMENT = "get_document"
+OPERATION_WRITE_DOCUMENT = "write_document"
+OPERATION_DELETE_DOCUMENT = "delete_document"
+OPERATION_OTHER = "other"
+
+# Database level endpoints (e.g. /db/_find)
+_DATABASE_ENDPOINTS = {
+    "_find": OPERATION_FIND,
+    "_all_docs": OPERATION_ALL_DOCS,
+    "_bulk_docs": OPERATION_BULK_DOCS,
+    "_bulk_get": OPERATION_BULK_GET,
+    "_changes": OPERATION_CHANGES,
+    "_compact": OPERATION_COMPACT,
+    "_view_cleanup": OPERATION_VIEW_CLEANUP,
+    "_local": OPERATION_LOCAL_DOCUMENT
+}
+
+# Server level endpoints (e.g. /_session)
+_SERVER_ENDPOINTS = {
+    "_session": OPERATION_SESSION,
+    "_iam_session": OPERATION_SESSION,
+    "_active_tasks": OPERATION_ACTIVE_TASKS,
+    "_api": OPERATION_API
+}
+
+# Public Functions ------------------------------------------------------------>
+
+def get_path_segments(url): # pylint: disable=unused-variable
+    """
+    Split the (decoded) path of the specified URL into segments
+    """
+
+    path = urlsplit(url).path
+
+    return [unquote(segment) for segment in path.split("/") if segment]
+
+
+def get_operation(method, url): # pylint: disable=unused-variable
+    """
+    Classify a CouchDB / Cloudant HTTP request into a logical operation name
+    """
+
+    # pylint: disable=too-many-return-statements
+
+    segments = get_path_segments(url)
+
+    if not segments:
+        return OPERATION_SERVER
+
+    if segments[0] in _SERVER_ENDPOINTS:
+        return _SERVER_ENDPOINTS[segments[0]]
+
+    if len(segments) == 1:
+        return OPERATION_DATABASE
+
+    endpoint = segments[1]
+
+    if endpoint == "_design":
+        if "_view" in segments:
+            return OPERATION_VIEW
+        if "_compact" in segments:
+            return OPERATION_COMPACT
+        return OPERATION_DESIGN_DOCUMENT
+
+    if endpoint in _DATABASE_ENDPOINTS:
+        return _DATABASE_ENDPOINTS[endpoint]
+
+    if endpoint.startswith("_"):
+        return OPERATION_OTHER
+
+    if method in ("GET", "HEAD"):
+        return OPERATION_GET_DOCUMENT
+
+    if method == "DELETE":
+        return OPERATION_DELETE_DOCUMENT
+
+    return OPERATION_WRITE_DOCUMENT
+
+
+def build_response(request, status, body, headers=None, elapsed=0, connection=None): # pylint: disable=unused-variable
+    """
+    Build the (fully read) response of a request without any network I/O, e.g. a replayed or injected response
+    """
+
+    # pylint: disable=too-many-arguments
+    # pylint: disable=protected-access
+
+    response = Response()
+    response.status_code = status
+    response.reason = responses.get(status, "")
+    response.headers = CaseInsensitiveDict(headers or {})
+    response.headers["Content-Length"] = str(len(body))
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = body
+    response._content_consumed = True
+    response.url = request.url
+    response.request = request
+    response.connection = connection
+    response.elapsed = datetime.timedelta(seconds=elapsed)
+
+    return response
@@ -0,0 +1,75 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import math
+
+# Globals
+
+# Public Functions ------------------------------------------------------------>
+
+def get_histogram_distribution(histogram): # pylint: disable=unused-variable
+    """
+    Compute the min / median / p99 / max distribution of a histogram (value -> number of occurrences, e.g. a
+    collections.Counter), in a single pass over its sorted distinct values
+    """
+
+    count = sum(histogram.values())
+
+    if count == 0:
+        return {
+            "count": 0,
+            "min": None,
+            "median": None,
+            "p99": None,
+            "max": None,
+            "mean": None
+        }
+
+    ordered = sorted(value for value, occurrences in histogram.items() if occurrences > 0)
+    ranks = {percentile: max(math.ceil(percentile / 100.0 * count), 1) for percentile in (50, 99)}
+    percentiles = {}
+    cumulative = 0
+
+    for value in ordered:
+        cumulative += histogram[value]
+
+        for percentile, rank in ranks.items():
+            if percentile not in percentiles and cumulative >= rank:
+                percentiles[percentile] = value
+
+    return {
+        "count": count,
+        "min": ordered[0],
+        "median": percentiles[50],
+        "p99": percentiles[99],
+        "max": ordered[-1],
+        "mean": sum(value * histogram[value] for value in ordered) / count
+    }
+
+
+def get_rate(count, seconds): # pylint: disable=unused-variable
+    """
+    Compute a per-second rate
+    """
+
+    if not seconds or seconds <= 0:
+        return 0.0
+
+    return count / seconds
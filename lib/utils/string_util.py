@@ -53,4 +53,7 @@ def sanitize_control_characters(text, substitute_char): # pylint: disable=unused
     """
     Sanitize control characters in the specified String by replacing them with the specified substitute character
     """
+    if text.isprintable():
+        # Fast path: no control characters (str.isprintable() is False for every character of the regex)
+        return text
     return CONTROL_CHARACTER_REGEX.sub(substitute_char, text)
@@ -0,0 +1,59 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import sys
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# Globals
+
+# Public Functions ------------------------------------------------------------>
+
+def get_peak_rss_bytes(): # pylint: disable=unused-variable
+    """
+    Retrieve the peak resident set size of the current process (in bytes), if available
+    """
+
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Note: Reported in bytes on macOS, kilobytes on Linux
+    if sys.platform == "darwin":
+        return peak_rss
+
+    return peak_rss * 1024
+
+
+def get_cpu_times(): # pylint: disable=unused-variable
+    """
+    Retrieve the user and system CPU time (in seconds) consumed by the current process, if available
+    """
+
+    if resource is None:
+        return None, None
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    return usage.ru_utime, usage.ru_stime
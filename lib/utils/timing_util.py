@@ -0,0 +1,48 @@
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import time
+
+# Globals
+
+# Public Functions ------------------------------------------------------------>
+
+def start_timer(): # pylint: disable=unused-variable
+    """
+    Start a monotonic timer
+    """
+
+    return time.perf_counter()
+
+
+def get_elapsed_seconds(start_time): # pylint: disable=unused-variable
+    """
+    Retrieve the elapsed time (in seconds) since the timer was started
+    """
+
+    return time.perf_counter() - start_time
+
+
+def get_elapsed_ms(start_time): # pylint: disable=unused-variable
+    """
+    Retrieve the elapsed time (in milliseconds) since the timer was started
+    """
+
+    return (time.perf_counter() - start_time) * 1000
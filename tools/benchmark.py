@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import os
+import sys
+import json
+import logging
+import argparse
+import pathlib
+
+from lib.constants import constants
+from lib.utils import logger_util
+from lib.utils import date_util
+from lib.utils import file_util
+from lib.utils import system_util
+from lib.utils import timing_util
+from lib.classes.cloudant_database import CloudantDatabase
+from lib.classes.scan_conflicts_task import ScanConflictsTask
+from lib.classes.delete_conflicts_task import DeleteConflictsTask
+from lib.classes.request_metrics import RequestMetrics
+from lib.classes.conflict_distribution import ConflictDistribution
+from lib.classes.benchmark_suite import BenchmarkSuite
+from lib.classes.fault_injector import FaultInjector
+from lib.classes.retry_policy import RetryPolicy
+from lib.classes import fault_injector
+from lib.classes import retry_policy
+from lib.classes import benchmark_suite
+from lib.classes import cloudant_database
+from lib.classes import conflicts_generator
+
+# Globals
+
+ENV_CLOUDANT_API_KEY = "CLOUDANT_API_KEY"
+ENV_CLOUDANT_PASSWORD = "CLOUDANT_PASSWORD"
+
+ARGUMENT_PARSER_EPILOG = \
+    "=== Examples ===\n" \
+    "\n" \
+    "python -m tools.benchmark --documents 10000,100000 --concurrency 1,8 --latencies-ms 0,20\n" \
+    "\n" \
+    "python -m tools.benchmark --baseline results/conflicts_benchmark_baseline.json\n" \
+    "\n" \
+    "python -m tools.benchmark --concurrency 4 --latencies-ms 5 --faults none,throttling,errors,resets,mixed\n"
+
+CURRENT_TIME = date_util.get_current_timestamp()
+
+DEFAULT_RESULTS_DIRNAME = "{0}/{1}{2}{3}".format(
+    "results",
+    constants.FILE_PREFIX,
+    "benchmark_",
+    CURRENT_TIME)
+
+RESULTS_FILENAME = "{0}{1}{2}".format(
+    constants.FILE_PREFIX,
+    "benchmark",
+    constants.JSON_FILE_EXTENSION)
+
+CASE_RESULT_FILENAME = "result.json"
+
+DEFAULT_DOCUMENTS = "10000"
+DEFAULT_DISTRIBUTIONS = "production"
+DEFAULT_PAGE_SIZES = "100"
+DEFAULT_CONCURRENCY = "1,4"
+DEFAULT_LATENCIES_MS = "0,10"
+DEFAULT_FAULTS = "none"
+DEFAULT_THRESHOLD = 5000 # revisions
+
+DEFAULT_LOGGER = logging.getLogger("benchmark")
+
+# Functions ------------------------------------------------------------------->
+
+def _get_int_list(value):
+    """
+    Parse a comma-separated list of integers
+    """
+
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def _get_distribution_list(value):
+    """
+    Parse (and validate) a comma-separated list of conflict distributions
+    """
+
+    items = [item.strip() for item in value.split(",") if item.strip()]
+
+    for item in items:
+        ConflictDistribution(item)
+
+    return items
+
+
+def _get_fault_profile_list(value):
+    """
+    Parse (and validate) a comma-separated list of fault profile presets / files
+    """
+
+    items = [item.strip() for item in value.split(",") if item.strip()]
+
+    for item in items:
+        try:
+            fault_injector.load_profile(item)
+        except ValueError as err:
+            raise argparse.ArgumentTypeError(str(err)) from err
+
+    return items
+
+
+def _parse_command_line_args():
+    """
+    Parse command-line arguments
+    """
+
+    parser = argparse.ArgumentParser(
+        description="End-to-end scan / delete throughput benchmark.",
+        epilog=ARGUMENT_PARSER_EPILOG,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument(
+        "--documents",
+        type=_get_int_list,
+        default=DEFAULT_DOCUMENTS,
+        help="Comma-separated database sizes (documents). "
+             "Default: {0}.".format(DEFAULT_DOCUMENTS))
+
+    parser.add_argument(
+        "--distributions",
+        type=_get_distribution_list,
+        default=DEFAULT_DISTRIBUTIONS,
+        help="Comma-separated conflict distributions (see: tools.generate_conflicts). "
+             "Default: {0}.".format(DEFAULT_DISTRIBUTIONS))
+
+    parser.add_argument(
+        "--page-sizes",
+        type=_get_int_list,
+        default=DEFAULT_PAGE_SIZES,
+        help="Comma-separated scan page sizes (rows). "
+             "Default: {0}.".format(DEFAULT_PAGE_SIZES))
+
+    parser.add_argument(
+        "--concurrency",
+        type=_get_int_list,
+        default=DEFAULT_CONCURRENCY,
+        help="Comma-separated deletion concurrency levels (workers). "
+             "Default: {0}.".format(DEFAULT_CONCURRENCY))
+
+    parser.add_argument(
+        "--latencies-ms",
+        type=_get_int_list,
+        default=DEFAULT_LATENCIES_MS,
+        help="Comma-separated injected server latencies (milliseconds, stand-in server only). "
+             "Default: {0}.".format(DEFAULT_LATENCIES_MS))
+
+    parser.add_argument(
+        "--faults",
+        type=_get_fault_profile_list,
+        default=DEFAULT_FAULTS,
+        help="Comma-separated client-side fault profiles: presets ({0}) or JSON files. "
+             "Measures the effective throughput and the work lost under failures. "
+             "Default: {1}.".format(", ".join(fault_injector.PRESETS), DEFAULT_FAULTS))
+
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=retry_policy.DEFAULT_MAX_RETRIES,
+        help="The maximum number of retries of a failed idempotent request. Use 0 to disable retries. "
+             "Default: {0}.".format(retry_policy.DEFAULT_MAX_RETRIES))
+
+    parser.add_argument(
+        "--conflicted-ratio",
+        type=float,
+        default=conflicts_generator.DEFAULT_CONFLICTED_RATIO,
+        help="The fraction (0 - 1) of generated documents that carry conflicts. "
+             "Default: {0}.".format(conflicts_generator.DEFAULT_CONFLICTED_RATIO))
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=conflicts_generator.DEFAULT_SEED,
+        help="The generator random seed. "
+             "Default: {0}.".format(conflicts_generator.DEFAULT_SEED))
+
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=int,
+        default=DEFAULT_THRESHOLD,
+        help="The scan threshold of revisions per document. "
+             "Default: {0}.".format(DEFAULT_THRESHOLD))
+
+    parser.add_argument(
+        "-u",
+        "--url",
+        default=None,
+        help="Benchmark against a local CouchDB (a database is generated and dropped per case). "
+             "Default: a stand-in server is started for each case.")
+
+    parser.add_argument(
+        "-r",
+        "--results-dir",
+        default=DEFAULT_RESULTS_DIRNAME,
+        help="The directory name to use for storing results. "
+             "Default: {0}.".format(DEFAULT_RESULTS_DIRNAME))
+
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        help="A previous benchmark results file to compare against. "
+             "The exit status is 2 when a regression is detected. "
+             "Default: none.")
+
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=benchmark_suite.DEFAULT_TOLERANCE,
+        help="The relative change tolerated before a metric is reported as a regression. "
+             "Default: {0}.".format(benchmark_suite.DEFAULT_TOLERANCE))
+
+    # Internal: run a single case (in a fresh process)
+
+    parser.add_argument("--run-case", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--database-name", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--drop-database", action="store_true", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    return args
+
+
+def _get_cpu_seconds():
+    """
+    Retrieve the process CPU time (user + system), if available
+    """
+
+    cpu_user, cpu_system = system_util.get_cpu_times()
+
+    if cpu_user is None:
+        return None
+
+    return cpu_user + cpu_system
+
+
+def _get_cpu_delta(start, end):
+    """
+    Retrieve the CPU time spent between two readings, if available
+    """
+
+    if start is None or end is None:
+        return None
+
+    return round(end - start, 3)
+
+
+def _run_case(args, logger=DEFAULT_LOGGER):
+    """
+    Run a single case (scan then delete) and write its result file
+    """
+
+    # pylint: disable=too-many-locals
+
+    case = json.loads(args.run_case)
+    results_dir = pathlib.Path(args.results_dir)
+    concurrency = case[benchmark_suite.CASE_CONCURRENCY]
+    metrics = RequestMetrics()
+
+    # Faults are injected once the case is set up (connection, design document, view size)
+
+    faults = FaultInjector(
+        profile=fault_injector.load_profile(case.get(benchmark_suite.CASE_FAULTS, DEFAULT_FAULTS)),
+        seed=args.seed,
+        enabled=False)
+
+    retry = RetryPolicy(max_retries=args.max_retries, seed=args.seed) if args.max_retries > 0 else None
+
+    database = CloudantDatabase(
+        account=None,
+        api_key=os.environ.get(ENV_CLOUDANT_API_KEY, ""),
+        password=os.environ.get(ENV_CLOUDANT_PASSWORD, ""),
+        database_name=args.database_name,
+        metrics=metrics,
+        url=args.url,
+        pool_size=max(concurrency, cloudant_database.DEFAULT_POOL_SIZE),
+        faults=faults,
+        retry=retry)
+
+    if not database.init_client() or not database.open_database():
+        return False
+
+    ddoc = database.get_design_document(ddoc_name=constants.DDOC_NAME)
+
+    if ddoc is None:
+        return False
+
+    view_row_count = database.get_view_row_count(ddoc=ddoc, view_name=constants.VIEW_NAME) or 0
+
+    faults.set_enabled(True)
+
+    # Scan (an aborted scan still hands its partial results to the deletion phase)
+
+    cpu_start = _get_cpu_seconds()
+
+    scan_task = ScanConflictsTask(
+        deletion_mode=True,
+        threshold=args.threshold,
+        ddoc=ddoc,
+        csv_file=results_dir / "scan.csv",
+        page_size=case[benchmark_suite.CASE_PAGE_SIZE])
+
+    scan_task.run()
+
+    cpu_scan = _get_cpu_seconds()
+
+    # Delete
+
+    delete_task = DeleteConflictsTask(
+        database=database,
+        conflicts=scan_task.get_conflicts(),
+        csv_file=results_dir / "delete.csv",
+        concurrency=concurrency)
+
+    if not delete_task.run():
+        return False
+
+    cpu_delete = _get_cpu_seconds()
+
+    faults.set_enabled(False)
+
+    if args.drop_database:
+        database.delete_database()
+
+    database.shutdown_client()
+
+    scan_summary = scan_task.get_summary()
+    delete_summary = delete_task.get_summary()
+    requests_summary = metrics.get_summary()
+
+    result = {
+        "scan": {
+            "elapsed_s": round(scan_summary["elapsed_s"], 3),
+            "rows_per_s": round(scan_summary["rows_per_s"], 1),
+            "conflicted_documents": scan_summary["conflicted_documents"],
+            "conflicted_revisions": scan_summary["conflicted_revisions"],
+            "omitted_documents": scan_summary["omitted_documents"],
+            "aborted": scan_summary["aborted"],
+            "cpu_s": _get_cpu_delta(cpu_start, cpu_scan)
+        },
+        "delete": {
+            "elapsed_s": round(delete_summary["elapsed_s"], 3),
+            "documents_per_s": round(delete_summary["documents_per_s"], 1),
+            "revisions_per_s": round(delete_summary["revisions_per_s"], 1),
+            "deleted_revisions": delete_summary["deleted_revisions"],
+            "failed_revisions": delete_summary["failed_revisions"],
+            "cpu_s": _get_cpu_delta(cpu_scan, cpu_delete)
+        },
+        "work_lost": _get_work_lost(view_row_count, scan_summary, delete_summary),
+        "faults": faults.get_summary(),
+        "retries": retry.get_summary() if retry else None,
+        "resources": {
+            "peak_rss_bytes": system_util.get_peak_rss_bytes(),
+            "cpu_s": _get_cpu_delta(0, _get_cpu_seconds())
+        },
+        "requests": {
+            "total": sum(item["requests"] for item in requests_summary.values()),
+            "by_operation": {operation: item["requests"] for operation, item in requests_summary.items()}
+        }
+    }
+
+    return file_util.create_json_file(
+        file=results_dir / CASE_RESULT_FILENAME,
+        content=result,
+        logger=logger)
+
+
+def _get_work_lost(view_row_count, scan_summary, delete_summary):
+    """
+    Summarize the work left undone by failures: view rows not scanned (aborted scan) and revisions not deleted
+    """
+
+    unscanned_rows = max(view_row_count - scan_summary["total_rows"], 0)
+    failed_revisions = delete_summary["failed_revisions"]
+
+    # Revisions of the unscanned rows are unknown: a row counts as one unit of work, like a revision
+
+    total = max(view_row_count, scan_summary["total_rows"]) + delete_summary["conflicted_revisions"]
+    lost = unscanned_rows + failed_revisions
+
+    return {
+        "unscanned_rows": unscanned_rows,
+        "failed_revisions": failed_revisions,
+        "ratio": round(lost / total, 4) if total else 0
+    }
+
+
+def _log_results(results, comparisons, logger=DEFAULT_LOGGER):
+    """
+    Log a compact table of the case results and the detected regressions
+    """
+
+    lines = ["Benchmark Results:"]
+
+    for item in results["cases"]:
+        key = benchmark_suite.get_case_key(item["case"])
+
+        if item.get("error"):
+            lines.append("- {0}: FAILED ({1})".format(key, item["error"]))
+            continue
+
+        lines.append("- {0}: scan {1:.1f} rows/s | delete {2:.1f} docs/s, {3:.1f} revs/s | peak RSS {4} | CPU {5} s"
+            " | work lost {6:.1%}".format(
+                key,
+                item["scan"]["rows_per_s"],
+                item["delete"]["documents_per_s"],
+                item["delete"]["revisions_per_s"],
+                item["resources"]["peak_rss_bytes"],
+                item["resources"]["cpu_s"],
+                item["work_lost"]["ratio"]))
+
+    regressions = [item for item in comparisons if item["regression"]]
+
+    if comparisons:
+        lines.append("Baseline Comparison: {0} metrics compared, {1} regressions.".format(
+            len(comparisons),
+            len(regressions)))
+
+    for item in regressions:
+        lines.append("- REGRESSION: {0}: {1}: {2} -> {3} ({4:+.1%})".format(
+            item["case"],
+            item["metric"],
+            item["baseline"],
+            item["current"],
+            item["change"]))
+
+    logger.info("\n".join(lines))
+
+
+def _main(logger=DEFAULT_LOGGER):
+    """
+    The main function.
+    """
+
+    status = logger_util.init_logging_subsystem(logger)
+
+    if status is False:
+        # Should never happen
+        print("Failed to initialize the logging subsystem.")
+        sys.exit(1)
+
+    args = _parse_command_line_args()
+
+    # Single case (child process)
+
+    if args.run_case:
+        status = _run_case(args)
+        logger_util.shutdown_logging_subsystem()
+        sys.exit(0 if status else 1)
+
+    # Matrix
+
+    matrix = {
+        benchmark_suite.CASE_DOCUMENTS: args.documents,
+        benchmark_suite.CASE_DISTRIBUTION: args.distributions,
+        benchmark_suite.CASE_PAGE_SIZE: args.page_sizes,
+        benchmark_suite.CASE_CONCURRENCY: args.concurrency,
+        benchmark_suite.CASE_LATENCY_MS: args.latencies_ms,
+        benchmark_suite.CASE_FAULTS: args.faults
+    }
+
+    suite = BenchmarkSuite(
+        matrix=matrix,
+        work_dir=args.results_dir,
+        url=args.url,
+        conflicted_ratio=args.conflicted_ratio,
+        seed=args.seed,
+        threshold=args.threshold,
+        max_retries=args.max_retries)
+
+    start_time = timing_util.start_timer()
+    results = suite.run()
+    results["elapsed_s"] = round(timing_util.get_elapsed_seconds(start_time), 3)
+
+    # Baseline comparison
+
+    comparisons = []
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file_handle:
+            baseline = json.load(file_handle)
+
+        comparisons = benchmark_suite.compare_results(results, baseline, args.tolerance)
+        results["baseline"] = {
+            "file": args.baseline,
+            "tolerance": args.tolerance,
+            "comparisons": comparisons
+        }
+
+    file_util.create_json_file(
+        file=pathlib.Path(args.results_dir, RESULTS_FILENAME),
+        content=results,
+        logger=logger)
+
+    _log_results(results, comparisons)
+
+    logger_util.shutdown_logging_subsystem()
+
+    if any(item.get("error") for item in results["cases"]):
+        sys.exit(1)
+
+    if any(item["regression"] for item in comparisons):
+        sys.exit(2)
+
+    sys.exit(0)
+
+
+# Main ------------------------------------------------------------------------>
+
+if __name__ == "__main__":
+    _main()
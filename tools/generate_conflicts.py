@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import os
+import sys
+import json
+import logging
+import argparse
+
+from lib.constants import constants
+from lib.utils import logger_util
+from lib.classes.cloudant_database import CloudantDatabase
+from lib.classes.conflict_distribution import ConflictDistribution
+from lib.classes.conflicts_generator import ConflictsGenerator
+from lib.classes.progress_reporter import ProgressReporter
+from lib.classes import conflict_distribution
+from lib.classes import conflicts_generator
+
+# Globals
+
+ENV_CLOUDANT_API_KEY = "CLOUDANT_API_KEY"
+ENV_CLOUDANT_PASSWORD = "CLOUDANT_PASSWORD"
+
+ARGUMENT_PARSER_EPILOG = \
+    "=== Environment Variables ===\n" \
+    "\n" \
+    "CLOUDANT_API_KEY : CouchDB / Cloudant user name (API key).\n" \
+    "CLOUDANT_PASSWORD : CouchDB / Cloudant password.\n" \
+    "\n" \
+    "=== Examples ===\n" \
+    "\n" \
+    "python -m tools.generate_conflicts -n conflicts-benchmark --url http://127.0.0.1:5984 " \
+    "--documents 1000000 --distribution production --seed 1\n"
+
+DEFAULT_URL = "http://127.0.0.1:5984"
+DEFAULT_DOCUMENTS = 10000
+DEFAULT_DISTRIBUTION = "production"
+DEFAULT_PROGRESS_INTERVAL = 10 # seconds
+
+DEFAULT_LOGGER = logging.getLogger("generate_conflicts")
+
+# Functions ------------------------------------------------------------------->
+
+def _parse_command_line_args():
+    """
+    Parse command-line arguments
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic conflicted CouchDB / Cloudant database.",
+        epilog=ARGUMENT_PARSER_EPILOG,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument(
+        "-n",
+        "--database-name",
+        required=True,
+        help="The name of the target database (created if it does not exist).")
+
+    parser.add_argument(
+        "-u",
+        "--url",
+        default=DEFAULT_URL,
+        help="The CouchDB / Cloudant server URL (e.g. a local CouchDB or the stand-in server). "
+             "Default: {0}.".format(DEFAULT_URL))
+
+    parser.add_argument(
+        "--documents",
+        type=int,
+        default=DEFAULT_DOCUMENTS,
+        help="The number of generated documents. "
+             "Default: {0}.".format(DEFAULT_DOCUMENTS))
+
+    parser.add_argument(
+        "--distribution",
+        type=ConflictDistribution,
+        default=DEFAULT_DISTRIBUTION,
+        help="The distribution of the number of conflicts per conflicted document: {0}. "
+             "Default: {1}.".format(conflict_distribution.SPECIFICATION_HELP, DEFAULT_DISTRIBUTION))
+
+    parser.add_argument(
+        "--conflicted-ratio",
+        type=float,
+        default=conflicts_generator.DEFAULT_CONFLICTED_RATIO,
+        help="The fraction (0 - 1) of documents that carry conflicts. "
+             "Default: {0}.".format(conflicts_generator.DEFAULT_CONFLICTED_RATIO))
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=conflicts_generator.DEFAULT_SEED,
+        help="The random seed. The same seed always generates the same documents and revisions. "
+             "Default: {0}.".format(conflicts_generator.DEFAULT_SEED))
+
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=conflicts_generator.DEFAULT_BATCH_SIZE,
+        help="The maximum number of revisions per _bulk_docs request. "
+             "Default: {0}.".format(conflicts_generator.DEFAULT_BATCH_SIZE))
+
+    parser.add_argument(
+        "--body-bytes",
+        type=int,
+        default=conflicts_generator.DEFAULT_BODY_BYTES,
+        help="The size of the padding property added to each revision (in bytes). "
+             "Default: {0}.".format(conflicts_generator.DEFAULT_BODY_BYTES))
+
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=DEFAULT_PROGRESS_INTERVAL,
+        help="The interval (in seconds) between progress reports. "
+             "Default: {0}.".format(DEFAULT_PROGRESS_INTERVAL))
+
+    args = parser.parse_args()
+
+    return args
+
+
+def _validate_command_line_args(args, logger=DEFAULT_LOGGER):
+    """
+    Validate command-line arguments
+    """
+
+    if args.documents < 0:
+        logger.error("Value specified for 'documents' CLI option is invalid: %d.", args.documents)
+        return False
+
+    if not 0 <= args.conflicted_ratio <= 1:
+        logger.error("Value specified for 'conflicted-ratio' CLI option is invalid: %s.", args.conflicted_ratio)
+        return False
+
+    if args.batch_size <= 0:
+        logger.error("Value specified for 'batch-size' CLI option is invalid: %d.", args.batch_size)
+        return False
+
+    if args.body_bytes < 0:
+        logger.error("Value specified for 'body-bytes' CLI option is invalid: %d.", args.body_bytes)
+        return False
+
+    if args.progress_interval <= 0:
+        logger.error("Value specified for 'progress-interval' CLI option is invalid: %s.", args.progress_interval)
+        return False
+
+    return True
+
+
+def _fatal_exit(logger=DEFAULT_LOGGER):
+    """
+    Exit script with fatal status
+    """
+
+    status = 1
+    logger.critical("Fatal error encountered. Exit script status: %d.", status)
+    logger_util.shutdown_logging_subsystem()
+    sys.exit(status)
+
+
+def _main(logger=DEFAULT_LOGGER):
+    """
+    The main function.
+    """
+
+    status = logger_util.init_logging_subsystem(logger)
+
+    if status is False:
+        # Should never happen
+        print("Failed to initialize the logging subsystem.")
+        sys.exit(1)
+
+    args = _parse_command_line_args()
+
+    if not _validate_command_line_args(args):
+        _fatal_exit()
+
+    # Connect and create the database / conflicts design document
+
+    database = CloudantDatabase(
+        account=None,
+        api_key=os.environ.get(ENV_CLOUDANT_API_KEY, ""),
+        password=os.environ.get(ENV_CLOUDANT_PASSWORD, ""),
+        database_name=args.database_name,
+        url=args.url)
+
+    if not database.init_client() or \
+            not database.create_database() or \
+            not database.create_design_document(
+                ddoc_name=constants.DDOC_NAME,
+                view_name=constants.VIEW_NAME,
+                map_function=constants.VIEW_MAP_FUNCTION):
+        _fatal_exit()
+
+    # Generate documents
+
+    generator = ConflictsGenerator(
+        write_revisions=database.write_revisions,
+        document_count=args.documents,
+        distribution=args.distribution,
+        conflicted_ratio=args.conflicted_ratio,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        body_bytes=args.body_bytes)
+
+    reporter = ProgressReporter(
+        name="generate",
+        task=generator,
+        total=args.documents,
+        interval=args.progress_interval)
+
+    reporter.start()
+
+    try:
+        status = generator.run()
+    finally:
+        reporter.stop()
+
+    database.shutdown_client()
+
+    logger.info("Generation summary:\n%s", json.dumps(generator.get_summary(), indent=constants.JSON_FORMAT_INDENT))
+
+    if status is False:
+        _fatal_exit()
+
+    logger_util.shutdown_logging_subsystem()
+
+    sys.exit(0)
+
+
+# Main ------------------------------------------------------------------------>
+
+if __name__ == "__main__":
+    _main()
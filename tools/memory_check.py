@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import os
+import sys
+import json
+import logging
+import argparse
+import subprocess
+import tracemalloc
+
+from lib.utils import logger_util
+from lib.utils import file_util
+from lib.utils import system_util
+from lib.utils import timing_util
+from lib.utils import statistics_util
+from lib.classes.scan_conflicts_task import ScanConflictsTask
+from lib.classes.delete_conflicts_task import DeleteConflictsTask
+from lib.classes.conflict_distribution import ConflictDistribution
+from lib.classes.synthetic_view_source import SyntheticViewSource
+from lib.classes import conflict_distribution
+from lib.classes import conflicts_generator
+
+# Globals
+
+ARGUMENT_PARSER_EPILOG = \
+    "=== Examples ===\n" \
+    "\n" \
+    "python -m tools.memory_check --rows 20000000\n" \
+    "\n" \
+    "python -m tools.memory_check --rows 1000000 --mode deletion --output results/conflicts_memory_check.json\n"
+
+MODE_SCAN = "scan"
+MODE_DELETION = "deletion"
+MODES = (MODE_SCAN, MODE_DELETION)
+
+DEFAULT_ROWS = 1000000
+DEFAULT_DISTRIBUTION = "production"
+DEFAULT_THRESHOLD = 5000 # revisions
+DEFAULT_ALLOWANCE_MB = 32 # fixed overhead (interpreter, buffers) tolerated on top of the per-row bound
+
+# Memory tolerated per streamed row:
+# - scan: nothing is retained per row (conflicts counts aggregated in a histogram)
+# - deletion: every conflicted row (ID, name, revisions) is retained for the deletion phase
+DEFAULT_MAX_BYTES_PER_ROW = {
+    MODE_SCAN: 4,
+    MODE_DELETION: 1024
+}
+
+DEFAULT_LOGGER = logging.getLogger("memory_check")
+
+# Classes --------------------------------------------------------------------->
+
+class _NullDatabase:
+    """
+    Deletion target that accepts every revision without any I/O
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    @staticmethod
+    def delete_document_revision(document_id, revision_id):
+        """
+        Delete a document revision (no-op)
+        """
+
+        # pylint: disable=unused-argument
+
+        return True
+
+# Functions ------------------------------------------------------------------->
+
+def _parse_command_line_args():
+    """
+    Parse command-line arguments
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Bounded-memory regression check: streams synthetic view rows through the scan "
+                    "(and deletion) phases and fails when memory grows beyond a bound relative to the row count.",
+        epilog=ARGUMENT_PARSER_EPILOG,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=DEFAULT_ROWS,
+        help="The number of synthetic conflicts view rows. "
+             "Default: {0}.".format(DEFAULT_ROWS))
+
+    parser.add_argument(
+        "--mode",
+        choices=MODES,
+        action="append",
+        default=None,
+        help="The checked mode (repeatable). scan: scan phase only. deletion: scan phase in deletion mode "
+             "followed by the deletion phase (no-op deletions). "
+             "Default: {0}.".format(", ".join(MODES)))
+
+    parser.add_argument(
+        "--distribution",
+        type=ConflictDistribution,
+        default=DEFAULT_DISTRIBUTION,
+        help="The distribution of the number of conflicts per row ({0}). "
+             "Default: {1}.".format(conflict_distribution.SPECIFICATION_HELP, DEFAULT_DISTRIBUTION))
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=conflicts_generator.DEFAULT_SEED,
+        help="The random seed. "
+             "Default: {0}.".format(conflicts_generator.DEFAULT_SEED))
+
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=int,
+        default=DEFAULT_THRESHOLD,
+        help="The scan threshold of revisions per document (deletion mode). "
+             "Default: {0}.".format(DEFAULT_THRESHOLD))
+
+    parser.add_argument(
+        "--max-bytes-per-row",
+        type=int,
+        default=None,
+        help="The memory growth tolerated per row. "
+             "Default: {0}.".format(", ".join(
+                 "{0}: {1}".format(mode, value) for mode, value in DEFAULT_MAX_BYTES_PER_ROW.items())))
+
+    parser.add_argument(
+        "--allowance-mb",
+        type=int,
+        default=DEFAULT_ALLOWANCE_MB,
+        help="The fixed memory growth tolerated on top of the per-row bound (MiB). "
+             "Default: {0}.".format(DEFAULT_ALLOWANCE_MB))
+
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="Also check the tracemalloc peak (Python allocations), in a separate pass per mode: tracemalloc "
+             "bookkeeping inflates the RSS and is about 3-5 times slower. "
+             "Default: False.")
+
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Write the results to the specified JSON file. "
+             "Default: none.")
+
+    # Internal: check a single mode (in a fresh process)
+
+    parser.add_argument("--run-mode", choices=MODES, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--run-tracemalloc", action="store_true", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    return args
+
+
+def _run_mode(args):
+    """
+    Stream the rows through the tasks of the specified mode; returns the measurements
+    """
+
+    mode = args.run_mode
+    deletion_mode = mode == MODE_DELETION
+    view_source = SyntheticViewSource(args.rows, args.distribution, args.seed)
+    use_tracemalloc = args.run_tracemalloc
+
+    # Quiet the per-task logs (CSV file open / close, documents omitted beyond the threshold)
+
+    logging.getLogger("scan_conflicts_task").setLevel(logging.ERROR)
+    logging.getLogger("delete_conflicts_task").setLevel(logging.ERROR)
+
+    if use_tracemalloc:
+        tracemalloc.start()
+
+    baseline_rss = system_util.get_peak_rss_bytes()
+    start_time = timing_util.start_timer()
+
+    scan_task = ScanConflictsTask(
+        deletion_mode=deletion_mode,
+        threshold=args.threshold,
+        ddoc=None,
+        csv_file=os.devnull,
+        view_source=view_source)
+    scan_task.run()
+
+    if deletion_mode:
+        delete_task = DeleteConflictsTask(
+            database=_NullDatabase(),
+            conflicts=scan_task.get_conflicts(),
+            csv_file=os.devnull)
+        delete_task.run()
+
+    elapsed_time = timing_util.get_elapsed_seconds(start_time)
+    peak_rss = system_util.get_peak_rss_bytes()
+
+    if use_tracemalloc:
+        # Note: The RSS of a traced pass includes the tracemalloc bookkeeping
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {"tracemalloc_peak_bytes": traced_peak}
+
+    summary = scan_task.get_summary()
+
+    return {
+        "mode": mode,
+        "rows": summary["total_rows"],
+        "conflicted_revisions": summary["conflicted_revisions"],
+        "elapsed_s": round(elapsed_time, 3),
+        "rows_per_s": round(statistics_util.get_rate(summary["total_rows"], elapsed_time), 1),
+        "rss_baseline_bytes": baseline_rss,
+        "rss_peak_bytes": peak_rss,
+        "rss_growth_bytes": peak_rss - baseline_rss if peak_rss is not None else None,
+        "tracemalloc_peak_bytes": None
+    }
+
+
+def _run_child(mode, use_tracemalloc, logger=DEFAULT_LOGGER):
+    """
+    Run a single measurement pass in a fresh process (the peak RSS cannot be reset); returns the measurements
+    """
+
+    command = [sys.executable, "-m", "tools.memory_check", "--run-mode", mode] + sys.argv[1:]
+
+    if use_tracemalloc:
+        command.append("--run-tracemalloc")
+
+    completed = subprocess.run(command, stdout=subprocess.PIPE, check=False)
+
+    if completed.returncode != 0:
+        logger.error("Memory check failed to run: %s (exit status: %d).", mode, completed.returncode)
+        return None
+
+    return json.loads(completed.stdout.decode("utf-8").splitlines()[-1])
+
+
+def _check_mode(args, mode, logger=DEFAULT_LOGGER):
+    """
+    Measure a mode and evaluate its memory bound
+    """
+
+    result = _run_child(mode, False)
+
+    if result and args.tracemalloc:
+        traced = _run_child(mode, True)
+        result = result if traced is None else dict(result, **traced)
+
+    if result is None:
+        return {"mode": mode, "error": "failed to run", "passed": False}
+
+    max_bytes_per_row = args.max_bytes_per_row
+    if max_bytes_per_row is None:
+        max_bytes_per_row = DEFAULT_MAX_BYTES_PER_ROW[mode]
+
+    bound = args.allowance_mb * 1024 * 1024 + max_bytes_per_row * args.rows
+    growth = max(result["rss_growth_bytes"] or 0, result["tracemalloc_peak_bytes"] or 0)
+
+    result["max_bytes_per_row"] = max_bytes_per_row
+    result["bound_bytes"] = bound
+    result["bytes_per_row"] = round(growth / max(args.rows, 1), 1)
+    result["passed"] = growth <= bound
+
+    log = logger.info if result["passed"] else logger.error
+    log("Memory check [%s]: %s. %d rows in %.1f s. RSS growth: %.1f MiB. tracemalloc peak: %s. "
+        "Bytes per row: %.1f (bound: %.1f MiB).",
+        mode,
+        "PASSED" if result["passed"] else "FAILED",
+        result["rows"],
+        result["elapsed_s"],
+        (result["rss_growth_bytes"] or 0) / (1024 * 1024),
+        "{0:.1f} MiB".format(result["tracemalloc_peak_bytes"] / (1024 * 1024))
+            if result["tracemalloc_peak_bytes"] is not None else "n/a",
+        result["bytes_per_row"],
+        bound / (1024 * 1024))
+
+    return result
+
+
+def _main(logger=DEFAULT_LOGGER):
+    """
+    The main function.
+    """
+
+    args = _parse_command_line_args()
+
+    # Single mode (child process): the measurements are printed as the last line of the standard output
+
+    if args.run_mode:
+        print(json.dumps(_run_mode(args)))
+        sys.exit(0)
+
+    status = logger_util.init_logging_subsystem(logger)
+
+    if status is False:
+        # Should never happen
+        print("Failed to initialize the logging subsystem.")
+        sys.exit(1)
+
+    logger.info("Checking memory growth: %d rows (distribution: %s, seed: %s)...",
+        args.rows, args.distribution, args.seed)
+
+    results = [_check_mode(args, mode) for mode in (args.mode or MODES)]
+
+    if args.output:
+        file_util.create_json_file(
+            file=args.output,
+            content={
+                "rows": args.rows,
+                "distribution": str(args.distribution),
+                "seed": args.seed,
+                "allowance_mb": args.allowance_mb,
+                "modes": results
+            },
+            logger=logger)
+
+    logger_util.shutdown_logging_subsystem()
+
+    sys.exit(0 if all(result["passed"] for result in results) else 1)
+
+
+# Main ------------------------------------------------------------------------>
+
+if __name__ == "__main__":
+    _main()
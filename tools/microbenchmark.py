@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# pylint: disable=protected-access
+
+# Modules
+
+import os
+import sys
+import logging
+import argparse
+import timeit
+
+from lib.constants import constants
+from lib.utils import logger_util
+from lib.utils import string_util
+from lib.utils import file_util
+from lib.classes.scan_conflicts_task import ScanConflictsTask
+from lib.classes.conflict_distribution import ConflictDistribution
+from lib.classes.synthetic_view_source import SyntheticViewSource
+from lib.classes import conflict_distribution
+from lib.classes import conflicts_generator
+
+# Globals
+
+ARGUMENT_PARSER_EPILOG = \
+    "=== Examples ===\n" \
+    "\n" \
+    "python -m tools.microbenchmark --rows 100000 --repeat 5\n" \
+    "\n" \
+    "python -m tools.microbenchmark --distribution small --output results/conflicts_microbenchmark.json\n"
+
+DEFAULT_ROWS = 100000
+DEFAULT_REPEAT = 5
+DEFAULT_DISTRIBUTION = "production"
+DEFAULT_THRESHOLD = 5000 # revisions
+
+DEFAULT_LOGGER = logging.getLogger("microbenchmark")
+
+# Functions ------------------------------------------------------------------->
+
+def _parse_command_line_args():
+    """
+    Parse command-line arguments
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Microbenchmarks of the per-row scan processing steps over synthetic view rows.",
+        epilog=ARGUMENT_PARSER_EPILOG,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=DEFAULT_ROWS,
+        help="The number of synthetic conflicts view rows. "
+             "Default: {0}.".format(DEFAULT_ROWS))
+
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=DEFAULT_REPEAT,
+        help="The number of timed passes per step (the fastest pass is reported). "
+             "Default: {0}.".format(DEFAULT_REPEAT))
+
+    parser.add_argument(
+        "--distribution",
+        type=ConflictDistribution,
+        default=DEFAULT_DISTRIBUTION,
+        help="The distribution of the number of conflicts per row ({0}). "
+             "Default: {1}.".format(conflict_distribution.SPECIFICATION_HELP, DEFAULT_DISTRIBUTION))
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=conflicts_generator.DEFAULT_SEED,
+        help="The random seed. "
+             "Default: {0}.".format(conflicts_generator.DEFAULT_SEED))
+
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Write the results to the specified JSON file. "
+             "Default: none.")
+
+    args = parser.parse_args()
+
+    return args
+
+
+def _get_steps(rows):
+    """
+    Retrieve the benchmarked steps: name -> callable processing every row once
+    """
+
+    def constants_attribute():
+        for _ in rows:
+            _ = constants.PROPERTY_ID
+
+    def module_constant():
+        property_id = constants.PROPERTY_ID
+        for _ in rows:
+            _ = property_id
+
+    def sanitize_key():
+        for row in rows:
+            string_util.sanitize_control_characters(row["key"], string_util.SUBSTITUTE_BLOCK_CHAR)
+
+    def validate_row():
+        for index, row in enumerate(rows):
+            ScanConflictsTask._validate_row(row, index)
+
+    def normalize_row():
+        for row in rows:
+            ScanConflictsTask._get_normalized_row(row)
+
+    def process_row(deletion_mode):
+        def run():
+            task = ScanConflictsTask(
+                deletion_mode=deletion_mode,
+                threshold=DEFAULT_THRESHOLD,
+                ddoc=None,
+                csv_file=os.devnull)
+            task._init_csv_file()
+            for index, row in enumerate(rows):
+                task._process_row(index, row)
+            task._shutdown_csv_file()
+        return run
+
+    return {
+        "constants_attribute": constants_attribute,
+        "module_constant": module_constant,
+        "sanitize_key": sanitize_key,
+        "validate_row": validate_row,
+        "normalize_row": normalize_row,
+        "process_row_scan": process_row(False),
+        "process_row_delete": process_row(True)
+    }
+
+
+def _main(logger=DEFAULT_LOGGER):
+    """
+    The main function.
+    """
+
+    status = logger_util.init_logging_subsystem(logger)
+
+    if status is False:
+        # Should never happen
+        print("Failed to initialize the logging subsystem.")
+        sys.exit(1)
+
+    args = _parse_command_line_args()
+
+    logger.info("Generating %d synthetic rows (distribution: %s, seed: %s)...",
+        args.rows, args.distribution, args.seed)
+
+    rows = list(SyntheticViewSource(args.rows, args.distribution, args.seed))
+    results = {}
+
+    # The task logs (CSV file open / close) would otherwise dominate the short steps
+
+    logging.getLogger("scan_conflicts_task").setLevel(logging.WARNING)
+
+    for name, step in _get_steps(rows).items():
+        seconds = min(timeit.repeat(step, number=1, repeat=args.repeat))
+        results[name] = {
+            "ns_per_row": round(seconds * 1e9 / args.rows, 1),
+            "rows_per_s": round(args.rows / seconds, 1)
+        }
+
+    lines = ["Microbenchmark Results ({0} rows, best of {1}):".format(args.rows, args.repeat)]
+
+    for name, result in results.items():
+        lines.append("- {0:<24} {1:>10.1f} ns/row {2:>14.1f} rows/s".format(
+            name,
+            result["ns_per_row"],
+            result["rows_per_s"]))
+
+    logger.info("\n".join(lines))
+
+    if args.output:
+        file_util.create_json_file(
+            file=args.output,
+            content={
+                "rows": args.rows,
+                "repeat": args.repeat,
+                "distribution": str(args.distribution),
+                "seed": args.seed,
+                "steps": results
+            },
+            logger=logger)
+
+    logger_util.shutdown_logging_subsystem()
+
+
+# Main ------------------------------------------------------------------------>
+
+if __name__ == "__main__":
+    _main()
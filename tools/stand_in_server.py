@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+    Copyright 2021 Mike Pawlowski
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Pylint Rule Overrides
+
+# Modules
+
+import sys
+import logging
+import argparse
+import threading
+import functools
+
+from lib.constants import constants
+from lib.utils import logger_util
+from lib.classes.stand_in_store import StandInStore
+from lib.classes.stand_in_server import StandInServer
+from lib.classes.conflict_distribution import ConflictDistribution
+from lib.classes.conflicts_generator import ConflictsGenerator
+from lib.classes import stand_in_server
+from lib.classes import stand_in_store
+from lib.classes import conflict_distribution
+from lib.classes import conflicts_generator
+
+# Globals
+
+ARGUMENT_PARSER_EPILOG = \
+    "=== Examples ===\n" \
+    "\n" \
+    "python -m tools.stand_in_server -n conflicts-benchmark --documents 100000 --latency-ms 20\n" \
+    "\n" \
+    "python index.py -n conflicts-benchmark --url http://127.0.0.1:5984\n"
+
+DEFAULT_DATABASE_NAME = "conflicts-benchmark"
+DEFAULT_DOCUMENTS = 10000
+DEFAULT_DISTRIBUTION = "production"
+
+MS_PER_SECOND = 1000.0
+
+DEFAULT_LOGGER = logging.getLogger("stand_in")
+
+# Functions ------------------------------------------------------------------->
+
+def _parse_command_line_args():
+    """
+    Parse command-line arguments
+    """
+
+    parser = argparse.ArgumentParser(
+        description="In-process CouchDB / Cloudant stand-in server for offline benchmarking.",
+        epilog=ARGUMENT_PARSER_EPILOG,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument(
+        "-n",
+        "--database-name",
+        default=DEFAULT_DATABASE_NAME,
+        help="The name of the seeded database. "
+             "Default: {0}.".format(DEFAULT_DATABASE_NAME))
+
+    parser.add_argument(
+        "--host",
+        default=stand_in_server.DEFAULT_HOST,
+        help="The listening address. "
+             "Default: {0}.".format(stand_in_server.DEFAULT_HOST))
+
+    parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        default=stand_in_server.DEFAULT_PORT,
+        help="The listening port (0: any free port). "
+             "Default: {0}.".format(stand_in_server.DEFAULT_PORT))
+
+    parser.add_argument(
+        "--username",
+        default=None,
+        help="The accepted user name (requires --password). "
+             "Default: any credentials are accepted.")
+
+    parser.add_argument(
+        "--password",
+        default=None,
+        help="The accepted password. "
+             "Default: any credentials are accepted.")
+
+    parser.add_argument(
+        "--documents",
+        type=int,
+        default=DEFAULT_DOCUMENTS,
+        help="The number of seeded documents. "
+             "Default: {0}.".format(DEFAULT_DOCUMENTS))
+
+    parser.add_argument(
+        "--distribution",
+        type=ConflictDistribution,
+        default=DEFAULT_DISTRIBUTION,
+        help="The distribution of the number of conflicts per conflicted document: {0}. "
+             "Default: {1}.".format(conflict_distribution.SPECIFICATION_HELP, DEFAULT_DISTRIBUTION))
+
+    parser.add_argument(
+        "--conflicted-ratio",
+        type=float,
+        default=conflicts_generator.DEFAULT_CONFLICTED_RATIO,
+        help="The fraction (0 - 1) of seeded documents that carry conflicts. "
+             "Default: {0}.".format(conflicts_generator.DEFAULT_CONFLICTED_RATIO))
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=conflicts_generator.DEFAULT_SEED,
+        help="The random seed (seeded documents, latency jitter, throttling). "
+             "The same seed always generates the same documents and revisions. "
+             "Default: {0}.".format(conflicts_generator.DEFAULT_SEED))
+
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0.0,
+        help="The fixed delay (in milliseconds) added to every response. "
+             "Default: 0.")
+
+    parser.add_argument(
+        "--latency-jitter-ms",
+        type=float,
+        default=0.0,
+        help="The maximum uniformly distributed extra delay (in milliseconds) added to every response. "
+             "Default: 0.")
+
+    parser.add_argument(
+        "--bandwidth",
+        type=int,
+        default=None,
+        help="The response transfer rate limit (in bytes per second). "
+             "Default: unlimited.")
+
+    parser.add_argument(
+        "--throttle-probability",
+        type=float,
+        default=0.0,
+        help="The probability (0 - 1) of answering a request with 429 Too Many Requests. "
+             "Default: 0.")
+
+    parser.add_argument(
+        "--throughput-blocks",
+        type=int,
+        default=stand_in_server.DEFAULT_THROUGHPUT_BLOCKS,
+        help="The provisioned throughput capacity blocks reported by the capacity API "
+             "(100 reads/s, 50 writes/s and 5 global queries/s per block). "
+             "Default: {0}.".format(stand_in_server.DEFAULT_THROUGHPUT_BLOCKS))
+
+    parser.add_argument(
+        "--background-tasks",
+        default=None,
+        help="The simulated cluster activity reported by /_active_tasks, as comma-separated TYPE:COUNT pairs "
+             "(types: {0}; e.g. indexer:2,replication:1). "
+             "Default: none.".format(", ".join(stand_in_server.BACKGROUND_TASK_TYPES)))
+
+    parser.add_argument(
+        "--background-cycle",
+        type=float,
+        default=0,
+        help="The period (in seconds) alternating between busy (background tasks running) and idle phases. "
+             "Use 0 to keep the background tasks running. "
+             "Default: 0.")
+
+    parser.add_argument(
+        "--compaction-time",
+        type=float,
+        default=stand_in_server.DEFAULT_COMPACTION_TIME,
+        help="The duration (in seconds) of a database / view compaction (see: /_compact). "
+             "Default: {0}.".format(stand_in_server.DEFAULT_COMPACTION_TIME))
+
+    args = parser.parse_args()
+
+    return args
+
+
+def _validate_command_line_args(args, logger=DEFAULT_LOGGER):
+    """
+    Validate command-line arguments
+    """
+
+    if (args.username is None) != (args.password is None):
+        logger.error("The 'username' and 'password' CLI options must be specified together.")
+        return False
+
+    if args.documents < 0:
+        logger.error("Value specified for 'documents' CLI option is invalid: %d.", args.documents)
+        return False
+
+    if not 0 <= args.conflicted_ratio <= 1:
+        logger.error("Value specified for 'conflicted-ratio' CLI option is invalid: %s.", args.conflicted_ratio)
+        return False
+
+    if args.latency_ms < 0 or args.latency_jitter_ms < 0:
+        logger.error("Values specified for 'latency-ms' / 'latency-jitter-ms' CLI options must not be negative.")
+        return False
+
+    if args.bandwidth is not None and args.bandwidth <= 0:
+        logger.error("Value specified for 'bandwidth' CLI option is invalid: %d.", args.bandwidth)
+        return False
+
+    if not 0 <= args.throttle_probability <= 1:
+        logger.error(
+            "Value specified for 'throttle-probability' CLI option is invalid: %s.",
+            args.throttle_probability)
+        return False
+
+    if args.throughput_blocks < 1:
+        logger.error("Value specified for 'throughput-blocks' CLI option is invalid: %d.", args.throughput_blocks)
+        return False
+
+    if args.background_tasks is not None and _parse_background_tasks(args.background_tasks) is None:
+        logger.error("Value specified for 'background-tasks' CLI option is invalid: %s.", args.background_tasks)
+        return False
+
+    if args.background_cycle < 0:
+        logger.error("Value specified for 'background-cycle' CLI option is invalid: %s.", args.background_cycle)
+        return False
+
+    if args.compaction_time < 0:
+        logger.error("Value specified for 'compaction-time' CLI option is invalid: %s.", args.compaction_time)
+        return False
+
+    return True
+
+
+def _parse_background_tasks(value):
+    """
+    Parse the background tasks specification (TYPE:COUNT pairs); returns None if invalid
+    """
+
+    tasks = {}
+
+    for item in value.split(","):
+        task_type, _, count = item.strip().partition(":")
+
+        if task_type not in stand_in_server.BACKGROUND_TASK_TYPES or not count.isdigit():
+            return None
+
+        tasks[task_type] = int(count)
+
+    return tasks
+
+
+def _main(logger=DEFAULT_LOGGER):
+    """
+    The main function.
+    """
+
+    status = logger_util.init_logging_subsystem(logger)
+
+    if status is False:
+        # Should never happen
+        print("Failed to initialize the logging subsystem.")
+        sys.exit(1)
+
+    args = _parse_command_line_args()
+
+    if not _validate_command_line_args(args):
+        sys.exit(1)
+
+    # Seed store
+
+    logger.info("Seeding stand-in database: %s (%d documents)...", args.database_name, args.documents)
+
+    store = StandInStore()
+    store.create_database(args.database_name)
+    store.install_design_document(args.database_name, stand_in_store.DESIGN_DOCUMENT_PREFIX + constants.DDOC_NAME)
+
+    generator = ConflictsGenerator(
+        write_revisions=functools.partial(store.write_revisions, args.database_name),
+        document_count=args.documents,
+        distribution=args.distribution,
+        conflicted_ratio=args.conflicted_ratio,
+        seed=args.seed)
+    generator.run()
+
+    _, info = store.get_database_info(args.database_name)
+
+    logger.info("Successfully seeded stand-in database: %s (%d documents).", args.database_name, info["doc_count"])
+
+    # Serve
+
+    server = StandInServer(
+        store=store,
+        port=args.port,
+        host=args.host,
+        username=args.username,
+        password=args.password,
+        latency=args.latency_ms / MS_PER_SECOND,
+        latency_jitter=args.latency_jitter_ms / MS_PER_SECOND,
+        bandwidth=args.bandwidth,
+        throttle_probability=args.throttle_probability,
+        throughput_blocks=args.throughput_blocks,
+        background_tasks=_parse_background_tasks(args.background_tasks) if args.background_tasks else None,
+        background_cycle=args.background_cycle,
+        compaction_time=args.compaction_time,
+        seed=args.seed)
+
+    if not server.start():
+        sys.exit(1)
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        logger_util.shutdown_logging_subsystem()
+
+    sys.exit(0)
+
+
+# Main ------------------------------------------------------------------------>
+
+if __name__ == "__main__":
+    _main()